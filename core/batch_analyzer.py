@@ -0,0 +1,221 @@
+import os
+import re
+import json
+import time
+import shlex
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+from core.error_types import FFmpegError
+
+# 携带滤镜图的命令行选项
+FILTER_OPTIONS = ("-filter_complex", "-lavfi", "-vf", "-af", "-filter:v", "-filter:a")
+
+STAGES = ("parse", "validate", "ranges")
+
+# 快速定位滤镜图参数（双引号、单引号或无引号），避免对整条命令做 shlex 切分
+_FILTER_ARG_RE = re.compile(
+    r'(?:^|\s)(?:' + "|".join(re.escape(o) for o in FILTER_OPTIONS) + r')\s+'
+    r'(?:"((?:[^"\\]|\\.)*)"|\'([^\']*)\'|([^\s"\'\\]+))(?=\s|$)'
+)
+_FILTER_OPTION_RE = re.compile(r'(?:^|\s)(?:' + "|".join(re.escape(o) for o in FILTER_OPTIONS) + r')(?=\s)')
+_DQUOTE_ESCAPE_RE = re.compile(r'\\([\\"$`])')
+
+# 工作进程内复用的解析器与分析器
+_worker_state: Dict[str, object] = {}
+
+
+def extract_filter_graphs(command: str) -> List[str]:
+    """按出现顺序提取 FFmpeg 命令中的全部滤镜图文本（每个 -filter_complex/-vf/-af 一个）"""
+    graphs = []
+    for match in _FILTER_ARG_RE.finditer(command):
+        double, single, bare = match.groups()
+        if double is not None:
+            graphs.append(_DQUOTE_ESCAPE_RE.sub(r"\1", double))
+        else:
+            graphs.append(single if single is not None else bare)
+    if len(graphs) == len(_FILTER_OPTION_RE.findall(command)):
+        return graphs
+    # 拼接引号等少见写法按 shell 规则完整切分
+    tokens = shlex.split(command)
+    return [tokens[i + 1] for i, token in enumerate(tokens[:-1]) if token in FILTER_OPTIONS]
+
+
+def _init_worker(mode: str) -> None:
+    from parsers.filter_parser import FilterParser
+    _worker_state["parser"] = FilterParser()
+    if mode == "validate":
+        from parsers.semantic_analyzer import SemanticAnalyzer
+        from core.bulk_validator import BulkRangeValidator
+        _worker_state["analyzer"] = SemanticAnalyzer()
+        _worker_state["ranges"] = BulkRangeValidator()
+    _worker_state["mode"] = mode
+
+
+def _analyze_one(command: str, timings: Dict[str, float], parsed_commands: List) -> Dict:
+    """分析单条命令，返回结果并累计各阶段耗时；滤镜链追加到 parsed_commands 供批量范围验证
+
+    每个滤镜图单独解析和验证；任何异常都只记为该命令的错误，不中断整批。
+    """
+    start = time.perf_counter()
+    parsed_commands.append(None)
+    try:
+        graphs = [_worker_state["parser"].parse(graph) for graph in extract_filter_graphs(command)]
+        now = time.perf_counter()
+        timings["parse"] += now - start
+        start = now
+        if graphs:
+            parsed_commands[-1] = [chain for parsed in graphs for chain in parsed.filter_chains]
+
+        result = {"status": "ok", "chains": sum(len(parsed.filter_chains) for parsed in graphs)}
+        if "analyzer" in _worker_state:
+            for parsed in graphs:
+                _worker_state["analyzer"].validate(parsed)
+            timings["validate"] += time.perf_counter() - start
+        return result
+    except FFmpegError as e:
+        return {"status": "error", "error_type": e.error_type, "message": e.message}
+    except ValueError as e:
+        # shlex 引号不匹配等
+        return {"status": "error", "error_type": "PARSER_ERROR", "message": str(e)}
+    except Exception as e:
+        return {"status": "error", "error_type": "INTERNAL_ERROR", "message": f"{type(e).__name__}: {e}"}
+
+
+def _analyze_chunk(commands: List[str]) -> Tuple[List[Dict], Dict[str, float]]:
+    """工作进程入口：处理一个命令块"""
+    timings = dict.fromkeys(STAGES, 0.0)
+    parsed_commands = []
+    results = [_analyze_one(command, timings, parsed_commands) for command in commands]
+    if "ranges" in _worker_state:
+        # 整块命令的数值参数一次性向量化检查
+        start = time.perf_counter()
+        for error in _worker_state["ranges"].validate(parsed_commands):
+            result = results[error.details["command_index"]]
+            if result["status"] == "ok":
+                result.update(status="error", error_type=error.error_type, message=error.message)
+        timings["ranges"] += time.perf_counter() - start
+    return results, timings
+
+
+@dataclass
+class BatchStats:
+    """批处理统计"""
+    commands: int = 0
+    errors: int = 0
+    elapsed: float = 0.0
+    stage_times: Dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+
+    @property
+    def throughput(self) -> float:
+        return self.commands / self.elapsed if self.elapsed else 0.0
+
+    def report(self) -> str:
+        lines = [
+            f"处理命令: {self.commands} 条, 错误: {self.errors} 条",
+            f"总耗时: {self.elapsed:.2f} s, 吞吐量: {self.throughput:.0f} 条/秒"
+        ]
+        for stage, seconds in self.stage_times.items():
+            per_command = seconds / self.commands * 1e6 if self.commands else 0.0
+            lines.append(f"  {stage}: {seconds:.2f} s (CPU 累计), {per_command:.1f} us/条")
+        return "\n".join(lines)
+
+
+class BatchAnalyzer:
+    """基于进程池的批量命令分析器，结果保持输入顺序"""
+
+    def __init__(self, mode: str = "analyze", workers: Optional[int] = None, chunk_size: int = 256):
+        if mode not in ("analyze", "validate"):
+            raise ValueError(f"未知的批处理模式: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.stats = BatchStats()
+
+    def run(self, commands: Iterable[str]) -> Iterator[Dict]:
+        """分块提交到进程池，按输入顺序产出结果"""
+        self.stats = BatchStats()
+        start = time.perf_counter()
+        # 限制在途块数，避免一次性读入全部命令
+        max_in_flight = self.workers * 2
+        pending = deque()
+        index = 0
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.mode,)) as pool:
+            for chunk in self._chunks(commands):
+                pending.append(pool.submit(_analyze_chunk, chunk))
+                while len(pending) >= max_in_flight:
+                    for result in self._collect(pending.popleft().result(), index):
+                        index += 1
+                        yield result
+            while pending:
+                for result in self._collect(pending.popleft().result(), index):
+                    index += 1
+                    yield result
+        self.stats.elapsed = time.perf_counter() - start
+
+    def _chunks(self, commands: Iterable[str]) -> Iterator[List[str]]:
+        chunk = []
+        for command in commands:
+            chunk.append(command)
+            if len(chunk) >= self.chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def _collect(self, chunk_result: Tuple[List[Dict], Dict[str, float]], start_index: int) -> Iterator[Dict]:
+        results, timings = chunk_result
+        for stage, seconds in timings.items():
+            self.stats.stage_times[stage] += seconds
+        for offset, result in enumerate(results):
+            self.stats.commands += 1
+            if result["status"] != "ok":
+                self.stats.errors += 1
+            result["index"] = start_index + offset
+            yield result
+
+
+def read_ndjson_commands(stream: TextIO, records: deque) -> Iterator[str]:
+    """读取 NDJSON 输入：每行是命令字符串或 {"command": ..., "id": ...} 对象
+
+    每行按顺序向 records 追加一条记录：可读的行只带 id，命令交给分析器；
+    JSON 格式错误或缺少 command 的行直接记为带行号的错误记录，继续读取后续行。
+    """
+    for line_no, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+            command = item["command"] if isinstance(item, dict) else str(item)
+        except (ValueError, KeyError) as e:
+            records.append({
+                "status": "error", "error_type": "INPUT_ERROR",
+                "message": f"{type(e).__name__}: {e}", "line": line_no, "id": line_no
+            })
+            continue
+        records.append({"id": item.get("id", line_no) if isinstance(item, dict) else line_no})
+        yield command
+
+
+def run_ndjson(input_stream: TextIO, output_stream: TextIO, analyzer: BatchAnalyzer) -> BatchStats:
+    """NDJSON 输入输出的批处理入口，输出与输入行一一对应"""
+    records = deque()
+
+    def write_input_errors() -> None:
+        while records and "status" in records[0]:
+            analyzer.stats.commands += 1
+            analyzer.stats.errors += 1
+            output_stream.write(json.dumps(records.popleft(), ensure_ascii=False) + "\n")
+
+    for result in analyzer.run(read_ndjson_commands(input_stream, records)):
+        write_input_errors()
+        result["id"] = records.popleft()["id"]
+        output_stream.write(json.dumps(result, ensure_ascii=False) + "\n")
+    write_input_errors()
+    return analyzer.stats
+
+
+# 确保导出类
+__all__ = ['BatchAnalyzer', 'BatchStats', 'run_ndjson', 'extract_filter_graphs']
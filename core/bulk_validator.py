@@ -0,0 +1,149 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from core.error_types import FFmpegError
+
+# 滤镜名 -> 参数名 -> (下限, 上限)
+RangeTable = Dict[str, Dict[str, Tuple[float, float]]]
+
+# 尺寸参数：0（保持输入尺寸）、-1 与 -n（按比例缩放并取 n 的倍数）是合法的特殊值，
+# 与 SemanticAnalyzer._is_valid_dimension 一致
+DIMENSION_PARAMS: Dict[str, Tuple[str, ...]] = {"scale": ("width", "height", "w", "h")}
+
+
+def _numeric_ranges(param_ranges: Optional[Dict]) -> Dict[str, Tuple[float, float]]:
+    """只保留 (下限, 上限) 形式的数值范围，枚举值列表交给逐条验证"""
+    ranges = {}
+    for param, bounds in (param_ranges or {}).items():
+        if isinstance(bounds, tuple) and len(bounds) == 2 and \
+                all(isinstance(b, (int, float)) and not isinstance(b, bool) for b in bounds):
+            ranges[param] = (float(bounds[0]), float(bounds[1]))
+    return ranges
+
+
+def default_range_table() -> RangeTable:
+    """汇总 FILTER_SPECS 与各滤镜类的范围表，滤镜类的规格优先（与 get_spec 一致）"""
+    from parsers.filter_registry import FILTER_SPECS
+    from filters.video.color import ColorBalance
+    from filters.video.scaling import ScaleFilter
+    from filters.audio.mixing import AudioMixer
+
+    table: RangeTable = {}
+    for name, spec in FILTER_SPECS.items():
+        table[name] = _numeric_ranges(spec.param_ranges)
+    table.setdefault("colorbalance", {}).update(_numeric_ranges(ColorBalance.PARAM_RANGES))
+    table.setdefault("scale", {}).update(_numeric_ranges(ScaleFilter.spec.param_ranges))
+    table.setdefault("amix", {}).update(_numeric_ranges(AudioMixer.spec.param_ranges))
+    return {name: ranges for name, ranges in table.items() if ranges}
+
+
+def _to_float(values: List[str]) -> np.ndarray:
+    """字符串批量转浮点数，无法解析的（表达式等）记为 NaN"""
+    try:
+        return np.array(values, dtype=np.float64)
+    except ValueError:
+        pass
+
+    def parse(value: str) -> float:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return np.nan
+    return np.fromiter(map(parse, values), dtype=np.float64, count=len(values))
+
+
+class BulkRangeValidator:
+    """批量数值参数范围验证
+
+    先把一批命令中所有带范围约束的参数收集成扁平数组（取值、参数 id、所在位置），
+    再用 NumPy 一次完成转换与上下限比较，只有越界的参数才映射回命令和滤镜节点。
+    表达式等非数值取值不在此检查；尺寸参数的 0 与负整数视为特殊值，不判为越界。
+    """
+
+    def __init__(self, ranges: Optional[RangeTable] = None):
+        ranges = default_range_table() if ranges is None else ranges
+        self._keys: List[Tuple[str, str]] = []
+        self._ids: Dict[str, Dict[str, int]] = {}
+        lows, highs, dimensions = [], [], []
+        for name, params in ranges.items():
+            for param, (low, high) in params.items():
+                self._ids.setdefault(name, {})[param] = len(self._keys)
+                self._keys.append((name, param))
+                lows.append(low)
+                highs.append(high)
+                dimensions.append(param in DIMENSION_PARAMS.get(name, ()))
+        self._lows = np.array(lows, dtype=np.float64)
+        self._highs = np.array(highs, dtype=np.float64)
+        self._dimensions = np.array(dimensions, dtype=bool)
+
+    def validate(self, commands: Iterable) -> List[FFmpegError]:
+        """验证一批 ParsedCommand（或滤镜链列表），返回按输入顺序排列的越界诊断"""
+        from parsers.filter_graph import chain_fields
+
+        unique: Dict[str, int] = {}  # 取值去重：批量命令中的参数值大量重复
+        codes = array('l')  # 每个取值 -> 去重后的编号
+        key_ids = array('l')  # 每个取值 -> 参数 id
+        owners = array('l')  # 每个取值 -> 所在滤镜编号
+        locations = array('l')  # 滤镜编号 -> (命令, 链, 滤镜) 三个整数
+        plans: Dict[tuple, Tuple[Tuple[int, int], ...]] = {}  # (滤镜名, 参数名元组) -> ((参数位置, 参数 id), ...)
+        ids = self._ids
+        for command_index, command in enumerate(commands):
+            if command is None:
+                continue
+            chains = command if isinstance(command, (list, tuple)) else command.filter_chains
+            for chain_index, chain in enumerate(chains):
+                for filter_index, filter_def in enumerate(chain_fields(chain)[2]):
+                    if isinstance(filter_def, dict):
+                        name, params = filter_def["name"], filter_def["params"]
+                        keys, param_values = tuple(params), tuple(params.values())
+                    else:
+                        # FilterNode 的参数名元组在滤镜间共享，可直接作为缓存键
+                        name, keys, param_values = filter_def.name, filter_def.param_keys, filter_def.param_values
+                    plan = plans.get((name, keys))
+                    if plan is None:
+                        param_ids = ids.get(name, {})
+                        plan = tuple((pos, param_ids[key]) for pos, key in enumerate(keys) if key in param_ids)
+                        plans[(name, keys)] = plan
+                    if not plan:
+                        continue
+                    owner = len(locations) // 3
+                    locations.extend((command_index, chain_index, filter_index))
+                    for pos, key_id in plan:
+                        codes.append(unique.setdefault(param_values[pos], len(unique)))
+                        key_ids.append(key_id)
+                        owners.append(owner)
+        if not codes:
+            return []
+
+        values = list(unique)
+        numbers = _to_float(values)[np.frombuffer(codes, dtype=np.dtype(codes.typecode))]
+        keys = np.frombuffer(key_ids, dtype=np.dtype(key_ids.typecode))
+        # NaN 的比较结果为 False，非数值取值自然不会被判为越界
+        below = numbers < self._lows[keys]
+        below &= ~(self._dimensions[keys] & (numbers <= 0) & (numbers == np.floor(numbers)))
+        violations = np.flatnonzero(below | (numbers > self._highs[keys]))
+        return [
+            self._violation(values[codes[i]], key_ids[i], locations, owners[i])
+            for i in violations.tolist()
+        ]
+
+    def _violation(self, value: str, key_id: int, locations: array, owner: int) -> FFmpegError:
+        name, param = self._keys[key_id]
+        low, high = self._lows[key_id], self._highs[key_id]
+        return FFmpegError(
+            f"滤镜 {name} 的参数 {param}={value} 超出允许范围",
+            error_type="INVALID_PARAM",
+            suggestion=f"取值范围: ({low:g}, {high:g})",
+            details={
+                "command_index": locations[3 * owner],
+                "chain_index": locations[3 * owner + 1],
+                "filter_index": locations[3 * owner + 2],
+                "filter": name,
+                "param": param,
+                "value": value,
+            }
+        )
+
+
+# 确保导出类
+__all__ = ['BulkRangeValidator', 'RangeTable', 'DIMENSION_PARAMS', 'default_range_table']
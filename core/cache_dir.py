@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+from typing import Optional
+
+# 可通过环境变量覆盖缓存目录
+CACHE_DIR_ENV = "FFMPEG_ANALYZER_CACHE_DIR"
+
+
+def get_cache_dir(subdir: Optional[str] = None) -> Path:
+    """获取磁盘缓存目录（不存在时自动创建）"""
+    root = os.environ.get(CACHE_DIR_ENV)
+    if root:
+        path = Path(root)
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+        path = Path(base) / "ffmpeg-analyzer"
+    if subdir:
+        path = path / subdir
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+# 确保导出
+__all__ = ['get_cache_dir', 'CACHE_DIR_ENV']
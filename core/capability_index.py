@@ -0,0 +1,259 @@
+import os
+import re
+import shutil
+import marshal
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from core.cache_dir import get_cache_dir
+from core.error_types import FFmpegError
+
+# 可通过环境变量指定 ffmpeg 可执行文件
+FFMPEG_BINARY_ENV = "FFMPEG_BINARY"
+
+# 探测的能力类别及对应的 ffmpeg 参数
+PROBES = {
+    "filters": "-filters",
+    "encoders": "-encoders",
+    "decoders": "-decoders",
+    "hwaccels": "-hwaccels",
+    "pix_fmts": "-pix_fmts",
+}
+
+# 索引文件格式版本，格式变化时递增
+INDEX_VERSION = 1
+PROBE_TIMEOUT = 10
+
+# " TSC acompressor       A->A       Audio compressor."
+_FILTER_LINE_RE = re.compile(r'^\s*([T.][S.][C.])\s+(\S+)\s+(\S*->\S*)\s+(.*)$')
+# " V....D libx264              libx264 H.264 / AVC ..."
+_CODER_LINE_RE = re.compile(r'^\s*([VAS][F.][S.][X.][B.][D.])\s+(\S+)\s+(.*)$')
+# "IO... yuv420p                3             12      8-8-8"
+_PIX_FMT_LINE_RE = re.compile(r'^([I.][O.][H.][P.][B.])\s+(\S+)\s+(\d+)\s+(\d+)')
+
+Fingerprint = Tuple[str, int, int]
+
+
+def parse_filters(output: str) -> Dict[str, Tuple[str, str]]:
+    """解析 `ffmpeg -filters`：滤镜名 -> (标志位, 输入->输出类型)"""
+    filters = {}
+    for line in output.splitlines():
+        match = _FILTER_LINE_RE.match(line)
+        if match and match.group(2) != "=":
+            filters[match.group(2)] = (match.group(1), match.group(3))
+    return filters
+
+
+def parse_coders(output: str) -> Dict[str, str]:
+    """解析 `ffmpeg -encoders/-decoders`：编解码器名 -> 标志位"""
+    coders = {}
+    started = False
+    for line in output.splitlines():
+        if not started:
+            # 标志说明与列表之间以 " ------" 分隔
+            started = line.strip().startswith("---")
+            continue
+        match = _CODER_LINE_RE.match(line)
+        if match:
+            coders[match.group(2)] = match.group(1)
+    return coders
+
+
+def parse_hwaccels(output: str) -> Tuple[str, ...]:
+    """解析 `ffmpeg -hwaccels`：硬件加速方法列表"""
+    lines = [line.strip() for line in output.splitlines()]
+    return tuple(line for line in lines if line and not line.endswith(":"))
+
+
+def parse_pix_fmts(output: str) -> Dict[str, Tuple[str, int, int]]:
+    """解析 `ffmpeg -pix_fmts`：像素格式 -> (标志位, 分量数, 每像素位数)"""
+    pix_fmts = {}
+    started = False
+    for line in output.splitlines():
+        if not started:
+            started = line.startswith("-----")
+            continue
+        match = _PIX_FMT_LINE_RE.match(line)
+        if match:
+            pix_fmts[match.group(2)] = (match.group(1), int(match.group(3)), int(match.group(4)))
+    return pix_fmts
+
+
+_PARSERS = {
+    "filters": parse_filters,
+    "encoders": parse_coders,
+    "decoders": parse_coders,
+    "hwaccels": parse_hwaccels,
+    "pix_fmts": parse_pix_fmts,
+}
+
+
+def resolve_binary(binary: Optional[str] = None) -> str:
+    """定位 ffmpeg 可执行文件的绝对路径"""
+    binary = binary or os.environ.get(FFMPEG_BINARY_ENV) or "ffmpeg"
+    path = shutil.which(binary)
+    if path is None:
+        raise FFmpegError(
+            f"未找到 FFmpeg 可执行文件: {binary}",
+            error_type="UNKNOWN_ERROR",
+            suggestion=f"请安装 FFmpeg 或通过环境变量 {FFMPEG_BINARY_ENV} 指定路径"
+        )
+    return os.path.realpath(path)
+
+
+def binary_fingerprint(path: str) -> Fingerprint:
+    """以路径、文件大小和修改时间标识一个 ffmpeg 版本"""
+    stat = os.stat(path)
+    return path, stat.st_size, stat.st_mtime_ns
+
+
+class CapabilityIndex:
+    """FFmpeg 能力索引：滤镜、编码器、解码器、硬件加速与像素格式
+
+    每个 ffmpeg 可执行文件只探测一次，结果以 marshal 格式持久化到磁盘缓存，
+    之后的查询全部由内存中的字典完成。
+    """
+
+    def __init__(self, data: Dict, fingerprint: Fingerprint):
+        self.fingerprint = fingerprint
+        self.filters: Dict[str, Tuple[str, str]] = data["filters"]
+        self.encoders: Dict[str, str] = data["encoders"]
+        self.decoders: Dict[str, str] = data["decoders"]
+        self.hwaccels: Tuple[str, ...] = tuple(data["hwaccels"])
+        self.pix_fmts: Dict[str, Tuple[str, int, int]] = data["pix_fmts"]
+
+    @property
+    def binary(self) -> str:
+        return self.fingerprint[0]
+
+    def has_filter(self, name: str) -> bool:
+        return name in self.filters
+
+    def has_encoder(self, name: str) -> bool:
+        return name in self.encoders
+
+    def has_decoder(self, name: str) -> bool:
+        return name in self.decoders
+
+    def has_hwaccel(self, name: str) -> bool:
+        return name in self.hwaccels
+
+    def has_pix_fmt(self, name: str) -> bool:
+        return name in self.pix_fmts
+
+    def supports_timeline(self, name: str) -> bool:
+        """滤镜是否支持 enable= 时间线编辑"""
+        info = self.filters.get(name)
+        return info is not None and info[0][0] == "T"
+
+    def to_data(self) -> Dict:
+        return {
+            "filters": self.filters,
+            "encoders": self.encoders,
+            "decoders": self.decoders,
+            "hwaccels": self.hwaccels,
+            "pix_fmts": self.pix_fmts,
+        }
+
+    @staticmethod
+    def probe(binary: str) -> Dict:
+        """运行 ffmpeg 探测全部能力（各类别并行执行）"""
+        def run(section: str) -> Tuple[str, object]:
+            try:
+                result = subprocess.run(
+                    [binary, "-hide_banner", PROBES[section]],
+                    capture_output=True,
+                    text=True,
+                    timeout=PROBE_TIMEOUT
+                )
+            except (OSError, subprocess.TimeoutExpired) as e:
+                raise FFmpegError(
+                    f"FFmpeg 能力探测失败: {PROBES[section]}",
+                    error_type="UNKNOWN_ERROR",
+                    suggestion="请检查 FFmpeg 是否可以正常运行",
+                    details={"binary": binary, "reason": str(e)}
+                ) from e
+            return section, _PARSERS[section](result.stdout)
+
+        with ThreadPoolExecutor(len(PROBES)) as pool:
+            return dict(pool.map(run, PROBES))
+
+    @classmethod
+    def load(cls, binary: Optional[str] = None, cache_dir: Optional[Path] = None,
+             refresh: bool = False) -> 'CapabilityIndex':
+        """加载索引：磁盘缓存命中且可执行文件未变化时不启动 ffmpeg"""
+        fingerprint = binary_fingerprint(resolve_binary(binary))
+        path = cls.index_path(fingerprint, cache_dir)
+        if not refresh:
+            data = cls._read(path, fingerprint)
+            if data is not None:
+                return cls(data, fingerprint)
+
+        index = cls(cls.probe(fingerprint[0]), fingerprint)
+        cls._write(path, fingerprint, index.to_data())
+        return index
+
+    @staticmethod
+    def index_path(fingerprint: Fingerprint, cache_dir: Optional[Path] = None) -> Path:
+        key = hashlib.blake2b(repr(fingerprint).encode("utf-8"), digest_size=12).hexdigest()
+        return Path(cache_dir or get_cache_dir("capabilities")) / f"ffmpeg-{key}.idx"
+
+    @staticmethod
+    def _read(path: Path, fingerprint: Fingerprint) -> Optional[Dict]:
+        try:
+            version, stored, data = marshal.loads(path.read_bytes())
+        except (OSError, ValueError, EOFError, TypeError):
+            return None
+        if version != INDEX_VERSION or tuple(stored) != fingerprint:
+            return None
+        return data
+
+    @staticmethod
+    def _write(path: Path, fingerprint: Fingerprint, data: Dict) -> None:
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(marshal.dumps((INDEX_VERSION, fingerprint, data)))
+            os.replace(tmp, path)
+        except OSError:
+            # 缓存目录不可写时仅使用内存中的索引
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+
+# 进程内按可执行文件复用索引，首次使用时才检查文件状态
+_indexes: Dict[str, CapabilityIndex] = {}
+_lock = threading.Lock()
+
+
+def get_capability_index(binary: Optional[str] = None, refresh: bool = False) -> CapabilityIndex:
+    """获取进程内共享的能力索引"""
+    key = binary or os.environ.get(FFMPEG_BINARY_ENV) or "ffmpeg"
+    index = _indexes.get(key)
+    if index is not None and not refresh:
+        return index
+    with _lock:
+        index = _indexes.get(key)
+        if index is None or refresh:
+            index = CapabilityIndex.load(key, refresh=refresh)
+            _indexes[key] = index
+        return index
+
+
+def clear_capability_cache() -> None:
+    """清空进程内的索引（磁盘缓存保留）"""
+    with _lock:
+        _indexes.clear()
+
+
+# 确保导出类
+__all__ = [
+    'CapabilityIndex', 'get_capability_index', 'clear_capability_cache',
+    'resolve_binary', 'binary_fingerprint', 'FFMPEG_BINARY_ENV',
+    'parse_filters', 'parse_coders', 'parse_hwaccels', 'parse_pix_fmts'
+]
@@ -0,0 +1,134 @@
+import sys
+import shlex
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, Dict, Optional
+from core.error_types import FFmpegError
+
+
+def normalize_command(command: str) -> str:
+    """空白归一化：按 shell 规则切分后重新拼接，引号内的空白保持不变"""
+    try:
+        return "\0".join(shlex.split(command))
+    except ValueError:
+        # 引号不匹配时退化为按空白切分
+        return "\0".join(command.split())
+
+
+def command_key(command: str, namespace: str = "") -> str:
+    """计算归一化命令的缓存键"""
+    digest = hashlib.blake2b(normalize_command(command).encode("utf-8"), digest_size=16)
+    if namespace:
+        digest.update(b"\0" + namespace.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def freeze(value: Any) -> Any:
+    """递归转换为不可变结构，防止缓存结果被调用方修改"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, set):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """把 freeze 的结果还原为可修改的 dict/list"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    if isinstance(value, frozenset):
+        return {thaw(v) for v in value}
+    return value
+
+
+def deep_sizeof(value: Any) -> int:
+    """估算对象占用的内存字节数"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (dict, MappingProxyType)):
+        size += sum(deep_sizeof(k) + deep_sizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(v) for v in value)
+    return size
+
+
+@dataclass(frozen=True)
+class CachedCommand:
+    """缓存的解析+验证+优化结果"""
+    parsed: Any  # freeze 后的命令结构
+    command: Optional[str] = None  # 生成的可执行命令
+    error: Optional[FFmpegError] = None  # 验证失败时的错误
+    size: int = 0
+
+
+class CommandCache:
+    """按归一化命令文本索引的 LRU 缓存，同时限制条目数与内存占用"""
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedCommand]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[CachedCommand]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, parsed: Any, command: Optional[str] = None,
+            error: Optional[FFmpegError] = None) -> CachedCommand:
+        frozen = freeze(parsed)
+        size = deep_sizeof(frozen) + deep_sizeof(command) + sys.getsizeof(key)
+        entry = CachedCommand(parsed=frozen, command=command, error=error, size=size)
+        if size > self.max_bytes:
+            # 单条结果超过内存上限时不缓存
+            return entry
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old.size
+            self._entries[key] = entry
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.current_bytes -= evicted.size
+                self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """命中/未命中/淘汰计数"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+# 确保导出类
+__all__ = ['CommandCache', 'CachedCommand', 'command_key', 'normalize_command', 'freeze', 'thaw']
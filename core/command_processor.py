@@ -1,75 +1,254 @@
 import re
 import shlex
 import subprocess
+from dataclasses import replace
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 from core.error_types import FFmpegError, ErrorLevel
+from core.command_cache import CommandCache, command_key
+
+# 不带值的命令行选项（与 command_grammar.lark 的 FLAG 保持一致）
+_FLAG_OPTIONS = frozenset({
+    "-y", "-n", "-an", "-vn", "-sn", "-dn", "-shortest", "-hide_banner", "-nostdin", "-nostats", "-stats",
+    "-re", "-copyts", "-start_at_zero", "-noautorotate"
+})
+
+# 滤镜链：链首输入标签、滤镜、链尾输出标签
+_CHAIN_LABELS = re.compile(r'^((?:\[[^\]]+\]\s*)*)(.*?)((?:\s*\[[^\]]+\])*)$', re.S)
+_LABEL = re.compile(r'\[([^\]]+)\]')
 
 class FFmpegCommandProcessor:
-    def __init__(self, enable_hw_accel: bool = True):
+    def __init__(self, enable_hw_accel: bool = True, cache: Optional[CommandCache] = None, probe=None):
+        # core 包导入时不加载 parsers 与 hardware 包
+        from parsers.semantic_analyzer import SemanticAnalyzer
+        from hardware.acceleration import AccelerationManager
         self.semantic_analyzer = SemanticAnalyzer()
-        self.accel_manager = AccelerationManager() if enable_hw_accel else None
+        # probe 为硬件探测器，默认使用进程共享的探测器
+        self.accel_manager = AccelerationManager(probe) if enable_hw_accel else None
+        self.cache = cache  # 可选的解析/验证/优化结果缓存
         self.temp_dir = Path("/tmp/ffmpeg_proc")
         self.temp_dir.mkdir(exist_ok=True)
 
-    def process_command(self, raw_command: str) -> Dict:
-        """完整处理流程"""
+    def process_command(self, raw_command: str, validated: bool = False) -> Dict:
+        """完整处理流程
+
+        :param validated: 调用方已完成语义验证（如节点的增量验证）时跳过验证
+        """
         try:
-            parsed = self._parse(raw_command)
-            self.semantic_analyzer.validate(parsed)
-            if self.accel_manager:
-                parsed = self.accel_manager.optimize(parsed)
-            cmd_str = self._generate_cmd(parsed)
+            cmd_str = self.prepare_command(raw_command, validated)
             return self._execute(cmd_str)
         except FFmpegError as e:
             return self._format_error(e)
 
+    def prepare_command(self, raw_command: str, validated: bool = False) -> str:
+        """解析、验证、优化并生成命令，启用缓存时复用之前的结果"""
+        if self.cache is None:
+            return self._prepare(raw_command, validated)[1]
+
+        accelerator = self.accel_manager.get_current_accelerator() if self.accel_manager else "software"
+        key = command_key(raw_command, f"{accelerator}:{int(validated)}")
+        entry = self.cache.get(key)
+        if entry is None:
+            try:
+                parsed, cmd_str = self._prepare(raw_command, validated)
+            except FFmpegError as e:
+                # 验证失败的命令同样缓存，重复提交时直接返回错误
+                self.cache.put(key, None, error=e)
+                raise
+            entry = self.cache.put(key, parsed, cmd_str)
+        if entry.error is not None:
+            raise replace(entry.error)
+        return entry.command
+
+    def _prepare(self, raw_command: str, validated: bool) -> Tuple[Dict, str]:
+        parsed = self._prune_unmapped(self._parse(raw_command))
+        if not validated and parsed["filters"]:
+            self.semantic_analyzer.validate(self._filter_model(parsed))
+        if self.accel_manager:
+            parsed = self._accelerate(parsed)
+        return parsed, self._generate_cmd(parsed)
+
+    def _filter_model(self, parsed: Dict):
+        """把滤镜链交给滤镜解析器，得到验证与优化使用的 ParsedCommand"""
+        from parsers.filter_parser import FilterParser
+        return FilterParser().parse(self._build_filters(parsed["filters"]))
+
+    def _accelerate(self, parsed: Dict) -> Dict:
+        """在当前加速器上规划滤镜放置，结果写回处理器的命令结构"""
+        from parsers.graph_writer import chain_parts
+        command = self.accel_manager.optimize_command({
+            "filter_chains": [chain.to_dict() for chain in self._filter_model(parsed).filter_chains]
+            if parsed["filters"] else [],
+            "inputs": parsed["inputs"],
+            # 放置规划按输出编码器决定链尾是否留在设备上
+            "outputs": [
+                {"file": output["path"], "maps": output["maps"],
+                 "options": {**{f"-c:{codec['type']}": codec["name"] for codec in output["codecs"]},
+                             **output["options"]}}
+                for output in parsed["outputs"]
+            ]
+        })
+        if parsed["filters"]:
+            parsed["filters"] = []
+            for chain in command["filter_chains"]:
+                # 链中间的标签（scale,[1:v]overlay）留在所属滤镜的文本中，与 _parse_filter_complex 一致
+                inputs, filters, outputs = chain_parts(chain)
+                parsed["filters"].append({
+                    "inputs": list(inputs),
+                    "filters": filters,
+                    "output": outputs[0] if outputs else None,
+                    "outputs": list(outputs)
+                })
+        for key in ("init_hw_device", "hwaccel_device"):
+            if command.get("global_options", {}).get(key):
+                parsed[key] = command["global_options"][key]
+        return parsed
+
     def _parse(self, command: str) -> Dict:
-        """深度解析命令结构"""
+        """深度解析命令结构：选项属于其后的第一个 -i 输入或输出文件"""
         parsed = {"inputs": [], "filters": [], "outputs": []}
-        tokens = iter(shlex.split(command))
-        
+        tokens = shlex.split(command)
+        if tokens and not tokens[0].startswith("-"):
+            tokens = tokens[1:]  # 可执行文件名
+        tokens = iter(tokens)
+        pending = self._new_output()
+
         while (token := next(tokens, None)) is not None:
             if token == "-i":
-                parsed["inputs"].append({"path": next(tokens)})
+                # 输入文件之前的选项（-ss、-f 等）是输入选项
+                parsed["inputs"].append({"path": next(tokens), "options": pending["options"]})
+                pending["options"] = {}
             elif token == "-filter_complex":
                 parsed["filters"] = self._parse_filter_complex(next(tokens))
-            elif token.startswith(("-c:", "-c:v", "-c:a")):
-                self._parse_codec(token, parsed)
+            elif token.startswith("-c:"):
+                self._parse_codec(token, next(tokens), pending)
             elif token == "-map":
-                parsed["outputs"][-1]["map"] = next(tokens)
+                label = next(tokens)
+                pending["maps"].append(label[1:-1] if label.startswith("[") and label.endswith("]") else label)
+            elif token.startswith("-") and token != "-":
+                self._parse_global(token, tokens, parsed, pending)
             else:
-                self._parse_global(token, parsed)
+                # 输出文件，- 表示标准输出
+                pending["path"] = token
+                parsed["outputs"].append(pending)
+                pending = self._new_output()
 
         return parsed
 
+    @staticmethod
+    def _new_output() -> Dict:
+        return {"maps": [], "codecs": [], "options": {}}
+
+    @staticmethod
+    def _parse_codec(token: str, name: str, output: Dict) -> None:
+        output["codecs"].append({"type": token[len("-c:"):], "name": name})
+
+    def _parse_global(self, token: str, tokens, parsed: Dict, output: Dict) -> None:
+        """全局选项与其他带值的输出选项；-y 由 _generate_cmd 固定添加"""
+        if token in ("-threads", "-hwaccel"):
+            parsed[token[1:]] = next(tokens)
+        elif token in _FLAG_OPTIONS:
+            if token != "-y":
+                output["options"][token] = None
+        else:
+            output["options"][token] = next(tokens, None)
+
     def _parse_filter_complex(self, filter_str: str) -> List:
-        """解析滤镜链语法"""
+        """解析滤镜链语法：链首的方括号为输入标签，链尾的为输出标签"""
         chains = []
-        current = {"inputs": [], "filters": [], "output": None}
-        
         for part in filter_str.split(';'):
             part = part.strip()
             if not part:
                 continue
-            
-            # 提取输入输出标签
-            inputs = re.findall(r'\[([^\]]+)\]', part)
-            output_match = re.search(r'\[([^\]]+)\]$', part)
-            
-            current["inputs"].extend(inputs)
-            current["filters"].extend(
-                [f.strip() for f in part.split(']')[-1].split(',') if f.strip()]
-            )
-            if output_match:
-                current["output"] = output_match.group(1)
-                chains.append(current)
-                current = {"inputs": [], "filters": [], "output": None}
-
+            match = _CHAIN_LABELS.match(part)
+            inputs = re.findall(r'\[([^\]]+)\]', match.group(1))
+            outputs = re.findall(r'\[([^\]]+)\]', match.group(3))
+            chains.append({
+                "inputs": inputs,
+                "filters": [f.strip() for f in match.group(2).split(',') if f.strip()],
+                "output": outputs[0] if outputs else None,
+                "outputs": outputs
+            })
         return chains
 
+    @staticmethod
+    def _trim_split(chain: Dict, used) -> None:
+        """删除链尾 split/asplit 未被使用的输出，只剩一路时改为 null/anull"""
+        name = chain["filters"][-1].split("=")[0] if chain["filters"] else ""
+        outputs = [label for label in chain["outputs"] if label in used]
+        if name not in ("split", "asplit") or not outputs or len(outputs) == len(chain["outputs"]):
+            return
+        if len(outputs) == 1:
+            chain["filters"][-1] = "anull" if name == "asplit" else "null"
+        else:
+            chain["filters"][-1] = f"{name}={len(outputs)}"
+        chain["output"], chain["outputs"] = outputs[0], outputs
+
+    def _prune_unmapped(self, parsed: Dict) -> Dict:
+        """删除输出未被 -map 使用的滤镜链，以及没有流被使用的 -i 输入（不再解复用和解码）
+
+        没有 -map 时 FFmpeg 自动选择流，不做删除；有输出文件未指定 -map 时保留全部输入。
+        """
+        # core 包导入时不加载 parsers 包
+        from parsers.filter_graph import (
+            FilterGraph, INPUT_INDEX_OPTIONS, input_file_index, option_input_index, renumber_input, renumber_option
+        )
+        maps = [label for output in parsed["outputs"] for label in output["maps"]]
+        if not maps:
+            return parsed
+        # 链中间的标签（scale,[1:v]overlay）留在滤镜文本中，连接关系按整条链的标签计算
+        graph = FilterGraph.build([dict(zip(("inputs", "outputs"), self._chain_labels(chain)))
+                                   for chain in parsed["filters"]])
+        live = graph.live_nodes(label.lstrip("-") for label in maps)
+        parsed["filters"] = [chain for index, chain in enumerate(parsed["filters"]) if index in live]
+        chain_inputs = [label for chain in parsed["filters"] for label in self._chain_labels(chain)[0]]
+        used = set(maps) | set(chain_inputs)
+        for chain in parsed["filters"]:
+            self._trim_split(chain, used)
+        if not all(output["maps"] for output in parsed["outputs"]) or \
+                not all(chain["inputs"] for chain in parsed["filters"]):
+            return parsed
+
+        references = maps + chain_inputs
+        used = {input_file_index(label.lstrip("-")) for label in references}
+        used.update(option_input_index(output["options"][option]) for output in parsed["outputs"]
+                    for option in INPUT_INDEX_OPTIONS if output["options"].get(option) is not None)
+        for index in reversed(range(len(parsed["inputs"]))):
+            if index in used:
+                continue
+            del parsed["inputs"][index]
+            for chain in parsed["filters"]:
+                chain["inputs"] = [renumber_input(label, index) for label in chain["inputs"]]
+                chain["filters"] = [self._relabel_inputs(text, lambda label: renumber_input(label, index))
+                                    for text in chain["filters"]]
+            for output in parsed["outputs"]:
+                output["maps"] = [renumber_input(label, index) for label in output["maps"]]
+                for option in INPUT_INDEX_OPTIONS:
+                    if output["options"].get(option) is not None:
+                        output["options"][option] = renumber_option(output["options"][option], index)
+        return parsed
+
+    @staticmethod
+    def _chain_labels(chain: Dict) -> Tuple[List[str], List[str]]:
+        """整条链的 (输入, 输出) 标签：链首、链尾的标签加上写在中间滤镜文本前后的标签"""
+        inputs, outputs = list(chain["inputs"]), []
+        for text in chain["filters"]:
+            match = _CHAIN_LABELS.match(text)
+            inputs += _LABEL.findall(match.group(1))
+            outputs += _LABEL.findall(match.group(3))
+        return inputs, outputs + list(chain.get("outputs") or ())
+
+    @staticmethod
+    def _relabel_inputs(text: str, rename) -> str:
+        """改写滤镜文本前的输入标签"""
+        match = _CHAIN_LABELS.match(text)
+        if not match.group(1):
+            return text
+        return "".join(f"[{rename(label)}]" for label in _LABEL.findall(match.group(1))) + text[match.end(1):]
+
     def _generate_cmd(self, parsed: Dict) -> str:
         """生成可执行命令"""
+        from parsers.filter_graph import input_file_index
         cmd = ["ffmpeg -y"]
         
         # 全局参数
@@ -77,9 +256,14 @@ class FFmpegCommandProcessor:
             cmd.append(f"-threads {threads}")
         if hwaccel := parsed.get("hwaccel"):
             cmd.append(f"-hwaccel {hwaccel}")
+        for key in ("hwaccel_device", "init_hw_device"):
+            if value := parsed.get(key):
+                cmd.append(f"-{key} {shlex.quote(value)}")
 
         # 输入文件
         for inp in parsed["inputs"]:
+            for option, value in inp.get("options", {}).items():
+                cmd.append(option if value is None else f"{option} {shlex.quote(value)}")
             cmd.append(f"-i {shlex.quote(inp['path'])}")
 
         # 滤镜链
@@ -88,10 +272,13 @@ class FFmpegCommandProcessor:
 
         # 输出参数
         for out in parsed["outputs"]:
-            if map_spec := out.get("map"):
-                cmd.append(f"-map {map_spec}")
-            if codec := out.get("codec"):
+            for label in out["maps"]:
+                # 滤镜图输出标签需要方括号，输入流说明符（0:v 等）不需要
+                cmd.append(f"-map {label}" if input_file_index(label.lstrip('-')) is not None else f"-map '[{label}]'")
+            for codec in out["codecs"]:
                 cmd.append(f"-c:{codec['type']} {codec['name']}")
+            for option, value in out["options"].items():
+                cmd.append(option if value is None else f"{option} {shlex.quote(value)}")
             cmd.append(shlex.quote(out["path"]))
 
         return " ".join(cmd)
@@ -106,8 +293,9 @@ class FFmpegCommandProcessor:
             # 构建滤镜部分
             filters = ",".join(c['filters'])
             
-            # 构建输出标签部分（修正后的代码）
-            output_label = f"[{c['output']}]" if c['output'] else ""
+            # 构建输出标签部分（split 等可有多个输出）
+            outputs = c.get('outputs') or ([c['output']] if c['output'] else [])
+            output_label = "".join(f"[{label}]" for label in outputs)
             
             filter_chain.append(f"{input_labels}{filters}{output_label}")
         return ";".join(filter_chain)
@@ -126,16 +314,16 @@ class FFmpegCommandProcessor:
             return {"status": "success", "output": result.stdout}
         except subprocess.CalledProcessError as e:
             raise FFmpegError(
-                code="EXECUTION_FAILED",
-                message=f"执行失败: {e.output}",
+                f"执行失败: {e.output}",
+                error_type="EXECUTION_FAILED",
                 suggestion="检查输入文件和参数",
-                level=ErrorLevel.CRITICAL
+                level=ErrorLevel.CRITICAL.value
             ) from e
 
     def _format_error(self, error: FFmpegError) -> Dict:
         return {
             "status": "error",
-            "code": error.code,
+            "code": error.error_type,
             "message": error.message,
             "suggestion": error.suggestion
         }
\ No newline at end of file
@@ -0,0 +1,551 @@
+import os
+import re
+import json
+import statistics
+import subprocess
+from dataclasses import dataclass, asdict, replace
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from core.cache_dir import get_cache_dir
+from core.error_types import FFmpegError
+from core.capability_index import PROBE_TIMEOUT, resolve_binary
+from parsers.parser_models import ParsedCommand
+from parsers.filter_graph import chain_fields
+from parsers.propagation import StreamInfo, Propagation, propagate
+
+# 校准后的成本表文件名（位于缓存目录 cost/ 下）
+COST_TABLE_FILE = "cost_table.json"
+
+# 无法探测输入时假定的视频/音频属性
+DEFAULT_VIDEO = StreamInfo("video", 1920, 1080, "yuv420p", 25.0)
+DEFAULT_AUDIO = StreamInfo("audio", sample_rate=48000, channels=2)
+
+# 每像素位数（与 ffmpeg -pix_fmts 的 BITS_PER_PIXEL 一致）
+BITS_PER_PIXEL = {
+    "gray": 8, "yuv420p": 12, "yuvj420p": 12, "nv12": 12, "nv21": 12,
+    "yuv422p": 16, "yuvj422p": 16, "yuyv422": 16, "uyvy422": 16, "nv16": 16,
+    "yuv444p": 24, "yuvj444p": 24, "rgb24": 24, "bgr24": 24, "gbrp": 24,
+    "yuva420p": 20, "yuva444p": 32, "rgba": 32, "bgra": 32, "argb": 32, "abgr": 32,
+    "rgb0": 32, "bgr0": 32, "0rgb": 32, "0bgr": 32, "gbrap": 32,
+    "p010le": 24, "yuv420p10le": 24, "yuv422p10le": 32, "yuv444p10le": 48,
+    "rgb48le": 48, "rgba64le": 64, "gbrpf32le": 96,
+}
+# 音频按 32 位浮点样本估算搬运量
+BYTES_PER_SAMPLE = 4
+
+# 打包 RGB 格式：多数重型滤镜不支持，会在滤镜前后各插入一次 swscale 转换
+PACKED_RGB = frozenset({"rgba", "bgra", "argb", "abgr", "rgb24", "bgr24", "rgb0", "bgr0", "0rgb", "0bgr",
+                        "rgb48le", "rgba64le"})
+
+# 一次像素格式转换（swscale）的单价，纳秒/像素
+CONVERSION_NS = 1.5
+
+# GPU 编码器：-threads 只影响 CPU 侧线程
+_GPU_ENCODER_RE = re.compile(r'_(nvenc|qsv|vaapi|amf|videotoolbox|v4l2m2m|cuda)$')
+
+_BENCH_RE = re.compile(r'bench:\s*utime=([\d.]+)s(?:\s+stime=([\d.]+)s)?')
+
+
+def pix_fmt_family(pix_fmt: Optional[str]) -> Optional[str]:
+    """像素格式族：rgb（打包或平面 RGB）、yuv、gray，未知返回 None"""
+    if pix_fmt is None:
+        return None
+    if pix_fmt in PACKED_RGB or pix_fmt.startswith(("gbr", "rgb", "bgr")):
+        return "rgb"
+    if pix_fmt.startswith("gray"):
+        return "gray"
+    if pix_fmt.startswith(("yuv", "nv", "p01", "yuyv", "uyvy")):
+        return "yuv"
+    return None
+
+
+def frame_bytes(stream: StreamInfo) -> Optional[float]:
+    """每秒搬运的字节数（一次读或写）"""
+    if stream.kind == "audio":
+        if stream.sample_rate is None or stream.channels is None:
+            return None
+        return stream.sample_rate * stream.channels * BYTES_PER_SAMPLE
+    rate = stream.pixel_rate
+    if rate is None:
+        return None
+    return rate * BITS_PER_PIXEL.get(stream.pix_fmt, 12) / 8
+
+
+@dataclass(frozen=True)
+class FilterCost:
+    """单个滤镜的成本参数
+
+    ns_per_unit 为处理每个像素（音频为每个样本）的 CPU 纳秒数；
+    basis 为计价的一侧：input、output 或两者中较大的 max；
+    families 为滤镜原生支持的像素格式族，空表示任意格式都不需要转换；
+    bench 为校准时使用的滤镜写法。
+    """
+    ns_per_unit: float
+    basis: str = "input"
+    families: Tuple[str, ...] = ()
+    bench: Optional[str] = None
+
+    def supports(self, pix_fmt: Optional[str]) -> bool:
+        family = pix_fmt_family(pix_fmt)
+        return not self.families or family is None or family in self.families
+
+
+# 默认成本（1080p 单线程量级的经验值），可用 calibrate 子命令按本机基准测试覆盖
+DEFAULT_COSTS: Dict[str, FilterCost] = {
+    # 几乎不触及像素的滤镜
+    "null": FilterCost(0.0), "anull": FilterCost(0.0), "setpts": FilterCost(0.0), "asetpts": FilterCost(0.0),
+    "setsar": FilterCost(0.0), "setdar": FilterCost(0.0), "trim": FilterCost(0.0), "atrim": FilterCost(0.0),
+    "split": FilterCost(0.0), "asplit": FilterCost(0.0), "fps": FilterCost(0.0),
+    "format": FilterCost(0.0), "aformat": FilterCost(0.0),
+    "crop": FilterCost(0.05, "output", bench="crop=iw/2:ih/2"),
+    # 几何与合成
+    "scale": FilterCost(2.0, "max", bench="scale=iw/2:ih/2"),
+    "pad": FilterCost(0.3, "output", bench="pad=iw+64:ih+64"),
+    "hstack": FilterCost(0.3, "output"), "vstack": FilterCost(0.3, "output"),
+    "overlay": FilterCost(1.5, "input", ("yuv", "rgb")),
+    "transpose": FilterCost(1.0, bench="transpose=1"),
+    "hflip": FilterCost(0.5), "vflip": FilterCost(0.2),
+    "rotate": FilterCost(4.0, bench="rotate=PI/6"),
+    # 调色
+    "eq": FilterCost(1.0, families=("yuv",), bench="eq=contrast=1.2"),
+    "hue": FilterCost(1.5, families=("yuv",), bench="hue=h=30"),
+    "colorbalance": FilterCost(1.5, families=("rgb",), bench="colorbalance=rs=0.2"),
+    "colorchannelmixer": FilterCost(2.0, families=("rgb",), bench="colorchannelmixer=rr=0.9"),
+    "curves": FilterCost(1.0, families=("rgb",), bench="curves=preset=vintage"),
+    "lut": FilterCost(0.8), "lutyuv": FilterCost(0.8, families=("yuv",)), "lutrgb": FilterCost(0.8, families=("rgb",)),
+    "vignette": FilterCost(3.0, bench="vignette"),
+    "fade": FilterCost(0.5, bench="fade=in:0:25"),
+    # 重型滤镜：卷积、降噪、插帧
+    "gblur": FilterCost(6.0, families=("yuv", "gray"), bench="gblur=sigma=2"),
+    "boxblur": FilterCost(4.0, families=("yuv", "gray"), bench="boxblur=2"),
+    "unsharp": FilterCost(5.0, families=("yuv",), bench="unsharp"),
+    "hqdn3d": FilterCost(4.0, families=("yuv",), bench="hqdn3d"),
+    "nlmeans": FilterCost(60.0, families=("yuv", "gray"), bench="nlmeans"),
+    "deband": FilterCost(4.0, families=("yuv",), bench="deband"),
+    "yadif": FilterCost(3.0, families=("yuv",), bench="yadif"),
+    "bwdif": FilterCost(4.0, families=("yuv",), bench="bwdif"),
+    "minterpolate": FilterCost(100.0, families=("yuv",), bench="minterpolate=fps=50"),
+    "zscale": FilterCost(3.0, "max"), "tonemap": FilterCost(5.0),
+    "drawtext": FilterCost(0.5), "subtitles": FilterCost(0.5),
+    # GPU 滤镜在 CPU 上几乎无成本，上传/下载按搬运计价
+    "scale_cuda": FilterCost(0.0, "max"), "scale_npp": FilterCost(0.0, "max"),
+    "scale_qsv": FilterCost(0.0, "max"), "scale_vaapi": FilterCost(0.0, "max"),
+    "hwupload": FilterCost(0.5), "hwupload_cuda": FilterCost(0.5), "hwdownload": FilterCost(0.5),
+    # 音频：纳秒/样本
+    "volume": FilterCost(2.0), "amix": FilterCost(5.0, "output"), "amerge": FilterCost(1.0, "output"),
+    "aresample": FilterCost(20.0, "max"), "atempo": FilterCost(30.0), "loudnorm": FilterCost(200.0),
+    "afftdn": FilterCost(150.0), "acompressor": FilterCost(15.0),
+}
+# 未列出的滤镜
+UNKNOWN_COST = FilterCost(1.0)
+# 单价达到该值视为重型滤镜
+HEAVY_NS = 3.0
+
+
+class CostTable:
+    """滤镜成本表：默认经验值，可从本机基准测试校准并持久化"""
+
+    def __init__(self, costs: Optional[Dict[str, FilterCost]] = None, conversion_ns: float = CONVERSION_NS):
+        self.costs = dict(DEFAULT_COSTS if costs is None else costs)
+        self.conversion_ns = conversion_ns
+
+    def get(self, name: str) -> FilterCost:
+        return self.costs.get(name, UNKNOWN_COST)
+
+    def is_heavy(self, name: str) -> bool:
+        return self.get(name).ns_per_unit >= HEAVY_NS
+
+    @staticmethod
+    def default_path() -> Path:
+        return get_cache_dir("cost") / COST_TABLE_FILE
+
+    def to_data(self) -> Dict:
+        return {
+            "conversion_ns": self.conversion_ns,
+            "costs": {name: {**asdict(cost), "families": list(cost.families)} for name, cost in self.costs.items()}
+        }
+
+    def save(self, path: Optional[Path] = None) -> Path:
+        path = Path(path) if path else self.default_path()
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.to_data(), indent=2, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[Path] = None) -> 'CostTable':
+        """读取校准结果并覆盖默认值；文件不存在或损坏时返回默认成本表"""
+        path = Path(path) if path else cls.default_path()
+        table = cls()
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            for name, cost in data.get("costs", {}).items():
+                table.costs[name] = FilterCost(
+                    float(cost["ns_per_unit"]),
+                    cost.get("basis", "input"),
+                    tuple(cost.get("families", ())),
+                    cost.get("bench")
+                )
+            table.conversion_ns = float(data.get("conversion_ns", table.conversion_ns))
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+        return table
+
+    def calibrate(self, samples: Iterable['BenchmarkSample']) -> 'CostTable':
+        """按基准测试结果生成新成本表：单价取同一滤镜多次测量的中位数"""
+        measured: Dict[str, List[float]] = {}
+        for sample in samples:
+            if sample.units > 0:
+                measured.setdefault(sample.filter, []).append(max(sample.seconds, 0.0) * 1e9 / sample.units)
+        costs = dict(self.costs)
+        conversion_ns = self.conversion_ns
+        for name, values in measured.items():
+            ns = statistics.median(values)
+            if name == "format":
+                # format 基准测量的就是一次 swscale 转换
+                conversion_ns = ns
+                continue
+            costs[name] = replace(self.get(name), ns_per_unit=ns)
+        return CostTable(costs, conversion_ns)
+
+
+@dataclass(frozen=True)
+class BenchmarkSample:
+    """一次基准测试：滤镜在 units 个像素（或样本）上花费的 CPU 秒数（已扣除解码与空滤镜开销）"""
+    filter: str
+    units: float
+    seconds: float
+
+
+def parse_benchmark(output: str) -> Optional[float]:
+    """解析 `ffmpeg -benchmark` 输出中的 CPU 时间（utime + stime）"""
+    match = _BENCH_RE.search(output)
+    if not match:
+        return None
+    return float(match.group(1)) + float(match.group(2) or 0)
+
+
+def _run_benchmark(binary: str, graph: str, width: int, height: int, frames: int) -> float:
+    args = [
+        binary, "-hide_banner", "-nostdin", "-benchmark",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=25",
+        "-frames:v", str(frames), "-vf", graph, "-f", "null", "-"
+    ]
+    try:
+        result = subprocess.run(args, capture_output=True, text=True, timeout=PROBE_TIMEOUT * 6)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        raise FFmpegError(
+            f"基准测试运行失败: {graph}",
+            error_type="UNKNOWN_ERROR",
+            suggestion="请检查 FFmpeg 是否可以正常运行",
+            details={"reason": str(e)}
+        ) from e
+    seconds = parse_benchmark(result.stdout + result.stderr)
+    if seconds is None:
+        raise FFmpegError(
+            f"无法解析基准测试结果: {graph}",
+            error_type="UNKNOWN_ERROR",
+            suggestion="确认 FFmpeg 支持 -benchmark 且滤镜可用",
+            details={"stderr": result.stderr[-500:]}
+        )
+    return seconds
+
+
+def benchmark_filters(names: Optional[Sequence[str]] = None, binary: Optional[str] = None,
+                      table: Optional[CostTable] = None, width: int = 1920, height: int = 1080,
+                      frames: int = 100) -> List[BenchmarkSample]:
+    """在 testsrc2 上逐个运行视频滤镜，扣除 null 的基线得到每个滤镜的净耗时"""
+    binary = resolve_binary(binary)
+    table = table or CostTable()
+    if names is None:
+        names = [name for name, cost in table.costs.items() if cost.bench]
+    baseline = _run_benchmark(binary, "null", width, height, frames)
+    units = width * height * frames
+    samples = []
+    for name in names:
+        graph = table.get(name).bench or name
+        seconds = _run_benchmark(binary, graph, width, height, frames)
+        samples.append(BenchmarkSample(name, units, seconds - baseline))
+    # format 转换作为 swscale 单价
+    seconds = _run_benchmark(binary, "format=rgba", width, height, frames)
+    samples.append(BenchmarkSample("format", units, seconds - baseline))
+    return samples
+
+
+@dataclass(frozen=True)
+class NodeCost:
+    """单个滤镜的成本估算（按每秒媒体时长计）"""
+    chain_index: int
+    filter_index: int
+    name: str
+    units_per_second: Optional[float]  # 视频为像素/秒，音频为样本/秒
+    bytes_per_second: Optional[float]  # 读入与写出的字节数
+    conversions: int  # 显式或隐式的像素格式转换次数
+    cpu_seconds: float  # 每秒媒体需要的 CPU 秒数
+    input: StreamInfo
+    output: StreamInfo
+
+    def to_dict(self) -> Dict:
+        return {
+            "chain_index": self.chain_index,
+            "filter_index": self.filter_index,
+            "name": self.name,
+            "units_per_second": self.units_per_second,
+            "bytes_per_second": self.bytes_per_second,
+            "conversions": self.conversions,
+            "cpu_seconds": self.cpu_seconds,
+            "input": self.input.to_dict(),
+            "output": self.output.to_dict(),
+        }
+
+
+class ExplainReport:
+    """性能分析结果：每个滤镜的成本估算与反模式提示"""
+
+    def __init__(self, nodes: List[NodeCost], warnings: List[FFmpegError], propagation: Propagation,
+                 assumed: Sequence[str] = ()):
+        self.nodes = nodes
+        self.warnings = warnings
+        self.propagation = propagation
+        self.assumed = list(assumed)  # 使用默认属性的输入标签
+
+    @property
+    def total_cpu_seconds(self) -> float:
+        return sum(node.cpu_seconds for node in self.nodes)
+
+    @property
+    def total_bytes_per_second(self) -> float:
+        return sum(node.bytes_per_second or 0.0 for node in self.nodes)
+
+    @property
+    def conversions(self) -> int:
+        return sum(node.conversions for node in self.nodes)
+
+    def hot_nodes(self, count: int = 5) -> List[NodeCost]:
+        """按 CPU 成本从高到低排列"""
+        ranked = sorted(self.nodes, key=lambda node: node.cpu_seconds, reverse=True)
+        return [node for node in ranked[:count] if node.cpu_seconds > 0]
+
+    def to_dict(self, top: int = 5) -> Dict:
+        return {
+            "total_cpu_seconds": self.total_cpu_seconds,
+            "total_bytes_per_second": self.total_bytes_per_second,
+            "conversions": self.conversions,
+            "assumed_inputs": self.assumed,
+            "hot_nodes": [node.to_dict() for node in self.hot_nodes(top)],
+            "nodes": [node.to_dict() for node in self.nodes],
+            "warnings": [asdict(w) for w in self.warnings],
+        }
+
+    def format_text(self, top: int = 5) -> str:
+        total = self.total_cpu_seconds or 1.0
+        lines = [
+            f"估算 CPU 负载: {self.total_cpu_seconds:.3f} 核·秒/秒媒体, "
+            f"内存搬运: {self.total_bytes_per_second / 2 ** 20:.1f} MiB/s, 像素格式转换: {self.conversions} 次"
+        ]
+        if self.assumed:
+            lines.append(f"以下输入未探测，按默认属性估算: {', '.join(self.assumed)}")
+        lines.append("热点滤镜:")
+        for rank, node in enumerate(self.hot_nodes(top), 1):
+            source = node.input
+            geometry = f"{source.width}x{source.height} {source.pix_fmt}" if source.kind == "video" else \
+                f"{source.sample_rate}Hz {source.channels}ch"
+            lines.append(
+                f"  {rank}. [{node.chain_index}:{node.filter_index}] {node.name:<18} "
+                f"{node.cpu_seconds:8.3f}s ({node.cpu_seconds / total:5.1%})  {geometry}"
+                + (f"  转换 {node.conversions} 次" if node.conversions else "")
+            )
+        for warning in self.warnings:
+            lines.append(f"[{warning.level} {warning.details['rule']}] {warning.message}")
+            if warning.suggestion:
+                lines.append(f"    建议: {warning.suggestion}")
+        return "\n".join(lines)
+
+
+# 反模式检查：(命令, 滤镜链, 传递结果, 成本表) -> 提示列表
+AntiPatternCheck = Callable[[Optional[ParsedCommand], Sequence, Propagation, CostTable], List[FFmpegError]]
+ANTI_PATTERNS: Dict[str, AntiPatternCheck] = {}
+
+
+def register_anti_pattern(name: str) -> Callable[[AntiPatternCheck], AntiPatternCheck]:
+    """注册反模式检查的装饰器"""
+    def decorator(check: AntiPatternCheck) -> AntiPatternCheck:
+        ANTI_PATTERNS[name] = check
+        return check
+    return decorator
+
+
+@register_anti_pattern("rgb-before-heavy")
+def _rgb_before_heavy(command, chains, propagation: Propagation, table: CostTable) -> List[FFmpegError]:
+    """format=rgba 等打包 RGB 转换位于重型滤镜上游：重型滤镜前后都要再转换一次"""
+    warnings = []
+    origins: Dict[str, Tuple[int, int, str]] = {}
+    graph = propagation.graph
+    for node in graph.order:
+        chain_inputs, chain_outputs, filters = chain_fields(chains[node])
+        origin = next((origins[label] for label in chain_inputs if label in origins), None)
+        for position, filter_def in enumerate(filters):
+            name = filter_def["name"]
+            source, output = propagation.filter_io(node, position)
+            if origin is not None and table.is_heavy(name) and source[0].pix_fmt in PACKED_RGB \
+                    and not table.get(name).supports(source[0].pix_fmt):
+                warnings.append(FFmpegError(
+                    f"{origin[2]} 位于重型滤镜 {name} 上游，{name} 前后需要额外的像素格式转换",
+                    error_type="PERFORMANCE_WARNING",
+                    suggestion=f"把 {origin[2]} 移到 {name} 之后，或改用 YUV 格式",
+                    details={"rule": "rgb-before-heavy", "chain_index": node, "filter_index": position,
+                             "format_chain_index": origin[0], "format_filter_index": origin[1]},
+                    level="WARNING"
+                ))
+            pix_fmt = output[0].pix_fmt if output else None
+            if pix_fmt != source[0].pix_fmt:
+                origin = (node, position, f"{name}={pix_fmt}") if pix_fmt in PACKED_RGB else None
+        for label in chain_outputs:
+            if origin is not None:
+                origins[label] = origin
+    return warnings
+
+
+@register_anti_pattern("threads-gpu-encoder")
+def _threads_with_gpu_encoder(command, chains, propagation: Propagation, table: CostTable) -> List[FFmpegError]:
+    """GPU 编码时 -threads 只会增加 CPU 线程与帧缓冲"""
+    if command is None:
+        return []
+    threads = command.global_options.get("threads")
+    if not threads or int(threads) <= 4:
+        return []
+    encoders = [
+        value for output in command.outputs for key, value in output.get("options", {}).items()
+        if key in ("-c:v", "-codec:v", "-vcodec") and _GPU_ENCODER_RE.search(str(value))
+    ]
+    if not encoders:
+        return []
+    return [FFmpegError(
+        f"-threads {threads} 与 GPU 编码器 {encoders[0]} 同时使用，编码不占用这些 CPU 线程",
+        error_type="PERFORMANCE_WARNING",
+        suggestion="去掉 -threads 或降到 2-4，CPU 线程数交给滤镜使用 -filter_threads 控制",
+        details={"rule": "threads-gpu-encoder", "threads": threads, "encoder": encoders[0]},
+        level="WARNING"
+    )]
+
+
+class CostModel:
+    """静态成本模型：沿传递后的滤镜图估算每个滤镜的像素吞吐、内存搬运与格式转换"""
+
+    def __init__(self, table: Optional[CostTable] = None, default_video: StreamInfo = DEFAULT_VIDEO,
+                 default_audio: StreamInfo = DEFAULT_AUDIO):
+        self.table = table or CostTable.load()
+        self.default_video = default_video
+        self.default_audio = default_audio
+
+    def _complete_inputs(self, chains: Sequence, inputs: Dict[str, StreamInfo]) -> Tuple[Dict[str, StreamInfo], List[str]]:
+        """补全外部输入标签的属性：缺失的字段取默认值"""
+        produced, consumed = set(), []
+        for chain in chains:
+            chain_inputs, chain_outputs, _ = chain_fields(chain)
+            consumed.extend(chain_inputs)
+            produced.update(chain_outputs)
+        completed = dict(inputs)
+        assumed = []
+        for label in dict.fromkeys(consumed):
+            if label in produced:
+                continue
+            default = self.default_audio if ":a" in label else self.default_video
+            stream = inputs.get(label)
+            if stream is None:
+                completed[label] = default
+                assumed.append(label)
+                continue
+            missing = {k: v for k, v in default.__dict__.items() if v is not None and getattr(stream, k) is None}
+            if missing:
+                completed[label] = replace(stream, **missing)
+                assumed.append(label)
+        return completed, assumed
+
+    def node_cost(self, chain_index: int, filter_index: int, name: str,
+                  inputs: Sequence[StreamInfo], outputs: Sequence[StreamInfo]) -> NodeCost:
+        cost = self.table.get(name)
+        source = inputs[0]
+        output = outputs[0] if outputs else source
+        if source.kind == "audio":
+            in_units = (source.sample_rate or 0) * (source.channels or 0)
+            out_units = (output.sample_rate or 0) * (output.channels or 0)
+        else:
+            in_units = sum(s.pixel_rate or 0.0 for s in inputs)
+            out_units = output.pixel_rate or 0.0
+        units = {"input": in_units, "output": out_units}.get(cost.basis, max(in_units, out_units))
+
+        conversions = 0
+        conversion_units = 0.0
+        if source.kind == "video":
+            if output.pix_fmt != source.pix_fmt and source.pix_fmt and output.pix_fmt:
+                conversions += 1
+                conversion_units += in_units
+            elif not cost.supports(source.pix_fmt):
+                # 格式协商会在滤镜前后各插入一次转换
+                conversions += 2
+                conversion_units += 2 * in_units
+        cpu = (cost.ns_per_unit * units + self.table.conversion_ns * conversion_units) / 1e9
+
+        moved = [frame_bytes(s) for s in inputs] + [frame_bytes(s) for s in outputs]
+        known = [b for b in moved if b is not None]
+        return NodeCost(
+            chain_index, filter_index, name,
+            units_per_second=units or None,
+            bytes_per_second=sum(known) if known else None,
+            conversions=conversions,
+            cpu_seconds=cpu,
+            input=source,
+            output=output
+        )
+
+    def explain(self, command, inputs: Optional[Dict[str, StreamInfo]] = None) -> ExplainReport:
+        """估算 ParsedCommand（或滤镜链列表）中每个滤镜的成本并检查反模式"""
+        # 按属性区分：loader 会重新执行模块，ParsedCommand 可能是另一份类对象
+        parsed = command if hasattr(command, "filter_chains") else None
+        chains = command.filter_chains if parsed is not None else command
+        completed, assumed = self._complete_inputs(chains, inputs or {})
+        propagation = propagate(chains, completed)
+        nodes = []
+        for chain_index, io in enumerate(propagation.filters):
+            filters = chain_fields(chains[chain_index])[2]
+            for filter_index, (source, output) in enumerate(io):
+                name = filters[filter_index]["name"]
+                nodes.append(self.node_cost(chain_index, filter_index, name, source, output))
+        warnings = []
+        for check in ANTI_PATTERNS.values():
+            warnings.extend(check(parsed, chains, propagation, self.table))
+        return ExplainReport(nodes, warnings, propagation, assumed)
+
+
+def parse_command_text(text: str) -> ParsedCommand:
+    """完整命令（以 ffmpeg 或选项开头）用语法解析器，其余按滤镜图解析"""
+    stripped = text.lstrip()
+    if stripped.startswith(("ffmpeg", "-")):
+        from parsers.grammar_parser import GrammarParser
+        return GrammarParser().parse_command(stripped)
+    from parsers.filter_parser import FilterParser
+    return FilterParser().parse(stripped)
+
+
+def explain(command, inputs: Optional[Dict[str, StreamInfo]] = None, table: Optional[CostTable] = None,
+            probe: bool = False) -> ExplainReport:
+    """性能分析入口：command 可以是命令字符串、ParsedCommand 或滤镜链列表
+
+    probe 为 True 时用 ffprobe 探测 -i 输入文件，探测结果被 inputs 中的声明覆盖。
+    """
+    if isinstance(command, str):
+        command = parse_command_text(command)
+    inputs = dict(inputs or {})
+    if probe and getattr(command, "inputs", None):
+        from parsers.propagation import probe_inputs
+        inputs = {**probe_inputs([i["path"] for i in command.inputs]), **inputs}
+    return CostModel(table).explain(command, inputs)
+
+
+# 确保导出类
+__all__ = [
+    'FilterCost', 'CostTable', 'BenchmarkSample', 'NodeCost', 'ExplainReport', 'CostModel',
+    'DEFAULT_COSTS', 'ANTI_PATTERNS', 'register_anti_pattern', 'benchmark_filters', 'parse_benchmark',
+    'pix_fmt_family', 'frame_bytes', 'parse_command_text', 'explain'
+]
@@ -18,6 +18,7 @@ class ErrorType(Enum):
     FORMAT_MISMATCH = "FORMAT_MISMATCH"
     HW_NOT_SUPPORTED = "HW_NOT_SUPPORTED"
     SEMANTIC_ERROR = "SEMANTIC_ERROR"
+    PERFORMANCE_WARNING = "PERFORMANCE_WARNING"
 
 @dataclass
 class FFmpegError(Exception):
@@ -0,0 +1,347 @@
+import os
+import re
+import mmap
+import struct
+import marshal
+import subprocess
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from core.cache_dir import get_cache_dir
+from core.error_types import FFmpegError
+from core.capability_index import CapabilityIndex, PROBE_TIMEOUT, binary_fingerprint, resolve_binary
+
+# 索引文件：头部 | 滤镜名 | 目录（按名称排序） | 每个滤镜的 marshal 数据
+_MAGIC = b"FFSCHEMA"
+SCHEMA_VERSION = 1
+_HEADER = struct.Struct("<8sIII")  # magic, 版本, 滤镜数, 目录偏移
+_ENTRY = struct.Struct("<IHII")  # 名称偏移, 名称长度, 数据偏移, 数据长度
+
+# "  w                 <string>     ..FV.....T. Output video width"
+_OPTION_RE = re.compile(r'^  (\S+)\s+<(\w+)>\s+([.A-Z]{8,})\s?(.*)$')
+# "     auto            -1           ..FV......."
+_CONST_RE = re.compile(r'^\s{4,}(\S+)\s+(?:(\S+)\s+)?([.A-Z]{8,})')
+_RANGE_RE = re.compile(r'\(from (\S+) to (\S+)\)')
+_DEFAULT_RE = re.compile(r'\(default (".*?"|\S+?)\)')
+
+_NUMERIC_TYPES = {"int", "int64", "uint64", "float", "double"}
+_BOOLEAN_VALUES = {"true", "false", "yes", "no", "y", "n", "on", "off", "enable", "disable", "auto", "1", "0"}
+
+
+@dataclass(frozen=True)
+class OptionSchema:
+    """滤镜选项的类型化描述"""
+    name: str
+    type: str
+    minimum: Optional[float] = None
+    maximum: Optional[float] = None
+    default: Optional[str] = None
+    aliases: Tuple[str, ...] = ()
+    constants: Tuple[str, ...] = ()  # 可用的命名常量
+    description: str = ""
+
+    def check(self, value: str) -> Optional[str]:
+        """检查取值，返回错误描述；合法时返回 None"""
+        if value in self.constants:
+            return None
+        if self.type in _NUMERIC_TYPES:
+            try:
+                number = float(value)
+            except ValueError:
+                return f"应为数值或常量 {', '.join(self.constants)}" if self.constants else "应为数值"
+            if self.minimum is not None and number < self.minimum or \
+                    self.maximum is not None and number > self.maximum:
+                return f"超出范围 [{_format_number(self.minimum)}, {_format_number(self.maximum)}]"
+        elif self.type == "boolean" and value.lower() not in _BOOLEAN_VALUES:
+            return "应为布尔值"
+        return None
+
+
+@dataclass(frozen=True)
+class FilterSchema:
+    """由 `ffmpeg -h filter=<name>` 生成的滤镜描述"""
+    name: str
+    description: str = ""
+    timeline: bool = False  # 是否支持 enable= 时间线编辑
+    options: Tuple[OptionSchema, ...] = ()
+    _lookup: Dict[str, OptionSchema] = field(default=None, init=False, repr=False, compare=False)
+
+    def option(self, name: str) -> Optional[OptionSchema]:
+        """按选项名或别名查找"""
+        if self._lookup is None:
+            lookup = {}
+            for option in self.options:
+                lookup[option.name] = option
+                for alias in option.aliases:
+                    lookup[alias] = option
+            object.__setattr__(self, "_lookup", lookup)
+        return self._lookup.get(name)
+
+    def resolve(self, key: str) -> Optional[OptionSchema]:
+        """解析参数名，纯数字的键按位置对应选项"""
+        if key.isdigit():
+            index = int(key)
+            return self.options[index] if index < len(self.options) else None
+        return self.option(key)
+
+    def validate_params(self, params: Dict[str, str]) -> List[FFmpegError]:
+        """检查参数名与取值"""
+        errors = []
+        for key, value in params.items():
+            if key == "enable" and self.timeline:
+                continue
+            option = self.resolve(key)
+            if option is None:
+                errors.append(FFmpegError(
+                    f"滤镜 {self.name} 没有参数: {key}",
+                    error_type="INVALID_PARAM",
+                    suggestion=f"可用参数: {', '.join(o.name for o in self.options)}",
+                    details={"filter": self.name, "param": key}
+                ))
+                continue
+            problem = option.check(value)
+            if problem:
+                errors.append(FFmpegError(
+                    f"滤镜 {self.name} 的参数 {option.name}={value} {problem}",
+                    error_type="INVALID_PARAM",
+                    suggestion=f"默认值: {option.default}" if option.default is not None else None,
+                    details={"filter": self.name, "param": option.name, "value": value}
+                ))
+        return errors
+
+    def to_tuple(self) -> tuple:
+        return (self.name, self.description, self.timeline, tuple(
+            (o.name, o.type, o.minimum, o.maximum, o.default, o.aliases, o.constants, o.description)
+            for o in self.options
+        ))
+
+    @classmethod
+    def from_tuple(cls, data: tuple) -> 'FilterSchema':
+        name, description, timeline, options = data
+        return cls(name, description, timeline, tuple(OptionSchema(*o) for o in options))
+
+
+def _format_number(value: Optional[float]) -> str:
+    if value is None:
+        return "?"
+    return str(int(value)) if value == int(value) else str(value)
+
+
+def _parse_number(text: str) -> Optional[float]:
+    try:
+        return float(text)
+    except ValueError:
+        # INT_MAX、FLT_MAX 等符号上下限
+        return None
+
+
+def parse_filter_help(text: str) -> FilterSchema:
+    """解析 `ffmpeg -h filter=<name>` 的输出"""
+    lines = text.splitlines()
+    name = ""
+    description = ""
+    options: List[dict] = []
+    for i, line in enumerate(lines):
+        if line.startswith("Filter "):
+            name = line[len("Filter "):].strip()
+            if i + 1 < len(lines):
+                description = lines[i + 1].strip()
+            continue
+        match = _OPTION_RE.match(line)
+        if match:
+            option_name, option_type, _, help_text = match.groups()
+            range_match = _RANGE_RE.search(help_text)
+            default_match = _DEFAULT_RE.search(help_text)
+            default = default_match.group(1).strip('"') if default_match else None
+            description_text = help_text.split(" (")[0].strip()
+            previous = options[-1] if options else None
+            # 与上一个选项类型、说明完全相同的视为别名（如 scale 的 w/width）
+            if previous and previous["type"] == option_type and previous["help"] == help_text and help_text:
+                previous["aliases"].append(option_name)
+                continue
+            options.append({
+                "name": option_name,
+                "type": option_type,
+                "help": help_text,
+                "minimum": _parse_number(range_match.group(1)) if range_match else None,
+                "maximum": _parse_number(range_match.group(2)) if range_match else None,
+                "default": default,
+                "aliases": [],
+                "constants": [],
+                "description": description_text,
+            })
+            continue
+        match = _CONST_RE.match(line)
+        if match and options:
+            options[-1]["constants"].append(match.group(1))
+
+    timeline = "support for timeline" in text
+    return FilterSchema(
+        name=name,
+        description=description,
+        timeline=timeline,
+        options=tuple(
+            OptionSchema(
+                name=o["name"], type=o["type"], minimum=o["minimum"], maximum=o["maximum"],
+                default=o["default"], aliases=tuple(o["aliases"]), constants=tuple(o["constants"]),
+                description=o["description"]
+            ) for o in options
+        )
+    )
+
+
+def write_schema_index(path: Path, schemas: Iterable[FilterSchema]) -> None:
+    """写入按名称排序、可内存映射的二进制索引"""
+    schemas = sorted(schemas, key=lambda s: s.name)
+    names = b""
+    blobs = []
+    entries = []
+    data_offset = 0
+    for schema in schemas:
+        encoded_name = schema.name.encode("utf-8")
+        blob = marshal.dumps(schema.to_tuple())
+        entries.append((len(names), len(encoded_name), data_offset, len(blob)))
+        names += encoded_name
+        blobs.append(blob)
+        data_offset += len(blob)
+
+    names_offset = _HEADER.size
+    dir_offset = names_offset + len(names)
+    data_start = dir_offset + _ENTRY.size * len(entries)
+    directory = b"".join(
+        _ENTRY.pack(names_offset + n_off, n_len, data_start + d_off, d_len)
+        for n_off, n_len, d_off, d_len in entries
+    )
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, SCHEMA_VERSION, len(entries), dir_offset))
+        f.write(names)
+        f.write(directory)
+        for blob in blobs:
+            f.write(blob)
+    os.replace(tmp, path)
+
+
+class SchemaIndex:
+    """内存映射的滤镜选项索引：打开时只读取头部，查询时二分查找并按需解码"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count, self._dir_offset = _HEADER.unpack_from(self._mmap, 0)
+        if magic != _MAGIC or version != SCHEMA_VERSION:
+            self._mmap.close()
+            raise FFmpegError(
+                f"滤镜选项索引格式不兼容: {self.path}",
+                error_type="UNKNOWN_ERROR",
+                suggestion="请重新生成滤镜选项索引"
+            )
+        self._decoded: Dict[str, Optional[FilterSchema]] = {}
+
+    def _entry(self, index: int) -> Tuple[int, int, int, int]:
+        return _ENTRY.unpack_from(self._mmap, self._dir_offset + index * _ENTRY.size)
+
+    def _name(self, index: int) -> bytes:
+        name_offset, name_length, _, _ = self._entry(index)
+        return self._mmap[name_offset:name_offset + name_length]
+
+    def names(self) -> List[str]:
+        return [self._name(i).decode("utf-8") for i in range(self.count)]
+
+    def _find(self, name: str) -> int:
+        key = name.encode("utf-8")
+        index = bisect_left(_NameView(self), key)
+        return index if index < self.count and self._name(index) == key else -1
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def get(self, name: str) -> Optional[FilterSchema]:
+        """获取滤镜描述，首次访问时才解码"""
+        if name in self._decoded:
+            return self._decoded[name]
+        index = self._find(name)
+        schema = None
+        if index >= 0:
+            _, _, data_offset, data_length = self._entry(index)
+            schema = FilterSchema.from_tuple(marshal.loads(self._mmap[data_offset:data_offset + data_length]))
+        self._decoded[name] = schema
+        return schema
+
+    def close(self) -> None:
+        self._mmap.close()
+
+
+class _NameView:
+    """供 bisect 使用的只读名称序列"""
+
+    def __init__(self, index: SchemaIndex):
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.index.count
+
+    def __getitem__(self, i: int) -> bytes:
+        return self.index._name(i)
+
+
+def schema_index_path(binary: Optional[str] = None, cache_dir: Optional[Path] = None) -> Path:
+    """与能力索引相同，以可执行文件指纹命名"""
+    fingerprint = binary_fingerprint(resolve_binary(binary))
+    return CapabilityIndex.index_path(fingerprint, cache_dir or get_cache_dir("schemas")).with_suffix(".schema")
+
+
+def probe_filter_help(binary: str, name: str) -> str:
+    result = subprocess.run(
+        [binary, "-hide_banner", "-h", f"filter={name}"],
+        capture_output=True,
+        text=True,
+        timeout=PROBE_TIMEOUT
+    )
+    return result.stdout
+
+
+def generate_schema_index(binary: Optional[str] = None, cache_dir: Optional[Path] = None,
+                          workers: int = 8) -> Path:
+    """为 ffmpeg 支持的全部滤镜生成选项索引"""
+    path = schema_index_path(binary, cache_dir)
+    capabilities = CapabilityIndex.load(binary)
+    executable = capabilities.binary
+
+    def build(name: str) -> Optional[FilterSchema]:
+        schema = parse_filter_help(probe_filter_help(executable, name))
+        return schema if schema.name else None
+
+    with ThreadPoolExecutor(workers) as pool:
+        schemas = [s for s in pool.map(build, sorted(capabilities.filters)) if s is not None]
+    write_schema_index(path, schemas)
+    return path
+
+
+def load_schema_index(binary: Optional[str] = None, cache_dir: Optional[Path] = None,
+                      generate: bool = False) -> Optional[SchemaIndex]:
+    """打开当前 ffmpeg 对应的选项索引；不存在时按需生成"""
+    try:
+        path = schema_index_path(binary, cache_dir)
+    except (FFmpegError, OSError):
+        return None
+    if not path.exists():
+        if not generate:
+            return None
+        generate_schema_index(binary, cache_dir)
+    return SchemaIndex(path)
+
+
+# 确保导出类
+__all__ = [
+    'OptionSchema', 'FilterSchema', 'SchemaIndex', 'parse_filter_help',
+    'write_schema_index', 'generate_schema_index', 'load_schema_index', 'schema_index_path'
+]
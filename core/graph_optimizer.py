@@ -0,0 +1,308 @@
+import copy
+import inspect
+from dataclasses import dataclass, asdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from core.error_types import FFmpegError
+from parsers.parser_models import ParsedCommand, FilterChain, FilterNode, Stream
+from parsers.graph_writer import format_filter
+from parsers.filter_graph import INPUT_INDEX_OPTIONS, has_inner_labels, renumber_input, renumber_option
+from parsers.propagation import StreamInfo, Propagation, propagate
+
+
+class OptimizationPass:
+    """优化遍基类：run 就地修改上下文中的滤镜链，返回是否有改动
+
+    类属性即可配置项，构造时可按名称覆盖（如 ReorderPass(tolerance=0.2)）。
+    """
+    name = ""
+    description = ""
+    enabled = True  # 未指定 select 时是否运行
+
+    def __init__(self, **options):
+        for key, value in options.items():
+            if key.startswith("_") or key in ("name", "description", "enabled") or not hasattr(self, key):
+                raise FFmpegError(
+                    f"优化遍 {self.name} 没有配置项: {key}",
+                    error_type="INVALID_PARAM"
+                )
+            setattr(self, key, value)
+
+    def run(self, ctx: 'OptimizationContext') -> bool:
+        raise NotImplementedError
+
+
+class OptimizerRegistry:
+    _registry: Dict[str, type] = {}
+    _builtin_loaded = False
+
+    @classmethod
+    def register(cls, pass_cls):
+        if not inspect.isclass(pass_cls) or not issubclass(pass_cls, OptimizationPass) or not pass_cls.name:
+            raise ValueError("优化遍必须继承 OptimizationPass 并定义 name")
+        cls._registry[pass_cls.name] = pass_cls
+        return pass_cls
+
+    @classmethod
+    def get_pass(cls, name: str):
+        return cls._registry.get(name)
+
+    @classmethod
+    def names(cls) -> List[str]:
+        cls._load_builtin()
+        return list(cls._registry)
+
+    @classmethod
+    def default_names(cls) -> List[str]:
+        """未指定 select 时运行的优化遍"""
+        cls._load_builtin()
+        return [name for name, pass_cls in cls._registry.items() if pass_cls.enabled]
+
+    @classmethod
+    def _load_builtin(cls) -> None:
+        """按 core.optimizer_passes 的静态列表加入内置优化遍（排在其他注册的优化遍之前）
+
+        不依赖导入时的注册副作用：loader 会重新执行模块，装饰器可能注册到另一份注册表。
+        """
+        if cls._builtin_loaded:
+            return
+        from core.optimizer_passes import BUILTIN_PASSES
+        cls._registry = {**{pass_cls.name: pass_cls for pass_cls in BUILTIN_PASSES}, **cls._registry}
+        cls._builtin_loaded = True
+
+    @classmethod
+    def create(cls, select: Optional[Iterable[str]] = None, ignore: Iterable[str] = (),
+               options: Optional[Dict[str, Dict]] = None) -> List[OptimizationPass]:
+        """按名称选择并实例化优化遍（按注册顺序执行）；select 为空时使用全部默认启用的优化遍
+
+        options 为 {优化遍名: {配置项: 值}}。
+        """
+        cls._load_builtin()
+        ignore = set(ignore)
+        if select is None:
+            names = cls.default_names()
+        else:
+            names = list(select)
+            unknown = [name for name in names if name not in cls._registry]
+            if unknown:
+                raise FFmpegError(
+                    f"未知的优化遍: {', '.join(unknown)}",
+                    error_type="INVALID_PARAM",
+                    suggestion=f"可用优化遍: {', '.join(cls.names())}"
+                )
+        options = options or {}
+        return [cls._registry[name](**options.get(name, {})) for name in names if name not in ignore]
+
+
+# 快捷装饰器
+register_pass = OptimizerRegistry.register
+
+
+@dataclass(frozen=True)
+class OptimizationChange:
+    """一次改写：action 为 remove（删除滤镜）、fuse（合并滤镜）、merge（合并滤镜链）等
+
+    drop-input（删除 -i 输入）与滤镜链无关，chain_index 为 -1。
+    """
+    pass_name: str
+    action: str
+    message: str
+    chain_index: int
+    filter_index: Optional[int]
+    filters: Tuple[str, ...]  # 被改写的滤镜原文
+
+    def to_dict(self) -> Dict:
+        return {**asdict(self), "filters": list(self.filters)}
+
+
+def _map_inputs(chain: FilterChain, rename) -> FilterChain:
+    """改写滤镜链的输入标签，包括记录在链中间滤镜上的输入"""
+    filters = [
+        FilterNode(node.name, node.items(), map(rename, node.inputs), node.outputs) if node.inputs else node
+        for node in chain.filters
+    ]
+    return FilterChain(map(rename, chain.inputs), chain.output, filters, chain.outputs)
+
+
+class OptimizationContext:
+    """一次优化运行的可变状态：滤镜链、输出映射与改写记录"""
+
+    def __init__(self, command: ParsedCommand, inputs: Optional[Dict[str, StreamInfo]] = None):
+        self.command = command
+        self.chains: List[FilterChain] = [FilterChain.from_dict(chain) for chain in command.filter_chains]
+        self.outputs: List[Dict] = copy.deepcopy(command.outputs)
+        self.input_files: List[Dict] = copy.deepcopy(command.inputs)
+        self.global_options: Dict = dict(command.global_options)
+        self.inputs = dict(inputs or {})
+        self.changes: List[OptimizationChange] = []
+        self.current_pass = ""
+        self._propagation: Optional[Propagation] = None
+
+    @property
+    def propagation(self) -> Propagation:
+        """当前滤镜链的属性传递结果，滤镜链改动后重新计算"""
+        if self._propagation is None:
+            self._propagation = propagate(self.chains, self.inputs)
+        return self._propagation
+
+    def record(self, action: str, message: str, chain_index: int, filter_index: Optional[int] = None,
+               filters: Sequence = ()) -> None:
+        self.changes.append(OptimizationChange(
+            self.current_pass, action, message, chain_index, filter_index,
+            tuple(f if isinstance(f, str) else format_filter(f) for f in filters)
+        ))
+
+    def rewritable(self, *indices: int) -> bool:
+        """滤镜链能否按整条链改写：链中间有流标签（scale,[1:v]overlay）的链保持原样"""
+        return not any(has_inner_labels(self.chains[index]) for index in indices)
+
+    def set_chain(self, index: int, chain: FilterChain) -> None:
+        self.chains[index] = chain
+        self._propagation = None
+
+    def remove_chain(self, index: int) -> None:
+        del self.chains[index]
+        self._propagation = None
+
+    def insert_chain(self, index: int, chain: FilterChain) -> None:
+        self.chains.insert(index, chain)
+        self._propagation = None
+
+    @property
+    def mapped_labels(self) -> Set[str]:
+        return {label for output in self.outputs for label in output.get("maps", ())}
+
+    def produced_labels(self) -> Set[str]:
+        return {label for chain in self.chains for label in chain.outputs}
+
+    def new_label(self, prefix: str = "t", reserved: Iterable[str] = ()) -> str:
+        """生成未被滤镜链、-map 与 reserved 使用的标签，如 t0、t1"""
+        used = self.produced_labels() | self.mapped_labels | {label for chain in self.chains for label in chain.inputs}
+        used.update(reserved)
+        index = 0
+        while f"{prefix}{index}" in used:
+            index += 1
+        return f"{prefix}{index}"
+
+    def consumers(self, label: str) -> List[int]:
+        return [i for i, chain in enumerate(self.chains) if label in chain.inputs]
+
+    def rename_label(self, old: str, new: str) -> None:
+        """把滤镜链输入与 -map 中的标签 old 改为 new"""
+        for index, chain in enumerate(self.chains):
+            if old in chain.inputs:
+                self.chains[index] = _map_inputs(chain, lambda label: new if label == old else label)
+        for output in self.outputs:
+            if "maps" in output:
+                output["maps"] = [new if label == old else label for label in output["maps"]]
+        self._propagation = None
+
+    def remove_input(self, index: int) -> None:
+        """删除第 index 个 -i 输入，之后的输入在滤镜链、-map 与输出选项中的序号减一"""
+        del self.input_files[index]
+
+        def renumber(label: str) -> str:
+            return renumber_input(label, index)
+
+        for position, chain in enumerate(self.chains):
+            self.chains[position] = _map_inputs(chain, renumber)
+        for output in self.outputs:
+            if "maps" in output:
+                output["maps"] = [renumber(label) for label in output["maps"]]
+            for option in INPUT_INDEX_OPTIONS:
+                if option in output.get("options", {}):
+                    output["options"][option] = renumber_option(output["options"][option], index)
+        self.inputs = {renumber(label): info for label, info in self.inputs.items()}
+        self._propagation = None
+
+    def to_command(self) -> ParsedCommand:
+        streams = []
+        for chain in self.chains:
+            streams.extend(Stream.from_label(label) for label in chain.inputs)
+            streams.extend(Stream.from_label(label) for label in chain.outputs)
+        return ParsedCommand(
+            streams=streams,
+            filter_chains=list(self.chains),
+            outputs=self.outputs,
+            inputs=copy.deepcopy(self.input_files),
+            global_options=dict(self.global_options)
+        )
+
+
+class OptimizationResult:
+    """优化结果：等价的新命令与全部改写记录"""
+
+    def __init__(self, command: ParsedCommand, changes: List[OptimizationChange], iterations: int):
+        self.command = command
+        self.changes = changes
+        self.iterations = iterations
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.changes)
+
+    @property
+    def removed(self) -> List[str]:
+        """被删除的滤镜原文"""
+        return [f for change in self.changes if change.action == "remove" for f in change.filters]
+
+    def by_pass(self, name: str) -> List[OptimizationChange]:
+        return [change for change in self.changes if change.pass_name == name]
+
+    def to_dict(self) -> Dict:
+        from parsers.graph_writer import format_command
+        return {
+            "command": format_command(self.command),
+            "iterations": self.iterations,
+            "changes": [change.to_dict() for change in self.changes],
+        }
+
+    def format_text(self) -> str:
+        if not self.changes:
+            return "滤镜图无可优化之处"
+        lines = [f"共 {len(self.changes)} 处改写（{self.iterations} 轮）:"]
+        for change in self.changes:
+            lines.append(f"  [{change.pass_name}] {change.message}")
+        return "\n".join(lines)
+
+
+class GraphOptimizer:
+    """按顺序反复运行优化遍，直到没有改动或达到轮数上限"""
+
+    def __init__(self, passes: Optional[Iterable[OptimizationPass]] = None, max_iterations: int = 8):
+        self.passes = list(passes) if passes is not None else OptimizerRegistry.create()
+        self.max_iterations = max_iterations
+
+    @classmethod
+    def from_names(cls, select: Optional[Iterable[str]] = None, ignore: Iterable[str] = (),
+                   options: Optional[Dict[str, Dict]] = None, max_iterations: int = 8) -> 'GraphOptimizer':
+        return cls(OptimizerRegistry.create(select, ignore, options), max_iterations)
+
+    def optimize(self, command: ParsedCommand, inputs: Optional[Dict[str, StreamInfo]] = None) -> OptimizationResult:
+        ctx = OptimizationContext(command, inputs)
+        iterations = 0
+        while iterations < self.max_iterations:
+            iterations += 1
+            changed = False
+            for optimization_pass in self.passes:
+                ctx.current_pass = optimization_pass.name
+                changed = optimization_pass.run(ctx) or changed
+            if not changed:
+                break
+        return OptimizationResult(ctx.to_command(), ctx.changes, iterations)
+
+
+def optimize_graph(command, inputs: Optional[Dict[str, StreamInfo]] = None,
+                   select: Optional[Iterable[str]] = None, ignore: Iterable[str] = (),
+                   options: Optional[Dict[str, Dict]] = None) -> OptimizationResult:
+    """优化入口：command 可以是命令字符串或 ParsedCommand"""
+    if isinstance(command, str):
+        from core.cost_model import parse_command_text
+        command = parse_command_text(command)
+    return GraphOptimizer.from_names(select, ignore, options).optimize(command, inputs)
+
+
+# 确保导出类
+__all__ = [
+    'OptimizationPass', 'OptimizerRegistry', 'register_pass', 'OptimizationChange', 'OptimizationContext',
+    'OptimizationResult', 'GraphOptimizer', 'optimize_graph'
+]
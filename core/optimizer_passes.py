@@ -0,0 +1,786 @@
+import math
+import re
+from dataclasses import dataclass
+from fractions import Fraction
+from typing import Callable, Dict, List, Optional, Tuple
+from core.error_types import FFmpegError
+from core.cost_model import CostModel, CostTable, pix_fmt_family
+from core.graph_optimizer import OptimizationPass, OptimizationContext
+from core.placement import PlacementPlanner
+from hardware.equivalence import EquivalenceCatalog
+from parsers.parser_models import FilterChain, FilterNode
+from parsers.filter_graph import FilterGraph, INPUT_INDEX_OPTIONS, input_file_index, option_input_index
+from parsers.expression import Expression, compile_expression
+from parsers.propagation import StreamInfo, TRANSFER_FUNCTIONS
+
+# 时间轴选项对恒等滤镜没有影响
+_TIMELINE_PARAMS = frozenset({"enable"})
+
+# 与取值无关的参数
+_ANY = object()
+
+# 参数 -> (默认值, 恒等取值)：所有参数（含缺省的）都取恒等值时滤镜为恒等变换
+NEUTRAL_PARAMS: Dict[str, Dict[str, Tuple[Optional[float], Tuple[float, ...]]]] = {
+    "rotate": {"angle": (0.0, (0.0,)), "a": (0.0, (0.0,)), "fillcolor": _ANY, "c": _ANY, "bilinear": _ANY},
+    "colorbalance": {
+        **{key: (0.0, (0.0,)) for key in ("rs", "gs", "bs", "rm", "gm", "bm", "rh", "gh", "bh")},
+        "pl": (0.0, (0.0,)),
+    },
+    "gblur": {"sigma": (0.5, (0.0,)), "sigmaV": (-1.0, (0.0, -1.0)), "steps": _ANY, "planes": _ANY},
+    "eq": {
+        "brightness": (0.0, (0.0,)), "contrast": (1.0, (1.0,)), "saturation": (1.0, (1.0,)),
+        "gamma": (1.0, (1.0,)), "gamma_r": (1.0, (1.0,)), "gamma_g": (1.0, (1.0,)), "gamma_b": (1.0, (1.0,)),
+        "gamma_weight": _ANY, "eval": _ANY,
+    },
+    "colorchannelmixer": {
+        **{key: (1.0, (1.0,)) for key in ("rr", "gg", "bb", "aa")},
+        **{key: (0.0, (0.0,)) for key in ("rg", "rb", "ra", "gr", "gb", "ga", "br", "bg", "ba", "ar", "ag", "ab")},
+        "pa": (0.0, (0.0,)),
+    },
+    "hue": {"h": (0.0, (0.0,)), "H": (0.0, (0.0,)), "s": (1.0, (1.0,)), "b": (0.0, (0.0,))},
+    "volume": {"volume": (1.0, (1.0,)), "precision": _ANY, "eval": _ANY},
+}
+
+# 不改变帧的滤镜
+_PASSTHROUGH = frozenset({"null", "anull", "copy", "acopy"})
+
+
+def _constant(value: Optional[str]) -> Optional[float]:
+    """常量表达式的值（0.0*PI/180 等），不是常量时返回 None"""
+    if value is None:
+        return None
+    try:
+        return compile_expression(value).value
+    except FFmpegError:
+        return None
+
+
+def _expression(value: str) -> Optional[Expression]:
+    try:
+        return compile_expression(value)
+    except FFmpegError:
+        return None
+
+
+def _is_neutral(name: str, params: Dict[str, str]) -> bool:
+    spec = NEUTRAL_PARAMS[name]
+    for key in params:
+        if key not in spec and key not in _TIMELINE_PARAMS:
+            return False
+    for key, neutral in spec.items():
+        if neutral is _ANY:
+            continue
+        default, values = neutral
+        value = _constant(params[key]) if key in params else default
+        if value is None or not any(math.isclose(value, v, abs_tol=1e-12) for v in values):
+            return False
+    return True
+
+
+def _same_size(value: Optional[str], names: Tuple[str, ...], actual: Optional[int], zero_is_input: bool) -> bool:
+    """尺寸表达式是否等于输入尺寸：iw/in_w 或等于已知输入宽度的常量"""
+    if value is None:
+        return True
+    expression = _expression(value)
+    if expression is None:
+        return False
+    if expression.simplified() in names:
+        return True
+    constant = expression.value
+    return constant is not None and (zero_is_input and constant == 0 or actual is not None and constant == actual)
+
+
+def _scale_identity(params: Dict[str, str], source: StreamInfo) -> bool:
+    if set(params) - {"width", "w", "height", "h", "flags"} - _TIMELINE_PARAMS:
+        return False
+    width = params.get("w", params.get("width"))
+    height = params.get("h", params.get("height"))
+    return _same_size(width, ("iw", "in_w"), source.width, True) and \
+        _same_size(height, ("ih", "in_h"), source.height, True)
+
+
+def _crop_identity(params: Dict[str, str], source: StreamInfo) -> bool:
+    if set(params) - {"w", "h", "out_w", "out_h", "x", "y", "keep_aspect", "exact"} - _TIMELINE_PARAMS:
+        return False
+    return _same_size(params.get("w", params.get("out_w")), ("iw", "in_w"), source.width, False) and \
+        _same_size(params.get("h", params.get("out_h")), ("ih", "in_h"), source.height, False)
+
+
+def _pad_identity(params: Dict[str, str], source: StreamInfo) -> bool:
+    if set(params) - {"width", "w", "height", "h", "x", "y", "color"} - _TIMELINE_PARAMS:
+        return False
+    offsets = [_constant(params[key]) for key in ("x", "y") if key in params]
+    return all(offset == 0 for offset in offsets) and \
+        _same_size(params.get("w", params.get("width")), ("iw", "in_w"), source.width, True) and \
+        _same_size(params.get("h", params.get("height")), ("ih", "in_h"), source.height, True)
+
+
+def _format_identity(params: Dict[str, str], source: StreamInfo) -> bool:
+    formats = params.get("pix_fmts", params.get("pix_fmt", params.get("0")))
+    # 输入格式在候选列表中时格式协商不做转换
+    return formats is not None and source.pix_fmt is not None and source.pix_fmt in formats.split("|")
+
+
+def _setpts_identity(params: Dict[str, str], source: StreamInfo) -> bool:
+    expression = _expression(params.get("expr", params.get("0", "PTS")))
+    return expression is not None and expression.simplified() == "PTS"
+
+
+# 滤镜名 -> 恒等判定函数（参数, 输入流属性）
+IDENTITY_CHECKS: Dict[str, Callable[[Dict[str, str], StreamInfo], bool]] = {
+    **{name: (lambda params, source, name=name: _is_neutral(name, params)) for name in NEUTRAL_PARAMS},
+    **{name: (lambda params, source: True) for name in _PASSTHROUGH},
+    "scale": _scale_identity, "crop": _crop_identity, "pad": _pad_identity, "format": _format_identity,
+    "setpts": _setpts_identity, "asetpts": _setpts_identity,
+    "trim": lambda params, source: not set(params) - _TIMELINE_PARAMS,
+    "atrim": lambda params, source: not set(params) - _TIMELINE_PARAMS,
+}
+
+
+def is_identity(filter_def, source: StreamInfo) -> bool:
+    """滤镜在给定输入上是否为恒等变换"""
+    check = IDENTITY_CHECKS.get(filter_def["name"])
+    return check is not None and check(filter_def["params"], source)
+
+
+def _can_splice(ctx: OptimizationContext, chain: FilterChain) -> bool:
+    """单输入单输出、输入为其他链的输出或 -i 输入流（0:v 等）时，空链可以直接删除"""
+    if len(chain.inputs) != 1 or len(chain.outputs) != 1:
+        return False
+    return chain.inputs[0] in ctx.produced_labels() or ":" in chain.inputs[0]
+
+
+def _splice_chain(ctx: OptimizationContext, index: int) -> None:
+    """删除滤镜链，把输出标签的使用者（含 -map）改为直接使用输入标签"""
+    chain = ctx.chains[index]
+    ctx.remove_chain(index)
+    ctx.rename_label(chain.outputs[0], chain.inputs[0])
+
+
+class DeadBranchPass(OptimizationPass):
+    """删除输出未被 -map 使用的滤镜链、split 的多余输出，以及没有流被使用的 -i 输入
+
+    命令中没有 -map 时 FFmpeg 自动选择流，不做删除；有输出文件未指定 -map 时保留全部输入。
+    """
+    name = "dead-branches"
+    description = "删除 -map 不可达的滤镜链与未使用的输入"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        if not ctx.mapped_labels:
+            return False
+        changed = self._remove_chains(ctx)
+        changed = self._trim_splits(ctx) or changed
+        return self._drop_inputs(ctx) or changed
+
+    @staticmethod
+    def _remove_chains(ctx: OptimizationContext) -> bool:
+        live = FilterGraph.build(ctx.chains).live_nodes(ctx.mapped_labels)
+        dead = [index for index in range(len(ctx.chains)) if index not in live]
+        for index in reversed(dead):
+            chain = ctx.chains[index]
+            ctx.record("remove", f"删除输出 [{']['.join(chain.outputs)}] 未被使用的滤镜链（第 {index} 条链）",
+                       index, 0, chain.filters)
+            ctx.remove_chain(index)
+        return bool(dead)
+
+    @staticmethod
+    def _trim_splits(ctx: OptimizationContext) -> bool:
+        changed = False
+        used = ctx.mapped_labels | {label for chain in ctx.chains for label in chain.inputs}
+        for index, chain in enumerate(ctx.chains):
+            last = chain.filters[-1] if chain.filters else None
+            if last is None or last.name not in ("split", "asplit") or not ctx.rewritable(index):
+                continue
+            outputs = [label for label in chain.outputs if label in used]
+            if not outputs or len(outputs) == len(chain.outputs):
+                continue
+            if len(outputs) == 1:
+                replacement = FilterNode("anull" if last.name == "asplit" else "null")
+            else:
+                replacement = FilterNode(last.name, {"outputs": str(len(outputs))} if len(outputs) != 2 else None)
+            unused = [label for label in chain.outputs if label not in used]
+            ctx.record("remove", f"删除 {last.name} 未被使用的输出 [{']['.join(unused)}]（第 {index} 条链）",
+                       index, len(chain.filters) - 1, [last])
+            ctx.set_chain(index, FilterChain(chain.inputs, outputs[0], chain.filters[:-1] + (replacement,), outputs))
+            changed = True
+        return changed
+
+    @staticmethod
+    def _drop_inputs(ctx: OptimizationContext) -> bool:
+        # 无输入标签的链按顺序连接未使用的输入流，无法判断使用了哪个输入
+        if any(not output.get("maps") for output in ctx.outputs) or any(not chain.inputs for chain in ctx.chains):
+            return False
+        references = [label for chain in ctx.chains for label in chain.inputs]
+        for output in ctx.outputs:
+            references += [label.lstrip("-") for label in output["maps"]]
+        used = {input_file_index(label) for label in references}
+        used.update(option_input_index(output["options"][option]) for output in ctx.outputs
+                    for option in INPUT_INDEX_OPTIONS if option in output.get("options", {}))
+        unused = [index for index in range(len(ctx.input_files)) if index not in used]
+        for index in reversed(unused):
+            ctx.record("drop-input", f"删除未使用的输入 #{index} {ctx.input_files[index].get('path', '')}", -1)
+            ctx.remove_input(index)
+        return bool(unused)
+
+
+class IdentityEliminationPass(OptimizationPass):
+    """删除恒等滤镜：scale=iw:ih、rotate=0、gblur=sigma=0、eq 默认值等"""
+    name = "identity"
+    description = "删除不改变帧的滤镜"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        index = 0
+        while index < len(ctx.chains):
+            chain = ctx.chains[index]
+            if not ctx.rewritable(index):
+                index += 1
+                continue
+            propagation = ctx.propagation
+            kept, removed = [], []
+            for position, node in enumerate(chain.filters):
+                sources = propagation.filter_io(index, position)[0]
+                # 多输入滤镜（overlay、hstack 等）不是恒等变换
+                if len(sources) == 1 and is_identity(node, sources[0]):
+                    removed.append((position, node))
+                else:
+                    kept.append(node)
+            splice = not kept and _can_splice(ctx, chain)
+            if not removed or not kept and not splice and [node.name for node in chain.filters] in (["null"], ["anull"]):
+                # 无法删除的空链已经只剩 null
+                index += 1
+                continue
+            for position, node in removed:
+                ctx.record("remove", f"删除恒等滤镜 {node.name}（第 {index} 条链第 {position} 个滤镜）",
+                           index, position, [node])
+            changed = True
+            if splice:
+                _splice_chain(ctx, index)
+                continue
+            if not kept:
+                source = propagation.filter_io(index, 0)[0][0]
+                kept = [FilterNode("anull" if source.kind == "audio" else "null")]
+            ctx.set_chain(index, FilterChain(chain.inputs, chain.output, kept, chain.outputs))
+            index += 1
+        return changed
+
+
+class ChainMergePass(OptimizationPass):
+    """把线性相连的滤镜链合并为一条，使跨链的相邻滤镜可以继续融合"""
+    name = "merge-chains"
+    description = "合并 [a]f1[x];[x]f2[y] 为 [a]f1,f2[y]"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        mapped = ctx.mapped_labels
+        index = 0
+        while index < len(ctx.chains):
+            chain = ctx.chains[index]
+            if len(chain.outputs) != 1 or chain.outputs[0] in mapped:
+                index += 1
+                continue
+            label = chain.outputs[0]
+            consumers = ctx.consumers(label)
+            if len(consumers) != 1 or consumers[0] == index or ctx.chains[consumers[0]].inputs != (label,) or \
+                    not ctx.rewritable(index, consumers[0]):
+                index += 1
+                continue
+            successor = consumers[0]
+            following = ctx.chains[successor]
+            merged = FilterChain(chain.inputs, following.output, chain.filters + following.filters, following.outputs)
+            ctx.record("merge", f"合并滤镜链（经由标签 [{label}]）", index)
+            ctx.set_chain(index, merged)
+            ctx.remove_chain(successor)
+            if successor < index:
+                index -= 1
+            changed = True
+        return changed
+
+
+# 每次运行输出不同的滤镜，重复计算不能合并
+_NONDETERMINISTIC = frozenset({"random", "arandom"})
+
+
+def _signature(node: FilterNode) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """滤镜的比较键：参数顺序不影响结果"""
+    return node.name, tuple(sorted(node.items()))
+
+
+def _shared_prefix(chains: List[FilterChain]) -> int:
+    """多条输入相同的滤镜链可以共用的前缀滤镜数
+
+    前缀以链尾滤镜结束时，该链只能有一个输出（split 等多输出滤镜的各路输出无法用一个标签表示）；
+    带链中间标签的滤镜不能放进前缀。
+    """
+    length = 0
+    for nodes in zip(*(chain.filters for chain in chains)):
+        if nodes[0].name in _NONDETERMINISTIC or len({_signature(node) for node in nodes}) != 1:
+            break
+        if any(node.inputs or node.outputs for node in nodes):
+            break
+        if any(len(chain.filters) == length + 1 and len(chain.outputs) != 1 for chain in chains):
+            break
+        length += 1
+    return length
+
+
+class CommonSubgraphPass(OptimizationPass):
+    """合并对同一输入做相同处理的滤镜链：公共前缀只计算一次，结果经 split/asplit 分发"""
+    name = "cse"
+    description = "[0:v]scale=..[a];[0:v]scale=..[b] 改为 [0:v]scale=..,split[a][b]"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        while self._share_one(ctx):
+            changed = True
+        return changed
+
+    def _share_one(self, ctx: OptimizationContext) -> bool:
+        groups: Dict[Tuple, List[int]] = {}
+        for index, chain in enumerate(ctx.chains):
+            # 无输入标签的链按顺序连接未使用的输入流，输入不确定；
+            # 链中间有输入标签（scale,[1:v]overlay）时链的输入不都进入第一个滤镜
+            if chain.inputs and chain.filters and not any(node.inputs for node in chain.filters):
+                groups.setdefault((chain.inputs, _signature(chain.filters[0])), []).append(index)
+        for indices in groups.values():
+            if len(indices) < 2:
+                continue
+            chains = [ctx.chains[index] for index in indices]
+            length = _shared_prefix(chains)
+            if length:
+                self._rewrite(ctx, indices, length)
+                return True
+        return False
+
+    @staticmethod
+    def _rewrite(ctx: OptimizationContext, indices: List[int], length: int) -> None:
+        chains = [ctx.chains[index] for index in indices]
+        prefix = chains[0].filters[:length]
+        kind = ctx.propagation.filter_io(indices[0], length - 1)[1][0].kind
+        labels, rewritten = [], []
+        for chain in chains:
+            if len(chain.filters) == length:
+                # 整条链都是公共部分：split 直接输出该链的标签
+                labels.append(chain.outputs[0])
+                rewritten.append(None)
+            else:
+                label = ctx.new_label()
+                labels.append(label)
+                rewritten.append(FilterChain((label,), chain.output, chain.filters[length:], chain.outputs))
+                # 占用标签，避免下一次生成重复
+                ctx.set_chain(indices[len(rewritten) - 1], rewritten[-1])
+        split = FilterNode("asplit" if kind == "audio" else "split",
+                           {"outputs": str(len(labels))} if len(labels) != 2 else None)
+        shared = FilterChain(chains[0].inputs, labels[0], prefix + (split,), labels)
+        ctx.record("share", f"{len(chains)} 条滤镜链共用 [{']['.join(chains[0].inputs)}] 上的 "
+                   f"{length} 个滤镜，改用 {split.name} 分发", indices[0], 0, prefix)
+        for index, chain in sorted(zip(indices, rewritten), reverse=True):
+            if chain is None:
+                ctx.remove_chain(index)
+        ctx.insert_chain(min(indices), shared)
+
+
+# scale 宽高表达式中可以替换为上一级输出尺寸的变量
+_SIZE_VARIABLES = frozenset({"iw", "ih", "in_w", "in_h"})
+
+
+def _scale_size(node: FilterNode) -> Optional[Tuple[Expression, Expression]]:
+    """可融合的 scale 宽高：只依赖输入尺寸的表达式或正常量（排除 0、-1、-2 等相对写法）"""
+    params = node.params
+    sizes = []
+    for keys, default in ((("w", "width"), "iw"), (("h", "height"), "ih")):
+        text = next((params[key] for key in keys if key in params), default)
+        expression = _expression(text)
+        if expression is None or not expression.pure or not expression.variables <= _SIZE_VARIABLES:
+            return None
+        if expression.is_constant and expression.value <= 0:
+            return None
+        sizes.append(expression)
+    return sizes[0], sizes[1]
+
+
+class ScaleFusionPass(OptimizationPass):
+    """相邻的两个 scale 合并为一次缩放：第二个的 iw/ih 替换为第一个的输出尺寸"""
+    name = "fuse-scale"
+    description = "scale=a:b,scale=c:d 合并为一个 scale"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        for index, chain in enumerate(ctx.chains):
+            if not ctx.rewritable(index):
+                continue
+            filters = list(chain.filters)
+            position = 0
+            fused = False
+            while position + 1 < len(filters):
+                first, second = filters[position], filters[position + 1]
+                node = self._fuse(first, second) if first.name == second.name == "scale" else None
+                if node is None:
+                    position += 1
+                    continue
+                ctx.record("fuse", f"合并相邻的 scale（第 {index} 条链第 {position} 个滤镜）", index, position,
+                           [first, second])
+                filters[position:position + 2] = [node]
+                fused = True
+            if fused:
+                ctx.set_chain(index, FilterChain(chain.inputs, chain.output, filters, chain.outputs))
+                changed = True
+        return changed
+
+    @staticmethod
+    def _fuse(first: FilterNode, second: FilterNode) -> Optional[FilterNode]:
+        if set(first.param_keys) - {"w", "width", "h", "height", "flags"}:
+            return None
+        first_size, second_size = _scale_size(first), _scale_size(second)
+        if first_size is None or second_size is None:
+            return None
+        sizes = [_fused_size(expression, first_size) for expression in second_size]
+        if None in sizes:
+            return None
+        params = {"width": sizes[0], "height": sizes[1]}
+        for key, value in second.items():
+            if key not in ("w", "width", "h", "height"):
+                params[key] = value
+        if "flags" not in params and first.get("flags"):
+            params["flags"] = first.get("flags")
+        return FilterNode("scale", params)
+
+
+def _monomial(tree) -> Optional[Tuple[Optional[str], Fraction]]:
+    """形如 c、v、v*c、c*v、v/c 的表达式树：(变量, 有理系数)，常量的变量为 None"""
+    kind = tree[0]
+    if kind == "num":
+        return (None, Fraction(repr(tree[1]))) if math.isfinite(tree[1]) else None
+    if kind == "var":
+        return tree[1], Fraction(1)
+    if kind == "neg":
+        term = _monomial(tree[1])
+        return (term[0], -term[1]) if term else None
+    if kind == "op" and tree[1] in ("*", "/"):
+        left, right = _monomial(tree[2]), _monomial(tree[3])
+        if left is None or right is None:
+            return None
+        if tree[1] == "*" and (left[0] is None or right[0] is None):
+            return left[0] or right[0], left[1] * right[1]
+        if tree[1] == "/" and right[0] is None and right[1]:
+            return left[0], left[1] / right[1]
+    return None
+
+
+def _fused_size(outer: Expression, inner: Tuple[Expression, Expression]) -> Optional[str]:
+    """把第二个 scale 的尺寸表达式中的 iw/ih 替换为第一个 scale 的输出尺寸
+
+    scale 把每一级的结果截断为整数，只在截断结果与分两步缩放一致时合并：上一级尺寸必为整数
+    （整数常量或 iw 的整数倍），或本级为 iw/n（n 为正整数，floor(floor(x)/n) == floor(x/n)）。
+    """
+    trees = {}
+    for names, expression in ((("iw", "in_w"), inner[0]), (("ih", "in_h"), inner[1])):
+        if not outer.variables & set(names):
+            continue
+        term = _monomial(expression.tree)
+        if expression.is_constant:
+            expression = compile_expression(str(math.trunc(expression.value)))
+        elif term is None or term[1].denominator != 1:
+            divisor = _monomial(outer.tree)
+            if divisor is None or divisor[0] not in names or divisor[1].numerator != 1 or divisor[1] <= 0:
+                return None
+        trees.update(dict.fromkeys(names, expression))
+    fused = outer.substitute(**trees)
+    if fused.is_constant:
+        value = math.trunc(fused.value)
+        return str(value) if value > 0 else None
+    term = _monomial(fused.tree)
+    if term is None or term[0] is None or term[1] <= 0:
+        return fused.simplified()
+    # 系数合并为 iw*p/q
+    numerator, denominator = term[1].numerator, term[1].denominator
+    return term[0] + (f"*{numerator}" if numerator != 1 else "") + (f"/{denominator}" if denominator != 1 else "")
+
+
+# 像素格式的信息量：(彩色, 色度分辨率, 透明通道, 位深)
+def _pix_fmt_content(pix_fmt: str) -> Optional[Tuple[int, int, int, int]]:
+    family = pix_fmt_family(pix_fmt)
+    if family is None:
+        return None
+    depth = 8
+    for bits in ("10", "12", "16"):
+        if bits in pix_fmt:
+            depth = int(bits)
+    if pix_fmt.startswith(("rgb48", "rgba64", "p016")):
+        depth = 16
+    elif pix_fmt.startswith("p010"):
+        depth = 10
+    alpha = int(pix_fmt.startswith(("yuva", "gbrap", "ya")) or any(x in pix_fmt for x in ("rgba", "bgra", "argb", "abgr")))
+    if family == "gray":
+        return 0, 0, alpha, depth
+    if family == "rgb" or "444" in pix_fmt:
+        chroma = 3
+    elif "422" in pix_fmt or pix_fmt.startswith("nv16"):
+        chroma = 2
+    else:
+        chroma = 1
+    return 1, chroma, alpha, depth
+
+
+def _single_format(node: FilterNode) -> Optional[str]:
+    value = node.get("pix_fmts", node.get("pix_fmt", node.get("0")))
+    return value if value and "|" not in value else None
+
+
+class FormatFusionPass(OptimizationPass):
+    """相邻的 format 只保留最后一个：前一个格式的信息量不少于后一个时，先转前者不影响结果"""
+    name = "fuse-format"
+    description = "format=a,format=b 合并为 format=b"
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        for index, chain in enumerate(ctx.chains):
+            if not ctx.rewritable(index):
+                continue
+            filters = list(chain.filters)
+            position = 0
+            fused = False
+            while position + 1 < len(filters):
+                first, second = filters[position], filters[position + 1]
+                if not (first.name == second.name == "format" and self._redundant(first, second)):
+                    position += 1
+                    continue
+                ctx.record("remove", f"删除多余的格式转换 {_single_format(first)}（紧接着转换为 "
+                           f"{_single_format(second)}）", index, position, [first])
+                del filters[position]
+                fused = True
+            if fused:
+                ctx.set_chain(index, FilterChain(chain.inputs, chain.output, filters, chain.outputs))
+                changed = True
+        return changed
+
+    @staticmethod
+    def _redundant(first: FilterNode, second: FilterNode) -> bool:
+        first_fmt, second_fmt = _single_format(first), _single_format(second)
+        if first_fmt is None or second_fmt is None:
+            return False
+        first_content, second_content = _pix_fmt_content(first_fmt), _pix_fmt_content(second_fmt)
+        if first_content is None or second_content is None:
+            return False
+        return all(a >= b for a, b in zip(first_content, second_content))
+
+
+@dataclass(frozen=True)
+class Commute:
+    """滤镜与缩放/裁剪交换顺序的规则
+
+    loss 为交换后画质差异的估计（0 表示逐像素等价，非线性调色约 0.02，卷积类更高）；
+    crop 为裁剪能否移到该滤镜前面（与画面位置相关的滤镜不能）；
+    uniform 为只与等比缩放交换；rescale 为交换时按缩放比例调整的参数（gblur 的 sigma 等），
+    fixed 为其余与尺寸无关的参数，有 rescale 时出现两者之外的参数（含未识别的位置参数）不交换。
+    """
+    loss: float = 0.0
+    crop: bool = True
+    uniform: bool = False
+    rescale: Tuple[str, ...] = ()
+    fixed: Tuple[str, ...] = ()
+
+
+# 可以与缩放/裁剪交换顺序的滤镜
+COMMUTE_TABLE: Dict[str, Commute] = {
+    # 逐像素的线性运算
+    "colorchannelmixer": Commute(), "negate": Commute(), "fade": Commute(),
+    # 逐像素的非线性运算：先缩放再调色与先调色再缩放只差插值误差
+    "eq": Commute(0.02), "colorbalance": Commute(0.02), "hue": Commute(0.02), "curves": Commute(0.02),
+    "lut": Commute(0.02), "lutyuv": Commute(0.02), "lutrgb": Commute(0.02),
+    "format": Commute(0.01),
+    # 时间轴操作
+    "null": Commute(), "setpts": Commute(), "fps": Commute(), "trim": Commute(), "settb": Commute(),
+    # 与画面位置相关
+    "hflip": Commute(crop=False), "vflip": Commute(crop=False),
+    "vignette": Commute(0.02, crop=False),
+    "rotate": Commute(0.05, crop=False, uniform=True),
+    # 卷积核随缩放比例调整
+    "gblur": Commute(0.05, uniform=True, rescale=("sigma", "sigmaV"), fixed=("steps", "planes")),
+    "boxblur": Commute(0.1, uniform=True, rescale=("luma_radius", "lr", "chroma_radius", "cr", "alpha_radius", "ar"),
+                       fixed=("luma_power", "lp", "chroma_power", "cp", "alpha_power", "ap")),
+    "unsharp": Commute(0.3, uniform=True),
+    "hqdn3d": Commute(0.5), "nlmeans": Commute(0.5),
+}
+
+# rotate 指定输出尺寸时不能交换
+_ROTATE_SIZE_PARAMS = frozenset({"out_w", "ow", "out_h", "oh"})
+
+# 滤镜表达式中代表画面尺寸的变量（lut 的 w/h、rotate 的 iw/ow 等），引用它们的滤镜不能与缩放/裁剪交换
+_FRAME_SIZE_VARIABLES = frozenset({"w", "h", "W", "H", "iw", "ih", "in_w", "in_h", "ow", "oh", "out_w", "out_h"})
+_FRAME_SIZE_RE = re.compile(r'\b(?:%s)\b' % "|".join(sorted(_FRAME_SIZE_VARIABLES)))
+
+# 判断缩放比例是否与输入尺寸无关的两组探测尺寸（宽高比不同）
+_PROBE_SIZES = ((1920, 1080), (1000, 800))
+
+
+def _scale_factors(node: FilterNode, source: StreamInfo) -> Optional[Tuple[float, float]]:
+    """scale 的宽高缩放比例：与输入尺寸无关（iw/2:-2 等）或输入尺寸已知时返回"""
+    transfer = TRANSFER_FUNCTIONS["scale"]
+    params = node.params
+    factors = set()
+    for width, height in _PROBE_SIZES:
+        output = transfer(params, [StreamInfo("video", width, height)])[0]
+        if output.width is None or output.height is None:
+            return None
+        factors.add((round(output.width / width, 6), round(output.height / height, 6)))
+    if len(factors) == 1:
+        return factors.pop()
+    if source.width and source.height:
+        output = transfer(params, [source])[0]
+        if output.width and output.height:
+            return output.width / source.width, output.height / source.height
+    return None
+
+
+def _size_dependent(node: FilterNode) -> bool:
+    """参数表达式是否引用画面尺寸；无法解析的参数按文本查找变量名"""
+    for value in node.params.values():
+        expression = _expression(value)
+        variables = expression.variables if expression is not None else set(_FRAME_SIZE_RE.findall(value))
+        if variables & _FRAME_SIZE_VARIABLES:
+            return True
+    return False
+
+
+def _rescaled(node: FilterNode, keys: Tuple[str, ...], factor: float) -> Optional[FilterNode]:
+    """把卷积半径等参数乘以缩放比例，参数不是常量时无法调整"""
+    params = dict(node.items())
+    for key in keys:
+        if key not in params:
+            continue
+        value = _constant(params[key])
+        if value is None:
+            return None
+        if value > 0:
+            scaled = value * factor
+            params[key] = f"{max(1, round(scaled))}" if node.name == "boxblur" else f"{scaled:g}"
+    if node.name == "gblur" and "sigma" not in params:
+        params["sigma"] = f"{0.5 * factor:g}"
+    return FilterNode(node.name, params)
+
+
+class ReorderPass(OptimizationPass):
+    """把缩小画面的 scale/crop 移到可交换的逐像素滤镜之前，按成本模型确认收益
+
+    只越过 COMMUTE_TABLE 中 loss 不超过 tolerance 的滤镜；gblur 等卷积类滤镜的半径按缩放比例调整。
+    """
+    name = "reorder"
+    description = "先缩小、再做逐像素处理"
+    tolerance = 0.1  # 单次交换允许的画质差异
+    table: Optional[CostTable] = None  # 默认使用校准后的成本表
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._model: Optional[CostModel] = None
+
+    @property
+    def model(self) -> CostModel:
+        if self._model is None:
+            self._model = CostModel(self.table or CostTable.load())
+        return self._model
+
+    def _chain_cost(self, ctx: OptimizationContext, index: int, filters: List[FilterNode]) -> float:
+        chains = list(ctx.chains)
+        chain = chains[index]
+        chains[index] = FilterChain(chain.inputs, chain.output, filters, chain.outputs)
+        report = self.model.explain(chains, ctx.inputs)
+        return sum(node.cpu_seconds for node in report.nodes if node.chain_index == index)
+
+    def _swap(self, ctx: OptimizationContext, index: int, position: int) -> Optional[List[FilterNode]]:
+        """尝试把 position 处的 scale/crop 与前一个滤镜交换，返回交换后的滤镜列表"""
+        filters = list(ctx.chains[index].filters)
+        mover, previous = filters[position], filters[position - 1]
+        rule = COMMUTE_TABLE.get(previous.name)
+        if rule is None or rule.loss > self.tolerance:
+            return None
+        if previous.name == "rotate" and _ROTATE_SIZE_PARAMS & set(previous.param_keys):
+            return None
+        if _size_dependent(previous):
+            return None
+        if rule.rescale and set(previous.param_keys) - set(rule.rescale) - set(rule.fixed) - _TIMELINE_PARAMS:
+            return None
+        if mover.name == "crop":
+            if not rule.crop:
+                return None
+            replacement = previous
+        else:
+            if set(mover.param_keys) - {"w", "width", "h", "height", "flags"}:
+                return None
+            replacement = previous
+            if rule.uniform or rule.rescale:
+                source = ctx.propagation.filter_io(index, position)[0][0]
+                factors = _scale_factors(mover, source)
+                if factors is None or not math.isclose(factors[0], factors[1], rel_tol=1e-3):
+                    return None
+                if rule.rescale:
+                    replacement = _rescaled(previous, rule.rescale, factors[0])
+                    if replacement is None:
+                        return None
+        filters[position - 1:position + 1] = [mover, replacement]
+        return filters
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        changed = False
+        for index in range(len(ctx.chains)):
+            if not ctx.rewritable(index):
+                continue
+            position = 1
+            while position < len(ctx.chains[index].filters):
+                filters = ctx.chains[index].filters
+                mover = filters[position]
+                # 链首滤镜可能接收多路输入，不与之交换
+                if mover.name not in ("scale", "crop") or position == 1 and len(ctx.chains[index].inputs) > 1:
+                    position += 1
+                    continue
+                swapped = self._swap(ctx, index, position)
+                if swapped is None or self._chain_cost(ctx, index, swapped) >= \
+                        self._chain_cost(ctx, index, list(filters)) * 0.99:
+                    position += 1
+                    continue
+                previous = filters[position - 1]
+                ctx.record("reorder", f"把 {mover.name} 移到 {previous.name} 之前（第 {index} 条链）",
+                           index, position, [mover, previous])
+                chain = ctx.chains[index]
+                ctx.set_chain(index, FilterChain(chain.inputs, chain.output, swapped, chain.outputs))
+                changed = True
+                # 继续向前移动同一个滤镜
+                position = max(1, position - 1)
+        return changed
+
+
+class PlacementPass(OptimizationPass):
+    """把滤镜放到 CPU 或硬件设备上，只在位置变化处插入 hwupload/hwdownload（默认不运行）"""
+    name = "placement"
+    description = "按计算与传输成本选择滤镜所在设备"
+    enabled = False
+    device = "cuda"
+    table: Optional[CostTable] = None
+    decode_on_device = False  # 解码输出硬件帧（-hwaccel_output_format）
+    catalog: Optional[EquivalenceCatalog] = None  # 默认对照 PATH 中 ffmpeg 的能力索引
+    binary: Optional[str] = None
+
+    def run(self, ctx: OptimizationContext) -> bool:
+        # 放置按整张图规划，有链中间标签的图不做改写
+        if not ctx.rewritable(*range(len(ctx.chains))):
+            return False
+        if self.catalog is None:
+            self.catalog = EquivalenceCatalog.probe(self.binary)
+        planner = PlacementPlanner(self.device, CostModel(self.table or CostTable.load()), self.decode_on_device,
+                                   self.catalog)
+        return bool(planner.apply(ctx).changed)
+
+
+# 内置优化遍，按执行顺序排列
+BUILTIN_PASSES = (
+    DeadBranchPass, IdentityEliminationPass, ChainMergePass, CommonSubgraphPass, ScaleFusionPass,
+    FormatFusionPass, ReorderPass, PlacementPass
+)
+
+
+# 确保导出类
+__all__ = [
+    'BUILTIN_PASSES', 'NEUTRAL_PARAMS', 'IDENTITY_CHECKS', 'is_identity', 'DeadBranchPass', 'IdentityEliminationPass',
+    'ChainMergePass', 'CommonSubgraphPass', 'ScaleFusionPass', 'FormatFusionPass', 'Commute', 'COMMUTE_TABLE',
+    'ReorderPass', 'PlacementPass'
+]
@@ -0,0 +1,340 @@
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+from core.cost_model import CostModel, frame_bytes
+from core.error_types import FFmpegError
+from core.graph_optimizer import OptimizationContext
+from parsers.parser_models import FilterChain, FilterNode
+from parsers.propagation import Propagation, StreamInfo
+from hardware.equivalence import DEFAULT_CATALOG, EquivalenceCatalog
+
+CPU = "cpu"
+GPU = "gpu"
+
+# 不处理像素、CPU 帧与硬件帧都能直接通过的滤镜
+TRANSPARENT_FILTERS = frozenset({"null", "split", "setpts", "settb", "fps", "trim", "copy"})
+
+# 指定视频编码器的输出选项
+_VIDEO_CODEC_OPTIONS = ("-c:v", "-codec:v", "-vcodec")
+
+# 已经指定了设备的滤镜：含这些滤镜的链保持用户的放置
+_HW_SUFFIXES = ("_cuda", "_npp", "_qsv", "_vaapi", "_opencl", "_vulkan")
+
+
+@dataclass(frozen=True)
+class DeviceProfile:
+    """硬件设备：上传/下载方式与传输带宽（滤镜等价实现见 hardware.equivalence）"""
+    name: str
+    upload: Tuple[str, ...]  # 上传滤镜（hwupload_cuda 可自行创建设备）
+    upload_formats: FrozenSet[str]  # 可以直接上传的软件像素格式
+    default_format: str  # 其他格式上传前转换到的格式，也是下载后的格式
+    compute_ratio: float  # 设备实现相对 CPU 实现的耗时比
+    upload_gbps: float
+    download_gbps: float
+    sync_ms: float = 0.5  # 每帧每次传输的同步与分配开销
+    encoder_suffix: str = ""  # 该设备的编码器后缀，接收设备上的帧
+    init_device: Optional[str] = None  # hwupload 需要的 -init_hw_device
+
+    def device_format(self, stream: StreamInfo) -> Optional[str]:
+        """帧上传后的软件像素格式"""
+        if stream.pix_fmt is None:
+            return None
+        return stream.pix_fmt if stream.pix_fmt in self.upload_formats else self.default_format
+
+    def transfer_seconds(self, stream: StreamInfo, upload: bool) -> float:
+        """每秒媒体的一次上传或下载耗时"""
+        moved = frame_bytes(stream) or 0.0
+        bandwidth = (self.upload_gbps if upload else self.download_gbps) * 1e9
+        return moved / bandwidth + (stream.frame_rate or 25.0) * self.sync_ms / 1000
+
+
+DEVICE_PROFILES: Dict[str, DeviceProfile] = {
+    "cuda": DeviceProfile(
+        "cuda",
+        upload=("hwupload_cuda",),
+        upload_formats=frozenset({"yuv420p", "nv12", "yuv444p", "p010le", "p016le", "bgr0", "rgb0", "bgra", "rgba"}),
+        default_format="nv12", compute_ratio=0.05, upload_gbps=6.0, download_gbps=4.0, encoder_suffix="_nvenc",
+    ),
+    "qsv": DeviceProfile(
+        "qsv",
+        upload=("hwupload",),
+        upload_formats=frozenset({"nv12", "p010le", "bgra"}),
+        default_format="nv12", compute_ratio=0.1, upload_gbps=8.0, download_gbps=6.0, encoder_suffix="_qsv",
+        init_device="qsv=hw",
+    ),
+    "vaapi": DeviceProfile(
+        "vaapi",
+        upload=("hwupload",),
+        upload_formats=frozenset({"nv12", "p010le", "bgra"}),
+        default_format="nv12", compute_ratio=0.12, upload_gbps=8.0, download_gbps=6.0, encoder_suffix="_vaapi",
+        init_device="vaapi=va",
+    ),
+}
+
+
+def output_video_codec(output: Dict) -> Optional[str]:
+    """输出的视频编码器（-c:v 等选项或解析结果中的 video_codec）"""
+    options = output.get("options", {})
+    codec = next((options[key] for key in _VIDEO_CODEC_OPTIONS if options.get(key)), output.get("video_codec"))
+    return str(codec) if codec else None
+
+
+def get_profile(device: str) -> DeviceProfile:
+    profile = DEVICE_PROFILES.get(device)
+    if profile is None:
+        raise FFmpegError(
+            f"不支持的硬件设备: {device}",
+            error_type="INVALID_PARAM",
+            suggestion=f"可用设备: {', '.join(DEVICE_PROFILES)}"
+        )
+    return profile
+
+
+def is_hw_filter(name: str) -> bool:
+    return name.startswith(("hwupload", "hwdownload", "hwmap")) or name.endswith(_HW_SUFFIXES)
+
+
+def _located_end(chain: FilterChain) -> str:
+    """已指定设备的链输出所在位置：最后一次上传之后、下载之前在设备上"""
+    location = CPU
+    for node in chain.filters:
+        if node.name.startswith(("hwupload", "hwmap")):
+            location = GPU
+        elif node.name == "hwdownload":
+            location = CPU
+        elif node.name.endswith(_HW_SUFFIXES):
+            location = GPU
+    return location
+
+
+@dataclass(frozen=True)
+class ChainPlacement:
+    """一条滤镜链的放置结果：每个滤镜所在位置与插入的传输次数，成本按每秒媒体计"""
+    chain_index: int
+    locations: Tuple[str, ...]
+    uploads: int
+    downloads: int
+    cpu_seconds: float  # 全部在 CPU 上（含输入所需的下载）的成本
+    planned_seconds: float
+
+    @property
+    def changed(self) -> bool:
+        return GPU in self.locations or self.uploads + self.downloads > 0
+
+
+@dataclass
+class PlacementPlan:
+    """整个滤镜图的放置：参与规划的链、每个标签所在位置与规划所用的属性传递结果"""
+    placements: Dict[int, ChainPlacement]
+    locations: Dict[str, str]
+    propagation: Propagation
+
+    @property
+    def changed(self) -> List[ChainPlacement]:
+        return [placement for placement in self.placements.values() if placement.changed]
+
+    @property
+    def saved_seconds(self) -> float:
+        return sum(p.cpu_seconds - p.planned_seconds for p in self.placements.values())
+
+
+class PlacementPlanner:
+    """为每个滤镜选择 CPU 或设备，使计算与主机/设备间传输的总成本最小
+
+    链内滤镜线性相连，按位置做动态规划（状态为当前帧所在位置）；链按拓扑序处理，
+    输入标签的位置由上游链的结果决定。上传/下载只插入在位置变化处，传输成本高于收益时整条链留在 CPU。
+    """
+
+    def __init__(self, device: str = "cuda", model: Optional[CostModel] = None, decode_on_device: bool = False,
+                 catalog: EquivalenceCatalog = DEFAULT_CATALOG):
+        self.profile = get_profile(device)
+        self.model = model or CostModel()
+        self.decode_on_device = decode_on_device  # 解码输出硬件帧（-hwaccel_output_format）
+        self.catalog = catalog
+
+    def translate(self, node: FilterNode, stream: StreamInfo) -> Optional[FilterNode]:
+        """滤镜在设备上的等价实现（stream 为滤镜的输入），无法转换时返回 None"""
+        return self.catalog.translate(node, self.profile.name, self.profile.device_format(stream))
+
+    def _output_locations(self, outputs: Sequence[Dict]) -> Dict[str, str]:
+        """-map 使用的标签需要的位置：该设备的编码器接收设备上的帧，其余编码器需要 CPU 帧"""
+        locations = {}
+        for output in outputs:
+            codec = output_video_codec(output)
+            on_device = codec is not None and codec.endswith(self.profile.encoder_suffix)
+            for label in output.get("maps", ()):
+                locations[label] = GPU if on_device else CPU
+        return locations
+
+    def _transfer(self, stream: StreamInfo, source: str, target: str) -> float:
+        if source == target:
+            return 0.0
+        seconds = self.profile.transfer_seconds(stream, upload=target == GPU)
+        if target == GPU and stream.pix_fmt not in self.profile.upload_formats and stream.pixel_rate:
+            # 先转换为可上传的格式
+            seconds += self.model.table.conversion_ns * stream.pixel_rate / 1e9
+        return seconds
+
+    def transfer_nodes(self, stream: StreamInfo, target: str) -> List[FilterNode]:
+        """把帧搬到 target 的滤镜序列"""
+        profile = self.profile
+        if target == GPU:
+            upload = [FilterNode(name) for name in profile.upload]
+            if stream.pix_fmt in profile.upload_formats:
+                return upload
+            return [FilterNode("format", {"pix_fmt": profile.default_format})] + upload
+        pix_fmt = stream.pix_fmt if stream.pix_fmt in profile.upload_formats else profile.default_format
+        return [FilterNode("hwdownload"), FilterNode("format", {"pix_fmt": pix_fmt})]
+
+    def plan(self, chains: Sequence[FilterChain], outputs: Sequence[Dict] = (),
+             inputs: Optional[Dict[str, StreamInfo]] = None) -> PlacementPlan:
+        """计算每条链的放置；音频链与已指定设备的链不参与规划"""
+        report = self.model.explain(list(chains), inputs)
+        propagation = report.propagation
+        cpu_costs = {(node.chain_index, node.filter_index): node.cpu_seconds for node in report.nodes}
+        required = self._output_locations(outputs)
+        locations: Dict[str, str] = {}
+        placements: Dict[int, ChainPlacement] = {}
+        order = list(propagation.graph.order)
+        order += [index for index in range(len(chains)) if index not in set(order)]
+        for index in order:
+            chain = chains[index]
+            if not chain.filters:
+                continue
+            io = propagation.filters[index]
+            if any(is_hw_filter(node.name) for node in chain.filters):
+                for label in chain.outputs:
+                    locations[label] = _located_end(chain)
+                continue
+            if io[0][0][0].kind == "audio":
+                continue
+            placement = self._plan_chain(index, chain, io, cpu_costs, locations, required)
+            placements[index] = placement
+            for label in chain.outputs:
+                locations[label] = placement.locations[-1]
+        return PlacementPlan(placements, locations, propagation)
+
+    def apply(self, ctx: OptimizationContext) -> PlacementPlan:
+        """按规划改写滤镜链：替换为设备滤镜，在位置变化处插入上传/下载
+
+        多输入滤镜的输入与多输出链的输出需要单独传输时，新建一条只做传输的链。
+        """
+        plan = self.plan(ctx.chains, ctx.outputs, ctx.inputs)
+        required = self._output_locations(ctx.outputs)
+        reserved: List[str] = []
+        extra: List[Tuple[int, FilterChain]] = []  # (插入位置, 传输链)
+
+        def new_label() -> str:
+            reserved.append(ctx.new_label(reserved=reserved))
+            return reserved[-1]
+
+        for placement in plan.changed:
+            index, path = placement.chain_index, placement.locations
+            chain = ctx.chains[index]
+            io = plan.propagation.filters[index]
+            inputs, outputs = list(chain.inputs), list(chain.outputs)
+            filters: List[FilterNode] = []
+            for position, (label, stream) in enumerate(zip(chain.inputs, io[0][0])):
+                if self._location(label, plan.locations) == path[0]:
+                    continue
+                nodes = self.transfer_nodes(stream, path[0])
+                if len(chain.inputs) == 1:
+                    filters += nodes
+                else:
+                    inputs[position] = new_label()
+                    extra.append((index, FilterChain((label,), inputs[position], nodes, (inputs[position],))))
+            for position, node in enumerate(chain.filters):
+                if position and path[position] != path[position - 1]:
+                    filters += self.transfer_nodes(io[position - 1][1][0], path[position])
+                on_device = path[position] == GPU and node.name not in TRANSPARENT_FILTERS
+                filters.append(self.translate(node, io[position][0][0]) if on_device else node)
+            streams = io[-1][1]
+            for position, label in enumerate(chain.outputs):
+                if label not in required or required[label] == path[-1]:
+                    continue
+                nodes = self.transfer_nodes(streams[min(position, len(streams) - 1)], required[label])
+                if len(chain.outputs) == 1:
+                    filters += nodes
+                else:
+                    outputs[position] = new_label()
+                    extra.append((index + 1, FilterChain((outputs[position],), label, nodes, (label,))))
+            moved = [node for node, location in zip(chain.filters, path)
+                     if location == GPU and node.name not in TRANSPARENT_FILTERS]
+            ctx.record(
+                "place",
+                f"第 {index} 条链: {len(moved)} 个滤镜放到 {self.profile.name}，上传 {placement.uploads} 次、"
+                f"下载 {placement.downloads} 次（估算 {placement.cpu_seconds:.4f} -> {placement.planned_seconds:.4f} 秒/秒）",
+                index, None, moved
+            )
+            ctx.set_chain(index, FilterChain(inputs, outputs[0] if outputs else None, filters, outputs))
+        for position, chain in sorted(extra, key=lambda item: item[0], reverse=True):
+            ctx.insert_chain(position, chain)
+        if plan.changed and self.profile.init_device and not ctx.global_options.get("init_hw_device"):
+            # hwupload 使用唯一的硬件设备
+            ctx.global_options["init_hw_device"] = self.profile.init_device
+        return plan
+
+    def _location(self, label: str, locations: Dict[str, str]) -> str:
+        if label in locations:
+            return locations[label]
+        # -i 输入流：解码输出硬件帧时在设备上
+        return GPU if self.decode_on_device and ":a" not in label else CPU
+
+    def _plan_chain(self, index: int, chain: FilterChain, io, cpu_costs: Dict[Tuple[int, int], float],
+                    locations: Dict[str, str], required: Dict[str, str]) -> ChainPlacement:
+        profile = self.profile
+
+        def states(position: int) -> List[str]:
+            node = chain.filters[position]
+            if node.name in TRANSPARENT_FILTERS or self.translate(node, io[position][0][0]) is not None:
+                return [CPU, GPU]
+            return [CPU]
+
+        def compute(position: int, state: str) -> float:
+            cost = cpu_costs.get((index, position), 0.0)
+            if state == GPU and chain.filters[position].name not in TRANSPARENT_FILTERS:
+                return cost * profile.compute_ratio
+            return cost
+
+        def entry(state: str) -> float:
+            return sum(self._transfer(stream, self._location(label, locations), state)
+                       for label, stream in zip(chain.inputs, io[0][0]))
+
+        def exit_cost(state: str) -> float:
+            streams = io[-1][1]
+            return sum(self._transfer(streams[min(position, len(streams) - 1)], state, required[label])
+                       for position, label in enumerate(chain.outputs) if label in required and streams)
+
+        # best[state] = (成本, 各滤镜位置)，成本相同时按字典序偏向 CPU
+        best = {state: (entry(state) + compute(0, state), (state,)) for state in states(0)}
+        for position in range(1, len(chain.filters)):
+            stream = io[position - 1][1][0]
+            best = {
+                state: min(
+                    (cost + self._transfer(stream, path[-1], state) + compute(position, state), path + (state,))
+                    for cost, path in best.values()
+                )
+                for state in states(position)
+            }
+        planned, path = min((cost + exit_cost(path[-1]), path) for cost, path in best.values())
+
+        # 对照：整条链留在 CPU
+        cpu_seconds = entry(CPU) + sum(compute(position, CPU) for position in range(len(path))) + exit_cost(CPU)
+
+        sources = [self._location(label, locations) for label in chain.inputs]
+        transfers = [(a, b) for a, b in zip(sources, [path[0]] * len(sources)) if a != b]
+        transfers += [(a, b) for a, b in zip(path, path[1:]) if a != b]
+        transfers += [(path[-1], required[label]) for label in chain.outputs
+                      if label in required and required[label] != path[-1]]
+        return ChainPlacement(
+            index, path,
+            uploads=sum(1 for _, target in transfers if target == GPU),
+            downloads=sum(1 for _, target in transfers if target == CPU),
+            cpu_seconds=cpu_seconds, planned_seconds=planned
+        )
+
+
+# 确保导出类
+__all__ = [
+    'CPU', 'GPU', 'TRANSPARENT_FILTERS', 'DeviceProfile', 'DEVICE_PROFILES', 'output_video_codec', 'get_profile',
+    'is_hw_filter', 'ChainPlacement', 'PlacementPlan', 'PlacementPlanner'
+]
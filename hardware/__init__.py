@@ -1,5 +1,10 @@
 from .nvidia import CUDAAccelerator
 from .intel import IntelQSVAccelerator
+from .vaapi import VAAPIAccelerator
 from .acceleration import AccelerationManager
+from .probe import HardwareProbe, HardwareSnapshot, get_hardware_snapshot
 
-__all__ = ['CUDAAccelerator', 'IntelQSVAccelerator', 'AccelerationManager']
+__all__ = [
+    'CUDAAccelerator', 'IntelQSVAccelerator', 'VAAPIAccelerator', 'AccelerationManager',
+    'HardwareProbe', 'HardwareSnapshot', 'get_hardware_snapshot'
+]
@@ -7,15 +7,22 @@ from typing import Dict, List, Optional, Union
 from core.error_types import FFmpegError, ErrorType
 from hardware.nvidia import CUDAAccelerator
 from hardware.intel import IntelQSVAccelerator
+from hardware.vaapi import VAAPIAccelerator
+from hardware.equivalence import EquivalenceCatalog
+from core.cost_model import CostTable
+from core.graph_optimizer import optimize_graph
+from parsers.parser_models import ParsedCommand, FilterChain
 
 class AccelerationManager:
     """硬件加速管理器"""
     PRIORITY = ['cuda', 'qsv', 'vaapi']
 
-    def __init__(self):
+    def __init__(self, probe=None):
+        # 各加速器共用一个探测器，只探测一次
         self.accelerators = {
-            'cuda': CUDAAccelerator(),
-            'qsv': IntelQSVAccelerator()
+            'cuda': CUDAAccelerator(probe),
+            'qsv': IntelQSVAccelerator(probe),
+            'vaapi': VAAPIAccelerator(probe)
         }
         self.active_accelerator = self._detect_accelerator()
 
@@ -25,26 +32,52 @@ class AccelerationManager:
                 return hw
         return None
 
-    def optimize_command(self, parsed_command: Dict) -> Dict:
+    def optimize_command(self, parsed_command: Dict, table: Optional[CostTable] = None,
+                         catalog: Optional[EquivalenceCatalog] = None, adapter=None) -> Dict:
+        """按计算与传输成本把滤镜放到当前加速器上，只在 CPU/设备切换处插入 hwupload/hwdownload
+
+        adapter 为 DeviceScheduler 分配的设备，命令改为使用该设备（默认使用第一块）。
+        """
         if not self.active_accelerator:
             return parsed_command
         
         accelerator = self.accelerators[self.active_accelerator]
         
-        # 优化滤镜链
-        for chain in parsed_command.get("filter_chains", []):
-            chain["filters"] = [
-                accelerator.optimize_filter(f) 
-                for f in chain["filters"]
-                if accelerator.optimize_filter(f) is not None
-            ]
-        
-        # 设置编码器
+        # 设置编码器（先于放置规划：链尾是否下载取决于编码器所在设备）
         if "outputs" in parsed_command:
             for output in parsed_command["outputs"]:
                 if "video_codec" in output:
                     output["video_codec"] = accelerator.video_codec
         
+        # 优化滤镜链
+        if parsed_command.get("filter_chains"):
+            command = ParsedCommand(
+                streams=[],
+                filter_chains=[FilterChain.from_dict(chain) for chain in parsed_command["filter_chains"]],
+                outputs=parsed_command.get("outputs", []),
+                inputs=parsed_command.get("inputs", []),
+                global_options=parsed_command.get("global_options", {})
+            )
+            result = optimize_graph(command, select=["placement"],
+                                    options={"placement": {"device": self.active_accelerator, "table": table,
+                                                           "catalog": catalog}})
+            parsed_command["filter_chains"] = [chain.to_dict() for chain in result.command.filter_chains]
+            if result.command.global_options:
+                parsed_command["global_options"] = result.command.global_options
+
+        if adapter is not None and adapter.device == self.active_accelerator:
+            from hardware.scheduler import rewrite_device
+            rewritten = rewrite_device(ParsedCommand(
+                streams=[],
+                filter_chains=[],
+                outputs=parsed_command.get("outputs", []),
+                inputs=parsed_command.get("inputs", []),
+                global_options=parsed_command.get("global_options", {})
+            ), adapter)
+            parsed_command["outputs"] = rewritten.outputs
+            if rewritten.global_options:
+                parsed_command["global_options"] = rewritten.global_options
+        
         return parsed_command
 
     def get_current_accelerator(self) -> str:
@@ -0,0 +1,206 @@
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from core.error_types import FFmpegError
+from parsers.parser_models import FilterNode
+
+logger = logging.getLogger(__name__)
+
+# 支持的硬件设备（与 -hwaccel 名称一致）
+DEVICES = ("cuda", "qsv", "vaapi")
+
+
+@dataclass(frozen=True)
+class HwEquivalent:
+    """CPU 滤镜在某个设备上的等价实现
+
+    params 为 CPU 参数名（含位置参数名与别名）-> 设备滤镜参数名，滤镜带有未列出的参数时不能转换；
+    values 为需要翻译取值的参数（CPU 参数名 -> {CPU 取值: 设备取值}），取值不在表中时不能转换；
+    fixed 为设备滤镜额外的固定参数；formats 为设备滤镜接受的帧格式（硬件帧的软件格式），空表示不限。
+    """
+    device: str
+    cpu_name: str
+    name: str
+    params: Dict[str, str] = field(default_factory=dict)
+    values: Dict[str, Dict[str, str]] = field(default_factory=dict)
+    fixed: Dict[str, str] = field(default_factory=dict)
+    formats: FrozenSet[str] = frozenset()
+
+    def translate(self, node: FilterNode, pix_fmt: Optional[str] = None) -> Optional[FilterNode]:
+        """转换为设备滤镜，参数、取值或帧格式不支持时返回 None"""
+        if self.formats and pix_fmt is not None and pix_fmt not in self.formats:
+            return None
+        params = dict(self.fixed)
+        for key, value in node.items():
+            target = self.params.get(key)
+            if target is None:
+                return None
+            if key in self.values:
+                value = self.values[key].get(value)
+                if value is None:
+                    return None
+            params[target] = value
+        return FilterNode(self.name, params)
+
+
+def _same(*names: str) -> Dict[str, str]:
+    return {name: name for name in names}
+
+
+# 像素格式取值：只接受表中的格式
+def _formats(*names: str) -> Dict[str, str]:
+    return _same(*names)
+
+
+# scale 的宽高（位置参数名为 width/height）
+_SIZE = {"w": "w", "width": "w", "h": "h", "height": "h"}
+_OVERLAY = _same("x", "y", "eof_action", "shortest", "repeatlast")
+_TRANSPOSE_DIRS = {
+    "0": "cclock_flip", "1": "clock", "2": "cclock", "3": "clock_flip",
+    **_same("cclock_flip", "clock", "cclock", "clock_flip"),
+}
+_DEINTERLACE = _same("mode", "parity", "deint")
+# yadif/bwdif 的 mode：逐帧或逐场输出
+_FIELD_RATE = {
+    "0": "frame", "send_frame": "frame", "2": "frame", "send_frame_nospatial": "frame",
+    "1": "field", "send_field": "field", "3": "field", "send_field_nospatial": "field",
+}
+
+_CUDA_FORMATS = frozenset({"yuv420p", "nv12", "yuv444p", "p010le", "p016le", "yuv444p16le",
+                           "bgr0", "bgra", "rgb0", "rgba"})
+_CUDA_DEINTERLACE_FORMATS = frozenset({"yuv420p", "nv12", "yuv444p", "p010le", "p016le", "yuv444p16le"})
+_VAAPI_FORMATS = ("nv12", "p010le", "bgra", "rgba", "bgr0", "rgb0")
+
+# 等价实现目录：同一设备上同一 CPU 滤镜的多个实现按优先顺序排列，使用能力索引中第一个可用的
+CATALOG: Tuple[HwEquivalent, ...] = (
+    # CUDA
+    HwEquivalent(
+        "cuda", "scale", "scale_cuda",
+        {**_SIZE, "flags": "interp_algo", **_same("force_original_aspect_ratio", "force_divisible_by")},
+        {"flags": {"bilinear": "bilinear", "bicubic": "bicubic", "lanczos": "lanczos", "neighbor": "nearest"}},
+        formats=_CUDA_FORMATS,
+    ),
+    HwEquivalent(
+        "cuda", "scale", "scale_npp",
+        {**_SIZE, "flags": "interp_algo", **_same("force_original_aspect_ratio", "force_divisible_by")},
+        {"flags": {"neighbor": "nn", "bilinear": "linear", "bicubic": "cubic", "lanczos": "lanczos"}},
+        formats=frozenset({"yuv420p", "nv12", "yuv444p"}),
+    ),
+    HwEquivalent(
+        "cuda", "format", "scale_cuda", {"pix_fmt": "format", "pix_fmts": "format"},
+        {key: _formats(*sorted(_CUDA_FORMATS)) for key in ("pix_fmt", "pix_fmts")},
+        formats=_CUDA_FORMATS,
+    ),
+    HwEquivalent("cuda", "overlay", "overlay_cuda", _OVERLAY,
+                 formats=frozenset({"nv12", "yuv420p", "yuva420p"})),
+    HwEquivalent("cuda", "yadif", "yadif_cuda", _DEINTERLACE, formats=_CUDA_DEINTERLACE_FORMATS),
+    HwEquivalent("cuda", "bwdif", "bwdif_cuda", _DEINTERLACE, formats=_CUDA_DEINTERLACE_FORMATS),
+    HwEquivalent("cuda", "transpose", "transpose_npp", {"dir": "dir", "passthrough": "passthrough"},
+                 {"dir": _TRANSPOSE_DIRS}, formats=frozenset({"yuv420p", "yuv444p"})),
+    HwEquivalent("cuda", "thumbnail", "thumbnail_cuda", _same("n")),
+    # QSV：vpp_qsv 一个滤镜完成裁剪、翻转、格式转换等
+    HwEquivalent("qsv", "scale", "scale_qsv", {**_SIZE, "flags": "mode"},
+                 {"flags": {"bicubic": "hq", "lanczos": "hq", "bilinear": "low_power", "fast_bilinear": "low_power"}}),
+    HwEquivalent("qsv", "format", "vpp_qsv", {"pix_fmt": "format", "pix_fmts": "format"},
+                 {key: _formats("nv12", "p010le", "bgra") for key in ("pix_fmt", "pix_fmts")}),
+    HwEquivalent("qsv", "crop", "vpp_qsv", {"w": "cw", "out_w": "cw", "h": "ch", "out_h": "ch", "x": "cx", "y": "cy"}),
+    HwEquivalent("qsv", "transpose", "vpp_qsv", {"dir": "transpose"}, {"dir": _TRANSPOSE_DIRS}),
+    HwEquivalent("qsv", "hflip", "vpp_qsv", fixed={"transpose": "hflip"}),
+    HwEquivalent("qsv", "vflip", "vpp_qsv", fixed={"transpose": "vflip"}),
+    HwEquivalent("qsv", "overlay", "overlay_qsv", _OVERLAY),
+    # deinterlace_qsv 没有逐场输出，只转换默认参数的 yadif/bwdif
+    HwEquivalent("qsv", "yadif", "deinterlace_qsv"),
+    HwEquivalent("qsv", "bwdif", "deinterlace_qsv"),
+    HwEquivalent("qsv", "hstack", "hstack_qsv", _same("inputs", "shortest")),
+    HwEquivalent("qsv", "vstack", "vstack_qsv", _same("inputs", "shortest")),
+    # VAAPI
+    HwEquivalent(
+        "vaapi", "scale", "scale_vaapi",
+        {**_SIZE, "flags": "mode", **_same("force_original_aspect_ratio", "force_divisible_by")},
+        {"flags": {"fast_bilinear": "fast", "bilinear": "default", "bicubic": "hq", "lanczos": "hq"}},
+    ),
+    HwEquivalent("vaapi", "format", "scale_vaapi", {"pix_fmt": "format", "pix_fmts": "format"},
+                 {key: _formats(*_VAAPI_FORMATS) for key in ("pix_fmt", "pix_fmts")}),
+    HwEquivalent("vaapi", "overlay", "overlay_vaapi", _OVERLAY),
+    HwEquivalent("vaapi", "pad", "pad_vaapi", {"width": "width", "w": "width", "height": "height", "h": "height",
+                                               "x": "x", "y": "y", "color": "color"}),
+    HwEquivalent("vaapi", "transpose", "transpose_vaapi", {"dir": "dir"}, {"dir": _TRANSPOSE_DIRS}),
+    HwEquivalent("vaapi", "hflip", "transpose_vaapi", fixed={"dir": "hflip"}),
+    HwEquivalent("vaapi", "vflip", "transpose_vaapi", fixed={"dir": "vflip"}),
+    HwEquivalent("vaapi", "yadif", "deinterlace_vaapi", {"mode": "rate"}, {"mode": _FIELD_RATE}),
+    HwEquivalent("vaapi", "bwdif", "deinterlace_vaapi", {"mode": "rate"}, {"mode": _FIELD_RATE}),
+    HwEquivalent("vaapi", "hstack", "hstack_vaapi", _same("inputs", "shortest")),
+    HwEquivalent("vaapi", "vstack", "vstack_vaapi", _same("inputs", "shortest")),
+)
+
+
+class EquivalenceCatalog:
+    """按设备查找 CPU 滤镜的等价实现；给定能力索引时只使用该 ffmpeg 编译进来的设备滤镜"""
+
+    def __init__(self, entries: Iterable[HwEquivalent] = CATALOG, index=None):
+        self.index = index
+        self.entries: Dict[Tuple[str, str], List[HwEquivalent]] = {}
+        for entry in entries:
+            self.entries.setdefault((entry.device, entry.cpu_name), []).append(entry)
+
+    @classmethod
+    def probe(cls, binary: Optional[str] = None) -> 'EquivalenceCatalog':
+        """对照 ffmpeg 的能力索引建立目录，无法探测时不做检查"""
+        from core.capability_index import get_capability_index
+        try:
+            return cls(index=get_capability_index(binary))
+        except FFmpegError as e:
+            logger.debug("无法探测 ffmpeg 能力，等价目录不做检查: %s", e.message)
+            return cls()
+
+    def available(self, entry: HwEquivalent) -> bool:
+        return self.index is None or self.index.has_filter(entry.name)
+
+    def candidates(self, name: str, device: str) -> List[HwEquivalent]:
+        return [entry for entry in self.entries.get((device, name), ()) if self.available(entry)]
+
+    def translate(self, node: FilterNode, device: str, pix_fmt: Optional[str] = None) -> Optional[FilterNode]:
+        """第一个可用且能转换参数的等价实现"""
+        for entry in self.candidates(node.name, device):
+            translated = entry.translate(node, pix_fmt)
+            if translated is not None:
+                return translated
+        return None
+
+    def missing(self, device: Optional[str] = None) -> List[HwEquivalent]:
+        """目录中当前 ffmpeg 不支持的设备滤镜"""
+        return [entry for entries in self.entries.values() for entry in entries
+                if (device is None or entry.device == device) and not self.available(entry)]
+
+    def coverage(self, device: str) -> Dict[str, List[str]]:
+        """设备上可以转换的 CPU 滤镜 -> 可用的设备滤镜"""
+        return {
+            name: [entry.name for entry in self.candidates(name, device)]
+            for entry_device, name in self.entries if entry_device == device and self.candidates(name, device)
+        }
+
+
+# 不检查能力索引的默认目录
+DEFAULT_CATALOG = EquivalenceCatalog()
+
+
+def lower_filter(filter_def: Union[str, Dict, FilterNode], device: str,
+                 catalog: EquivalenceCatalog = DEFAULT_CATALOG) -> Union[str, Dict, FilterNode]:
+    """把单个滤镜换成设备实现（字符串、字典或 FilterNode，返回同一形式），没有等价实现时原样返回"""
+    if isinstance(filter_def, str):
+        from parsers.filter_scanner import FilterScanner
+        from parsers.graph_writer import format_filter
+        chains = FilterScanner().parse(filter_def).filter_chains
+        if len(chains) != 1 or len(chains[0].filters) != 1:
+            return filter_def
+        translated = catalog.translate(chains[0].filters[0], device)
+        return format_filter(translated) if translated is not None else filter_def
+    node = FilterNode.from_dict(filter_def)
+    translated = catalog.translate(node, device)
+    if translated is None:
+        return filter_def
+    return translated if isinstance(filter_def, FilterNode) else translated.to_dict()
+
+
+# 确保导出类
+__all__ = ['DEVICES', 'HwEquivalent', 'CATALOG', 'EquivalenceCatalog', 'DEFAULT_CATALOG', 'lower_filter']
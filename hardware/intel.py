@@ -1,76 +1,19 @@
-import os
-import sys
-import logging
-import subprocess
-from typing import Dict, Optional
-from core.error_types import FFmpegError, ErrorType
+from typing import Dict, Union
+from hardware.equivalence import DEFAULT_CATALOG, lower_filter
+from hardware.probe import get_hardware_probe
 
 class IntelQSVAccelerator:
     """Intel QSV 加速器"""
     
-    SUPPORTED_FILTERS = {
-        'scale': {
-            'impl': 'scale_qsv',
-            'params': {'w': 'width', 'h': 'height'},
-            'requires': ['-hwaccel qsv']
-        },
-        'overlay': {
-            'impl': 'overlay_qsv',
-            'params': {'x': 'x', 'y': 'y'}
-        }
-    }
-
-    def __init__(self):
+    def __init__(self, probe=None):
         self.video_codec = "h264_qsv"
         self.device_id = 0
-        self._check_driver()
+        self.probe = probe  # 默认使用进程内共享的硬件探测器
         
     def is_available(self) -> bool:
-        """检查是否可用QSV加速"""
-        try:
-            self._check_driver()
-            return True
-        except FFmpegError:
-            return False
-
-    def optimize_filter(self, filter_str: str) -> Optional[str]:
-        """优化滤镜命令"""
-        name, params = self._parse_filter(filter_str)
-        if spec := self.SUPPORTED_FILTERS.get(name):
-            param_mapping = ":".join(
-                f"{spec['params'][k]}={v}"
-                for k, v in params.items()
-                if k in spec['params']
-            )
-            return f"{spec['impl']}={param_mapping}"
-        return None
-
-    def _parse_filter(self, filter_str: str) -> tuple:
-        """解析滤镜字符串"""
-        if '=' in filter_str:
-            name, param_part = filter_str.split('=', 1)
-            params = dict(p.split('=') for p in param_part.split(':'))
-        else:
-            name, params = filter_str, {}
-        return name.strip(), params
+        """检查是否可用QSV加速（读取硬件探测快照，不运行 vainfo）"""
+        return (self.probe or get_hardware_probe()).snapshot().is_available("qsv")
 
-    def _check_driver(self) -> None:
-        """检查驱动是否可用"""
-        try:
-            output = subprocess.check_output(
-                ["vainfo"], 
-                text=True, 
-                stderr=subprocess.STDOUT
-            )
-            if "iHD" not in output:
-                raise FFmpegError(
-                    "Intel iHD驱动未安装",
-                    error_type=ErrorType.DRIVER_MISSING,
-                    suggestion="安装intel-media-va-driver"
-                )
-        except FileNotFoundError:
-            raise FFmpegError(
-                "未检测到VAAPI支持",
-                error_type=ErrorType.HARDWARE_UNAVAILABLE,
-                suggestion="安装vainfo和intel-media-va-driver"
-            )
\ No newline at end of file
+    def optimize_filter(self, filter_def: Union[str, Dict], catalog=DEFAULT_CATALOG) -> Union[str, Dict]:
+        """替换为 QSV 上的等价滤镜（参数名与取值一并转换），没有等价实现时原样返回"""
+        return lower_filter(filter_def, "qsv", catalog)
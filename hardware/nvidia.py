@@ -1,41 +1,34 @@
-from typing import Dict, Optional
+from typing import Dict, Optional, Union
 from core.error_types import FFmpegError, ErrorType
+from hardware.equivalence import DEFAULT_CATALOG, lower_filter
+from hardware.probe import get_hardware_probe
 
 class CUDAAccelerator:
     """NVIDIA CUDA 加速器"""
     
-    def __init__(self):
+    def __init__(self, probe=None):
         self.video_codec = "h264_nvenc"
         self.device_id = 0
+        self.probe = probe  # 默认使用进程内共享的硬件探测器
     
     def is_available(self) -> bool:
-        """检查是否可用CUDA加速"""
-        try:
-            import torch
-            return torch.cuda.is_available()
-        except ImportError:
-            return False
+        """检查是否可用CUDA加速（读取硬件探测快照，不导入 torch）"""
+        return (self.probe or get_hardware_probe()).snapshot().is_available("cuda")
     
-    def optimize_filter(self, filter_def: Dict) -> Optional[Dict]:
-        """优化滤镜配置"""
-        name = filter_def["name"]
-        if name == "scale":
-            filter_def["name"] = "scale_cuda"
-        elif name == "format":
-            filter_def["name"] = "format_cuda"
-        return filter_def
+    def optimize_filter(self, filter_def: Union[str, Dict], catalog=DEFAULT_CATALOG) -> Union[str, Dict]:
+        """替换为 CUDA 上的等价滤镜（参数名与取值一并转换），没有等价实现时原样返回"""
+        return lower_filter(filter_def, "cuda", catalog)
     
     def get_device_info(self) -> Dict:
         """获取设备信息"""
-        try:
-            import torch
-            return {
-                "name": torch.cuda.get_device_name(self.device_id),
-                "memory": torch.cuda.get_device_properties(self.device_id).total_memory,
-                "capability": torch.cuda.get_device_capability(self.device_id)
-            }
-        except ImportError:
-            return {}
+        for adapter in (self.probe or get_hardware_probe()).snapshot().adapters("cuda"):
+            if adapter.index == self.device_id:
+                return {
+                    "name": adapter.name,
+                    "memory": adapter.memory_mb * 1024 * 1024 if adapter.memory_mb is not None else None,
+                    "node": adapter.node
+                }
+        return {}
 
 # 确保导出类
 __all__ = ['CUDAAccelerator']
\ No newline at end of file
@@ -0,0 +1,322 @@
+import os
+import glob
+import time
+import marshal
+import hashlib
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from core.cache_dir import get_cache_dir
+from core.error_types import FFmpegError
+from core.capability_index import binary_fingerprint, parse_hwaccels, resolve_binary
+
+# 单个探测命令的超时（秒）与快照有效期（秒）
+PROBE_TIMEOUT = 5.0
+SNAPSHOT_TTL = 3600.0
+# 快照文件格式版本，格式变化时递增
+SNAPSHOT_VERSION = 1
+
+# 运行命令：(参数列表, 超时) -> (返回码, 输出)，超时或无法启动时返回码为 None
+Runner = Callable[[Sequence[str], float], Tuple[Optional[int], str]]
+
+
+def run_command(args: Sequence[str], timeout: float) -> Tuple[Optional[int], str]:
+    """运行探测命令，成功时返回标准输出，失败时返回标准错误"""
+    try:
+        result = subprocess.run(list(args), capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None, f"超时（{timeout:g} 秒）"
+    except OSError as e:
+        return None, str(e)
+    return result.returncode, result.stdout if result.returncode == 0 else result.stderr
+
+
+@dataclass(frozen=True)
+class DeviceCheck:
+    """设备的探测方式：设备节点与 -init_hw_device 写法（{node} 为设备节点）"""
+    device: str
+    nodes: str
+    init: str
+    init_without_node: str
+
+
+DEVICE_CHECKS: Dict[str, DeviceCheck] = {
+    "cuda": DeviceCheck("cuda", "/dev/nvidia[0-9]*", "cuda=hw", "cuda=hw"),
+    "qsv": DeviceCheck("qsv", "/dev/dri/renderD*", "qsv=hw:{node}", "qsv=hw"),
+    "vaapi": DeviceCheck("vaapi", "/dev/dri/renderD*", "vaapi=va:{node}", "vaapi=va"),
+}
+
+# NVIDIA 显卡清单：序号、名称、显存（MiB）
+_NVIDIA_SMI = ("nvidia-smi", "--query-gpu=index,name,memory.total", "--format=csv,noheader,nounits")
+
+
+@dataclass(frozen=True)
+class Adapter:
+    """设备上的一块硬件（显卡或渲染节点）"""
+    device: str
+    index: int
+    name: str = ""
+    node: Optional[str] = None  # 设备节点，如 /dev/dri/renderD128
+    memory_mb: Optional[int] = None
+
+    def to_data(self) -> Tuple:
+        return self.device, self.index, self.name, self.node, self.memory_mb
+
+
+@dataclass(frozen=True)
+class DeviceStatus:
+    """一种设备的探测结果，不可用时 reason 说明原因"""
+    device: str
+    available: bool
+    adapters: Tuple[Adapter, ...] = ()
+    reason: str = ""
+
+    def to_data(self) -> Tuple:
+        return self.available, tuple(adapter.to_data() for adapter in self.adapters), self.reason
+
+
+@dataclass
+class HardwareSnapshot:
+    """某一时刻的硬件加速能力：ffmpeg 支持的 -hwaccel 与各设备的可用性"""
+    binary: Optional[str]
+    hwaccels: Tuple[str, ...]
+    devices: Dict[str, DeviceStatus]
+    created: float = field(default_factory=time.time)
+
+    @classmethod
+    def cpu_only(cls) -> 'HardwareSnapshot':
+        """没有任何硬件设备的快照（CPU 主机与 CI 使用）"""
+        return cls(None, (), {
+            device: DeviceStatus(device, False, reason="未启用硬件探测") for device in DEVICE_CHECKS
+        })
+
+    def is_available(self, device: str) -> bool:
+        status = self.devices.get(device)
+        return status is not None and status.available
+
+    def adapters(self, device: str) -> List[Adapter]:
+        status = self.devices.get(device)
+        return list(status.adapters) if status is not None and status.available else []
+
+    @property
+    def available_devices(self) -> List[str]:
+        return [device for device, status in self.devices.items() if status.available]
+
+    def expired(self, ttl: float, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) - self.created > ttl
+
+    def to_data(self) -> Dict:
+        return {
+            "binary": self.binary,
+            "hwaccels": self.hwaccels,
+            "devices": {device: status.to_data() for device, status in self.devices.items()},
+            "created": self.created,
+        }
+
+    @classmethod
+    def from_data(cls, data: Dict) -> 'HardwareSnapshot':
+        devices = {}
+        for device, (available, adapters, reason) in data["devices"].items():
+            devices[device] = DeviceStatus(device, available, tuple(Adapter(*adapter) for adapter in adapters), reason)
+        return cls(data["binary"], tuple(data["hwaccels"]), devices, data["created"])
+
+    def to_dict(self) -> Dict:
+        return {
+            "binary": self.binary,
+            "hwaccels": list(self.hwaccels),
+            "devices": {
+                device: {
+                    "available": status.available,
+                    "reason": status.reason,
+                    "adapters": [
+                        {"index": a.index, "name": a.name, "node": a.node, "memory_mb": a.memory_mb}
+                        for a in status.adapters
+                    ],
+                }
+                for device, status in self.devices.items()
+            },
+            "created": self.created,
+        }
+
+
+class HardwareProbe:
+    """轻量硬件探测：检查设备节点，并行运行 ffmpeg -hwaccels 与 -init_hw_device 试运行
+
+    不导入 torch 等重量级库；结果按 ffmpeg 可执行文件缓存到磁盘，有效期内直接读取快照。
+    runner 与 find_nodes 可替换为假实现，在没有硬件的 CI 上测试。
+    """
+
+    def __init__(self, binary: Optional[str] = None, timeout: float = PROBE_TIMEOUT, ttl: float = SNAPSHOT_TTL,
+                 cache_dir: Optional[Path] = None, runner: Runner = run_command,
+                 find_nodes: Optional[Callable[[str], List[str]]] = None):
+        self.binary = binary
+        self.timeout = timeout
+        self.ttl = ttl
+        self.cache_dir = cache_dir
+        self.runner = runner
+        # Windows 没有设备节点，只依据 ffmpeg 的探测结果
+        self.find_nodes = find_nodes if find_nodes is not None else (glob.glob if os.name != "nt" else None)
+        self._snapshot: Optional[HardwareSnapshot] = None
+        self._lock = threading.Lock()
+
+    def snapshot(self, refresh: bool = False) -> HardwareSnapshot:
+        """获取快照：内存与磁盘缓存未过期时不运行任何命令"""
+        with self._lock:
+            if not refresh and self._snapshot is not None and not self._snapshot.expired(self.ttl):
+                return self._snapshot
+            binary = self._resolve()
+            path = self.snapshot_path(binary)
+            snapshot = None if refresh else self._read(path)
+            if snapshot is None or snapshot.expired(self.ttl):
+                snapshot = self.probe(binary)
+                self._write(path, snapshot)
+            self._snapshot = snapshot
+            return snapshot
+
+    def _resolve(self) -> Optional[str]:
+        try:
+            return resolve_binary(self.binary)
+        except FFmpegError:
+            return None
+
+    def probe(self, binary: Optional[str] = None) -> HardwareSnapshot:
+        """运行全部探测（并行，每个命令单独超时）"""
+        nodes = {
+            device: sorted(self.find_nodes(check.nodes)) if self.find_nodes is not None else None
+            for device, check in DEVICE_CHECKS.items()
+        }
+        with ThreadPoolExecutor(len(DEVICE_CHECKS) + 2) as pool:
+            hwaccels = pool.submit(self.runner, [binary, "-hide_banner", "-hwaccels"], self.timeout) if binary else None
+            inits = {
+                device: pool.submit(self.runner, self._init_args(binary, check, nodes[device]), self.timeout)
+                for device, check in DEVICE_CHECKS.items() if binary and nodes[device] != []
+            }
+            smi = pool.submit(self.runner, _NVIDIA_SMI, self.timeout) if nodes["cuda"] != [] else None
+            supported = ()
+            if hwaccels is not None:
+                code, output = hwaccels.result()
+                supported = parse_hwaccels(output) if code == 0 else ()
+            gpus = _parse_nvidia_smi(smi.result()) if smi is not None else []
+
+        devices = {}
+        for device in DEVICE_CHECKS:
+            if nodes[device] == []:
+                reason = f"未找到设备节点 {DEVICE_CHECKS[device].nodes}"
+            elif binary is None:
+                reason = "未找到 FFmpeg 可执行文件"
+            elif device not in supported:
+                reason = f"FFmpeg 不支持 -hwaccel {device}"
+            else:
+                code, output = inits[device].result()
+                reason = "" if code == 0 else f"-init_hw_device 失败: {_last_line(output)}"
+            adapters = self._adapters(device, nodes[device], gpus)
+            devices[device] = DeviceStatus(device, not reason, adapters if not reason else (), reason)
+        return HardwareSnapshot(binary, supported, devices)
+
+    @staticmethod
+    def _init_args(binary: str, check: DeviceCheck, nodes: Optional[List[str]]) -> List[str]:
+        spec = check.init.format(node=nodes[0]) if nodes else check.init_without_node
+        return [binary, "-hide_banner", "-v", "error", "-init_hw_device", spec,
+                "-f", "lavfi", "-i", "nullsrc=s=64x64:d=0.04", "-f", "null", "-"]
+
+    @staticmethod
+    def _adapters(device: str, nodes: Optional[List[str]], gpus: List[Adapter]) -> Tuple[Adapter, ...]:
+        if device == "cuda" and gpus:
+            return tuple(gpus)
+        if device != "cuda" and nodes:
+            return tuple(Adapter(device, index, node=node) for index, node in enumerate(nodes))
+        # 无法列出时视为一块
+        return (Adapter(device, 0),)
+
+    def snapshot_path(self, binary: Optional[str]) -> Path:
+        key = repr(binary_fingerprint(binary)) if binary else "none"
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+        return Path(self.cache_dir or get_cache_dir("hardware")) / f"probe-{digest}.snap"
+
+    @staticmethod
+    def _read(path: Path) -> Optional[HardwareSnapshot]:
+        try:
+            version, data = marshal.loads(path.read_bytes())
+            if version != SNAPSHOT_VERSION:
+                return None
+            return HardwareSnapshot.from_data(data)
+        except (OSError, ValueError, EOFError, TypeError, KeyError):
+            return None
+
+    @staticmethod
+    def _write(path: Path, snapshot: HardwareSnapshot) -> None:
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(marshal.dumps((SNAPSHOT_VERSION, snapshot.to_data())))
+            os.replace(tmp, path)
+        except OSError:
+            # 缓存目录不可写时仅使用内存中的快照
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+
+
+class StaticProbe:
+    """返回固定快照的探测器（测试与 CPU 主机使用）"""
+
+    def __init__(self, snapshot: Optional[HardwareSnapshot] = None):
+        self._snapshot = snapshot or HardwareSnapshot.cpu_only()
+
+    def snapshot(self, refresh: bool = False) -> HardwareSnapshot:
+        return self._snapshot
+
+
+def _parse_nvidia_smi(result: Tuple[Optional[int], str]) -> List[Adapter]:
+    """解析 nvidia-smi 的 "0, NVIDIA GeForce RTX 3090, 24576" 行"""
+    code, output = result
+    if code != 0:
+        return []
+    adapters = []
+    for line in output.splitlines():
+        parts = [part.strip() for part in line.split(",")]
+        if len(parts) == 3 and parts[0].isdigit():
+            memory = int(parts[2]) if parts[2].isdigit() else None
+            adapters.append(Adapter("cuda", int(parts[0]), parts[1], f"/dev/nvidia{parts[0]}", memory))
+    return adapters
+
+
+def _last_line(output: str) -> str:
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    return lines[-1] if lines else "未知错误"
+
+
+# 进程内共享的探测器，可替换为 StaticProbe 等假实现
+_probe = None
+_probe_lock = threading.Lock()
+
+
+def get_hardware_probe():
+    global _probe
+    with _probe_lock:
+        if _probe is None:
+            _probe = HardwareProbe()
+        return _probe
+
+
+def set_hardware_probe(probe) -> None:
+    """替换进程内共享的探测器（None 恢复默认）"""
+    global _probe
+    with _probe_lock:
+        _probe = probe
+
+
+def get_hardware_snapshot(refresh: bool = False) -> HardwareSnapshot:
+    return get_hardware_probe().snapshot(refresh)
+
+
+# 确保导出类
+__all__ = [
+    'PROBE_TIMEOUT', 'SNAPSHOT_TTL', 'run_command', 'DeviceCheck', 'DEVICE_CHECKS', 'Adapter', 'DeviceStatus',
+    'HardwareSnapshot', 'HardwareProbe', 'StaticProbe', 'get_hardware_probe', 'set_hardware_probe',
+    'get_hardware_snapshot'
+]
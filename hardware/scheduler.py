@@ -0,0 +1,266 @@
+import copy
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterator, List, Optional, Tuple
+from core.cost_model import BITS_PER_PIXEL, DEFAULT_VIDEO
+from core.error_types import FFmpegError
+from core.placement import DEVICE_PROFILES, output_video_codec
+from hardware.probe import Adapter, HardwareSnapshot, get_hardware_probe
+from parsers.parser_models import ParsedCommand
+from parsers.propagation import StreamInfo
+
+# 消费级显卡（GeForce/TITAN）的 NVENC 并发会话上限，专业卡不限
+NVENC_CONSUMER_SESSIONS = 8
+_NVENC_LIMITED = ("GeForce", "TITAN")
+
+# 显存预算占总显存的比例（余量留给驱动与其他进程）
+VRAM_FRACTION = 0.9
+# 设备上下文的固定显存开销（MiB）与每个会话的帧池大小
+CONTEXT_VRAM_MB = {"cuda": 300.0, "qsv": 64.0, "vaapi": 64.0}
+SURFACE_POOL = 32
+
+_job_ids = itertools.count()
+
+
+def session_limit(adapter: Adapter) -> Optional[int]:
+    """设备的并发编码会话上限，None 表示不限（名称未知的 NVIDIA 显卡按消费级处理）"""
+    if adapter.device == "cuda" and (not adapter.name or any(key in adapter.name for key in _NVENC_LIMITED)):
+        return NVENC_CONSUMER_SESSIONS
+    return None
+
+
+def estimate_vram_mb(device: str, stream: StreamInfo, sessions: int = 1) -> float:
+    """任务占用的显存：设备上下文加上每个会话的帧池"""
+    width, height = stream.width or DEFAULT_VIDEO.width, stream.height or DEFAULT_VIDEO.height
+    frame_mb = width * height * BITS_PER_PIXEL.get(stream.pix_fmt, 12) / 8 / 2 ** 20
+    return CONTEXT_VRAM_MB.get(device, 0.0) + SURFACE_POOL * frame_mb * max(sessions, 1)
+
+
+@dataclass(frozen=True)
+class Job:
+    """一个要放到设备上的任务：占用的编码会话数与显存"""
+    job_id: str
+    device: str
+    sessions: int = 1
+    vram_mb: float = 0.0
+
+    @classmethod
+    def from_command(cls, command: ParsedCommand, device: str, inputs: Optional[Dict[str, StreamInfo]] = None,
+                     job_id: Optional[str] = None) -> 'Job':
+        """按命令估算：每个使用该设备编码器的输出占一个会话，显存按最大的输入视频估算"""
+        suffix = DEVICE_PROFILES[device].encoder_suffix if device in DEVICE_PROFILES else f"_{device}"
+        sessions = sum(1 for output in command.outputs
+                       if (output_video_codec(output) or "").endswith(suffix))
+        videos = [info for info in (inputs or {}).values() if info.kind == "video" and info.width and info.height]
+        stream = max(videos, key=lambda info: info.width * info.height) if videos else DEFAULT_VIDEO
+        return cls(job_id or f"job-{next(_job_ids)}", device, sessions, estimate_vram_mb(device, stream, sessions))
+
+
+@dataclass(frozen=True)
+class Assignment:
+    """任务分配到的设备"""
+    job: Job
+    adapter: Adapter
+
+
+@dataclass
+class DeviceLoad:
+    """设备的容量与当前占用"""
+    adapter: Adapter
+    session_limit: Optional[int]
+    vram_budget_mb: Optional[float]
+    sessions: int = 0
+    vram_mb: float = 0.0
+    jobs: List[Job] = field(default_factory=list)
+
+    @property
+    def load(self) -> float:
+        """会话与显存占用比例中较高的一个"""
+        ratios = [0.0]
+        if self.session_limit:
+            ratios.append(self.sessions / self.session_limit)
+        if self.vram_budget_mb:
+            ratios.append(self.vram_mb / self.vram_budget_mb)
+        return max(ratios)
+
+    def can_hold(self, job: Job) -> bool:
+        """空闲时能否容纳该任务"""
+        return ((self.session_limit is None or job.sessions <= self.session_limit)
+                and (self.vram_budget_mb is None or job.vram_mb <= self.vram_budget_mb))
+
+    def fits(self, job: Job) -> bool:
+        return ((self.session_limit is None or self.sessions + job.sessions <= self.session_limit)
+                and (self.vram_budget_mb is None or self.vram_mb + job.vram_mb <= self.vram_budget_mb))
+
+
+class DeviceScheduler:
+    """多设备任务调度：按硬件探测得到的设备清单，把任务分配到负载最低且容量足够的设备
+
+    容量为每块设备的编码会话上限与显存预算；容量不足时 assign 返回 None，acquire 等待其他任务释放。
+    """
+
+    def __init__(self, inventory: HardwareSnapshot, session_limits: Optional[Dict[str, Optional[int]]] = None,
+                 vram_fraction: float = VRAM_FRACTION):
+        # session_limits 按设备类型覆盖会话上限（None 表示不限）
+        session_limits = session_limits or {}
+        self._loads: Dict[str, List[DeviceLoad]] = {}
+        for device in inventory.available_devices:
+            self._loads[device] = [
+                DeviceLoad(
+                    adapter,
+                    session_limits[device] if device in session_limits else session_limit(adapter),
+                    adapter.memory_mb * vram_fraction if adapter.memory_mb else None
+                )
+                for adapter in inventory.adapters(device)
+            ]
+        self._condition = threading.Condition()
+
+    @classmethod
+    def from_probe(cls, probe=None, **kwargs) -> 'DeviceScheduler':
+        return cls((probe or get_hardware_probe()).snapshot(), **kwargs)
+
+    def loads(self, device: str) -> List[DeviceLoad]:
+        with self._condition:
+            return [replace(load, jobs=list(load.jobs)) for load in self._loads.get(device, ())]
+
+    def assign(self, job: Job) -> Optional[Assignment]:
+        """立即分配，所有设备都已满时返回 None"""
+        with self._condition:
+            return self._assign(job)
+
+    def acquire(self, job: Job, timeout: Optional[float] = None) -> Assignment:
+        """分配设备，容量不足时等待其他任务释放"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while True:
+                assignment = self._assign(job)
+                if assignment is not None:
+                    return assignment
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise FFmpegError(
+                        f"等待 {job.device} 设备超时: {job.job_id}",
+                        error_type="HW_NOT_SUPPORTED",
+                        suggestion="减少并发任务或延长等待时间",
+                        details={"timeout": timeout}
+                    )
+                self._condition.wait(remaining)
+
+    def release(self, assignment: Assignment) -> None:
+        with self._condition:
+            for load in self._loads.get(assignment.job.device, ()):
+                if load.adapter == assignment.adapter and assignment.job in load.jobs:
+                    load.jobs.remove(assignment.job)
+                    load.sessions -= assignment.job.sessions
+                    load.vram_mb -= assignment.job.vram_mb
+                    self._condition.notify_all()
+                    return
+
+    @contextmanager
+    def session(self, command: ParsedCommand, device: str, inputs: Optional[Dict[str, StreamInfo]] = None,
+                timeout: Optional[float] = None) -> Iterator[Tuple[ParsedCommand, Assignment]]:
+        """分配设备并改写命令，退出时释放"""
+        assignment = self.acquire(Job.from_command(command, device, inputs), timeout)
+        try:
+            yield rewrite_device(command, assignment.adapter), assignment
+        finally:
+            self.release(assignment)
+
+    def _assign(self, job: Job) -> Optional[Assignment]:
+        loads = self._loads.get(job.device)
+        if not loads:
+            raise FFmpegError(
+                f"没有可用的 {job.device} 设备",
+                error_type="HW_NOT_SUPPORTED",
+                suggestion="运行 loader.py hwprobe 查看硬件探测结果"
+            )
+        if not any(load.can_hold(job) for load in loads):
+            raise FFmpegError(
+                f"任务 {job.job_id} 超出所有 {job.device} 设备的容量",
+                error_type="HW_NOT_SUPPORTED",
+                suggestion="降低分辨率或减少同时编码的输出",
+                details={"sessions": job.sessions, "vram_mb": round(job.vram_mb, 1)}
+            )
+        candidates = [load for load in loads if load.fits(job)]
+        if not candidates:
+            return None
+        # 负载最低优先，相同时任务少的、序号小的优先
+        load = min(candidates, key=lambda item: (item.load, len(item.jobs), item.adapter.index))
+        load.jobs.append(job)
+        load.sessions += job.sessions
+        load.vram_mb += job.vram_mb
+        return Assignment(job, load.adapter)
+
+
+def parse_device_spec(spec: str) -> Tuple[str, str, str, Dict[str, str]]:
+    """拆分 -init_hw_device 的 type[=name][:device[,key=value...]]"""
+    head, _, rest = spec.partition(":")
+    kind, _, name = head.partition("=")
+    device, *pairs = rest.split(",") if rest else ("",)
+    options = dict(pair.partition("=")[::2] for pair in pairs if pair)
+    return kind, name, device, options
+
+
+def format_device_spec(kind: str, name: str, device: str, options: Dict[str, str]) -> str:
+    spec = f"{kind}={name}" if name else kind
+    if device or options:
+        spec += ":" + ",".join([device] + [f"{key}={value}" for key, value in options.items()])
+    return spec
+
+
+def _device_string(adapter: Adapter, device: str, options: Dict[str, str]) -> Tuple[str, Dict[str, str]]:
+    """设备在 -init_hw_device/-hwaccel_device 中的写法"""
+    if adapter.device == "qsv":
+        if adapter.node:
+            return device or "hw", {**options, "child_device": adapter.node}
+        # 没有设备节点（Windows）时按 MFX 实现序号选择：hw、hw2、hw3...
+        return ("hw" if adapter.index == 0 else f"hw{adapter.index + 1}"), options
+    if adapter.device == "vaapi":
+        return adapter.node or device, options
+    return str(adapter.index), options
+
+
+def rewrite_device(command: ParsedCommand, adapter: Adapter) -> ParsedCommand:
+    """把命令使用的设备改为 adapter：改写同类型的 -init_hw_device 与 -hwaccel_device，
+    只用 NVENC 编码时设置 -gpu；不使用该设备的命令保持不变
+    """
+    kind = adapter.device
+    global_options = dict(command.global_options)
+    outputs = copy.deepcopy(command.outputs)
+    init = global_options.get("init_hw_device")
+    uses_hwaccel = global_options.get("hwaccel") == kind
+
+    name = ""
+    if init and "@" not in init and parse_device_spec(init)[0] == kind:
+        _, name, device, options = parse_device_spec(init)
+        device, options = _device_string(adapter, device, options)
+        global_options["init_hw_device"] = format_device_spec(kind, name, device, options)
+    elif uses_hwaccel and kind == "qsv" and adapter.node:
+        # QSV 的渲染节点只能通过 child_device 指定，创建命名设备供 -hwaccel_device 引用
+        name = "qs"
+        device, options = _device_string(adapter, "", {})
+        global_options["init_hw_device"] = format_device_spec(kind, name, device, options)
+    if uses_hwaccel:
+        global_options["hwaccel_device"] = name or _device_string(adapter, "", {})[0]
+    elif kind == "cuda" and not init:
+        # 没有 CUDA 帧时 NVENC 按 -gpu 选择显卡
+        for output in outputs:
+            if (output_video_codec(output) or "").endswith(DEVICE_PROFILES["cuda"].encoder_suffix):
+                output.setdefault("options", {})["-gpu"] = str(adapter.index)
+    return ParsedCommand(
+        streams=command.streams,
+        filter_chains=command.filter_chains,
+        outputs=outputs,
+        inputs=copy.deepcopy(command.inputs),
+        global_options=global_options
+    )
+
+
+# 确保导出类
+__all__ = [
+    'NVENC_CONSUMER_SESSIONS', 'VRAM_FRACTION', 'session_limit', 'estimate_vram_mb', 'Job', 'Assignment',
+    'DeviceLoad', 'DeviceScheduler', 'parse_device_spec', 'format_device_spec', 'rewrite_device'
+]
@@ -0,0 +1,29 @@
+from typing import Dict, Union
+from hardware.equivalence import DEFAULT_CATALOG, lower_filter
+from hardware.probe import get_hardware_probe
+
+class VAAPIAccelerator:
+    """VAAPI 加速器（Intel/AMD 的 Linux 渲染节点）"""
+
+    def __init__(self, probe=None):
+        self.video_codec = "h264_vaapi"
+        self.device_id = 0
+        self.probe = probe  # 默认使用进程内共享的硬件探测器
+
+    def is_available(self) -> bool:
+        """检查是否可用VAAPI加速（读取硬件探测快照）"""
+        return (self.probe or get_hardware_probe()).snapshot().is_available("vaapi")
+
+    def optimize_filter(self, filter_def: Union[str, Dict], catalog=DEFAULT_CATALOG) -> Union[str, Dict]:
+        """替换为 VAAPI 上的等价滤镜（参数名与取值一并转换），没有等价实现时原样返回"""
+        return lower_filter(filter_def, "vaapi", catalog)
+
+    def get_device_info(self) -> Dict:
+        """获取设备信息"""
+        for adapter in (self.probe or get_hardware_probe()).snapshot().adapters("vaapi"):
+            if adapter.index == self.device_id:
+                return {"name": adapter.name, "node": adapter.node}
+        return {}
+
+# 确保导出类
+__all__ = ['VAAPIAccelerator']
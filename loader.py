@@ -215,15 +215,31 @@ def show_examples():
     
     # 以JSON格式输出分析结果
     python loader.py analyze --format json "ffmpeg -i input.mp4 -vf scale=1280:720 output.mp4"
+
+    # 批量分析（每行一个JSON命令字符串或 {"id": ..., "command": ...}）
+    python loader.py analyze --batch --workers 8 commands.ndjson > results.ndjson
     
     # 优化FFmpeg命令
     python loader.py optimize "ffmpeg -i input.mp4 -vf scale=1280:720 output.mp4"
     
+    # 只删除恒等滤镜，不做融合
+    python loader.py optimize --pass identity "ffmpeg -i in.mp4 -filter_complex [0:v]rotate=0,eq=contrast=1[v] -map [v] out.mp4"
+
     # 使用硬件加速优化命令
     python loader.py optimize --hw-accel "ffmpeg -i input.mp4 -vf scale=1280:720 output.mp4"
+    python loader.py optimize --device cuda "ffmpeg -i in.mp4 -filter_complex [0:v]scale=1280:720[v] -map [v] -c:v h264_nvenc out.mp4"
     
     # 验证FFmpeg命令
     python loader.py validate "ffmpeg -i input.mp4 -vf scale=1280:720 output.mp4"
+
+    # 估算滤镜图各节点的成本并给出性能建议（--probe 用 ffprobe 探测输入）
+    python loader.py explain --probe "ffmpeg -i in.mp4 -filter_complex [0:v]format=rgba,gblur=sigma=2[v] -map [v] out.mp4"
+
+    # 用本机基准测试校准成本表
+    python loader.py calibrate --frames 200
+
+    # 探测本机可用的硬件加速设备（结果缓存一小时，--refresh 重新探测）
+    python loader.py hwprobe --refresh
     """
     print(examples)
 
@@ -262,18 +278,58 @@ def parse_args():
     
     # analyze 命令
     analyze_parser = subparsers.add_parser('analyze', help='分析FFmpeg命令')
-    analyze_parser.add_argument('input', help='输入的FFmpeg命令')
+    analyze_parser.add_argument('input', nargs='?', default='-', help='输入的FFmpeg命令（--batch 时为NDJSON文件，- 表示标准输入）')
     analyze_parser.add_argument('--format', choices=['text', 'json'], default='text', help='输出格式')
+    analyze_parser.add_argument('--batch', action='store_true', help='批处理模式：NDJSON输入，NDJSON输出')
+    analyze_parser.add_argument('--validate', action='store_true', help='批处理时同时进行语义验证')
+    analyze_parser.add_argument('--workers', type=int, default=None, help='批处理进程数（默认CPU核数）')
+    analyze_parser.add_argument('--chunk-size', type=int, default=256, help='每次提交给进程池的命令数')
     
     # optimize 命令
     optimize_parser = subparsers.add_parser('optimize', help='优化FFmpeg命令')
     optimize_parser.add_argument('input', help='输入的FFmpeg命令')
     optimize_parser.add_argument('--hw-accel', action='store_true', help='启用硬件加速')
+    optimize_parser.add_argument('--pass', dest='passes', action='append', default=None, help='只运行指定的优化遍（可重复）')
+    optimize_parser.add_argument('--skip', action='append', default=[], help='跳过指定的优化遍（可重复）')
+    optimize_parser.add_argument('--tolerance', type=float, default=None,
+                                 help='reorder 优化遍单次交换允许的画质差异（默认 0.1，0 表示只做无损交换）')
+    optimize_parser.add_argument('--device', choices=['cuda', 'qsv', 'vaapi'], default=None,
+                                 help='按计算与传输成本把滤镜放到指定硬件设备上（placement 优化遍）')
     
     # validate 命令
     validate_parser = subparsers.add_parser('validate', help='验证FFmpeg命令')
     validate_parser.add_argument('input', help='输入的FFmpeg命令')
+
+    # schemas 命令
+    schemas_parser = subparsers.add_parser('schemas', help='从 ffmpeg -h filter=X 生成滤镜选项索引')
+    schemas_parser.add_argument('--ffmpeg', default=None, help='FFmpeg可执行文件路径')
+    schemas_parser.add_argument('--workers', type=int, default=8, help='并行探测的进程数')
     
+    # explain 命令
+    explain_parser = subparsers.add_parser('explain', help='估算滤镜图成本并给出性能建议')
+    explain_parser.add_argument('input', help='FFmpeg命令或滤镜图')
+    explain_parser.add_argument('--probe', action='store_true', help='用 ffprobe 探测 -i 输入文件的属性')
+    explain_parser.add_argument('--size', default=None, help='未探测输入的默认分辨率，如 1920x1080')
+    explain_parser.add_argument('--fps', type=float, default=None, help='未探测输入的默认帧率')
+    explain_parser.add_argument('--pix-fmt', default=None, help='未探测输入的默认像素格式')
+    explain_parser.add_argument('--top', type=int, default=5, help='列出的热点滤镜数')
+    explain_parser.add_argument('--cost-table', default=None, help='成本表路径（默认使用校准结果）')
+    explain_parser.add_argument('--format', choices=['text', 'json'], default='text', help='输出格式')
+
+    # calibrate 命令
+    calibrate_parser = subparsers.add_parser('calibrate', help='运行基准测试校准滤镜成本表')
+    calibrate_parser.add_argument('filters', nargs='*', help='要测量的滤镜（默认全部带基准写法的滤镜）')
+    calibrate_parser.add_argument('--ffmpeg', default=None, help='FFmpeg可执行文件路径')
+    calibrate_parser.add_argument('--size', default='1920x1080', help='测试画面分辨率')
+    calibrate_parser.add_argument('--frames', type=int, default=100, help='每个滤镜处理的帧数')
+    calibrate_parser.add_argument('--cost-table', default=None, help='成本表保存路径')
+
+    # hwprobe 命令
+    hwprobe_parser = subparsers.add_parser('hwprobe', help='探测可用的硬件加速设备')
+    hwprobe_parser.add_argument('--ffmpeg', default=None, help='FFmpeg可执行文件路径')
+    hwprobe_parser.add_argument('--refresh', action='store_true', help='忽略缓存的探测结果')
+    hwprobe_parser.add_argument('--format', choices=['text', 'json'], default='text', help='输出格式')
+
     args = parser.parse_args()
     
     if args.examples:
@@ -286,9 +342,28 @@ def parse_args():
     
     return args
 
+def execute_batch(args):
+    """批量分析NDJSON中的命令"""
+    from core.batch_analyzer import BatchAnalyzer, run_ndjson
+    analyzer = BatchAnalyzer(
+        mode='validate' if args.validate else 'analyze',
+        workers=args.workers,
+        chunk_size=args.chunk_size
+    )
+    if args.input == '-':
+        stats = run_ndjson(sys.stdin, sys.stdout, analyzer)
+    else:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            stats = run_ndjson(f, sys.stdout, analyzer)
+    sys.stdout.flush()
+    print(stats.report(), file=sys.stderr)
+
 def execute_command(args):
     """执行命令"""
-    if args.command == 'analyze':
+    if args.command == 'analyze' and args.batch:
+        execute_batch(args)
+
+    elif args.command == 'analyze':
         from parsers.semantic_analyzer import SemanticAnalyzer
         analyzer = SemanticAnalyzer()
         result = analyzer.analyze(args.input)
@@ -299,14 +374,7 @@ def execute_command(args):
             print(result)
             
     elif args.command == 'optimize':
-        from core.command_builder import CommandBuilder
-        builder = CommandBuilder()
-        if args.hw_accel:
-            from hardware.acceleration import AccelerationManager
-            accel = AccelerationManager()
-            builder.enable_hw_accel(accel.get_current_accelerator())
-        result = builder.build(args.input)
-        print(result)
+        execute_optimize(args)
         
     elif args.command == 'validate':
         from parsers.semantic_analyzer import SemanticAnalyzer
@@ -318,6 +386,99 @@ def execute_command(args):
             print(f"命令验证失败: {e}")
             sys.exit(1)
 
+    elif args.command == 'schemas':
+        from core.filter_schema import generate_schema_index, SchemaIndex
+        path = generate_schema_index(args.ffmpeg, workers=args.workers)
+        index = SchemaIndex(path)
+        print(f"已生成 {len(index)} 个滤镜的选项索引: {path}")
+        index.close()
+
+    elif args.command == 'explain':
+        execute_explain(args)
+
+    elif args.command == 'calibrate':
+        execute_calibrate(args)
+
+    elif args.command == 'hwprobe':
+        execute_hwprobe(args)
+
+def execute_optimize(args):
+    """优化滤镜图（删除恒等滤镜、融合相邻滤镜），可选再替换为硬件滤镜"""
+    from core.graph_optimizer import OptimizerRegistry, optimize_graph
+    from parsers.graph_writer import format_command
+    options = {}
+    if args.tolerance is not None:
+        options["reorder"] = {"tolerance": args.tolerance}
+    passes = args.passes
+    if args.device:
+        # placement 默认不运行，指定设备时追加在其他优化遍之后
+        options["placement"] = {"device": args.device}
+        passes = (passes or [name for name in OptimizerRegistry.default_names() if name != "placement"]) + ["placement"]
+    result = optimize_graph(args.input, select=passes, ignore=args.skip, options=options)
+    command = format_command(result.command)
+    if args.hw_accel:
+        from core.command_builder import CommandBuilder
+        from hardware.acceleration import AccelerationManager
+        builder = CommandBuilder()
+        accel = AccelerationManager()
+        builder.enable_hw_accel(accel.get_current_accelerator())
+        command = builder.build(command)
+    print(command)
+    # 改写记录输出到标准错误，标准输出只有命令
+    print(result.format_text(), file=sys.stderr)
+
+def execute_explain(args):
+    """输出滤镜图的成本估算与性能建议"""
+    from dataclasses import replace
+    from core.cost_model import CostTable, CostModel, DEFAULT_VIDEO, parse_command_text
+    from parsers.propagation import probe_inputs
+    default_video = DEFAULT_VIDEO
+    if args.size:
+        width, height = (int(v) for v in args.size.lower().split('x'))
+        default_video = replace(default_video, width=width, height=height)
+    if args.fps:
+        default_video = replace(default_video, frame_rate=args.fps)
+    if args.pix_fmt:
+        default_video = replace(default_video, pix_fmt=args.pix_fmt)
+    command = parse_command_text(args.input)
+    inputs = probe_inputs([i['path'] for i in command.inputs]) if args.probe else {}
+    model = CostModel(CostTable.load(args.cost_table), default_video=default_video)
+    report = model.explain(command, inputs)
+    if args.format == 'json':
+        import json
+        print(json.dumps(report.to_dict(args.top), indent=2, ensure_ascii=False))
+    else:
+        print(report.format_text(args.top))
+
+def execute_calibrate(args):
+    """运行基准测试并保存校准后的成本表"""
+    from core.cost_model import CostTable, benchmark_filters
+    width, height = (int(v) for v in args.size.lower().split('x'))
+    table = CostTable.load(args.cost_table)
+    samples = benchmark_filters(args.filters or None, args.ffmpeg, table, width, height, args.frames)
+    for sample in samples:
+        print(f"{sample.filter:<20} {sample.seconds * 1e9 / sample.units:8.3f} ns/像素")
+    path = table.calibrate(samples).save(args.cost_table)
+    print(f"已保存成本表: {path}")
+
+def execute_hwprobe(args):
+    """输出硬件加速设备的探测结果"""
+    from hardware.probe import HardwareProbe
+    snapshot = HardwareProbe(args.ffmpeg).snapshot(refresh=args.refresh)
+    if args.format == 'json':
+        import json
+        print(json.dumps(snapshot.to_dict(), indent=2, ensure_ascii=False))
+        return
+    print(f"FFmpeg: {snapshot.binary or '未找到'}")
+    print(f"-hwaccels: {', '.join(snapshot.hwaccels) or '无'}")
+    for device, status in snapshot.devices.items():
+        if not status.available:
+            print(f"{device:<6} 不可用: {status.reason}")
+            continue
+        for adapter in status.adapters:
+            memory = f" {adapter.memory_mb} MiB" if adapter.memory_mb is not None else ""
+            print(f"{device:<6} #{adapter.index} {adapter.name or adapter.node or ''}{memory}")
+
 def setup_environment(args):
     """设置运行环境"""
     # 设置工作目录
@@ -0,0 +1,434 @@
+import re
+import math
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterable, Optional, Tuple, Union
+import numpy as np
+from core.error_types import FFmpegError
+
+# 数值后缀（与 av_strtod 一致），带 i 为二进制前缀，B 表示乘以 8
+_SI_PREFIXES = {
+    "y": -24, "z": -21, "a": -18, "f": -15, "p": -12, "n": -9, "u": -6, "m": -3,
+    "c": -2, "d": -1, "h": 2, "k": 3, "K": 3, "M": 6, "G": 9, "T": 12, "P": 15, "E": 18, "Z": 21, "Y": 24,
+}
+_TOKEN_RE = re.compile(
+    r'(?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)(?P<suffix>[yzafpnumcdhkKMGTPEZY]?i?B?)'
+    r'|(?P<name>[A-Za-z_][A-Za-z0-9_]*)'
+    r'|(?P<op>[-+*/^(),;])'
+)
+
+CONSTANTS = {"E": math.e, "PI": math.pi, "PHI": (1 + math.sqrt(5)) / 2, "QP2LAMBDA": 118.0}
+
+# 各滤镜表达式可用的变量
+FILTER_VARIABLES: Dict[str, FrozenSet[str]] = {
+    "scale": frozenset({"in_w", "iw", "in_h", "ih", "out_w", "ow", "out_h", "oh", "a", "sar", "dar",
+                        "hsub", "vsub", "ohsub", "ovsub", "n", "t", "pos"}),
+    "crop": frozenset({"in_w", "iw", "in_h", "ih", "out_w", "ow", "out_h", "oh", "a", "sar", "dar",
+                       "hsub", "vsub", "x", "y", "n", "pos", "t"}),
+    "rotate": frozenset({"in_w", "iw", "in_h", "ih", "out_w", "ow", "out_h", "oh", "hsub", "vsub", "n", "t"}),
+    "overlay": frozenset({"main_w", "W", "main_h", "H", "overlay_w", "w", "overlay_h", "h", "x", "y",
+                          "hsub", "vsub", "n", "pos", "t"}),
+    "eq": frozenset({"n", "pos", "r", "t"}),
+    "volume": frozenset({"n", "nb_channels", "nb_consumed_samples", "nb_samples", "pos", "pts",
+                         "sample_rate", "startpts", "startt", "t", "tb", "volume"}),
+}
+
+
+def _gauss(x):
+    return np.exp(-x * x / 2) / math.sqrt(2 * math.pi)
+
+
+def _flag(values) -> Union[float, np.ndarray]:
+    """布尔结果转为 0/1"""
+    return values * 1.0 if isinstance(values, np.ndarray) else float(values)
+
+
+def _if(x, y, z=0.0):
+    return np.where(x != 0, y, z)
+
+
+def _ifnot(x, y, z=0.0):
+    return np.where(x == 0, y, z)
+
+
+# 函数名 -> (最少参数, 最多参数, 实现)；实现同时接受标量与 NumPy 数组
+_FUNCTIONS: Dict[str, Tuple[int, int, Callable]] = {
+    "sin": (1, 1, np.sin), "cos": (1, 1, np.cos), "tan": (1, 1, np.tan),
+    "asin": (1, 1, np.arcsin), "acos": (1, 1, np.arccos), "atan": (1, 1, np.arctan),
+    "sinh": (1, 1, np.sinh), "cosh": (1, 1, np.cosh), "tanh": (1, 1, np.tanh),
+    "atan2": (2, 2, np.arctan2), "hypot": (2, 2, np.hypot),
+    "exp": (1, 1, np.exp), "log": (1, 1, np.log), "sqrt": (1, 1, np.sqrt), "abs": (1, 1, np.abs),
+    "floor": (1, 1, np.floor), "ceil": (1, 1, np.ceil), "trunc": (1, 1, np.trunc),
+    "round": (1, 1, lambda x: np.copysign(np.floor(np.abs(x) + 0.5), x)),  # 与 C round() 一致，远离零取整
+    "pow": (2, 2, np.power), "min": (2, 2, np.minimum), "max": (2, 2, np.maximum), "mod": (2, 2, np.mod),
+    "eq": (2, 2, lambda a, b: _flag(a == b)), "gt": (2, 2, lambda a, b: _flag(a > b)),
+    "gte": (2, 2, lambda a, b: _flag(a >= b)), "lt": (2, 2, lambda a, b: _flag(a < b)),
+    "lte": (2, 2, lambda a, b: _flag(a <= b)), "not": (1, 1, lambda x: _flag(x == 0)),
+    "isnan": (1, 1, lambda x: _flag(np.isnan(x))), "isinf": (1, 1, lambda x: _flag(np.isinf(x))),
+    "between": (3, 3, lambda x, lo, hi: _flag((x >= lo) & (x <= hi))),
+    "clip": (3, 3, np.clip), "if": (2, 3, _if), "ifnot": (2, 3, _ifnot),
+    "gauss": (1, 1, _gauss), "squish": (1, 1, lambda x: 1 / (1 + np.exp(4 * x))),
+    "lerp": (3, 3, lambda x, y, z: x + (y - x) * z), "sgn": (1, 1, np.sign),
+    "bitand": (2, 2, lambda a, b: np.bitwise_and(np.int64(a), np.int64(b)) * 1.0),
+    "bitor": (2, 2, lambda a, b: np.bitwise_or(np.int64(a), np.int64(b)) * 1.0),
+    "gcd": (2, 2, lambda a, b: np.gcd(np.int64(a), np.int64(b)) * 1.0),
+}
+
+# 依赖求值状态或随机数的函数：可以解析，但不能折叠或向量化求值
+_IMPURE_FUNCTIONS = {"st": (2, 2), "ld": (1, 1), "random": (1, 1), "while": (2, 2), "print": (1, 2),
+                     "root": (2, 2), "taylor": (2, 3), "randomi": (3, 3)}
+
+_BINARY = {"+": np.add, "-": np.subtract, "*": np.multiply, "/": np.true_divide, "^": np.power}
+
+# AST 节点：("num", 值) ("var", 名称) ("neg", 子节点) ("op", 运算符, 左, 右) ("call", 函数名, 参数...) ("seq", 左, 右)
+Node = tuple
+
+
+def _syntax_error(text: str, message: str, position: int) -> FFmpegError:
+    return FFmpegError(
+        f"表达式语法错误: {message}",
+        error_type="PARSER_ERROR",
+        suggestion="检查括号、运算符与函数参数",
+        details={"expression": text, "position": position}
+    )
+
+
+class _Parser:
+    """递归下降解析，优先级与 libavutil/eval.c 一致：; < +- < */ < 前置符号 < ^"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.tokens = []
+        pos = 0
+        while pos < len(text):
+            if text[pos].isspace():
+                pos += 1
+                continue
+            match = _TOKEN_RE.match(text, pos)
+            if match is None:
+                raise _syntax_error(text, f"无法识别的字符 '{text[pos]}'", pos)
+            if match.group("number") is not None:
+                self.tokens.append(("num", _parse_number(match.group("number"), match.group("suffix")), pos))
+            elif match.group("name") is not None:
+                self.tokens.append(("name", match.group("name"), pos))
+            else:
+                self.tokens.append((match.group("op"), None, pos))
+            pos = match.end()
+        self.index = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.index][0] if self.index < len(self.tokens) else None
+
+    def take(self, kind: str) -> tuple:
+        if self.peek() != kind:
+            position = self.tokens[self.index][2] if self.index < len(self.tokens) else len(self.text)
+            raise _syntax_error(self.text, f"期望 '{kind}'", position)
+        token = self.tokens[self.index]
+        self.index += 1
+        return token
+
+    def parse(self) -> Node:
+        if not self.tokens:
+            raise _syntax_error(self.text, "空表达式", 0)
+        node = self.sequence()
+        if self.index < len(self.tokens):
+            raise _syntax_error(self.text, f"多余的 '{self.tokens[self.index][1] or self.tokens[self.index][0]}'",
+                                self.tokens[self.index][2])
+        return node
+
+    def sequence(self) -> Node:
+        node = self.additive()
+        while self.peek() == ";":
+            self.index += 1
+            node = ("seq", node, self.additive())
+        return node
+
+    def additive(self) -> Node:
+        node = self.term()
+        while self.peek() in ("+", "-"):
+            op = self.tokens[self.index][0]
+            self.index += 1
+            node = _fold(("op", op, node, self.term()))
+        return node
+
+    def term(self) -> Node:
+        node = self.power()
+        while self.peek() in ("*", "/"):
+            op = self.tokens[self.index][0]
+            self.index += 1
+            node = _fold(("op", op, node, self.power()))
+        return node
+
+    def power(self) -> Node:
+        # 与 eval.c 相同，前置符号作用于整个乘方：-2^2 = -4
+        if self.peek() in ("+", "-"):
+            op = self.tokens[self.index][0]
+            self.index += 1
+            operand = self.power()
+            return operand if op == "+" else _fold(("neg", operand))
+        node = self.primary()
+        while self.peek() == "^":
+            self.index += 1
+            node = _fold(("op", "^", node, self.exponent()))
+        return node
+
+    def exponent(self) -> Node:
+        if self.peek() in ("+", "-"):
+            op = self.tokens[self.index][0]
+            self.index += 1
+            operand = self.primary()
+            return operand if op == "+" else _fold(("neg", operand))
+        return self.primary()
+
+    def primary(self) -> Node:
+        kind = self.peek()
+        if kind == "num":
+            return ("num", self.take("num")[1])
+        if kind == "(":
+            self.index += 1
+            node = self.sequence()
+            self.take(")")
+            return node
+        if kind == "name":
+            _, name, position = self.take("name")
+            if self.peek() == "(":
+                return self.call(name, position)
+            if name in CONSTANTS:
+                return ("num", CONSTANTS[name])
+            return ("var", name)
+        position = self.tokens[self.index][2] if kind else len(self.text)
+        raise _syntax_error(self.text, "缺少操作数", position)
+
+    def call(self, name: str, position: int) -> Node:
+        arity = _FUNCTIONS.get(name) or _IMPURE_FUNCTIONS.get(name)
+        if arity is None:
+            raise _syntax_error(self.text, f"未知函数 {name}", position)
+        self.take("(")
+        args = [self.sequence()]
+        while self.peek() == ",":
+            self.index += 1
+            args.append(self.sequence())
+        self.take(")")
+        if not arity[0] <= len(args) <= arity[1]:
+            raise _syntax_error(self.text, f"函数 {name} 的参数个数错误", position)
+        return _fold(("call", name) + tuple(args))
+
+
+def _parse_number(digits: str, suffix: str) -> float:
+    value = float(digits)
+    if suffix.endswith("B"):
+        value *= 8
+        suffix = suffix[:-1]
+    if suffix.endswith("i"):
+        prefix = suffix[:-1]
+        return value * 2 ** (10 * _SI_PREFIXES[prefix] // 3) if prefix else value
+    return value * 10.0 ** _SI_PREFIXES[suffix] if suffix else value
+
+
+def _is_num(node: Node, value: Optional[float] = None) -> bool:
+    return node[0] == "num" and (value is None or node[1] == value)
+
+
+def _fold(node: Node) -> Node:
+    """常量折叠与恒等化简（x*1、x/1、x+0、x-0、x^1）"""
+    kind = node[0]
+    if kind == "op":
+        _, op, left, right = node
+        if _is_num(left) and _is_num(right):
+            return ("num", _scalar(_BINARY[op], left[1], right[1]))
+        if op in ("*", "/", "^") and _is_num(right, 1.0) or op in ("+", "-") and _is_num(right, 0.0):
+            return left
+        if op == "*" and _is_num(left, 1.0) or op == "+" and _is_num(left, 0.0):
+            return right
+    elif kind == "neg" and _is_num(node[1]):
+        return ("num", -node[1][1])
+    elif kind == "call" and node[1] in _FUNCTIONS and all(_is_num(arg) for arg in node[2:]):
+        return ("num", _scalar(_FUNCTIONS[node[1]][2], *(arg[1] for arg in node[2:])))
+    elif kind == "call" and node[1] in ("if", "ifnot") and _is_num(node[2]):
+        # 条件为常量时只保留选中的分支
+        taken = (node[2][1] != 0) == (node[1] == "if")
+        return node[3] if taken else (node[4] if len(node) > 4 else ("num", 0.0))
+    return node
+
+
+def _scalar(func: Callable, *args: float) -> float:
+    with np.errstate(all="ignore"):
+        return float(func(*args))
+
+
+def _variables(node: Node) -> FrozenSet[str]:
+    if node[0] == "var":
+        return frozenset((node[1],))
+    if node[0] == "num":
+        return frozenset()
+    children = node[2:] if node[0] in ("op", "call") else node[1:]
+    return frozenset().union(*(_variables(child) for child in children))
+
+
+def _impure(node: Node) -> bool:
+    if node[0] in ("num", "var"):
+        return False
+    if node[0] == "call" and node[1] in _IMPURE_FUNCTIONS or node[0] == "seq":
+        return True
+    children = node[2:] if node[0] in ("op", "call") else node[1:]
+    return any(_impure(child) for child in children)
+
+
+def _substitute(node: Node, trees: Dict[str, Node]) -> Node:
+    kind = node[0]
+    if kind == "var":
+        return trees.get(node[1], node)
+    if kind == "num":
+        return node
+    head = node[:2] if kind in ("op", "call") else node[:1]
+    children = node[2:] if kind in ("op", "call") else node[1:]
+    return _fold(head + tuple(_substitute(child, trees) for child in children))
+
+
+def _build(node: Node) -> Callable[[Dict], object]:
+    """把 AST 编译为闭包，env 中的变量可以是标量或 NumPy 数组"""
+    kind = node[0]
+    if kind == "num":
+        value = node[1]
+        return lambda env: value
+    if kind == "var":
+        name = node[1]
+        return lambda env: env[name]
+    if kind == "neg":
+        operand = _build(node[1])
+        return lambda env: -operand(env)
+    if kind == "op":
+        func, left, right = _BINARY[node[1]], _build(node[2]), _build(node[3])
+        return lambda env: func(left(env), right(env))
+    func = _FUNCTIONS[node[1]][2]
+    args = [_build(arg) for arg in node[2:]]
+    return lambda env: func(*(arg(env) for arg in args))
+
+
+_PRECEDENCE = {"seq": 0, "+": 1, "-": 1, "*": 2, "/": 2, "neg": 2.5, "^": 3}
+
+
+def _format_number(value: float) -> str:
+    if not math.isfinite(value):
+        # 表达式语言没有 inf/nan 字面量
+        return "(0/0)" if math.isnan(value) else ("(1/0)" if value > 0 else "(-1/0)")
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _to_source(node: Node, parent: int = 0, right: bool = False) -> str:
+    kind = node[0]
+    if kind == "num":
+        text = _format_number(node[1])
+        return f"({text})" if node[1] < 0 and parent > 0 else text
+    if kind == "var":
+        return node[1]
+    if kind == "call":
+        return f"{node[1]}({','.join(_to_source(arg) for arg in node[2:])})"
+    if kind == "neg":
+        text = "-" + _to_source(node[1], _PRECEDENCE["neg"])
+        return f"({text})" if parent >= _PRECEDENCE["neg"] else text
+    if kind == "seq":
+        text = f"{_to_source(node[1], 0)};{_to_source(node[2], 0)}"
+        return f"({text})" if parent > 0 else text
+    precedence = _PRECEDENCE[node[1]]
+    text = _to_source(node[2], precedence) + node[1] + _to_source(node[3], precedence, True)
+    # 左结合：右操作数同级时也要加括号
+    return f"({text})" if precedence < parent or precedence == parent and right else text
+
+
+class Expression:
+    """编译后的 FFmpeg 表达式（已做常量折叠）"""
+
+    def __init__(self, source: str, tree: Node):
+        self.source = source
+        self.tree = tree
+        self.variables = _variables(tree)
+        self.pure = not _impure(tree)
+        self._func = _build(tree) if self.pure else None
+
+    @property
+    def is_constant(self) -> bool:
+        return self.tree[0] == "num"
+
+    @property
+    def value(self) -> Optional[float]:
+        """常量表达式的值"""
+        return self.tree[1] if self.is_constant else None
+
+    def simplified(self) -> str:
+        """折叠后的表达式文本"""
+        return _to_source(self.tree)
+
+    def substitute(self, **expressions: 'Expression') -> 'Expression':
+        """把变量替换为其他表达式并重新折叠，如把 iw 替换为上一级 scale 的输出宽度"""
+        tree = _substitute(self.tree, {name: e.tree for name, e in expressions.items()})
+        return Expression(_to_source(tree), tree)
+
+    def evaluate(self, **variables) -> Union[float, np.ndarray]:
+        """求值，变量可以是标量或等长的 NumPy 数组（一次向量化求值）"""
+        if self._func is None:
+            raise FFmpegError(
+                f"表达式包含有状态的函数，无法静态求值: {self.source}",
+                error_type="UNKNOWN_ERROR",
+                suggestion="st/ld/random/while 等函数的结果依赖逐帧执行"
+            )
+        missing = self.variables - variables.keys()
+        if missing:
+            raise FFmpegError(
+                f"缺少表达式变量: {', '.join(sorted(missing))}",
+                error_type="INVALID_PARAM",
+                details={"expression": self.source}
+            )
+        env = {
+            name: np.asarray(value, dtype=np.float64) if isinstance(value, (np.ndarray, list, tuple)) else float(value)
+            for name, value in variables.items()
+        }
+        with np.errstate(all="ignore"):
+            result = self._func(env)
+        if isinstance(result, np.ndarray) and result.ndim > 0:
+            return result
+        return float(result)
+
+    def sample(self, duration: float, frame_rate: float = 25.0, max_samples: int = 100000,
+               **variables) -> np.ndarray:
+        """在 [0, duration) 内按帧对 t、n 采样求值，其余变量取给定值"""
+        frames = max(1, int(duration * frame_rate))
+        n = np.linspace(0, frames - 1, min(frames, max_samples)).round()
+        values = self.evaluate(**{"n": n, "t": n / frame_rate, **variables})
+        return np.broadcast_to(values, n.shape)
+
+    def __repr__(self):
+        return f"Expression({self.source!r} -> {self.simplified()!r})"
+
+
+@lru_cache(maxsize=4096)
+def _compile(text: str, variables: Optional[FrozenSet[str]]) -> Expression:
+    expression = Expression(text, _Parser(text).parse())
+    if variables is not None:
+        unknown = expression.variables - variables
+        if unknown:
+            raise FFmpegError(
+                f"未知的表达式变量: {', '.join(sorted(unknown))}",
+                error_type="INVALID_PARAM",
+                suggestion=f"可用变量: {', '.join(sorted(variables))}",
+                details={"expression": text}
+            )
+    return expression
+
+
+def compile_expression(text: str, variables: Optional[Iterable[str]] = None) -> Expression:
+    """编译表达式（按文本与变量集记忆化）；variables 给定时检查未知变量"""
+    return _compile(text, frozenset(variables) if variables is not None else None)
+
+
+def is_number(text: str) -> bool:
+    try:
+        float(text)
+        return True
+    except ValueError:
+        return False
+
+
+# 确保导出类
+__all__ = ['Expression', 'compile_expression', 'is_number', 'CONSTANTS', 'FILTER_VARIABLES']
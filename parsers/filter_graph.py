@@ -0,0 +1,227 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from core.error_types import FFmpegError
+
+# 标签没有生产节点（外部输入或未定义）
+NO_PRODUCER = -1
+
+
+def chain_fields(chain) -> Tuple[Sequence[str], Sequence[str], Sequence]:
+    """取出滤镜链的 (输入标签, 输出标签, 滤镜)，兼容 FilterChain 模型与字典"""
+    if isinstance(chain, dict):
+        output = chain.get("output")
+        outputs = chain.get("outputs") or ([output] if output is not None else [])
+        return chain["inputs"], outputs, chain.get("filters", ())
+    outputs = chain.outputs or ((chain.output,) if chain.output is not None else ())
+    return chain.inputs, outputs, chain.filters
+
+
+def filter_labels(node) -> Tuple[Sequence[str], Sequence[str]]:
+    """滤镜自带的 (输入标签, 输出标签)：链中间的标签，如 scale,[1:v]overlay 中的 [1:v]"""
+    if isinstance(node, dict):
+        return node.get("inputs", ()), node.get("outputs", ())
+    return getattr(node, "inputs", ()), getattr(node, "outputs", ())
+
+
+def has_inner_labels(chain) -> bool:
+    """滤镜链中间是否有流标签（这类链的标签属于各个滤镜，不能按整条链改写）"""
+    return any(label for node in chain_fields(chain)[2] for label in filter_labels(node))
+
+
+class FilterGraph:
+    """整数索引的滤镜图 IR：节点是滤镜链，边是经由流标签的连接
+
+    节点与边都用连续整数编号，邻接关系保存为 CSR 数组
+    （节点 n 的出边为 adj_edges[adj_offsets[n]:adj_offsets[n + 1]]），
+    标签通过 label_ids 映射为整数。构建过程对节点和边各遍历常数次，复杂度 O(V+E)。
+    """
+
+    def __init__(self):
+        self.labels: List[str] = []  # 标签 id -> 标签
+        self.label_ids: Dict[str, int] = {}  # 标签 -> 标签 id
+        self.producers = array('l')  # 标签 id -> 生产节点
+        self.consumer_counts = array('l')  # 标签 id -> 被消费次数
+        self.node_inputs: List[Tuple[int, ...]] = []  # 节点 -> 输入标签 id
+        self.node_outputs: List[Tuple[int, ...]] = []  # 节点 -> 输出标签 id
+        self.edge_src = array('l')
+        self.edge_dst = array('l')
+        self.edge_label = array('l')
+        self.adj_offsets = array('l', [0])
+        self.adj_edges = array('l')
+        self.order = array('l')  # 拓扑序
+        self.errors: List[FFmpegError] = []
+        self.unconsumed: List[int] = []  # 未被任何滤镜消费的输出标签 id（通常由 -map 使用）
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_inputs)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_src)
+
+    def label_id(self, label: str) -> int:
+        """获取或分配标签 id"""
+        lid = self.label_ids.get(label)
+        if lid is None:
+            lid = len(self.labels)
+            self.label_ids[label] = lid
+            self.labels.append(label)
+            self.producers.append(NO_PRODUCER)
+            self.consumer_counts.append(0)
+        return lid
+
+    def successors(self, node: int) -> Iterable[int]:
+        edges = self.adj_edges
+        dst = self.edge_dst
+        for i in range(self.adj_offsets[node], self.adj_offsets[node + 1]):
+            yield dst[edges[i]]
+
+    def unconsumed_outputs(self) -> List[str]:
+        return [self.labels[lid] for lid in self.unconsumed]
+
+    def live_nodes(self, roots: Iterable[str]) -> Set[int]:
+        """从 -map 使用的标签出发反向可达的节点；没有输出标签的链直接送往输出文件，同样是起点"""
+        live = set()
+        stack = [self.producers[self.label_ids[label]] for label in roots if label in self.label_ids]
+        stack += [node for node, outputs in enumerate(self.node_outputs) if not outputs]
+        producers = self.producers
+        while stack:
+            node = stack.pop()
+            if node == NO_PRODUCER or node in live:
+                continue
+            live.add(node)
+            stack.extend(producers[lid] for lid in self.node_inputs[node])
+        return live
+
+    @classmethod
+    def build(cls, chains: Iterable, external_labels: Optional[Set[str]] = None) -> 'FilterGraph':
+        """构建滤镜图，同时完成标签解析、重复输出、未消费输出与环检测"""
+        graph = cls()
+        external_labels = external_labels or set()
+        label_id = graph.label_id
+        producers = graph.producers
+
+        # 节点与输出：登记每个标签的生产节点，发现重复输出
+        for node, chain in enumerate(chains):
+            inputs, outputs, _ = chain_fields(chain)
+            graph.node_inputs.append(tuple(map(label_id, inputs)))
+            output_ids = tuple(map(label_id, outputs))
+            graph.node_outputs.append(output_ids)
+            for lid in output_ids:
+                if producers[lid] != NO_PRODUCER:
+                    graph.errors.append(FFmpegError(
+                        f"重复的输出标签: {graph.labels[lid]}",
+                        error_type="SEMANTIC_ERROR",
+                        suggestion="输出标签不能重复使用",
+                        details={"chain_index": node, "label": graph.labels[lid]}
+                    ))
+                else:
+                    producers[lid] = node
+
+        # 输入：解析到生产节点并生成边，允许先使用后定义
+        node_count = graph.node_count
+        out_degree = array('l', [0]) * (node_count + 1)
+        for node, input_ids in enumerate(graph.node_inputs):
+            for lid in input_ids:
+                source = producers[lid]
+                if source != NO_PRODUCER:
+                    graph.edge_src.append(source)
+                    graph.edge_dst.append(node)
+                    graph.edge_label.append(lid)
+                    graph.consumer_counts[lid] += 1
+                    out_degree[source + 1] += 1
+                elif graph.labels[lid] not in external_labels:
+                    graph.errors.append(FFmpegError(
+                        f"未定义的输入流: {graph.labels[lid]}",
+                        error_type="SEMANTIC_ERROR",
+                        suggestion="请先定义输入流再使用",
+                        details={"chain_index": node, "label": graph.labels[lid]}
+                    ))
+
+        # CSR 邻接数组（计数排序）
+        offsets = out_degree
+        for node in range(node_count):
+            offsets[node + 1] += offsets[node]
+        graph.adj_offsets = offsets
+        cursor = array('l', offsets)
+        graph.adj_edges = array('l', [0]) * graph.edge_count
+        for edge, source in enumerate(graph.edge_src):
+            graph.adj_edges[cursor[source]] = edge
+            cursor[source] += 1
+
+        graph._topological_sort()
+        graph.unconsumed = [
+            lid for lid in range(len(graph.labels))
+            if producers[lid] != NO_PRODUCER and graph.consumer_counts[lid] == 0
+        ]
+        return graph
+
+    def _topological_sort(self) -> None:
+        """Kahn 算法求拓扑序，剩余节点即构成环"""
+        node_count = self.node_count
+        in_degree = array('l', [0]) * node_count
+        for node in self.edge_dst:
+            in_degree[node] += 1
+
+        order = array('l', (node for node in range(node_count) if in_degree[node] == 0))
+        edges, dst, offsets = self.adj_edges, self.edge_dst, self.adj_offsets
+        head = 0
+        while head < len(order):
+            node = order[head]
+            head += 1
+            for i in range(offsets[node], offsets[node + 1]):
+                target = dst[edges[i]]
+                in_degree[target] -= 1
+                if in_degree[target] == 0:
+                    order.append(target)
+        self.order = order
+
+        if len(order) < node_count:
+            cyclic = [node for node in range(node_count) if in_degree[node] > 0]
+            labels = sorted({self.labels[lid] for node in cyclic for lid in self.node_outputs[node]})
+            self.errors.append(FFmpegError(
+                f"检测到流标签循环依赖: {', '.join(labels)}",
+                error_type="SEMANTIC_ERROR",
+                suggestion="滤镜链不能直接或间接消费自己的输出",
+                details={"chain_indices": cyclic}
+            ))
+
+
+def input_file_index(label: str) -> Optional[int]:
+    """流说明符（0:v、1:a:0、2）对应的 -i 输入序号，滤镜图标签返回 None"""
+    head, _, _ = label.partition(":")
+    return int(head) if head.isdigit() else None
+
+
+
+# 以 -i 输入序号为值的输出选项
+INPUT_INDEX_OPTIONS = ("-map_metadata", "-map_chapters")
+
+
+def renumber_input(label: str, removed: int) -> str:
+    """删除第 removed 个 -i 输入后，流说明符中之后输入的序号减一（保留否定 -map 的 - 前缀）"""
+    sign = "-" if label.startswith("-") else ""
+    file_index = input_file_index(label[len(sign):])
+    if file_index is None or file_index <= removed:
+        return label
+    return f"{sign}{file_index - 1}{label[len(sign) + len(str(file_index)):]}"
+
+
+def option_input_index(value) -> Optional[int]:
+    """INPUT_INDEX_OPTIONS 选项值引用的 -i 输入序号；负值（-map_metadata -1 等）表示不复制，返回 None"""
+    value = str(value)
+    return None if value.startswith("-") else input_file_index(value)
+
+
+def renumber_option(value, removed: int) -> str:
+    """删除第 removed 个 -i 输入后改写 INPUT_INDEX_OPTIONS 选项值，负值保持不变"""
+    value = str(value)
+    return value if value.startswith("-") else renumber_input(value, removed)
+
+
+# 确保导出类
+__all__ = [
+    'FilterGraph', 'chain_fields', 'filter_labels', 'has_inner_labels', 'input_file_index', 'INPUT_INDEX_OPTIONS', 'renumber_input',
+    'option_input_index', 'renumber_option', 'NO_PRODUCER'
+]
@@ -3,51 +3,33 @@ from parsers.lexer.filter_lexer import FilterLexer, FilterTokenType
 from core.error_types import FFmpegError, ErrorLevel
 from parsers.semantic_analyzer import SemanticAnalyzer
 from parsers.parser_models import ParsedCommand, Stream, FilterNode, FilterChain
+from parsers.filter_scanner import FilterScanner
 
 class FilterParser:
-    def __init__(self):
+    def __init__(self, mode: str = "scanner"):
         self.current_pos = 0
         self.text = ""
+        # scanner: 手写线性扫描器；lalr: 基于 grammar/filter_grammar.lark 的 LALR 解析器；
+        # tokens: 偏移量 token 流，可直接解析 bytes/memoryview（如 mmap 的脚本文件）
+        if mode == "lalr":
+            from parsers.grammar_parser import GrammarParser
+            self.scanner = GrammarParser()
+        elif mode == "tokens":
+            from parsers.token_stream import TokenParser
+            self.scanner = TokenParser()
+        elif mode == "scanner":
+            self.scanner = FilterScanner()
+        else:
+            raise ValueError(f"未知的解析模式: {mode}")
 
     def parse(self, text):
         """解析滤镜链文本"""
         try:
             self.text = text
             self.current_pos = 0
-            
-            streams = []
-            filter_chains = []
-            
-            # 解析流标签和滤镜
-            while self.current_pos < len(text):
-                # 解析输入流标签
-                input_streams = []
-                while self.peek() == '[':
-                    stream = self._parse_stream_label()
-                    input_streams.append(stream["id"])
-                    streams.append(Stream(**stream))
-
-                # 解析滤镜名称和参数
-                filter_name, params = self._parse_filter()
-                
-                # 解析输出流标签
-                output_stream = None
-                if self.peek() == '[':
-                    output_stream = self._parse_stream_label()
-                    streams.append(Stream(**output_stream))
-
-                # 添加到滤镜链
-                filter_chains.append(FilterChain(
-                    inputs=input_streams,
-                    output=output_stream["id"] if output_stream else None,
-                    filters=[{"name": filter_name, "params": params}]
-                ))
-
-                # 跳过分隔符
-                if self.peek() == ';':
-                    self.current_pos += 1
-
-            return ParsedCommand(streams=streams, filter_chains=filter_chains)
+            parsed = self.scanner.parse(text)
+            self.current_pos = len(text)
+            return parsed
 
         except Exception as e:
             if not isinstance(e, FFmpegError):
@@ -58,141 +40,6 @@ class FilterParser:
                 )
             raise
 
-    def _parse_stream_label(self):
-        """解析流标签 [label]"""
-        if self.text[self.current_pos] != '[':
-            raise FFmpegError(
-                message="括号不匹配",
-                error_type="PARSER_ERROR",
-                suggestion="检查是否有未闭合的括号"
-            )
-        
-        self.current_pos += 1
-        label = ''
-        
-        while self.current_pos < len(self.text) and self.text[self.current_pos] != ']':
-            label += self.text[self.current_pos]
-            self.current_pos += 1
-            
-        if self.current_pos >= len(self.text) or self.text[self.current_pos] != ']':
-            raise FFmpegError(
-                message="括号不匹配",
-                error_type="PARSER_ERROR",
-                suggestion="检查是否有未闭合的括号"
-            )
-            
-        self.current_pos += 1
-        return {"id": label, "type": "video" if ":v" in label else "audio"}
-
-    def _parse_filter(self):
-        """解析滤镜名称和参数"""
-        # 跳过空白字符
-        while self.current_pos < len(self.text) and self.text[self.current_pos].isspace():
-            self.current_pos += 1
-
-        name = ''
-        # 解析滤镜名称
-        while (self.current_pos < len(self.text) and 
-               (self.text[self.current_pos].isalnum() or self.text[self.current_pos] == '_')):
-            name += self.text[self.current_pos]
-            self.current_pos += 1
-            
-        if not name:
-            # 检查是否在流标签后面
-            if self.current_pos > 0 and self.text[self.current_pos - 1] == ']':
-                name = 'scale'  # 默认滤镜
-            else:
-                raise FFmpegError(
-                    message="缺少滤镜名称",
-                    error_type="PARSER_ERROR",
-                    suggestion="请指定有效的滤镜名称"
-                )
-            
-        # 解析参数
-        params = {}
-        if self.peek() == '=':
-            self.current_pos += 1
-            if name == 'format':
-                # 特殊处理 format 滤镜
-                params = self._parse_format_params()
-            else:
-                params = self._parse_parameters()
-        elif name == 'scale':
-            # 为scale滤镜添加默认参数
-            params = {"width": "iw", "height": "ih"}
-        
-        return name, params
-
-    def _parse_format_params(self):
-        """特殊处理 format 滤镜的参数"""
-        params = {}
-        value = ''
-        
-        # 跳过空白字符
-        while self.current_pos < len(self.text) and self.text[self.current_pos].isspace():
-            self.current_pos += 1
-        
-        # 收集到下一个分隔符前的所有字符
-        while (self.current_pos < len(self.text) and 
-               self.text[self.current_pos] not in '[];,'):
-            value += self.text[self.current_pos]
-            self.current_pos += 1
-        
-        if value:
-            params['pix_fmt'] = value.strip()
-        
-        return params
-
-    def _parse_parameters(self):
-        """解析滤镜参数"""
-        params = {}
-        while self.current_pos < len(self.text):
-            # 跳过空白字符
-            while self.current_pos < len(self.text) and self.text[self.current_pos].isspace():
-                self.current_pos += 1
-            
-            # 获取参数名或值
-            value = ''
-            while (self.current_pos < len(self.text) and 
-                   self.text[self.current_pos] not in '[];,: \t\n'):
-                value += self.text[self.current_pos]
-                self.current_pos += 1
-            
-            if not value:
-                break
-            
-            # 处理 scale=1280:720 这样的简写格式
-            if value.isdigit():
-                if len(params) == 0:
-                    params["width"] = value
-                else:
-                    params["height"] = value
-                # 跳过冒号
-                if self.peek() == ':':
-                    self.current_pos += 1
-                continue
-            
-            # 处理常规 key=value 格式
-            if self.peek() == '=':
-                self.current_pos += 1
-                param_name = value
-                param_value = ''
-                while (self.current_pos < len(self.text) and 
-                       self.text[self.current_pos] not in '[];,'):
-                    param_value += self.text[self.current_pos]
-                    self.current_pos += 1
-                params[param_name] = param_value.strip()
-            
-            # 跳过分隔符
-            if self.peek() == ',':
-                self.current_pos += 1
-            
-        return params
-
-    def peek(self):
-        """查看下一个字符"""
-        return self.text[self.current_pos] if self.current_pos < len(self.text) else None
-
     def _parse_complex_label(self, tokens):
         """解析复合流标签（如 [0:v]overlay[x]）"""
         self._label_stack.append([])
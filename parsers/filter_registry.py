@@ -1,7 +1,6 @@
 import os
 import sys
 import inspect
-import subprocess
 from dataclasses import dataclass
 from typing import List, Optional, Dict, Callable
 from core.error_types import FFmpegError, ErrorType
@@ -9,6 +8,7 @@ from parsers.lexer.filter_lexer import FilterLexer
 from parsers.lexer.token_types import FilterTokenType
 from filters.video.format_filter import FormatFilter
 from parsers.parser_models import FilterNode
+from core.capability_index import get_capability_index
 
 @dataclass
 class FilterSpec:
@@ -46,18 +46,15 @@ class FilterRegistry:
 
     @classmethod
     def get_filter(cls, filter_name: str):
-        """获取滤镜"""
+        """获取滤镜（仅返回当前 FFmpeg 支持的滤镜）"""
         try:
-            result = subprocess.run(['ffmpeg', '-filters'], 
-                                 capture_output=True, 
-                                 text=True, 
-                                 check=True)
-            if filter_name in result.stdout:
-                return cls._filters.get(filter_name, None)
-            return None
-        except subprocess.CalledProcessError as e:
-            print(f"FFmpeg 命令执行失败: {e.stderr}")
+            index = get_capability_index()
+        except FFmpegError as e:
+            print(f"FFmpeg 能力探测失败: {e.message}")
             return None
+        if index.has_filter(filter_name):
+            return cls._filters.get(filter_name, None)
+        return None
 
     @classmethod
     def get_spec(cls, name: str) -> Optional[FilterSpec]:
@@ -0,0 +1,229 @@
+import re
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+from core.error_types import FFmpegError
+from parsers.parser_models import ParsedCommand, Stream, FilterNode, FilterChain
+
+# 预编译的词法边界，每个 token 只做一次切片
+_LABEL_RE = re.compile(r'\s*\[([^\[\]]*)\]')
+_NAME_RE = re.compile(r'\s*([A-Za-z0-9_]+(?:@[A-Za-z0-9_]+)?)')
+_ARGS_RE = re.compile(r"=((?:[^\\'\[\];,]+|\\.|'[^']*')*)", re.S)
+_SEP_RE = re.compile(r'\s*([;,]?)')
+_WS_RE = re.compile(r'\s*')
+_KEY_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*$')
+_UNQUOTE_RE = re.compile(r"\\(.)|'([^']*)'", re.S)
+
+# FFmpeg 输入文件流标签，如 0:v、1:a、0:v:0
+INPUT_LABEL_RE = re.compile(r'\d+(:[vasdt](:\d+)?)?$')
+
+# 位置参数对应的参数名（未列出的滤镜按序号命名）
+POSITIONAL_PARAMS: Dict[str, Tuple[str, ...]] = {
+    "scale": ("width", "height", "flags"),
+    "format": ("pix_fmt",),
+    "crop": ("w", "h", "x", "y"),
+    "pad": ("width", "height", "x", "y", "color"),
+    "overlay": ("x", "y"),
+    "volume": ("volume",),
+    "rotate": ("angle",),
+    "fps": ("fps",),
+    "setpts": ("expr",),
+    "asetpts": ("expr",),
+    "trim": ("start", "end"),
+    "atrim": ("start", "end"),
+    "gblur": ("sigma",),
+    "boxblur": ("luma_radius", "luma_power", "chroma_radius", "chroma_power", "alpha_radius", "alpha_power"),
+    "transpose": ("dir",),
+    "yadif": ("mode", "parity", "deint"),
+    "bwdif": ("mode", "parity", "deint"),
+    "thumbnail": ("n",),
+    "split": ("outputs",),
+    "asplit": ("outputs",),
+    "hstack": ("inputs",),
+    "vstack": ("inputs",),
+    "amix": ("inputs",),
+}
+
+
+class FilterScanner:
+    """基于预编译正则的线性滤镜图扫描器"""
+
+    def parse(self, text: str) -> ParsedCommand:
+        """单遍扫描整个滤镜图"""
+        streams: List[Stream] = []
+        filter_chains = list(self.iter_text(text, streams))
+        return ParsedCommand(streams=streams, filter_chains=filter_chains, outputs=[])
+
+    def iter_text(self, text: str, streams: List[Stream]) -> Iterator[FilterChain]:
+        """逐条产出文本中的滤镜链，流标签追加到 streams"""
+        pos = _WS_RE.match(text).end()
+        end = len(text)
+
+        while pos < end:
+            if text[pos] == ';':
+                # 空滤镜链
+                pos = _WS_RE.match(text, pos + 1).end()
+                continue
+            chain, pos = self._scan_chain(text, pos, streams)
+            yield chain
+            if pos < end:
+                if text[pos] != ';':
+                    raise self._unexpected(text, pos, f"意外的字符: {text[pos]!r}")
+                pos = _WS_RE.match(text, pos + 1).end()
+
+    def _scan_chain(self, text: str, pos: int, streams: List[Stream]) -> Tuple[FilterChain, int]:
+        """扫描一条以 ';' 结束的滤镜链，返回滤镜链和结束位置"""
+        # (滤镜, 输入标签, 输出标签)
+        scanned: List[Tuple[FilterNode, List[str], List[str]]] = []
+
+        while True:
+            filter_inputs: List[str] = []
+            pos = self._scan_labels(text, pos, filter_inputs, streams)
+
+            match = _NAME_RE.match(text, pos)
+            if match is None:
+                raise self._unexpected(text, pos, "缺少滤镜名称")
+            name = match.group(1)
+            pos = match.end()
+
+            args = None
+            match = _ARGS_RE.match(text, pos)
+            if match is not None:
+                args = match.group(1)
+                pos = match.end()
+
+            filter_outputs: List[str] = []
+            pos = self._scan_labels(text, pos, filter_outputs, streams)
+            scanned.append((FilterNode(name, parse_filter_args(name, args)), filter_inputs, filter_outputs))
+
+            match = _SEP_RE.match(text, pos)
+            if match.group(1) != ',':
+                # 停在 ';' 或文本末尾，交给调用方处理
+                pos = match.start(1)
+                break
+            pos = match.end()
+
+        return build_chain(scanned), pos
+
+    def _scan_labels(self, text: str, pos: int, labels: List[str], streams: List[Stream]) -> int:
+        """扫描连续的 [label]"""
+        match = _LABEL_RE.match(text, pos)
+        while match is not None:
+            label = match.group(1)
+            labels.append(label)
+            streams.append(Stream.from_label(label))
+            pos = match.end()
+            match = _LABEL_RE.match(text, pos)
+        return pos
+
+    @classmethod
+    def _unexpected(cls, text: str, pos: int, message: str) -> FFmpegError:
+        """生成语法错误，未闭合的 '[' 单独报告"""
+        pos = _WS_RE.match(text, pos).end()
+        if pos < len(text) and text[pos] == '[':
+            line, column = line_column(text, pos)
+            return FFmpegError(
+                message="括号不匹配",
+                error_type="PARSER_ERROR",
+                suggestion="检查是否有未闭合的括号",
+                details={"position": pos, "line": line, "column": column}
+            )
+        return cls._error(text, pos, message)
+
+    @staticmethod
+    def _error(text: str, pos: int, message: str) -> FFmpegError:
+        line, column = line_column(text, pos)
+        return FFmpegError(
+            message=f"{message} (位置 {pos})",
+            error_type="PARSER_ERROR",
+            suggestion="请检查滤镜链语法是否正确",
+            details={"position": pos, "line": line, "column": column, "context": text[max(0, pos - 20):pos + 20]}
+        )
+
+
+def build_chain(scanned: Sequence[Tuple[FilterNode, Sequence[str], Sequence[str]]]) -> FilterChain:
+    """由 (滤镜, 输入标签, 输出标签) 列表生成滤镜链
+
+    链首的输入与链尾的输出是整条链的标签；链中间的标签（如 scale,[1:v]overlay 中的 [1:v]）
+    另外记录在所属滤镜上，同时按出现顺序计入整条链的 inputs/outputs。
+    """
+    inputs: List[str] = []
+    outputs: List[str] = []
+    filters: List[FilterNode] = []
+    last = len(scanned) - 1
+    for position, (node, filter_inputs, filter_outputs) in enumerate(scanned):
+        inputs.extend(filter_inputs)
+        outputs.extend(filter_outputs)
+        inner_inputs = filter_inputs if position else ()
+        inner_outputs = filter_outputs if position < last else ()
+        if inner_inputs or inner_outputs:
+            node = FilterNode(node.name, node.items(), inner_inputs, inner_outputs)
+        filters.append(node)
+    return FilterChain(
+        inputs=inputs,
+        output=outputs[0] if outputs else None,
+        filters=filters,
+        outputs=outputs
+    )
+
+
+def line_column(text: str, pos: int) -> Tuple[int, int]:
+    """把偏移量换算为从 1 开始的 (行, 列)，只在出错时调用"""
+    return text.count("\n", 0, pos) + 1, pos - text.rfind("\n", 0, pos)
+
+
+def parse_filter_args(name: str, args: Optional[str]) -> Dict[str, str]:
+    """解析 key=value:key=value 或位置参数"""
+    if not args:
+        if name == "scale":
+            # 为scale滤镜添加默认参数
+            return {"width": "iw", "height": "ih"}
+        return {}
+
+    quoted = "'" in args or "\\" in args
+    items = _split_quoted(args) if quoted else args.split(':')
+    positional = POSITIONAL_PARAMS.get(name, ())
+
+    params = {}
+    for index, item in enumerate(items):
+        key, sep, value = item.partition('=')
+        key = key.strip()
+        if sep and _KEY_RE.match(key):
+            params[key] = _unquote(value.strip()) if quoted else value.strip()
+            continue
+        value = _unquote(item.strip()) if quoted else item.strip()
+        if not value:
+            continue
+        key = positional[index] if index < len(positional) else str(index)
+        params[key] = value
+    return params
+
+
+def _split_quoted(args: str) -> List[str]:
+    """按不在引号或转义内的 ':' 切分参数"""
+    items = []
+    start = 0
+    i = 0
+    end = len(args)
+    while i < end:
+        ch = args[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == "'":
+            close = args.find("'", i + 1)
+            i = end if close < 0 else close + 1
+            continue
+        if ch == ':':
+            items.append(args[start:i])
+            start = i + 1
+        i += 1
+    items.append(args[start:])
+    return items
+
+
+def _unquote(value: str) -> str:
+    """去除引号与反斜杠转义"""
+    return _UNQUOTE_RE.sub(lambda m: m.group(1) if m.group(1) is not None else m.group(2), value)
+
+
+# 确保导出类
+__all__ = ['FilterScanner', 'POSITIONAL_PARAMS', 'INPUT_LABEL_RE', 'parse_filter_args', 'build_chain', 'line_column']
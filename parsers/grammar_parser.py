@@ -0,0 +1,218 @@
+import hashlib
+import shlex
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from core.cache_dir import get_cache_dir
+from core.error_types import FFmpegError
+from parsers.parser_models import ParsedCommand, Stream, FilterNode, FilterChain
+from parsers.filter_scanner import build_chain, parse_filter_args
+
+try:
+    from lark import Lark, Transformer
+    from lark.exceptions import LarkError, UnexpectedInput
+except ImportError:  # lark 为可选依赖，仅语法解析模式需要
+    Lark = None
+    Transformer = object
+    LarkError = UnexpectedInput = ()
+
+GRAMMAR_DIR = Path(__file__).parent / "grammar"
+
+
+def grammar_digest(name: str) -> str:
+    """计算语法文件内容的哈希，用作解析表缓存键"""
+    source = (GRAMMAR_DIR / f"{name}_grammar.lark").read_bytes()
+    return hashlib.sha256(source).hexdigest()[:16]
+
+
+def load_lalr_parser(name: str, transformer=None, cache_dir: Optional[Path] = None) -> 'Lark':
+    """构建 LALR 解析器，解析表序列化到以语法哈希命名的缓存文件"""
+    if Lark is None:
+        raise FFmpegError(
+            "未安装 lark，无法使用语法解析模式",
+            error_type="PARSER_ERROR",
+            suggestion="pip install lark"
+        )
+    path = GRAMMAR_DIR / f"{name}_grammar.lark"
+    cache_dir = Path(cache_dir) if cache_dir else get_cache_dir("grammar")
+    cache_file = cache_dir / f"{name}-{grammar_digest(name)}.lark"
+    return Lark(
+        path.read_text(encoding="utf-8"),
+        parser="lalr",
+        lexer="contextual",
+        transformer=transformer,
+        maybe_placeholders=True,
+        cache=str(cache_file)
+    )
+
+
+class FilterGraphTransformer(Transformer):
+    """把滤镜图语法树直接转换为 ParsedCommand（与 FilterScanner 输出一致）"""
+
+    def label(self, children):
+        return str(children[0])[1:-1]
+
+    def filter(self, children):
+        index = next(i for i, c in enumerate(children) if getattr(c, "type", None) == "FILTER")
+        name, eq, args = str(children[index]).partition("=")
+        inputs = children[:index]
+        outputs = children[index + 1:]
+        return inputs, name, parse_filter_args(name, args if eq else None), outputs
+
+    def chain(self, children):
+        streams = [Stream.from_label(label)
+                   for filter_inputs, _, _, filter_outputs in children for label in (*filter_inputs, *filter_outputs)]
+        return build_chain([(FilterNode(name, params), inputs, outputs)
+                            for inputs, name, params, outputs in children]), streams
+
+    def graph(self, children):
+        streams: List[Stream] = []
+        filter_chains: List[FilterChain] = []
+        for item in children:
+            if item is None:
+                continue
+            chain, chain_streams = item
+            filter_chains.append(chain)
+            streams.extend(chain_streams)
+        return ParsedCommand(streams=streams, filter_chains=filter_chains, outputs=[])
+
+
+# 第一个输入之前的这些选项记为全局选项 {选项: global_options 键}
+_GLOBAL_OPTIONS = {
+    "-threads": "threads", "-hwaccel": "hwaccel", "-hwaccel_device": "hwaccel_device",
+    "-init_hw_device": "init_hw_device", "-loglevel": "loglevel", "-v": "loglevel",
+}
+# 出现在任何位置都属于全局的开关
+_GLOBAL_FLAGS = {
+    "-y": "overwrite", "-n": "no_overwrite", "-hide_banner": "hide_banner",
+    "-nostdin": "nostdin", "-nostats": "nostats", "-stats": "stats",
+}
+
+
+class CommandTransformer(Transformer):
+    """把完整命令语法树转换为 ParsedCommand：选项归属其后的第一个输入或输出文件"""
+
+    def __init__(self, graph_parser: 'GrammarParser'):
+        super().__init__()
+        self.graph_parser = graph_parser
+
+    def value(self, children):
+        text = str(children[0])
+        try:
+            parts = shlex.split(text)
+        except ValueError:
+            return text
+        return parts[0] if len(parts) == 1 else text
+
+    def graph_text(self, children):
+        return self.graph_parser.parse(children[0])
+
+    def input(self, children):
+        return "input", children[0]
+
+    def filter_complex(self, children):
+        return "filter_complex", children[0]
+
+    def output(self, children):
+        return "output", children[0]
+
+    def map(self, children):
+        return "map", children[0].strip("[]")
+
+    def codec(self, children):
+        return "option", (str(children[0]), children[1])
+
+    def option(self, children):
+        return "option", (str(children[0]), children[1])
+
+    def flag(self, children):
+        return "flag", str(children[0])
+
+    def command(self, children):
+        parsed = ParsedCommand(streams=[], filter_chains=[], outputs=[])
+        maps: List[str] = []
+        options: Dict[str, object] = {}
+        for kind, value in children:
+            if kind == "flag" and value in _GLOBAL_FLAGS:
+                parsed.global_options[_GLOBAL_FLAGS[value]] = True
+            elif kind == "flag":
+                options[value] = True
+            elif kind == "option":
+                options[value[0]] = value[1]
+            elif kind == "map":
+                maps.append(value)
+            elif kind == "filter_complex":
+                # 多个 -filter_complex 合并为一个滤镜图
+                parsed.streams = list(parsed.streams) + list(value.streams)
+                parsed.filter_chains = list(parsed.filter_chains) + list(value.filter_chains)
+            elif kind == "input":
+                if maps:
+                    raise FFmpegError(
+                        f"-map 不能用于输入文件: {value}",
+                        error_type="PARSER_ERROR",
+                        suggestion="把 -map 放在输出文件之前"
+                    )
+                if not parsed.inputs:
+                    for key in [key for key in options if key in _GLOBAL_OPTIONS]:
+                        option = options.pop(key)
+                        parsed.global_options[_GLOBAL_OPTIONS[key]] = (
+                            int(option) if key == "-threads" and option.isdigit() else option
+                        )
+                parsed.inputs.append({"path": value, "options": options})
+                options = {}
+            else:
+                parsed.outputs.append({"file": value, "maps": maps, "options": options})
+                maps, options = [], {}
+        if maps or options or not parsed.outputs:
+            raise FFmpegError(
+                "命令末尾缺少输出文件",
+                error_type="PARSER_ERROR",
+                suggestion="输出选项必须位于输出文件之前",
+                details={"options": [*maps, *options]}
+            )
+        return parsed
+
+
+class GrammarParser:
+    """基于 lark LALR 的语法驱动解析器"""
+
+    # 进程内复用已加载的解析器 {(语法名, 缓存目录): Lark}
+    _parsers: Dict[Tuple[str, str], 'Lark'] = {}
+
+    def __init__(self, cache_dir: Optional[Path] = None):
+        self.cache_dir = cache_dir
+        self._graph = self._get_parser("filter", FilterGraphTransformer())
+        self._command = None
+
+    def _get_parser(self, name: str, transformer) -> 'Lark':
+        key = (name, str(self.cache_dir))
+        if key not in self._parsers:
+            self._parsers[key] = load_lalr_parser(name, transformer, self.cache_dir)
+        return self._parsers[key]
+
+    def parse(self, text: str) -> ParsedCommand:
+        """解析滤镜图文本，结果与 FilterParser.parse 相同"""
+        return self._run(self._graph, text)
+
+    def parse_command(self, command: str) -> ParsedCommand:
+        """解析完整的 FFmpeg 命令"""
+        if self._command is None:
+            self._command = self._get_parser("command", CommandTransformer(self))
+        return self._run(self._command, command)
+
+    @staticmethod
+    def _run(parser: 'Lark', text: str) -> ParsedCommand:
+        try:
+            return parser.parse(text)
+        except UnexpectedInput as e:
+            raise FFmpegError(
+                f"语法错误 (行 {e.line}, 列 {e.column})",
+                error_type="PARSER_ERROR",
+                suggestion="请检查滤镜链语法是否正确",
+                details={"line": e.line, "column": e.column, "context": e.get_context(text)}
+            ) from e
+        except LarkError as e:
+            raise FFmpegError(str(e), error_type="PARSER_ERROR") from e
+
+
+# 确保导出类
+__all__ = ['GrammarParser', 'load_lalr_parser', 'grammar_digest']
@@ -0,0 +1,134 @@
+import shlex
+from typing import Dict, List, Sequence, Tuple
+from parsers.parser_models import ParsedCommand
+from parsers.filter_graph import chain_fields, filter_labels
+from parsers.filter_scanner import POSITIONAL_PARAMS
+
+# 需要加引号的字符：参数分隔符、滤镜分隔符与标签括号
+_SPECIAL = set(":,;[]'\\ ")
+
+# 扫描器为位置参数起的名字中不是 FFmpeg 选项名的（format 的选项名为 pix_fmts），只能按位置写回
+_POSITIONAL_ONLY = {"format": frozenset({"pix_fmt"})}
+
+# 全局选项 -> 命令行参数（与 grammar_parser 的 _GLOBAL_OPTIONS、_GLOBAL_FLAGS 对应）
+_GLOBAL_FLAGS = {
+    "overwrite": "-y", "hwaccel": "-hwaccel", "hwaccel_device": "-hwaccel_device",
+    "init_hw_device": "-init_hw_device", "threads": "-threads", "loglevel": "-loglevel",
+    "no_overwrite": "-n", "hide_banner": "-hide_banner", "nostdin": "-nostdin", "nostats": "-nostats",
+    "stats": "-stats",
+}
+
+
+def _quote(value: str) -> str:
+    if not any(ch in _SPECIAL for ch in value):
+        return value
+    return "'" + value.replace("'", "'\\''") + "'"
+
+
+def _split_positional(name: str, items: Sequence[Tuple[str, str]]) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """拆出需要按位置写回的参数：扫描器按序号命名的参数（"0"、"1"...）及其前面的位置参数"""
+    params = dict(items)
+    names = POSITIONAL_PARAMS.get(name, ())
+    only = _POSITIONAL_ONLY.get(name, frozenset())
+    has_index = str(len(names)) in params if names else "0" in params
+    positional = []
+    for key in names:
+        if key not in params or not (has_index or key in only):
+            break
+        positional.append(key)
+    index = len(positional)
+    while str(index) in params:
+        positional.append(str(index))
+        index += 1
+    used = set(positional)
+    return [params[key] for key in positional], [(k, v) for k, v in items if k not in used]
+
+
+def format_filter(filter_def) -> str:
+    """把滤镜写回 name=arg1:key=value 形式"""
+    name = filter_def["name"]
+    params = filter_def["params"]
+    items = list(params.items()) if isinstance(params, dict) else list(zip(filter_def.param_keys, filter_def.param_values))
+    positional, named = _split_positional(name, items)
+    args = [_quote(value) for value in positional] + [f"{key}={_quote(value)}" for key, value in named]
+    return f"{name}={':'.join(args)}" if args else name
+
+
+def chain_parts(chain) -> Tuple[Sequence[str], List[str], Sequence[str]]:
+    """拆出 (链首输入, 滤镜文本, 链尾输出)：链中间的标签写在所属滤镜的文本前后"""
+    inputs, outputs, filters = chain_fields(chain)
+    labels = [filter_labels(f) for f in filters]
+    head = len(inputs) - sum(len(filter_inputs) for filter_inputs, _ in labels)
+    tail = sum(len(filter_outputs) for _, filter_outputs in labels)
+    texts = [
+        "".join(f"[{label}]" for label in filter_inputs)
+        + format_filter(f)
+        + "".join(f"[{label}]" for label in filter_outputs)
+        for f, (filter_inputs, filter_outputs) in zip(filters, labels)
+    ]
+    return inputs[:head], texts, outputs[tail:]
+
+
+def format_chain(chain) -> str:
+    inputs, texts, outputs = chain_parts(chain)
+    return (
+        "".join(f"[{label}]" for label in inputs)
+        + ",".join(texts)
+        + "".join(f"[{label}]" for label in outputs)
+    )
+
+
+def format_graph(chains: Sequence) -> str:
+    """把滤镜链列表写回 -filter_complex 文本"""
+    return ";".join(format_chain(chain) for chain in chains)
+
+
+def format_command(command: ParsedCommand, binary: str = "ffmpeg") -> str:
+    """把 ParsedCommand 写回完整命令行"""
+    args = [binary]
+    for key, flag in _GLOBAL_FLAGS.items():
+        value = command.global_options.get(key)
+        if value is True:
+            args.append(flag)
+        elif value is not None and value is not False:
+            args += [flag, str(value)]
+    for item in command.inputs:
+        args += _format_options(item.get("options", {})) + ["-i", item["path"]]
+    args = [shlex.quote(arg) for arg in args]
+    if command.filter_chains:
+        args += ["-filter_complex", _double_quote(format_graph(command.filter_chains))]
+    for output in command.outputs:
+        for label in output.get("maps", ()):
+            # 滤镜图输出标签需要方括号（与处理器一致加引号，避免 shell 通配），输入流（0:v 等）不需要
+            args += ["-map", shlex.quote(label if _is_stream_spec(label) else f"[{label}]")]
+        args += [shlex.quote(arg) for arg in _format_options(output.get("options", {}))]
+        args.append(shlex.quote(output["file"]))
+    return " ".join(args)
+
+
+def _format_options(options: Dict) -> List[str]:
+    """输入/输出选项，值为 True 的是不带值的开关"""
+    args = []
+    for key, value in options.items():
+        args += [key] if value is True else [key, str(value)]
+    return args
+
+
+def _double_quote(text: str) -> str:
+    """滤镜图常含单引号，用双引号包裹；反斜杠只在 shell 会把它当作转义符时才加倍"""
+    out = []
+    for i, ch in enumerate(text):
+        if ch in '"$`' or ch == "\\" and (i + 1 == len(text) or text[i + 1] in '"\\$`'):
+            out.append("\\")
+        out.append(ch)
+    return '"' + "".join(out) + '"'
+
+
+def _is_stream_spec(label: str) -> bool:
+    # 否定的 -map（-0:a）同样是流说明符
+    label = label[1:] if label.startswith("-") else label
+    return label[:1].isdigit() and (":" in label or label.isdigit())
+
+
+# 确保导出类
+__all__ = ['format_filter', 'chain_parts', 'format_chain', 'format_graph', 'format_command']
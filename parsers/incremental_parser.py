@@ -0,0 +1,199 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Set, Tuple
+from core.error_types import FFmpegError
+from parsers.parser_models import ParsedCommand, Stream, FilterChain
+from parsers.filter_scanner import FilterScanner, INPUT_LABEL_RE
+from parsers.validation_session import cyclic_nodes
+
+
+def split_chains(text: str) -> List[str]:
+    """按顶层 ';' 切分滤镜图，忽略引号与转义中的 ';'"""
+    if "'" not in text and "\\" not in text:
+        segments = text.split(';')
+    else:
+        segments = []
+        start = 0
+        i = 0
+        end = len(text)
+        while i < end:
+            ch = text[i]
+            if ch == '\\':
+                i += 2
+                continue
+            if ch == "'":
+                close = text.find("'", i + 1)
+                i = end if close < 0 else close + 1
+                continue
+            if ch == ';':
+                segments.append(text[start:i])
+                start = i + 1
+            i += 1
+        segments.append(text[start:])
+    return [s.strip() for s in segments if s.strip()]
+
+
+class IncrementalParser:
+    """增量滤镜图解析器：只重新解析和验证改动的滤镜链及其下游"""
+
+    def __init__(self, ffmpeg_query=None):
+        self.scanner = FilterScanner()
+        self.ffmpeg_query = ffmpeg_query  # 提供 validate_filter_params 的参数验证器（可选）
+        self._chains: Dict[str, Tuple[FilterChain, List[Stream]]] = {}  # 链文本 -> 解析结果
+        self._errors: Dict[str, List[FFmpegError]] = {}  # 链文本 -> 验证结果
+        self._producers: Dict[str, int] = defaultdict(int)  # 输出标签 -> 产生它的链数
+        self._producer_index: Dict[str, Set[str]] = defaultdict(set)  # 输出标签 -> 生产者链文本
+        self._consumer_index: Dict[str, Set[str]] = defaultdict(set)  # 输入标签 -> 消费者链文本
+        self._counts: Counter = Counter()  # 链文本 -> 出现次数
+        self._on_cycle: Set[str] = set()  # 位于环上的链文本
+        self._text = None
+        self._result = None
+        self.errors: List[FFmpegError] = []
+        self.stats = {"reused": 0, "reparsed": 0, "revalidated": 0}
+
+    def update(self, text: str) -> ParsedCommand:
+        """解析新的滤镜图文本，复用未改动的滤镜链"""
+        if text == self._text:
+            return self._result
+        segments = split_chains(text)
+
+        # 只解析新出现的链，全部成功后再写入缓存
+        parsed_chains: Dict[str, Tuple[FilterChain, List[Stream]]] = {}
+        for index, segment in enumerate(segments):
+            if segment in self._chains or segment in parsed_chains:
+                continue
+            try:
+                parsed = self.scanner.parse(segment)
+            except FFmpegError as e:
+                e.details = dict(e.details or {}, chain_index=index)
+                raise
+            parsed_chains[segment] = (parsed.filter_chains[0], parsed.streams)
+        self._chains.update(parsed_chains)
+        self.stats["reparsed"] += len(parsed_chains)
+        self.stats["reused"] += len(segments) - len(parsed_chains)
+
+        # 出现次数发生变化的链（新增、删除、重复）改变了其输出标签的生产者
+        new_counts = Counter(segments)
+        delta = new_counts.copy()
+        delta.subtract(self._counts)
+        dirty_labels: Set[str] = set()
+        changed: Set[str] = set()
+        for segment, count in delta.items():
+            if count == 0:
+                continue
+            chain = self._chains[segment][0]
+            present = segment in new_counts
+            for label in self._outputs(chain):
+                self._producers[label] += count
+                dirty_labels.add(label)
+                self._update_index(self._producer_index, label, segment, present)
+            for label in chain.inputs:
+                self._update_index(self._consumer_index, label, segment, present)
+            if present:
+                changed.add(segment)
+
+        affected, downstream = self._affected(changed, dirty_labels)
+        # 新增或断开的环一定经过改动链，环上的链都在下游闭包内
+        self._on_cycle -= downstream
+        self._on_cycle |= self._cyclic(downstream)
+        for segment in affected:
+            self._errors[segment] = self._validate_chain(self._chains[segment][0])
+            if segment in self._on_cycle:
+                self._errors[segment].append(FFmpegError(
+                    "检测到流标签循环依赖",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="滤镜链不能直接或间接消费自己的输出"
+                ))
+            self.stats["revalidated"] += 1
+
+        for segment, count in delta.items():
+            if segment not in new_counts:
+                del self._chains[segment]
+                self._errors.pop(segment, None)
+                self._on_cycle.discard(segment)
+        self._counts = new_counts
+        self._text = text
+
+        streams: List[Stream] = []
+        filter_chains: List[FilterChain] = []
+        self.errors = []
+        for segment in segments:
+            chain, chain_streams = self._chains[segment]
+            filter_chains.append(chain)
+            streams.extend(chain_streams)
+            self.errors.extend(self._errors[segment])
+        self._result = ParsedCommand(streams=streams, filter_chains=filter_chains, outputs=[])
+        return self._result
+
+    @staticmethod
+    def _outputs(chain: FilterChain) -> List[str]:
+        return chain.outputs or ([chain.output] if chain.output else [])
+
+    @staticmethod
+    def _update_index(index: Dict[str, Set[str]], label: str, segment: str, present: bool) -> None:
+        if present:
+            index[label].add(segment)
+        else:
+            index[label].discard(segment)
+            if not index[label]:
+                del index[label]
+
+    def _affected(self, changed: Set[str], dirty_labels: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """找出需要重新验证的链：改动链、改动标签的生产者及其全部下游，同时返回下游闭包"""
+        downstream = set(changed)
+        pending = list(dirty_labels)
+        seen = set(pending)
+        while pending:
+            label = pending.pop()
+            for segment in self._consumer_index.get(label, ()):
+                downstream.add(segment)
+                for out in self._outputs(self._chains[segment][0]):
+                    if out not in seen:
+                        seen.add(out)
+                        pending.append(out)
+
+        affected = set(downstream)
+        for label in dirty_labels:
+            # 重复输出标签的判断依赖同名标签的其他生产者
+            affected.update(self._producer_index.get(label, ()))
+        return affected, downstream
+
+    def _cyclic(self, segments: Set[str]) -> Set[str]:
+        """在下游闭包内查找位于环上的链"""
+        def successors(segment: str) -> List[str]:
+            result = []
+            for label in self._outputs(self._chains[segment][0]):
+                result.extend(s for s in self._consumer_index.get(label, ()) if s in segments)
+            return result
+
+        return cyclic_nodes(segments, successors)
+
+    def _validate_chain(self, chain: FilterChain) -> List[FFmpegError]:
+        """验证单条滤镜链：标签解析、重复输出与滤镜参数"""
+        errors = []
+        for label in chain.inputs:
+            if self._producers.get(label, 0) <= 0 and not INPUT_LABEL_RE.match(label):
+                errors.append(FFmpegError(
+                    f"未定义的输入流: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="请先定义输入流再使用"
+                ))
+        for label in self._outputs(chain):
+            if self._producers.get(label, 0) > 1:
+                errors.append(FFmpegError(
+                    f"重复的输出标签: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="输出标签不能重复使用"
+                ))
+
+        if self.ffmpeg_query is None:
+            return errors
+        for node in chain.filters:
+            try:
+                self.ffmpeg_query.validate_filter_params(node.name, node.params)
+            except FFmpegError as e:
+                errors.append(e)
+        return errors
+
+
+# 确保导出类
+__all__ = ['IncrementalParser', 'split_chains']
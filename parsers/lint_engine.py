@@ -0,0 +1,224 @@
+import inspect
+from time import perf_counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from core.error_types import FFmpegError
+from parsers.filter_graph import FilterGraph, chain_fields
+
+# 规则可实现的访问回调
+HOOKS = ("begin", "visit_chain", "visit_filter", "visit_edge", "finish")
+
+
+class LintRule:
+    """检查规则基类
+
+    规则只需实现用到的回调，引擎在一次图遍历中依次调用所有规则的回调：
+    begin(ctx) -> 每个节点 visit_chain(ctx, node, chain) 与 visit_filter(ctx, node, position, name, params)
+    -> 每条出边 visit_edge(ctx, src, dst, label) -> finish(ctx)。
+    """
+    name = ""
+    description = ""
+    level = "WARNING"
+    enabled = True  # 未指定 select 时是否运行
+
+    def begin(self, ctx: 'LintContext') -> None:
+        pass
+
+    def visit_chain(self, ctx: 'LintContext', node: int, chain) -> None:
+        pass
+
+    def visit_filter(self, ctx: 'LintContext', node: int, position: int, name: str, params: Dict[str, str]) -> None:
+        pass
+
+    def visit_edge(self, ctx: 'LintContext', src: int, dst: int, label: str) -> None:
+        pass
+
+    def finish(self, ctx: 'LintContext') -> None:
+        pass
+
+    def report(self, ctx: 'LintContext', message: str, error_type: str = "SEMANTIC_ERROR",
+               suggestion: Optional[str] = None, level: Optional[str] = None, **details) -> None:
+        """记录一条诊断，details 中附带规则名"""
+        details["rule"] = self.name
+        ctx.diagnostics.append(FFmpegError(
+            message,
+            error_type=error_type,
+            suggestion=suggestion,
+            details=details,
+            level=level or self.level
+        ))
+
+
+class LintRegistry:
+    _registry: Dict[str, type] = {}
+    _builtin_loaded = False
+
+    @classmethod
+    def register(cls, rule_cls):
+        if not inspect.isclass(rule_cls) or not issubclass(rule_cls, LintRule) or not rule_cls.name:
+            raise ValueError("检查规则必须继承 LintRule 并定义 name")
+        cls._registry[rule_cls.name] = rule_cls
+        return rule_cls
+
+    @classmethod
+    def get_rule(cls, name: str):
+        cls._load_builtin()
+        return cls._registry.get(name)
+
+    @classmethod
+    def names(cls) -> List[str]:
+        cls._load_builtin()
+        return sorted(cls._registry)
+
+    @classmethod
+    def _load_builtin(cls) -> None:
+        """按 parsers.lint_rules 的静态列表加入内置规则（排在其他注册的规则之前）
+
+        与 OptimizerRegistry 相同，不依赖导入时的注册副作用。
+        """
+        if cls._builtin_loaded:
+            return
+        from parsers.lint_rules import BUILTIN_RULES
+        cls._registry = {**{rule_cls.name: rule_cls for rule_cls in BUILTIN_RULES}, **cls._registry}
+        cls._builtin_loaded = True
+
+    @classmethod
+    def create(cls, select: Optional[Iterable[str]] = None, ignore: Iterable[str] = ()) -> List[LintRule]:
+        """按名称选择并实例化规则；select 为空时使用全部默认启用的规则"""
+        cls._load_builtin()
+        ignore = set(ignore)
+        if select is None:
+            names = [name for name, rule_cls in cls._registry.items() if rule_cls.enabled]
+        else:
+            names = list(select)
+            unknown = [name for name in names if name not in cls._registry]
+            if unknown:
+                raise FFmpegError(
+                    f"未知的检查规则: {', '.join(unknown)}",
+                    error_type="INVALID_PARAM",
+                    suggestion=f"可用规则: {', '.join(cls.names())}"
+                )
+        return [cls._registry[name]() for name in names if name not in ignore]
+
+
+# 快捷装饰器
+register_rule = LintRegistry.register
+
+
+class LintContext:
+    """一次检查运行的共享状态"""
+
+    def __init__(self, command, streams: Sequence, chains: Sequence, graph: FilterGraph):
+        self.command = command
+        self.streams = streams
+        self.chains = chains
+        self.graph = graph
+        self.diagnostics: List[FFmpegError] = []
+        self.state: Dict[str, object] = {}  # 规则间共享的中间结果
+
+
+class LintReport:
+    """检查结果：诊断列表与每条规则的累计耗时（秒）"""
+
+    def __init__(self, diagnostics: List[FFmpegError], timings: Dict[str, float], graph: FilterGraph):
+        self.diagnostics = diagnostics
+        self.timings = timings
+        self.graph = graph
+
+    @property
+    def errors(self) -> List[FFmpegError]:
+        return [d for d in self.diagnostics if d.level != "WARNING"]
+
+    @property
+    def warnings(self) -> List[FFmpegError]:
+        return [d for d in self.diagnostics if d.level == "WARNING"]
+
+    def by_rule(self, name: str) -> List[FFmpegError]:
+        return [d for d in self.diagnostics if d.details.get("rule") == name]
+
+    def slowest(self, count: int = 10) -> List[Tuple[str, float]]:
+        return sorted(self.timings.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+class LintEngine:
+    """把所有规则的回调融合进一次图遍历
+
+    构造时按回调类型收集真正实现了该回调的规则，遍历时每个节点、滤镜、边只取一次数据，
+    规则数量增加只增加回调调用，不增加遍历次数。
+    """
+
+    def __init__(self, rules: Optional[Iterable[LintRule]] = None, timed: bool = True):
+        self.rules = list(rules) if rules is not None else LintRegistry.create()
+        self.timed = timed
+        self._hooks: Dict[str, List[Tuple[int, object]]] = {hook: [] for hook in HOOKS}
+        for slot, rule in enumerate(self.rules):
+            for hook in HOOKS:
+                if getattr(type(rule), hook) is not getattr(LintRule, hook):
+                    self._hooks[hook].append((slot, getattr(rule, hook)))
+
+    @classmethod
+    def from_names(cls, select: Optional[Iterable[str]] = None, ignore: Iterable[str] = (),
+                   timed: bool = True) -> 'LintEngine':
+        return cls(LintRegistry.create(select, ignore), timed=timed)
+
+    def run(self, command, external_labels: Optional[Set[str]] = None) -> LintReport:
+        """检查 ParsedCommand 或 {"streams", "filter_chains"} 字典"""
+        if isinstance(command, dict):
+            streams, chains = command.get("streams", ()), command["filter_chains"]
+        else:
+            streams, chains = command.streams, command.filter_chains
+        if external_labels is None:
+            external_labels = set()
+            for stream in streams:
+                stream_id = stream["id"] if isinstance(stream, dict) else stream.id
+                if ":v" in stream_id or ":a" in stream_id:
+                    external_labels.add(stream_id)
+
+        graph = FilterGraph.build(chains, external_labels)
+        ctx = LintContext(command, streams, chains, graph)
+        elapsed = [0.0] * len(self.rules)
+        hooks = self._hooks
+        chain_hooks, filter_hooks, edge_hooks = hooks["visit_chain"], hooks["visit_filter"], hooks["visit_edge"]
+        timed = self.timed
+
+        def call(hook_list, *args):
+            if timed:
+                for slot, fn in hook_list:
+                    start = perf_counter()
+                    fn(ctx, *args)
+                    elapsed[slot] += perf_counter() - start
+            else:
+                for slot, fn in hook_list:
+                    fn(ctx, *args)
+
+        call(hooks["begin"])
+        labels, edge_dst, edge_label = graph.labels, graph.edge_dst, graph.edge_label
+        offsets, adj_edges = graph.adj_offsets, graph.adj_edges
+        for node, chain in enumerate(chains):
+            if chain_hooks:
+                call(chain_hooks, node, chain)
+            if filter_hooks:
+                for position, filter_def in enumerate(chain_fields(chain)[2]):
+                    # 滤镜名与参数只取一次，供全部规则共用
+                    call(filter_hooks, node, position, filter_def["name"], filter_def["params"])
+            if edge_hooks:
+                for i in range(offsets[node], offsets[node + 1]):
+                    edge = adj_edges[i]
+                    call(edge_hooks, node, edge_dst[edge], labels[edge_label[edge]])
+        call(hooks["finish"])
+
+        timings: Dict[str, float] = {}
+        for slot, rule in enumerate(self.rules):
+            timings[rule.name] = timings.get(rule.name, 0.0) + elapsed[slot]
+        return LintReport(ctx.diagnostics, timings, graph)
+
+
+def lint(command, select: Optional[Iterable[str]] = None, ignore: Iterable[str] = ()) -> LintReport:
+    """使用注册的规则检查命令"""
+    return LintEngine.from_names(select, ignore).run(command)
+
+
+# 确保导出类
+__all__ = [
+    'LintRule', 'LintRegistry', 'register_rule', 'LintContext', 'LintReport',
+    'LintEngine', 'lint', 'HOOKS'
+]
@@ -0,0 +1,137 @@
+from typing import Dict, Optional
+from core.error_types import FFmpegError
+from parsers.filter_definitions import FILTER_DEFINITIONS
+from parsers.lint_engine import LintRule, LintContext
+from parsers.expression import FILTER_VARIABLES, compile_expression, is_number
+
+# scale 的宽高参数名（含位置参数经扫描器命名后的形式）
+_DIMENSION_PARAMS = ("width", "height", "w", "h")
+
+
+def is_valid_dimension(value: str) -> bool:
+    """验证尺寸参数是否有效：数字或只使用 scale 变量的表达式（iw/2、trunc(ih*1.5) 等）"""
+    if value.isdigit():
+        return True
+    try:
+        compile_expression(value, FILTER_VARIABLES["scale"])
+    except FFmpegError:
+        return False
+    return True
+
+
+class GraphStructureRule(LintRule):
+    """未定义输入、重复输出与循环依赖（构建滤镜图时已检出）"""
+    name = "graph-structure"
+    description = "流标签必须先定义、不能重复输出、不能形成环"
+    level = "ERROR"
+
+    def begin(self, ctx: LintContext) -> None:
+        for error in ctx.graph.errors:
+            self.report(ctx, error.message, error.error_type, error.suggestion, **(error.details or {}))
+
+
+class UnknownFilterRule(LintRule):
+    name = "unknown-filter"
+    description = "滤镜不在内置滤镜定义中"
+
+    def visit_filter(self, ctx: LintContext, node: int, position: int, name: str, params: Dict[str, str]) -> None:
+        if name not in FILTER_DEFINITIONS:
+            self.report(ctx, f"未知滤镜: {name}", "UNKNOWN_FILTER", "检查名称或更新滤镜库",
+                        chain_index=node, filter_index=position)
+
+
+class MissingParamRule(LintRule):
+    name = "missing-param"
+    description = "缺少滤镜定义中的必要参数"
+
+    def visit_filter(self, ctx: LintContext, node: int, position: int, name: str, params: Dict[str, str]) -> None:
+        definition = FILTER_DEFINITIONS.get(name)
+        if definition is None:
+            return
+        for param, spec in definition["parameters"].items():
+            if spec.get("required") and param not in params:
+                self.report(ctx, f"滤镜 `{name}` 缺少必要参数: {param}", "INVALID_PARAM", f"添加参数 `{param}=...`",
+                            chain_index=node, filter_index=position, param=param)
+
+
+class InvalidDimensionRule(LintRule):
+    name = "invalid-dimension"
+    description = "scale 的宽高必须是数字或 iw/ih 表达式"
+    level = "ERROR"
+
+    def visit_filter(self, ctx: LintContext, node: int, position: int, name: str, params: Dict[str, str]) -> None:
+        if name != "scale":
+            return
+        for param in _DIMENSION_PARAMS:
+            value = params.get(param)
+            if value is not None and not is_valid_dimension(value):
+                self.report(ctx, f"无效的参数: {param}", "SEMANTIC_ERROR", "尺寸必须是数字或有效的表达式",
+                            chain_index=node, filter_index=position, param=param, value=value)
+
+
+class ExpressionRangeRule(LintRule):
+    """对只依赖 t、n 的表达式参数按帧采样，检查整段时长内是否越界"""
+    name = "expression-range"
+    description = "随时间变化的表达式参数在整段视频内都要满足取值范围"
+    level = "ERROR"
+    duration = 600.0  # 采样时长（秒）
+    frame_rate = 25.0
+    _ranges: Optional[Dict] = None
+
+    @classmethod
+    def ranges(cls) -> Dict:
+        if ExpressionRangeRule._ranges is None:
+            from core.bulk_validator import default_range_table
+            ExpressionRangeRule._ranges = default_range_table()
+        return ExpressionRangeRule._ranges
+
+    def visit_filter(self, ctx: LintContext, node: int, position: int, name: str, params: Dict[str, str]) -> None:
+        ranges = self.ranges().get(name)
+        if not ranges:
+            return
+        for param, value in params.items():
+            bounds = ranges.get(param)
+            if bounds is None or is_number(value):
+                continue
+            try:
+                expression = compile_expression(value, FILTER_VARIABLES.get(name))
+            except FFmpegError as e:
+                self.report(ctx, e.message, e.error_type, e.suggestion,
+                            chain_index=node, filter_index=position, param=param, value=value)
+                continue
+            if not expression.pure or not expression.variables <= {"t", "n"}:
+                continue
+            samples = expression.sample(self.duration, self.frame_rate)
+            low, high = float(samples.min()), float(samples.max())
+            if low < bounds[0] or high > bounds[1]:
+                self.report(
+                    ctx, f"滤镜 {name} 的参数 {param}={value} 在 {self.duration:g} 秒内取值 [{low:g}, {high:g}] 超出范围",
+                    "INVALID_PARAM", f"取值范围: ({bounds[0]:g}, {bounds[1]:g})",
+                    chain_index=node, filter_index=position, param=param, value=value
+                )
+
+
+class UnconsumedOutputRule(LintRule):
+    """默认关闭：输出标签通常由 -map 使用"""
+    name = "unconsumed-output"
+    description = "输出标签没有被任何滤镜消费"
+    enabled = False
+
+    def finish(self, ctx: LintContext) -> None:
+        for label in ctx.graph.unconsumed_outputs():
+            self.report(ctx, f"输出标签未被滤镜消费: {label}", "SEMANTIC_ERROR", "确认该标签由 -map 使用",
+                        label=label)
+
+
+# 内置检查规则，按执行顺序排列
+BUILTIN_RULES = (
+    GraphStructureRule, UnknownFilterRule, MissingParamRule, InvalidDimensionRule, ExpressionRangeRule,
+    UnconsumedOutputRule
+)
+
+
+# 确保导出类
+__all__ = [
+    'BUILTIN_RULES', 'is_valid_dimension', 'GraphStructureRule', 'UnknownFilterRule', 'MissingParamRule',
+    'InvalidDimensionRule', 'ExpressionRangeRule', 'UnconsumedOutputRule'
+]
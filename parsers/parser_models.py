@@ -1,23 +1,168 @@
-from typing import List, Dict, Optional, Any
-from dataclasses import dataclass
+import sys
+from functools import lru_cache
+from typing import List, Dict, Optional, Any, Iterable, Iterator, Tuple, Union
+from dataclasses import dataclass, field, asdict, is_dataclass, FrozenInstanceError
 
-@dataclass
-class Stream:
-    id: str
-    type: str  # "video" 或 "audio"
+# 参数名元组的共享表：同一组参数名（如 scale 的 width/height）只保留一份
+# 流标签大多各不相同，不做驻留，避免驻留表随图规模增长
+_PARAM_KEYS: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+_PARAM_KEYS_LIMIT = 65536
 
-@dataclass
-class FilterNode:
-    name: str
-    params: Dict[str, str]
-    inputs: List[str]
-    outputs: List[str]
+_set = object.__setattr__
+_intern = sys.intern
+
+
+def _intern_keys(keys: Tuple[str, ...]) -> Tuple[str, ...]:
+    shared = _PARAM_KEYS.get(keys)
+    if shared is not None:
+        return shared
+    shared = tuple(map(_intern, keys))
+    if len(_PARAM_KEYS) < _PARAM_KEYS_LIMIT:
+        _PARAM_KEYS[shared] = shared
+    return shared
+
+
+class _FrozenModel:
+    """不可变模型基类：字段保存在 __slots__ 中，没有实例 __dict__"""
+    __slots__ = ()
+
+    def _values(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(f"cannot assign to field '{name}'")
+
+    def __delattr__(self, name):
+        raise FrozenInstanceError(f"cannot delete field '{name}'")
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash(self._values())
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{self.__class__.__name__}({fields})"
+
+    def __reduce__(self):
+        return self.__class__._from_values, (self._values(),)
+
+    @classmethod
+    def _from_values(cls, values: tuple):
+        obj = cls.__new__(cls)
+        for name, value in zip(cls.__slots__, values):
+            _set(obj, name, value)
+        return obj
+
+
+class Stream(_FrozenModel):
+    __slots__ = ("id", "type")
+
+    def __init__(self, id: str, type: str):
+        _set(self, "id", id)
+        _set(self, "type", _intern(type))  # "video" 或 "audio"
+
+    @classmethod
+    def from_label(cls, label: str) -> 'Stream':
+        """按流标签获取共享的 Stream 实例"""
+        return _stream_for_label(label)
+
+    def to_dict(self) -> Dict:
+        return {"id": self.id, "type": self.type}
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict, 'Stream']) -> 'Stream':
+        return cls(**data) if isinstance(data, dict) else data
+
+
+@lru_cache(maxsize=256)
+def _stream_for_label(label: str) -> Stream:
+    return Stream(id=label, type="video" if ":v" in label else "audio")
+
+
+class FilterNode(_FrozenModel):
+    """单个滤镜：参数名与参数值分别保存为元组，参数名元组在滤镜间共享"""
+    __slots__ = ("name", "param_keys", "param_values", "inputs", "outputs")
+
+    def __init__(self, name: str, params: Union[Dict[str, str], Iterable[Tuple[str, str]], None] = None,
+                 inputs: Iterable[str] = (), outputs: Iterable[str] = ()):
+        if params is None:
+            keys, values = (), ()
+        elif isinstance(params, dict):
+            keys, values = tuple(params), tuple(params.values())
+        else:
+            pairs = tuple(params)
+            keys, values = tuple(k for k, _ in pairs), tuple(v for _, v in pairs)
+        _set(self, "name", _intern(name))
+        _set(self, "param_keys", _PARAM_KEYS.get(keys) or _intern_keys(keys))
+        _set(self, "param_values", values)
+        _set(self, "inputs", tuple(inputs))
+        _set(self, "outputs", tuple(outputs))
+
+    @property
+    def params(self) -> Dict[str, str]:
+        """参数字典（每次访问生成新字典）"""
+        return dict(zip(self.param_keys, self.param_values))
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        return zip(self.param_keys, self.param_values)
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """按参数名取值"""
+        for k, v in zip(self.param_keys, self.param_values):
+            if k == key:
+                return v
+        return default
+
+    def __getitem__(self, key: str):
+        # 兼容旧的 {"name": ..., "params": ...} 字典访问方式
+        if key in ("name", "params", "inputs", "outputs"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def to_dict(self) -> Dict:
+        data = {"name": self.name, "params": self.params}
+        if self.inputs or self.outputs:
+            data["inputs"] = list(self.inputs)
+            data["outputs"] = list(self.outputs)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict, 'FilterNode']) -> 'FilterNode':
+        # 非字典即为模型（loader 重新执行模块后可能是另一份类对象）
+        if not isinstance(data, dict):
+            return data
+        return cls(data["name"], data.get("params"), data.get("inputs", ()), data.get("outputs", ()))
+
+
+class FilterChain(_FrozenModel):
+    __slots__ = ("inputs", "output", "filters", "outputs")
+
+    def __init__(self, inputs: Iterable[str], output: Optional[str],
+                 filters: Iterable[Union[FilterNode, Dict]], outputs: Iterable[str] = ()):
+        _set(self, "inputs", tuple(inputs))
+        _set(self, "output", output)
+        _set(self, "filters", tuple(map(FilterNode.from_dict, filters)))
+        # 全部输出标签（如 split 的多个输出）
+        _set(self, "outputs", tuple(outputs))
+
+    def to_dict(self) -> Dict:
+        return {
+            "inputs": list(self.inputs),
+            "output": self.output,
+            "filters": [f.to_dict() for f in self.filters],
+            "outputs": list(self.outputs)
+        }
+
+    @classmethod
+    def from_dict(cls, data: Union[Dict, 'FilterChain']) -> 'FilterChain':
+        if not isinstance(data, dict):
+            return data
+        return cls(data["inputs"], data.get("output"), data.get("filters", ()), data.get("outputs", ()))
 
-@dataclass
-class FilterChain:
-    inputs: List[str]
-    output: str
-    filters: List[Dict[str, any]]
 
 @dataclass
 class ParseError:
@@ -34,28 +179,39 @@ class ParseResult:
     data: Optional[Dict]
     errors: List[ParseError]
 
+def _model_to_dict(item: Any) -> Any:
+    if hasattr(item, "to_dict"):
+        return item.to_dict()
+    return asdict(item) if is_dataclass(item) else item
+
 @dataclass
 class ParsedCommand:
     """解析后的命令结构"""
     streams: List[Dict]
     filter_chains: List[Dict]
     outputs: List[Dict]
+    inputs: List[Dict] = field(default_factory=list)  # -i 输入文件
+    global_options: Dict[str, Any] = field(default_factory=dict)  # -y/-threads/-hwaccel 等全局参数
 
     def to_dict(self) -> Dict:
         """转换为字典格式"""
         return {
-            "streams": self.streams,
-            "filter_chains": self.filter_chains,
-            "outputs": self.outputs
+            "streams": [_model_to_dict(s) for s in self.streams],
+            "filter_chains": [_model_to_dict(c) for c in self.filter_chains],
+            "outputs": self.outputs,
+            "inputs": self.inputs,
+            "global_options": self.global_options
         }
 
     @classmethod
     def from_dict(cls, data: dict) -> 'ParsedCommand':
         """从字典创建实例"""
         return cls(
-            streams=[Stream(**s) for s in data["streams"]],
-            filter_chains=[FilterChain(**c) for c in data["filter_chains"]],
-            outputs=data["outputs"]
+            streams=[Stream.from_dict(s) for s in data["streams"]],
+            filter_chains=[FilterChain.from_dict(c) for c in data["filter_chains"]],
+            outputs=data["outputs"],
+            inputs=data.get("inputs", []),
+            global_options=data.get("global_options", {})
         )
 
 # 确保导出所有需要的类
@@ -0,0 +1,400 @@
+import os
+import json
+import subprocess
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from fractions import Fraction
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from core.error_types import FFmpegError
+from core.capability_index import PROBE_TIMEOUT, binary_fingerprint, resolve_binary
+from parsers.filter_graph import FilterGraph, chain_fields
+from parsers.expression import compile_expression
+
+# 可通过环境变量指定 ffprobe 可执行文件
+FFPROBE_BINARY_ENV = "FFPROBE_BINARY"
+
+# fps 滤镜与 -r 支持的帧率别名
+_RATE_NAMES = {
+    "ntsc": Fraction(30000, 1001), "pal": Fraction(25), "film": Fraction(24), "ntsc_film": Fraction(24000, 1001),
+}
+
+
+@dataclass(frozen=True)
+class StreamInfo:
+    """一条流的静态属性，未知的属性为 None"""
+    kind: str = "video"
+    width: Optional[int] = None
+    height: Optional[int] = None
+    pix_fmt: Optional[str] = None
+    frame_rate: Optional[float] = None
+    sample_rate: Optional[int] = None
+    channels: Optional[int] = None
+
+    @property
+    def pixels(self) -> Optional[int]:
+        return self.width * self.height if self.width is not None and self.height is not None else None
+
+    @property
+    def pixel_rate(self) -> Optional[float]:
+        """每秒像素数"""
+        pixels = self.pixels
+        return pixels * self.frame_rate if pixels is not None and self.frame_rate else None
+
+    def to_dict(self) -> Dict:
+        return {k: v for k, v in self.__dict__.items() if v is not None}
+
+
+UNKNOWN_VIDEO = StreamInfo("video")
+UNKNOWN_AUDIO = StreamInfo("audio")
+
+
+def parse_rate(value) -> Optional[float]:
+    """解析 25、29.97、30000/1001、ntsc 等帧率写法"""
+    if value is None:
+        return None
+    text = str(value).strip()
+    if text in _RATE_NAMES:
+        return float(_RATE_NAMES[text])
+    try:
+        rate = Fraction(text)
+    except (ValueError, ZeroDivisionError):
+        return None
+    return float(rate) if rate > 0 else None
+
+
+def _subsampling(pix_fmt: Optional[str]) -> Tuple[int, int]:
+    if pix_fmt is None:
+        return 1, 1
+    if "420" in pix_fmt or pix_fmt in ("nv12", "nv21", "p010le", "p016le"):
+        return 2, 2
+    if "422" in pix_fmt:
+        return 2, 1
+    return 1, 1
+
+
+def _evaluate(text: Optional[str], env: Dict[str, float]) -> Optional[float]:
+    """在给定变量下求值尺寸表达式，变量缺失或无法静态求值时返回 None"""
+    if text is None:
+        return None
+    try:
+        expression = compile_expression(text)
+        if not expression.pure or not expression.variables <= env.keys():
+            return None
+        return expression.evaluate(**{name: env[name] for name in expression.variables})
+    except FFmpegError:
+        return None
+
+
+def _geometry_env(source: StreamInfo) -> Dict[str, float]:
+    env = {"n": 0.0, "t": 0.0, "pos": 0.0, "sar": 1.0}
+    if source.width is not None:
+        env["iw"] = env["in_w"] = source.width
+    if source.height is not None:
+        env["ih"] = env["in_h"] = source.height
+    if source.width and source.height:
+        env["a"] = env["dar"] = source.width / source.height
+    env["hsub"], env["vsub"] = _subsampling(source.pix_fmt)
+    return env
+
+
+def _first(params: Dict[str, str], *names: str) -> Optional[str]:
+    for name in names:
+        if name in params:
+            return params[name]
+    return None
+
+
+def _scale(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    """scale 及其硬件变体：宽高表达式、-1/-n 保持宽高比、0 表示输入尺寸"""
+    source = inputs[0]
+    env = _geometry_env(source)
+    w_text = _first(params, "w", "width", "0")
+    h_text = _first(params, "h", "height", "1")
+    w = _evaluate(w_text or "iw", env)
+    h = _evaluate(h_text or "ih", {**env, **({"ow": w, "out_w": w} if w is not None else {})})
+    if w is None and h is not None:
+        # 宽度表达式引用了 oh，按 eval.c 的顺序再求一次
+        w = _evaluate(w_text, {**env, "oh": h, "out_h": h})
+    if w is not None and w == 0:
+        w = source.width
+    if h is not None and h == 0:
+        h = source.height
+    if w is not None and h is not None and (w < 0 or h < 0) and source.width and source.height:
+        if w < 0 and h < 0:
+            w, h = source.width, source.height
+        elif w < 0:
+            w = _round_to(h * source.width / source.height, int(-w))
+        else:
+            h = _round_to(w * source.height / source.width, int(-h))
+    pix_fmt = _first(params, "format") or source.pix_fmt
+    return [replace(source, width=_int(w), height=_int(h), pix_fmt=pix_fmt)]
+
+
+def _round_to(value: float, multiple: int) -> int:
+    multiple = max(multiple, 1)
+    return int(round(value / multiple)) * multiple
+
+
+def _int(value: Optional[float]) -> Optional[int]:
+    return int(value) if value is not None and value > 0 else None
+
+
+def _format(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    source = inputs[0]
+    text = _first(params, "pix_fmts", "pix_fmt", "0")
+    if not text:
+        return [source]
+    formats = text.split("|")
+    # 输入格式在候选列表中时协商结果保持不变
+    return [source if source.pix_fmt in formats else replace(source, pix_fmt=formats[0])]
+
+
+def _crop(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    source = inputs[0]
+    env = _geometry_env(source)
+    w = _evaluate(_first(params, "w", "out_w") or "iw", env)
+    h = _evaluate(_first(params, "h", "out_h") or "ih", {**env, **({"ow": w, "out_w": w} if w is not None else {})})
+    return [replace(source, width=_int(w), height=_int(h))]
+
+
+def _pad(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    source = inputs[0]
+    env = _geometry_env(source)
+    w = _evaluate(_first(params, "width", "w") or "iw", env)
+    h = _evaluate(_first(params, "height", "h") or "ih", env)
+    w = source.width if w == 0 else w
+    h = source.height if h == 0 else h
+    return [replace(source, width=_int(w), height=_int(h))]
+
+
+def _stack(axis: str) -> Callable:
+    def transfer(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+        first = inputs[0]
+        sizes = [s.width if axis == "h" else s.height for s in inputs]
+        total = sum(sizes) if all(size is not None for size in sizes) else None
+        if axis == "h":
+            return [replace(first, width=total)]
+        return [replace(first, height=total)]
+    return transfer
+
+
+def _transpose(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    source = inputs[0]
+    return [replace(source, width=source.height, height=source.width)]
+
+
+def _fps(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    rate = parse_rate(_first(params, "fps", "0"))
+    return [replace(inputs[0], frame_rate=rate or inputs[0].frame_rate)]
+
+
+def _setpts(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    """PTS 的线性变换（如 0.5*PTS）按比例改变帧率，其余表达式帧率未知"""
+    source = inputs[0]
+    text = _first(params, "expr", "0")
+    if not text or source.frame_rate is None:
+        return [source]
+    values = [_evaluate(text, {"PTS": float(pts), "N": 0.0, "T": 0.0, "TB": 1.0, "STARTPTS": 0.0})
+              for pts in (0, 1, 2)]
+    if None in values or values[2] - values[1] != values[1] - values[0] or values[1] == values[0]:
+        return [replace(source, frame_rate=None)]
+    return [replace(source, frame_rate=source.frame_rate / (values[1] - values[0]))]
+
+
+def _split(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    count = _first(params, "outputs", "0") or "2"
+    count = int(count) if count.isdigit() else 2
+    return [inputs[0]] * count
+
+
+def _amix(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    channels = [s.channels for s in inputs]
+    return [replace(inputs[0], channels=max(channels) if None not in channels else None)]
+
+
+def _amerge(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    channels = [s.channels for s in inputs]
+    return [replace(inputs[0], channels=sum(channels) if None not in channels else None)]
+
+
+def _aresample(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    rate = _first(params, "osr", "out_sample_rate", "0")
+    return [replace(inputs[0], sample_rate=int(rate) if rate and rate.isdigit() else inputs[0].sample_rate)]
+
+
+def _aformat(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+    rates = _first(params, "sample_rates", "r")
+    rate = rates.split("|")[0] if rates else None
+    return [replace(inputs[0], sample_rate=int(rate) if rate and rate.isdigit() else inputs[0].sample_rate)]
+
+
+def _hwupload(pix_fmt: Optional[str]) -> Callable:
+    def transfer(params: Dict[str, str], inputs: Sequence[StreamInfo]) -> List[StreamInfo]:
+        return [replace(inputs[0], pix_fmt=pix_fmt)]
+    return transfer
+
+
+# 滤镜名 -> 属性传递函数；未列出的滤镜按单输入单输出、属性不变处理
+TRANSFER_FUNCTIONS: Dict[str, Callable[[Dict[str, str], Sequence[StreamInfo]], List[StreamInfo]]] = {
+    "scale": _scale, "scale_cuda": _scale, "scale_npp": _scale, "scale_qsv": _scale, "scale_vaapi": _scale,
+    "format": _format, "crop": _crop, "pad": _pad,
+    "hstack": _stack("h"), "vstack": _stack("v"),
+    "transpose": _transpose, "fps": _fps, "setpts": _setpts,
+    "split": _split, "asplit": _split,
+    "amix": _amix, "amerge": _amerge, "aresample": _aresample, "aformat": _aformat,
+    "hwupload_cuda": _hwupload("cuda"), "hwupload": _hwupload(None), "hwdownload": _hwupload(None),
+}
+
+
+class Propagation:
+    """属性传递结果：每个标签（边）与每个滤镜的输入/输出属性"""
+
+    def __init__(self, graph: FilterGraph):
+        self.graph = graph
+        self.labels: Dict[str, StreamInfo] = {}
+        self.filters: List[List[Tuple[Tuple[StreamInfo, ...], Tuple[StreamInfo, ...]]]] = []
+
+    @property
+    def edges(self) -> List[StreamInfo]:
+        """按 FilterGraph 边 id 排列的流属性"""
+        labels = self.graph.labels
+        return [self.labels.get(labels[lid], UNKNOWN_VIDEO) for lid in self.graph.edge_label]
+
+    def filter_io(self, chain_index: int, filter_index: int) -> Tuple[Tuple[StreamInfo, ...], Tuple[StreamInfo, ...]]:
+        return self.filters[chain_index][filter_index]
+
+
+def _default_for(label: str) -> StreamInfo:
+    return UNKNOWN_AUDIO if ":a" in label else UNKNOWN_VIDEO
+
+
+def propagate(chains: Sequence, inputs: Optional[Dict[str, StreamInfo]] = None) -> Propagation:
+    """按拓扑序沿滤镜图传递宽高、像素格式、帧率与采样率"""
+    inputs = inputs or {}
+    graph = FilterGraph.build(chains, set(inputs))
+    result = Propagation(graph)
+    result.filters = [[] for _ in chains]
+    labels = result.labels
+    labels.update(inputs)
+    # 环上的节点不在拓扑序中，按原顺序补在最后
+    order = list(graph.order)
+    ordered = set(order)
+    order += [node for node in range(len(chains)) if node not in ordered]
+    for node in order:
+        chain_inputs, chain_outputs, filters = chain_fields(chains[node])
+        streams = tuple(labels.get(label) or _default_for(label) for label in chain_inputs)
+        io = []
+        for filter_def in filters:
+            name, params = filter_def["name"], filter_def["params"]
+            if not streams:
+                streams = (UNKNOWN_AUDIO if name.startswith("a") else UNKNOWN_VIDEO,)
+            transfer = TRANSFER_FUNCTIONS.get(name)
+            outputs = tuple(transfer(params, streams)) if transfer else (streams[0],)
+            io.append((streams, outputs))
+            streams = outputs
+        result.filters[node] = io
+        for position, label in enumerate(chain_outputs):
+            if streams:
+                labels[label] = streams[min(position, len(streams) - 1)]
+    return result
+
+
+class PropertyPropagator:
+    """按 (滤镜图, 输入属性) 缓存传递结果；输入属性来自 ffprobe（按文件指纹缓存）或调用方声明"""
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[tuple, Propagation]" = OrderedDict()
+
+    def propagate(self, command, inputs: Optional[Dict[str, StreamInfo]] = None) -> Propagation:
+        chains = getattr(command, "filter_chains", command)
+        inputs = inputs or {}
+        try:
+            key = (tuple(chains), tuple(sorted(inputs.items())))
+        except TypeError:
+            # 字典形式的滤镜链不可哈希，不缓存
+            return propagate(chains, inputs)
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+            return result
+        result = propagate(chains, inputs)
+        self._cache[key] = result
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return result
+
+    def propagate_files(self, command, files: Sequence[str]) -> Propagation:
+        """探测 -i 输入文件后传递属性"""
+        return self.propagate(command, probe_inputs(files))
+
+
+def parse_probe_streams(data: Dict) -> Tuple[StreamInfo, ...]:
+    """解析 `ffprobe -show_streams -of json` 的输出"""
+    streams = []
+    for stream in data.get("streams", ()):
+        kind = stream.get("codec_type")
+        if kind == "video":
+            streams.append(StreamInfo(
+                "video",
+                width=stream.get("width"),
+                height=stream.get("height"),
+                pix_fmt=stream.get("pix_fmt"),
+                frame_rate=parse_rate(stream.get("avg_frame_rate")) or parse_rate(stream.get("r_frame_rate"))
+            ))
+        elif kind == "audio":
+            rate = stream.get("sample_rate")
+            streams.append(StreamInfo(
+                "audio",
+                sample_rate=int(rate) if rate else None,
+                channels=stream.get("channels")
+            ))
+    return tuple(streams)
+
+
+@lru_cache(maxsize=256)
+def _probe_fingerprint(fingerprint: Tuple[str, int, int], ffprobe: str) -> Tuple[StreamInfo, ...]:
+    try:
+        result = subprocess.run(
+            [ffprobe, "-v", "error", "-show_streams", "-of", "json", fingerprint[0]],
+            capture_output=True,
+            text=True,
+            timeout=PROBE_TIMEOUT
+        )
+        return parse_probe_streams(json.loads(result.stdout or "{}"))
+    except (OSError, subprocess.TimeoutExpired, ValueError) as e:
+        raise FFmpegError(
+            f"输入文件探测失败: {fingerprint[0]}",
+            error_type="UNKNOWN_ERROR",
+            suggestion="请检查文件是否存在且 ffprobe 可以正常运行",
+            details={"reason": str(e)}
+        ) from e
+
+
+def probe_file(path: str, ffprobe: Optional[str] = None) -> Tuple[StreamInfo, ...]:
+    """探测文件中的流；文件未变化（路径、大小、修改时间相同）时复用结果"""
+    binary = resolve_binary(ffprobe or os.environ.get(FFPROBE_BINARY_ENV) or "ffprobe")
+    return _probe_fingerprint(binary_fingerprint(os.path.realpath(path)), binary)
+
+
+def probe_inputs(files: Sequence[str], ffprobe: Optional[str] = None) -> Dict[str, StreamInfo]:
+    """把 -i 输入文件映射为流标签：0:v、0:a 为首个视频/音频流，0:v:1 等为后续流"""
+    labels = {}
+    for index, path in enumerate(files):
+        counters = {"video": 0, "audio": 0}
+        for stream in probe_file(path, ffprobe):
+            kind = "v" if stream.kind == "video" else "a"
+            position = counters[stream.kind]
+            counters[stream.kind] += 1
+            labels[f"{index}:{kind}:{position}"] = stream
+            if position == 0:
+                labels[f"{index}:{kind}"] = stream
+    return labels
+
+
+# 确保导出类
+__all__ = [
+    'StreamInfo', 'Propagation', 'PropertyPropagator', 'TRANSFER_FUNCTIONS', 'propagate',
+    'probe_file', 'probe_inputs', 'parse_probe_streams', 'parse_rate', 'FFPROBE_BINARY_ENV'
+]
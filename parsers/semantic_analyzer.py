@@ -1,10 +1,14 @@
-from collections import defaultdict
 from core.error_types import FFmpegError, ErrorType
 from filters.filter_registry import FilterRegistry, get_filter_spec
 from parsers.filter_definitions import FILTER_DEFINITIONS
 from parsers.parser_models import ParsedCommand, ParseResult, Stream, FilterChain
+from parsers.filter_graph import FilterGraph, chain_fields
+from parsers.validation_session import ValidationSession
+from parsers.lint_engine import LintEngine, LintRegistry, LintReport
+from parsers.lint_rules import is_valid_dimension
 from parsers.some_parser import SomeParser, SomeParserConfig
 from core.ffmpeg_query import FFmpegQuery
+from core.filter_schema import load_schema_index
 import re
 from typing import Dict, List, Optional
 from dataclasses import dataclass
@@ -24,13 +28,14 @@ class SemanticAnalyzer(SomeParser):
         super().__init__(config or SemanticAnalyzerConfig())
         self.config: SemanticAnalyzerConfig = self.config  # 类型提示
         self.filter_definitions = FILTER_DEFINITIONS
-        self.defined_labels = set()  # 已定义的流标签
-        self.used_labels = set()     # 已使用的流标签
         self.parser = SomeParser()  # 确保初始化 parser 属性
-        self.defined_streams = set()
-        self.used_streams = set()
-        self.output_streams = set()   # 作为输出的流标签
+        self.graph: Optional[FilterGraph] = None  # 最近一次验证构建的滤镜图
         self.ffmpeg_query = FFmpegQuery()  # 添加 FFmpeg 查询支持
+        self.schema_index = load_schema_index()  # 由 ffmpeg -h filter=X 生成的选项索引（未生成时为 None）
+        # validate 使用的检查引擎：只运行错误级别的默认规则
+        self.validation_engine = LintEngine(
+            [rule for rule in LintRegistry.create() if rule.level != "WARNING"], timed=False
+        )
 
     def _do_parse(self, text: str) -> Dict:
         """实现语义分析逻辑"""
@@ -63,61 +68,43 @@ class SemanticAnalyzer(SomeParser):
 
     def validate(self, command):
         """验证命令的语义正确性"""
-        if isinstance(command, ParsedCommand):
-            command = command.to_dict()
-        elif not isinstance(command, dict):
+        # 按属性识别 ParsedCommand：loader 重新执行模块后可能是另一份类对象
+        if isinstance(command, dict):
+            streams, chains = command["streams"], command["filter_chains"]
+        elif hasattr(command, "filter_chains"):
+            streams, chains = command.streams, command.filter_chains
+        else:
             raise FFmpegError("无效的命令格式", "命令必须是字典格式或ParsedCommand对象")
 
-        # 重置状态
-        self.defined_streams.clear()
-        self.used_streams.clear()
-        self.output_streams.clear()
-
-        # 收集所有初始流
-        for stream in command["streams"]:
-            stream_id = stream["id"]
-            if ":v" in stream_id or ":a" in stream_id:  # 输入流标签
-                self.defined_streams.add(stream_id)
-
-        # 验证滤镜链
-        for chain in command["filter_chains"]:
-            # 验证输入流
-            for input_stream in chain["inputs"]:
-                if input_stream not in self.defined_streams:
-                    raise FFmpegError(
-                        f"未定义的输入流: {input_stream}",
-                        error_type="SEMANTIC_ERROR",
-                        suggestion="请先定义输入流再使用"
-                    )
-                self.used_streams.add(input_stream)
-
-            # 验证输出流
-            output = chain["output"]
-            if output in self.output_streams:
-                raise FFmpegError(
-                    f"重复的输出标签: {output}",
-                    error_type="SEMANTIC_ERROR",
-                    suggestion="输出标签不能重复使用"
+        # 标签解析、重复输出、环检测与尺寸、表达式取值检查在一次图遍历中完成
+        report = self.validation_engine.run({"streams": streams, "filter_chains": chains})
+        self.graph = report.graph
+        if report.errors:
+            raise report.errors[0]
+
+        # 验证滤镜参数
+        for chain in chains:
+            for filter_def in chain_fields(chain)[2]:
+                # 选项索引覆盖全部滤镜，优先使用
+                schema = self.schema_index.get(filter_def["name"]) if self.schema_index else None
+                if schema is not None:
+                    errors = schema.validate_params(filter_def["params"])
+                    if errors:
+                        raise errors[0]
+                    continue
+                # 直接使用 FFmpegQuery 的验证方法
+                self.ffmpeg_query.validate_filter_params(
+                    filter_def["name"],
+                    filter_def["params"]
                 )
-            
-            # 将输出流添加到已定义和输出集合中
-            self.defined_streams.add(output)
-            self.output_streams.add(output)
-
-            # 验证滤镜参数
-            for filter_def in chain["filters"]:
-                try:
-                    # 直接使用 FFmpegQuery 的验证方法
-                    self.ffmpeg_query.validate_filter_params(
-                        filter_def["name"], 
-                        filter_def["params"]
-                    )
-                except FFmpegError:
-                    # 直接重新抛出错误
-                    raise
 
         return True
 
+    def session(self, external_labels=None) -> ValidationSession:
+        """创建增量验证会话，供编辑大型滤镜图时逐链更新"""
+        return ValidationSession(external_labels, ffmpeg_query=self.ffmpeg_query,
+                                 schema_index=self.schema_index)
+
     def _validate_filter_params(self, filter_def):
         """验证滤镜参数"""
         name = filter_def["name"]
@@ -147,129 +134,40 @@ class SemanticAnalyzer(SomeParser):
 
     def _is_valid_dimension(self, value):
         """验证尺寸参数是否有效"""
-        if value.isdigit():
-            return True
-        # 支持的表达式：iw/2, ih*1.5 等
-        valid_expressions = {"iw", "ih", "in_w", "in_h", "out_w", "out_h"}
-        operators = {"+", "-", "*", "/"}
-        parts = ''.join(c if c not in operators else ' ' + c + ' ' for c in value).split()
-        return all(p in valid_expressions or p.replace(".", "").isdigit() or p in operators for p in parts)
-
-    def _check_filter_parameters(self, parsed_command: ParsedCommand, warnings: list):
-        for filter_node in parsed_command.get_filters():
-            if filter_node.name not in self.filter_definitions:
-                warnings.append({
-                    "type": "UNKNOWN_FILTER",
-                    "message": f"未知滤镜: {filter_node.name}",
-                    "suggestion": "检查名称或更新滤镜库"
-                })
-                continue
+        return is_valid_dimension(value)
 
-            # 检查必填参数
-            definition = self.filter_definitions[filter_node.name]
-            required_params = [k for k, v in definition["parameters"].items() if v.get("required")]
-            for param in required_params:
-                if param not in filter_node.params:
-                    warnings.append({
-                        "type": "MISSING_PARAM",
-                        "message": f"滤镜 `{filter_node.name}` 缺少必要参数: {param}",
-                        "suggestion": f"添加参数 `{param}=...`"
-                    })
+    def lint(self, command, select=None, ignore=()) -> LintReport:
+        """在一次图遍历中运行所选检查规则，返回诊断与各规则耗时"""
+        return LintEngine.from_names(select, ignore).run(command)
 
-    def _build_stream_graph(self, parsed_command: ParsedCommand):
+    def _check_filter_parameters(self, parsed_command: ParsedCommand, warnings: list):
+        report = self.lint(parsed_command, select=["unknown-filter", "missing-param"])
+        for diagnostic in report.diagnostics:
+            warnings.append({
+                "type": "UNKNOWN_FILTER" if diagnostic.error_type == "UNKNOWN_FILTER" else "MISSING_PARAM",
+                "message": diagnostic.message,
+                "suggestion": diagnostic.suggestion
+            })
+
+    def _build_stream_graph(self, streams, chains) -> FilterGraph:
         """构建流标签依赖图"""
-        graph = defaultdict(list)
-        defined = set()
-        
-        for chain in parsed_command.filter_chains:
-            for node in chain:
-                # 记录定义
-                for out_stream in node.outputs:
-                    defined.add(out_stream.label)
-                # 记录依赖
-                for in_stream in node.inputs:
-                    graph[in_stream.label].append(node.name)
-        
-        # 确保 '0:v' 被视为已定义的标签
-        defined.add("0:v")
-        
-        return graph, defined
+        # 输入文件流（如 0:v、1:a）视为已定义
+        external = set()
+        for stream in streams:
+            stream_id = stream["id"] if isinstance(stream, dict) else stream.id
+            if ":v" in stream_id or ":a" in stream_id:
+                external.add(stream_id)
+        return FilterGraph.build(chains, external)
 
-    
     def _check_stream_labels(self, parsed_command: ParsedCommand) -> None:
-        for chain in parsed_command.filter_chains:
-            if not chain:
-                raise FFmpegError('Empty filter chain detected')
-            
-            # Check for valid stream labels
-            if '[' in chain or ']' in chain:
-                try:
-                    self.parser._parse_stream_label(chain)
-                except FFmpegError as e:
-                    raise FFmpegError(f'Invalid stream label in filter chain: {chain}') from e
-
-        defined = set()
-        used = set()
-
-        # 添加 FFmpeg 隐式输入流 (如 0:v, 1:a 等)
-        implicit_streams = {"0:v", "0:a", "1:v", "1:a"}  # 根据实际情况扩展
-        defined.update(implicit_streams)
-
-        # 收集显式定义的流
-        for chain in parsed_command.filter_chains:
-            for node in chain:
-                for output in node.outputs:
-                    defined.add(output.label)
-
-        # 验证使用的流
-        for chain in parsed_command.filter_chains:
-            for node in chain:
-                for input_stream in node.inputs:
-                    used.add(input_stream.label)
-                    if input_stream.label not in defined:
-                        raise FFmpegError(
-                            code="UNDEFINED_STREAM",
-                            message=f"未定义输入流: {input_stream.label}",
-                            suggestion="请确保输入流在使用前已定义",
-                            level=ErrorType.CRITICAL
-                        )
-
-        # 检查未闭合标签
-        for label in parsed_command.inputs:
-            if not label.startswith("["):
-                raise FFmpegError(
-                    code="INVALID_INPUT",
-                    message=f"输入流格式错误: {label}",
-                    suggestion="格式应为 [type:label]",
-                    level=ErrorType.CRITICAL
-                )
-
-    def _detect_cycles(self, graph):
-        """使用拓扑排序检测循环依赖"""
-        in_degree = {u: 0 for u in graph}
-        
-        # 初始化所有节点的入度
-        for u in graph:
-            for v in graph[u]:
-                if v not in in_degree:
-                    in_degree[v] = 0  # 确保所有节点都在 in_degree 中
-
-                in_degree[v] += 1
-        
-        queue = [u for u in in_degree if in_degree[u] == 0]
-        while queue:
-            u = queue.pop(0)
-            for v in graph[u]:
-                in_degree[v] -= 1
-                if in_degree[v] == 0:
-                    queue.append(v)
-        
-        if any(in_degree[u] > 0 for u in in_degree):
-            raise FFmpegError(
-                code="CIRCULAR_DEPENDENCY",
-                message="检测到流标签循环依赖",
-                level=ErrorType.CRITICAL
-            )
+        report = self.lint(parsed_command, select=["graph-structure"])
+        if report.diagnostics:
+            raise report.diagnostics[0]
+
+    def _detect_cycles(self, graph: FilterGraph):
+        """检查拓扑排序是否覆盖全部节点"""
+        if len(graph.order) < graph.node_count:
+            raise next(e for e in graph.errors if "chain_indices" in (e.details or {}))
 
     def analyze(self, input_str):
         """分析滤镜字符串的语义"""
@@ -0,0 +1,154 @@
+import os
+from typing import IO, Dict, Iterable, Iterator, List, Set, Union
+from core.error_types import FFmpegError
+from parsers.parser_models import Stream, FilterChain
+from parsers.filter_scanner import FilterScanner, INPUT_LABEL_RE
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class StreamingFilterParser:
+    """流式滤镜图解析器：按块读取，每条以 ';' 结束的滤镜链完成即产出"""
+
+    def __init__(self, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.scanner = FilterScanner()
+
+    def iter_chains(self, source: Union[str, os.PathLike, IO[str]]) -> Iterator[FilterChain]:
+        """从文件路径或文本流中逐条产出 FilterChain"""
+        if isinstance(source, (str, os.PathLike)):
+            with open(source, "r", encoding="utf-8") as f:
+                yield from self._iter_stream(f)
+        else:
+            yield from self._iter_stream(source)
+
+    def _iter_stream(self, stream: IO[str]) -> Iterator[FilterChain]:
+        buffer = ""
+        offset = 0  # buffer 在整个输入中的起始位置
+        scanned = 0  # buffer 中已确认不含顶层 ';' 的前缀长度
+        in_quote = False
+        while True:
+            chunk = stream.read(self.chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+            split, scanned, in_quote = self._last_separator(buffer, scanned, in_quote)
+            if split < 0:
+                continue
+            yield from self._scan(buffer[:split], offset)
+            offset += split + 1
+            buffer = buffer[split + 1:]
+            scanned -= split + 1
+
+        if buffer.strip():
+            yield from self._scan(buffer, offset)
+
+    @staticmethod
+    def _last_separator(buffer: str, start: int, in_quote: bool):
+        """从 start 开始查找最后一个顶层 ';'，返回 (位置, 已扫描长度, 引号状态)"""
+        if not in_quote and buffer.find("'", start) < 0 and buffer.find("\\", start) < 0:
+            return buffer.rfind(";", start), len(buffer), False
+
+        last = -1
+        i = start
+        end = len(buffer)
+        while i < end:
+            ch = buffer[i]
+            if in_quote:
+                if ch == "'":
+                    in_quote = False
+            elif ch == "\\":
+                if i + 1 >= end:
+                    # 转义符在块末尾，等待下一块
+                    break
+                i += 1
+            elif ch == "'":
+                in_quote = True
+            elif ch == ";":
+                last = i
+            i += 1
+        return last, i, in_quote
+
+    def _scan(self, text: str, offset: int) -> Iterator[FilterChain]:
+        streams: List[Stream] = []
+        try:
+            for chain in self.scanner.iter_text(text, streams):
+                streams.clear()
+                yield chain
+        except FFmpegError as e:
+            if e.details and "position" in e.details:
+                e.details["position"] += offset
+            raise
+
+
+class StreamValidator:
+    """随滤镜链到达逐条验证标签，仅保留尚未配对的标签
+
+    默认只在未配对的标签中检测重复，内存与图的规模无关；
+    strict=True 时额外记录已配对的标签，可发现配对后的重复使用。
+    """
+
+    def __init__(self, strict: bool = False):
+        self.strict = strict
+        self.pending_inputs: Dict[str, int] = {}  # 已使用但尚未定义的标签 -> 链序号
+        self.open_outputs: Set[str] = set()  # 已定义但尚未使用的标签
+        self.closed_labels: Set[str] = set()  # 已配对的标签（仅 strict 模式）
+        self.chain_count = 0
+
+    def feed(self, chain: FilterChain) -> None:
+        """验证一条滤镜链"""
+        index = self.chain_count
+        self.chain_count += 1
+        for label in chain.outputs or ([chain.output] if chain.output else []):
+            if label in self.open_outputs or label in self.closed_labels:
+                raise FFmpegError(
+                    f"重复的输出标签: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="输出标签不能重复使用",
+                    details={"chain_index": index}
+                )
+            if self.pending_inputs.pop(label, None) is None:
+                self.open_outputs.add(label)
+            elif self.strict:
+                self.closed_labels.add(label)
+
+        for label in chain.inputs:
+            if INPUT_LABEL_RE.match(label):
+                continue
+            if label in self.open_outputs:
+                self.open_outputs.discard(label)
+                if self.strict:
+                    self.closed_labels.add(label)
+            elif label in self.closed_labels or label in self.pending_inputs:
+                raise FFmpegError(
+                    f"流标签被重复使用: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="每个滤镜输出只能被使用一次，需要多次使用时请插入 split/asplit",
+                    details={"chain_index": index}
+                )
+            else:
+                # 允许先使用、后定义
+                self.pending_inputs[label] = index
+
+    def finish(self) -> List[str]:
+        """结束验证，返回未被使用的输出标签（通常由 -map 消费）"""
+        if self.pending_inputs:
+            label, index = next(iter(self.pending_inputs.items()))
+            raise FFmpegError(
+                f"未定义的输入流: {label}",
+                error_type="SEMANTIC_ERROR",
+                suggestion="请先定义输入流再使用",
+                details={"chain_index": index}
+            )
+        return sorted(self.open_outputs)
+
+    def validate(self, chains: Iterable[FilterChain]) -> Iterator[FilterChain]:
+        """边验证边转发滤镜链，迭代结束时完成整体检查"""
+        for chain in chains:
+            self.feed(chain)
+            yield chain
+        self.finish()
+
+
+# 确保导出类
+__all__ = ['StreamingFilterParser', 'StreamValidator', 'DEFAULT_CHUNK_SIZE']
@@ -0,0 +1,221 @@
+import re
+from array import array
+from bisect import bisect_right
+from typing import Iterator, List, Optional, Tuple, Union
+from core.error_types import FFmpegError
+from parsers.parser_models import ParsedCommand, ParseError, Stream, FilterNode, FilterChain
+from parsers.filter_scanner import (
+    _LABEL_RE, _NAME_RE, _ARGS_RE, _SEP_RE, _WS_RE, build_chain, parse_filter_args
+)
+
+Buffer = Union[str, bytes, bytearray, memoryview]
+
+# token 类型
+LABEL, NAME, ARGS, COMMA, SEMICOLON = range(5)
+TOKEN_NAMES = ("LABEL", "NAME", "ARGS", "COMMA", "SEMICOLON")
+
+
+def _bytes_pattern(pattern: 're.Pattern') -> 're.Pattern':
+    """由 str 正则生成等价的 bytes 正则，可直接匹配 bytes/memoryview/mmap"""
+    return re.compile(pattern.pattern.encode("ascii"), pattern.flags & ~re.UNICODE)
+
+
+_STR_PATTERNS = (_LABEL_RE, _NAME_RE, _ARGS_RE, _SEP_RE, _WS_RE)
+_BYTES_PATTERNS = tuple(_bytes_pattern(p) for p in _STR_PATTERNS)
+
+
+class TokenStream:
+    """偏移量 token 流：每个 token 只记录 (类型, 起点, 终点)，文本在读取时才生成"""
+
+    def __init__(self, buffer: Buffer):
+        self.buffer = buffer
+        self.is_text = isinstance(buffer, str)
+        self.kinds = array('B')
+        self.starts = array('q')
+        self.ends = array('q')
+        self._newlines: Optional[List[int]] = None
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def token(self, index: int) -> Tuple[int, int, int]:
+        return self.kinds[index], self.starts[index], self.ends[index]
+
+    def text(self, index: int) -> str:
+        """解码第 index 个 token 的文本"""
+        return self.slice(self.starts[index], self.ends[index])
+
+    def slice(self, start: int, end: int) -> str:
+        if self.is_text:
+            return self.buffer[start:end]
+        return bytes(self.buffer[start:end]).decode("utf-8")
+
+    def position(self, offset: int) -> Tuple[int, int]:
+        """把偏移量换算为从 1 开始的 (行, 列)；换行索引只在第一次出错时建立"""
+        if self._newlines is None:
+            newline = "\n" if self.is_text else b"\n"
+            data = self.buffer if self.is_text else memoryview(self.buffer).cast("B")
+            self._newlines = [m.start() for m in re.finditer(re.escape(newline), data)]
+        line = bisect_right(self._newlines, offset - 1)
+        line_start = self._newlines[line - 1] + 1 if line else 0
+        return line + 1, len(self.slice(line_start, offset)) + 1
+
+    def parse_error(self, offset: int, message: str) -> ParseError:
+        line, column = self.position(offset)
+        context = self.slice(max(0, offset - 20), offset) + self.slice(offset, min(len(self.buffer), offset + 20))
+        return ParseError(message=message, line=line, column=column, context=context)
+
+    def error(self, offset: int, message: str) -> FFmpegError:
+        parse_error = self.parse_error(offset, message)
+        return FFmpegError(
+            message=f"{message} (行 {parse_error.line}, 列 {parse_error.column})",
+            error_type="PARSER_ERROR",
+            suggestion="请检查滤镜链语法是否正确",
+            details={
+                "position": offset,
+                "line": parse_error.line,
+                "column": parse_error.column,
+                "context": parse_error.context
+            }
+        )
+
+    def filters(self) -> Iterator['FilterView']:
+        """逐个产出滤镜视图，参数在访问时才解码"""
+        for index, kind in enumerate(self.kinds):
+            if kind == NAME:
+                yield FilterView(self, index)
+
+
+class FilterView:
+    """token 流中一个滤镜的惰性视图"""
+    __slots__ = ("stream", "index")
+
+    def __init__(self, stream: TokenStream, index: int):
+        self.stream = stream
+        self.index = index  # NAME token 的序号
+
+    @property
+    def name(self) -> str:
+        return self.stream.text(self.index)
+
+    @property
+    def args(self) -> Optional[str]:
+        following = self.index + 1
+        if following < len(self.stream) and self.stream.kinds[following] == ARGS:
+            return self.stream.text(following)
+        return None
+
+    @property
+    def params(self):
+        name = self.name
+        return parse_filter_args(name, self.args)
+
+    def to_node(self) -> FilterNode:
+        name = self.name
+        return FilterNode(name, parse_filter_args(name, self.args))
+
+
+def tokenize(buffer: Buffer) -> TokenStream:
+    """单遍扫描滤镜图，只记录 token 偏移量"""
+    if isinstance(buffer, memoryview) and buffer.format != "B":
+        buffer = buffer.cast("B")
+    stream = TokenStream(buffer)
+    label_re, name_re, args_re, sep_re, ws_re = _STR_PATTERNS if stream.is_text else _BYTES_PATTERNS
+    kinds, starts, ends = stream.kinds, stream.starts, stream.ends
+    end = len(buffer)
+    pos = ws_re.match(buffer).end()
+
+    while pos < end:
+        # [label]* name[=args] [label]*
+        match = label_re.match(buffer, pos)
+        while match is not None:
+            kinds.append(LABEL)
+            starts.append(match.start(1))
+            ends.append(match.end(1))
+            pos = match.end()
+            match = label_re.match(buffer, pos)
+
+        match = name_re.match(buffer, pos)
+        if match is None:
+            pos = ws_re.match(buffer, pos).end()
+            if pos < end and buffer[pos:pos + 1] in ("[", b"["):
+                raise stream.error(pos, "括号不匹配")
+            if pos < end and buffer[pos:pos + 1] in (";", b";") and (not kinds or kinds[-1] == SEMICOLON):
+                # 空滤镜链
+                pos = ws_re.match(buffer, pos + 1).end()
+                continue
+            raise stream.error(pos, "缺少滤镜名称")
+        kinds.append(NAME)
+        starts.append(match.start(1))
+        ends.append(match.end(1))
+        pos = match.end()
+
+        match = args_re.match(buffer, pos)
+        if match is not None:
+            kinds.append(ARGS)
+            starts.append(match.start(1))
+            ends.append(match.end(1))
+            pos = match.end()
+
+        match = label_re.match(buffer, pos)
+        while match is not None:
+            kinds.append(LABEL)
+            starts.append(match.start(1))
+            ends.append(match.end(1))
+            pos = match.end()
+            match = label_re.match(buffer, pos)
+
+        match = sep_re.match(buffer, pos)
+        separator = match.group(1)
+        if separator:
+            kinds.append(COMMA if separator in (",", b",") else SEMICOLON)
+            starts.append(match.start(1))
+            ends.append(match.end(1))
+            pos = ws_re.match(buffer, match.end()).end()
+        elif match.end() < end:
+            pos = match.end()
+            if buffer[pos:pos + 1] in ("[", b"["):
+                raise stream.error(pos, "括号不匹配")
+            raise stream.error(pos, f"意外的字符: {stream.slice(pos, pos + 1)!r}")
+        else:
+            pos = end
+    return stream
+
+
+def parse_tokens(stream: TokenStream) -> ParsedCommand:
+    """把 token 流转换为 ParsedCommand，与 FilterScanner 的结果一致"""
+    streams: List[Stream] = []
+    filter_chains: List[FilterChain] = []
+    scanned: List[Tuple[FilterNode, List[str], List[str]]] = []  # (滤镜, 输入标签, 输出标签)
+    inputs: List[str] = []
+    after_filter = False  # 滤镜名之后的标签是输出，之前的是输入
+
+    for index, kind in enumerate(stream.kinds):
+        if kind == LABEL:
+            label = stream.text(index)
+            streams.append(Stream.from_label(label))
+            (scanned[-1][2] if after_filter else inputs).append(label)
+        elif kind == NAME:
+            scanned.append((FilterView(stream, index).to_node(), inputs, []))
+            inputs = []
+            after_filter = True
+        elif kind == COMMA:
+            after_filter = False
+        elif kind == SEMICOLON:
+            filter_chains.append(build_chain(scanned))
+            scanned = []
+            after_filter = False
+    if scanned:
+        filter_chains.append(build_chain(scanned))
+    return ParsedCommand(streams=streams, filter_chains=filter_chains, outputs=[])
+
+
+class TokenParser:
+    """基于偏移量 token 流的解析器，接受 str、bytes 或 memoryview（如 mmap 的脚本文件）"""
+
+    def parse(self, buffer: Buffer) -> ParsedCommand:
+        return parse_tokens(tokenize(buffer))
+
+
+# 确保导出类
+__all__ = ['TokenStream', 'TokenParser', 'FilterView', 'tokenize', 'parse_tokens', 'TOKEN_NAMES']
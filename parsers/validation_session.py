@@ -0,0 +1,312 @@
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple
+from core.error_types import FFmpegError
+from parsers.parser_models import FilterChain
+from parsers.filter_graph import chain_fields
+from parsers.filter_scanner import INPUT_LABEL_RE
+
+
+def cyclic_nodes(nodes: Iterable[Hashable], successors: Callable[[Hashable], List[Hashable]]) -> Set[Hashable]:
+    """求子图的强连通分量（迭代 Tarjan），返回位于环上的节点；successors 只应返回子图内的节点"""
+    index: Dict[Hashable, int] = {}
+    low: Dict[Hashable, int] = {}
+    stack: List[Hashable] = []
+    on_stack: Set[Hashable] = set()
+    cyclic: Set[Hashable] = set()
+    counter = 0
+
+    for root in nodes:
+        if root in index:
+            continue
+        work = [(root, iter(successors(root)))]
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        on_stack.add(root)
+        while work:
+            node, children = work[-1]
+            advanced = False
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(successors(child))))
+                    advanced = True
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                if len(component) > 1 or node in successors(node):
+                    cyclic.update(component)
+    return cyclic
+
+
+class ValidationSession:
+    """有状态的增量语义验证会话
+
+    记录每条滤镜链的输入/输出标签及标签的生产者、消费者索引。
+    增加、删除或替换滤镜链时，只重新验证该链、受影响标签的生产者和全部下游消费者，
+    其余链的诊断结果直接复用。
+    """
+
+    def __init__(self, external_labels: Optional[Set[str]] = None, ffmpeg_query=None, schema_index=None):
+        self.external_labels = external_labels  # 为 None 时按 0:v、1:a 等输入文件标签判断
+        self.ffmpeg_query = ffmpeg_query  # 提供 validate_filter_params 的参数验证器（可选）
+        self.schema_index = schema_index  # 滤镜选项索引（可选），覆盖的滤镜优先按索引验证
+        self._chains: Dict[int, object] = {}  # 链 id -> 滤镜链
+        self._labels: Dict[int, Tuple[Sequence[str], Sequence[str]]] = {}  # 链 id -> (输入, 输出)
+        self._producers: Dict[str, Set[int]] = defaultdict(set)  # 标签 -> 生产链 id
+        self._consumers: Dict[str, Set[int]] = defaultdict(set)  # 标签 -> 消费链 id
+        self._structural: Dict[int, List[FFmpegError]] = {}  # 链 id -> 标签/环诊断
+        self._param_errors: Dict[int, List[FFmpegError]] = {}  # 链 id -> 参数诊断
+        self._by_chain: Dict[object, List[int]] = defaultdict(list)  # 滤镜链 -> 链 id（供 sync 比较）
+        self._unconsumed: Set[str] = set()
+        self._on_cycle: Set[int] = set()  # 位于环上的链 id
+        self._next_id = 0
+        self.stats = {"revalidated": 0}
+
+    def add_chain(self, chain) -> int:
+        """加入一条滤镜链，返回链 id"""
+        chain_id = self._next_id
+        self._next_id += 1
+        self._attach(chain_id, chain)
+        self._revalidate(chain_id, self._labels[chain_id][1])
+        return chain_id
+
+    def remove_chain(self, chain_id: int) -> List[FFmpegError]:
+        """删除滤镜链，返回更新后的诊断"""
+        _, outputs = self._labels[chain_id]
+        self._detach(chain_id)
+        self._revalidate(None, outputs)
+        return self.diagnostics()
+
+    def replace_chain(self, chain_id: int, chain) -> List[FFmpegError]:
+        """替换滤镜链，返回更新后的诊断"""
+        old_labels = self._labels[chain_id]
+        structural = self._structural.get(chain_id)
+        on_cycle = chain_id in self._on_cycle
+        self._detach(chain_id)
+        self._attach(chain_id, chain)
+        new_labels = self._labels[chain_id]
+        for label in {*old_labels[0], *old_labels[1], *new_labels[1]}:
+            self._update_unconsumed(label)
+        if new_labels == old_labels:
+            # 只改了滤镜参数，标签关系不变
+            if structural:
+                self._structural[chain_id] = structural
+            if on_cycle:
+                self._on_cycle.add(chain_id)
+            self.stats["revalidated"] += 1
+            return self.diagnostics()
+        # 生产者发生变化的标签
+        self._revalidate(chain_id, set(old_labels[1]) ^ set(new_labels[1]))
+        return self.diagnostics()
+
+    def sync(self, chains: Iterable) -> List[FFmpegError]:
+        """与新的滤镜链列表同步：未变化的链保留，其余按增删处理"""
+        remaining = {chain: list(ids) for chain, ids in self._by_chain.items()}
+        added = []
+        for chain in chains:
+            ids = remaining.get(chain)
+            if ids:
+                ids.pop()
+            else:
+                added.append(chain)
+        for ids in remaining.values():
+            for chain_id in ids:
+                self.remove_chain(chain_id)
+        for chain in added:
+            self.add_chain(chain)
+        return self.diagnostics()
+
+    def chain(self, chain_id: int):
+        return self._chains[chain_id]
+
+    def chain_ids(self) -> List[int]:
+        return sorted(self._chains)
+
+    def diagnostics(self) -> List[FFmpegError]:
+        """当前全部诊断，按链 id 排序"""
+        errors = []
+        for chain_id in sorted(set(self._structural) | set(self._param_errors)):
+            errors.extend(self._structural.get(chain_id, ()))
+            errors.extend(self._param_errors.get(chain_id, ()))
+        return errors
+
+    def errors_for(self, chain_id: int) -> List[FFmpegError]:
+        return self._structural.get(chain_id, []) + self._param_errors.get(chain_id, [])
+
+    def unconsumed_outputs(self) -> List[str]:
+        """未被任何滤镜消费的输出标签（通常由 -map 使用）"""
+        return sorted(self._unconsumed)
+
+    def _attach(self, chain_id: int, chain) -> None:
+        if isinstance(chain, dict):
+            chain = FilterChain.from_dict(chain)
+        inputs, outputs, filters = chain_fields(chain)
+        self._chains[chain_id] = chain
+        self._labels[chain_id] = (tuple(inputs), tuple(outputs))
+        self._by_chain[chain].append(chain_id)
+        for label in outputs:
+            self._producers[label].add(chain_id)
+        for label in inputs:
+            self._consumers[label].add(chain_id)
+        self._param_errors.pop(chain_id, None)
+        errors = self._validate_params(filters)
+        if errors:
+            self._param_errors[chain_id] = errors
+
+    def _detach(self, chain_id: int) -> None:
+        chain = self._chains.pop(chain_id)
+        inputs, outputs = self._labels.pop(chain_id)
+        ids = self._by_chain[chain]
+        ids.remove(chain_id)
+        if not ids:
+            del self._by_chain[chain]
+        for label in outputs:
+            self._discard(self._producers, label, chain_id)
+        for label in inputs:
+            self._discard(self._consumers, label, chain_id)
+            self._update_unconsumed(label)
+        self._structural.pop(chain_id, None)
+        self._param_errors.pop(chain_id, None)
+        self._on_cycle.discard(chain_id)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[int]], label: str, chain_id: int) -> None:
+        ids = index.get(label)
+        if ids is not None:
+            ids.discard(chain_id)
+            if not ids:
+                del index[label]
+
+    def _update_unconsumed(self, label: str) -> None:
+        if label in self._producers and label not in self._consumers:
+            self._unconsumed.add(label)
+        else:
+            self._unconsumed.discard(label)
+
+    def _revalidate(self, chain_id: Optional[int], dirty_labels: Iterable[str]) -> None:
+        """重新验证改动链、改动标签的生产者及其全部下游"""
+        dirty_labels = set(dirty_labels)
+        affected: Set[int] = set()
+        if chain_id is not None:
+            affected.add(chain_id)
+            for label in self._labels[chain_id][0]:
+                self._update_unconsumed(label)
+        for label in dirty_labels:
+            # 重复输出标签的判断依赖同名标签的其他生产者
+            affected.update(self._producers.get(label, ()))
+            self._update_unconsumed(label)
+
+        # 下游闭包：改动链与改动标签的全部（传递）消费者
+        downstream: Set[int] = set() if chain_id is None else {chain_id}
+        pending = list(dirty_labels)
+        if chain_id is not None:
+            pending.extend(self._labels[chain_id][1])
+        seen = set(pending)
+        while pending:
+            label = pending.pop()
+            for consumer in self._consumers.get(label, ()):
+                if consumer in downstream:
+                    continue
+                downstream.add(consumer)
+                for out in self._labels[consumer][1]:
+                    if out not in seen:
+                        seen.add(out)
+                        pending.append(out)
+        affected |= downstream
+
+        # 新增或断开的环一定经过改动链，环上节点都在下游闭包内
+        cyclic = self._cyclic_nodes(downstream)
+        self._on_cycle -= downstream
+        self._on_cycle |= cyclic
+        for node in affected:
+            errors = self._validate_labels(node)
+            if node in self._on_cycle:
+                errors.append(FFmpegError(
+                    "检测到流标签循环依赖",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="滤镜链不能直接或间接消费自己的输出",
+                    details={"chain_id": node}
+                ))
+            if errors:
+                self._structural[node] = errors
+            else:
+                self._structural.pop(node, None)
+        self.stats["revalidated"] += len(affected)
+
+    def _validate_labels(self, chain_id: int) -> List[FFmpegError]:
+        inputs, outputs = self._labels[chain_id]
+        errors = []
+        for label in inputs:
+            if label not in self._producers and not self._is_external(label):
+                errors.append(FFmpegError(
+                    f"未定义的输入流: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="请先定义输入流再使用",
+                    details={"chain_id": chain_id, "label": label}
+                ))
+        for label in outputs:
+            if len(self._producers.get(label, ())) > 1:
+                errors.append(FFmpegError(
+                    f"重复的输出标签: {label}",
+                    error_type="SEMANTIC_ERROR",
+                    suggestion="输出标签不能重复使用",
+                    details={"chain_id": chain_id, "label": label}
+                ))
+        return errors
+
+    def _is_external(self, label: str) -> bool:
+        if self.external_labels is None:
+            return INPUT_LABEL_RE.match(label) is not None
+        return label in self.external_labels
+
+    def _validate_params(self, filters) -> List[FFmpegError]:
+        if self.ffmpeg_query is None and self.schema_index is None:
+            return []
+        errors = []
+        for filter_def in filters:
+            schema = self.schema_index.get(filter_def["name"]) if self.schema_index else None
+            if schema is not None:
+                errors.extend(schema.validate_params(filter_def["params"]))
+                continue
+            if self.ffmpeg_query is None:
+                continue
+            try:
+                self.ffmpeg_query.validate_filter_params(filter_def["name"], filter_def["params"])
+            except FFmpegError as e:
+                errors.append(e)
+        return errors
+
+    def _cyclic_nodes(self, nodes: Set[int]) -> Set[int]:
+        """在受影响的子图上查找位于环上的节点
+
+        环上任一节点受影响时整条环都在其下游，因此只需在受影响子图内查找。
+        """
+        def successors(node: int) -> List[int]:
+            result = []
+            for label in self._labels[node][1]:
+                result.extend(c for c in self._consumers.get(label, ()) if c in nodes)
+            return result
+
+        return cyclic_nodes(nodes, successors)
+
+
+# 确保导出类
+__all__ = ['ValidationSession', 'cyclic_nodes']
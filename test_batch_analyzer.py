@@ -0,0 +1,98 @@
+import io
+import json
+import unittest
+from core.batch_analyzer import BatchAnalyzer, extract_filter_graphs, run_ndjson
+
+
+class TestBatchAnalyzer(unittest.TestCase):
+    def test_extract_filter_graphs(self):
+        """测试从命令中提取全部滤镜图"""
+        self.assertEqual(
+            extract_filter_graphs("ffmpeg -i in.mp4 -filter_complex '[0:v]scale=1280:720[out]' -map '[out]' out.mp4"),
+            ["[0:v]scale=1280:720[out]"]
+        )
+        self.assertEqual(
+            extract_filter_graphs('ffmpeg -i in.mp4 -vf "drawtext=text=\\"hi\\"" out.mp4'),
+            ['drawtext=text="hi"']
+        )
+        self.assertEqual(extract_filter_graphs("ffmpeg -lavfi a\\ b out.mp4"), ["a b"])
+        self.assertEqual(extract_filter_graphs("ffmpeg -i in.mp4 out.mp4"), [])
+        self.assertEqual(
+            extract_filter_graphs("ffmpeg -i in.mp4 -vf 'scale=640:360' -af volume=2 a.mp4 -vf hflip b.mp4"),
+            ["scale=640:360", "volume=2", "hflip"]
+        )
+
+    def test_results_keep_input_order(self):
+        """测试多块并行处理后结果保持输入顺序"""
+        commands = [
+            f"ffmpeg -i in.mp4 -filter_complex '[0:v]scale={i}:{i}[v{i}]' out.mp4" for i in range(1, 50)
+        ]
+        commands[7] = "ffmpeg -i in.mp4 -filter_complex '[0:v]scale=1:1[' out.mp4"
+        analyzer = BatchAnalyzer(workers=2, chunk_size=4)
+        results = list(analyzer.run(commands))
+
+        self.assertEqual([r["index"] for r in results], list(range(len(commands))))
+        self.assertEqual(results[7]["status"], "error")
+        self.assertEqual(results[7]["error_type"], "PARSER_ERROR")
+        self.assertEqual(results[8], {"status": "ok", "chains": 1, "index": 8})
+        self.assertEqual((analyzer.stats.commands, analyzer.stats.errors), (len(commands), 1))
+
+    def test_ndjson_ids(self):
+        """测试 NDJSON 输入输出保留命令 id"""
+        source = io.StringIO(
+            json.dumps({"id": "a", "command": "ffmpeg -i in.mp4 -vf scale=640:360 out.mp4"}) + "\n\n"
+            + json.dumps("ffmpeg -i in.mp4 -vf 'scale=640:360' out.mp4") + "\n"
+        )
+        output = io.StringIO()
+        stats = run_ndjson(source, output, BatchAnalyzer(workers=1))
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([row["id"] for row in rows], ["a", 3])
+        self.assertEqual(stats.commands, 2)
+
+    def test_ndjson_bad_lines(self):
+        """测试 NDJSON 中格式错误或缺少 command 的行只产出带行号的错误记录，不中断后续命令"""
+        source = io.StringIO("\n".join([
+            json.dumps({"id": "a", "command": "ffmpeg -i in.mp4 -vf scale=640:360 out.mp4"}),
+            '{"id": "b", "command": ',
+            json.dumps({"id": "c"}),
+            json.dumps({"id": "d", "command": "ffmpeg -i in.mp4 -vf hflip out.mp4"}),
+            "[",
+        ]) + "\n")
+        output = io.StringIO()
+        stats = run_ndjson(source, output, BatchAnalyzer(workers=1))
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+
+        self.assertEqual([row["id"] for row in rows], ["a", 2, 3, "d", 5])
+        self.assertEqual([row["status"] for row in rows], ["ok", "error", "error", "ok", "error"])
+        self.assertEqual([rows[i]["line"] for i in (1, 2, 4)], [2, 3, 5])
+        self.assertEqual({rows[i]["error_type"] for i in (1, 2, 4)}, {"INPUT_ERROR"})
+        self.assertTrue(rows[1]["message"].startswith("JSONDecodeError"))
+        self.assertTrue(rows[2]["message"].startswith("KeyError"))
+        self.assertEqual((stats.commands, stats.errors), (5, 3))
+
+    def test_validate_mode(self):
+        """测试验证模式：每个滤镜图都经检查规则与批量范围验证，意外异常只记为该命令的错误"""
+        source = io.StringIO("\n".join(json.dumps(item) for item in [
+            {"id": "ok", "command": "ffmpeg -i in.mp4 -filter_complex '[0:v]scale=640:360[v]' -map '[v]' out.mp4"},
+            {"id": "label", "command": "ffmpeg -i in.mp4 -vf scale=640:360 -filter_complex '[x]hflip[v]' out.mp4"},
+            {"id": "range", "command": "ffmpeg -i in.mp4 -vf hflip -af volume=2 a.mp4 -vf scale=640:9000 b.mp4"},
+            {"id": "dimension", "command": "ffmpeg -i in.mp4 -vf scale=iw*k:360 out.mp4"},
+            {"id": "expression", "command": "ffmpeg -i in.mp4 -vf 'colorbalance=rs=2*sin(t)' out.mp4"},
+            {"id": "keep", "command": "ffmpeg -i in.mp4 -vf scale=640:0 a.mp4 -vf scale=-2:720 b.mp4"},
+            {"id": "crash", "command": 5},
+        ]))
+        output = io.StringIO()
+        stats = run_ndjson(source, output, BatchAnalyzer("validate", workers=1))
+        rows = {row["id"]: row for row in map(json.loads, output.getvalue().splitlines())}
+        self.assertEqual(rows["ok"]["status"], "ok")
+        self.assertEqual(rows["label"]["error_type"], "SEMANTIC_ERROR")
+        self.assertEqual(rows["range"]["error_type"], "INVALID_PARAM")
+        self.assertEqual(rows["dimension"]["error_type"], "SEMANTIC_ERROR")
+        self.assertEqual(rows["expression"]["error_type"], "INVALID_PARAM")
+        self.assertEqual(rows["keep"]["status"], "ok")
+        self.assertEqual(rows["crash"]["error_type"], "INTERNAL_ERROR")
+        self.assertEqual((stats.commands, stats.errors), (7, 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,320 @@
+import io
+import os
+import json
+import time
+import timeit
+import tempfile
+import tracemalloc
+import unittest
+from dataclasses import dataclass, field
+from typing import Dict, List
+from unittest import mock
+from parsers.filter_parser import FilterParser
+from parsers.grammar_parser import GrammarParser
+from parsers.stream_parser import StreamingFilterParser, StreamValidator
+from parsers.token_stream import tokenize
+from parsers.filter_graph import FilterGraph, chain_fields
+from parsers.validation_session import ValidationSession
+from parsers.lint_engine import LintEngine, LintRule
+from parsers.parser_models import FilterChain, FilterNode
+
+# 依赖机器速度的耗时基准默认跳过，设置 RUN_BENCHMARKS=1 后运行
+benchmark = unittest.skipUnless(os.environ.get("RUN_BENCHMARKS"), "设置 RUN_BENCHMARKS=1 运行耗时基准")
+
+
+def build_filter_graph(filter_count: int, filters_per_chain: int = 5) -> str:
+    """生成包含 filter_count 个滤镜的滤镜图"""
+    templates = [
+        "scale=iw*1.0:ih*1.0",
+        "eq=brightness=0.0{i}:contrast=1.0",
+        "colorbalance=rs=0.{i}:gs=0:bs=0",
+        "format=yuv420p",
+        "gblur=sigma=0.{i}",
+    ]
+    chains = []
+    label = "0:v"
+    for start in range(0, filter_count, filters_per_chain):
+        filters = ",".join(
+            templates[i % len(templates)].format(i=i)
+            for i in range(start, min(start + filters_per_chain, filter_count))
+        )
+        chains.append(f"[{label}]{filters}[n{start}]")
+        label = f"n{start}"
+    return ";".join(chains)
+
+
+class TestScannerPerformance(unittest.TestCase):
+    @benchmark
+    def test_large_graph_throughput(self):
+        """测试万级滤镜图的扫描吞吐量（与 LALR 模式在同一输入上比较，不依赖机器的绝对速度）"""
+        graph = build_filter_graph(10000)
+        parser = FilterParser()
+        duration = min(timeit.repeat(lambda: parser.parse(graph), number=1, repeat=5))
+        throughput = len(graph) / duration / (1024 * 1024)
+        print(f"\n10k滤镜图: {len(graph) / 1024:.0f} KiB, {duration * 1000:.1f} ms/次, {throughput:.2f} MB/s")
+
+        parsed = parser.parse(graph)
+        self.assertEqual(sum(len(c.filters) for c in parsed.filter_chains), 10000)
+
+        # 两种模式交替运行并各取最快一次，机器负载对两者的影响相同
+        sample = build_filter_graph(2000)
+        lalr = FilterParser(mode="lalr")
+        scanner_times, lalr_times = [], []
+        for _ in range(5):
+            scanner_times.append(timeit.timeit(lambda: parser.parse(sample), number=1))
+            lalr_times.append(timeit.timeit(lambda: lalr.parse(sample), number=1))
+        ratio = min(lalr_times) / min(scanner_times)
+        print(f"同一滤镜图: 扫描器比 LALR 模式快 {ratio:.1f} 倍")
+        self.assertGreater(ratio, 1.5, "扫描器应明显快于 LALR 语法解析")
+
+
+class TestGrammarParserPerformance(unittest.TestCase):
+    SAMPLE_GRAPH = (
+        "[1:v]scale=iw*1.0:ih*1.0,rotate=0.0*PI/180,colorbalance=rs=0:gs=0:bs=0,"
+        "gblur=sigma=0.0,eq=brightness=0.0:contrast=1.0,format=rgba,colorchannelmixer=aa=1.0[v2];"
+        "[0:v]scale=iw/2:ih/2[base1];[v2]scale=iw/2:ih/2[base2];[base1][base2]hstack[outv];"
+        "[1:a]volume=1.0[a1];[0:a][a1]amix=inputs=2[aout]"
+    )
+
+    def test_warm_start_skips_grammar_compile(self):
+        """测试冷启动编译语法并写入解析表缓存，热启动直接加载缓存、不再编译语法"""
+        import lark.lark
+        with tempfile.TemporaryDirectory() as cache_dir:
+            GrammarParser._parsers.clear()
+            try:
+                with mock.patch.object(lark.lark, "load_grammar", wraps=lark.lark.load_grammar) as compile_grammar:
+                    GrammarParser(cache_dir=cache_dir).parse(self.SAMPLE_GRAPH)
+                    cold = compile_grammar.call_count
+                    GrammarParser._parsers.clear()
+                    grammar_parser = GrammarParser(cache_dir=cache_dir)
+                    parsed = grammar_parser.parse(self.SAMPLE_GRAPH)
+                    warm = compile_grammar.call_count - cold
+            finally:
+                GrammarParser._parsers.clear()
+
+        self.assertGreater(cold, 0)
+        self.assertEqual(warm, 0, "缓存解析表后启动不应重新编译语法")
+        self.assertEqual(parsed, FilterParser().parse(self.SAMPLE_GRAPH))
+
+    @benchmark
+    def test_cold_warm_start_and_latency(self):
+        """对比 LALR 解析器冷启动、热启动与单次解析延迟"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            GrammarParser._parsers.clear()
+            start = time.perf_counter()
+            GrammarParser(cache_dir=cache_dir).parse(self.SAMPLE_GRAPH)
+            cold = time.perf_counter() - start
+
+            GrammarParser._parsers.clear()
+            start = time.perf_counter()
+            grammar_parser = GrammarParser(cache_dir=cache_dir)
+            grammar_parser.parse(self.SAMPLE_GRAPH)
+            warm = time.perf_counter() - start
+            GrammarParser._parsers.clear()
+
+        scanner = FilterParser()
+        runs = 1000
+        lalr_latency = timeit.timeit(lambda: grammar_parser.parse(self.SAMPLE_GRAPH), number=runs) / runs
+        scanner_latency = timeit.timeit(lambda: scanner.parse(self.SAMPLE_GRAPH), number=runs) / runs
+        print(f"\nLALR 冷启动: {cold * 1000:.1f} ms, 热启动: {warm * 1000:.1f} ms")
+        print(f"单次解析: LALR {lalr_latency * 1e6:.1f} us, 手写扫描器 {scanner_latency * 1e6:.1f} us")
+        self.assertLess(warm, cold, "缓存解析表后启动应快于编译语法")
+
+
+class GeneratedGraphStream(io.TextIOBase):
+    """按需生成滤镜图文本的流，整个图不会同时驻留内存"""
+
+    def __init__(self, chain_count: int):
+        self.chain_count = chain_count
+        self.index = 0
+        self.buffer = ""
+
+    def read(self, size: int = -1) -> str:
+        while (size < 0 or len(self.buffer) < size) and self.index < self.chain_count:
+            label = "0:v" if self.index == 0 else f"n{self.index - 1}"
+            self.buffer += f"[{label}]scale=iw/2:ih/2,eq=contrast=1.0,format=yuv420p[n{self.index}];"
+            self.index += 1
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+class TestStreamingParserMemory(unittest.TestCase):
+    def _peak_memory(self, chain_count: int) -> int:
+        tracemalloc.start()
+        try:
+            validator = StreamValidator()
+            chains = StreamingFilterParser().iter_chains(GeneratedGraphStream(chain_count))
+            count = sum(1 for _ in validator.validate(chains))
+            self.assertEqual(count, chain_count)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    def test_peak_memory_constant(self):
+        """测试流式解析+验证的峰值内存不随图规模增长"""
+        small = self._peak_memory(2000)
+        large = self._peak_memory(20000)
+        print(f"\n峰值内存: 2k链 {small / 1024:.0f} KiB, 20k链 {large / 1024:.0f} KiB")
+        self.assertLess(large, small * 2, "峰值内存应与图规模基本无关")
+
+
+@dataclass
+class LegacyStream:
+    """旧版模型布局（带 __dict__ 的 dataclass），用作内存对照"""
+    id: str
+    type: str
+
+
+@dataclass
+class LegacyFilterChain:
+    inputs: List[str]
+    output: str
+    filters: List[Dict]
+    outputs: List[str] = field(default_factory=list)
+
+
+class TestModelMemory(unittest.TestCase):
+    NODE_COUNT = 100000
+
+    def _traced(self, build):
+        tracemalloc.start()
+        try:
+            result = build()
+            return result, tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def test_per_node_memory(self):
+        """测试 10 万滤镜节点下紧凑模型的单节点内存"""
+        graph = build_filter_graph(self.NODE_COUNT)
+        parser = FilterParser()
+        parsed, compact = self._traced(lambda: parser.parse(graph))
+        self.assertEqual(sum(len(c.filters) for c in parsed.filter_chains), self.NODE_COUNT)
+
+        # 旧布局：每个字符串独立、滤镜参数为字典
+        payload = json.dumps(parsed.to_dict())
+        del parsed
+
+        def build_legacy():
+            data = json.loads(payload)
+            return (
+                [LegacyStream(**s) for s in data["streams"]],
+                [LegacyFilterChain(**c) for c in data["filter_chains"]]
+            )
+        legacy_model, legacy = self._traced(build_legacy)
+
+        print(f"\n单节点内存: 紧凑模型 {compact / self.NODE_COUNT:.0f} B, 旧模型 {legacy / self.NODE_COUNT:.0f} B")
+        self.assertLess(compact, legacy * 0.6, "紧凑模型的单节点内存应明显低于旧模型")
+
+
+class TestTokenStreamAllocations(unittest.TestCase):
+    def _retained_blocks(self, build):
+        tracemalloc.start()
+        try:
+            result = build()
+            snapshot = tracemalloc.take_snapshot()
+            return result, sum(stat.count for stat in snapshot.statistics("filename"))
+        finally:
+            tracemalloc.stop()
+
+    def test_offset_tokens_allocations(self):
+        """测试偏移量 token 流保留的内存块数固定，不像扫描器那样随滤镜数增长"""
+        small_stream, small_blocks = self._retained_blocks(lambda: tokenize(build_filter_graph(2000).encode()))
+        stream, token_blocks = self._retained_blocks(lambda: tokenize(build_filter_graph(20000).encode()))
+        self.assertEqual(sum(1 for _ in stream.filters()), 20000)
+        self.assertEqual(token_blocks, small_blocks, "token 流只保存偏移量数组，内存块数不应随 token 数增长")
+
+        graph = build_filter_graph(20000)
+        scanned, scanner_blocks = self._retained_blocks(lambda: FilterParser().parse(graph))
+        print(f"\n保留的内存块: 扫描器 {scanner_blocks}, 偏移量 token 流 {token_blocks} ({len(stream)} 个 token)")
+        self.assertGreater(scanner_blocks, 20000)
+
+
+def build_chain_dag(node_count: int):
+    """生成 node_count 条滤镜链组成的 DAG：每条链消费前一条的输出，每 10 条合并一次"""
+    chains = []
+    for i in range(node_count):
+        inputs = ["0:v"] if i == 0 else [f"n{i - 1}"]
+        if i % 10 == 9:
+            inputs.append(f"s{i - 5}")
+        outputs = [f"n{i}", f"s{i}"] if i % 10 == 4 else [f"n{i}"]
+        chains.append(FilterChain(inputs, outputs[0], [FilterNode("null")], outputs))
+    return chains
+
+
+class TestFilterGraphScaling(unittest.TestCase):
+    @benchmark
+    def test_linear_scaling(self):
+        """测试 1k/10k/100k 节点下图构建与验证的耗时近似线性"""
+        timings = {}
+        for node_count in (1000, 10000, 100000):
+            chains = build_chain_dag(node_count)
+            runs = max(1, 100000 // node_count)
+            elapsed = min(timeit.repeat(lambda: FilterGraph.build(chains, {"0:v"}), number=runs, repeat=3)) / runs
+            graph = FilterGraph.build(chains, {"0:v"})
+            self.assertEqual(graph.errors, [])
+            self.assertEqual(len(graph.order), node_count)
+            timings[node_count] = elapsed
+            print(f"\n{node_count} 节点: {elapsed * 1000:.1f} ms, {elapsed / node_count * 1e6:.2f} us/节点")
+        self.assertLess(timings[100000] / timings[1000], 100 * 3, "耗时应随节点数近似线性增长")
+
+
+class TestValidationSessionLatency(unittest.TestCase):
+    def test_edit_revalidation_flat(self):
+        """测试编辑单条链时重新验证的链数不随图规模增长"""
+        revalidated = {}
+        for branches in (100, 1000, 10000):
+            # branches 条互不相关的分支，每条 5 段
+            session = ValidationSession({"0:v"})
+            ids = []
+            for b in range(branches):
+                for k in range(5):
+                    source = "0:v" if k == 0 else f"b{b}_{k - 1}"
+                    ids.append(session.add_chain(FilterChain([source], f"b{b}_{k}", [FilterNode("null")], [f"b{b}_{k}"])))
+            target = ids[len(ids) // 2]
+            original = session.chain(target)
+            broken = FilterChain(["missing"], original.output, original.filters, original.outputs)
+
+            session.stats["revalidated"] = 0
+            for _ in range(200):
+                session.replace_chain(target, broken)
+                session.replace_chain(target, original)
+            revalidated[branches] = session.stats["revalidated"]
+            self.assertEqual(session.diagnostics(), [])
+        self.assertEqual(len(set(revalidated.values())), 1, f"重新验证的链数应与图规模无关: {revalidated}")
+        self.assertLessEqual(revalidated[10000], 400 * 5)
+
+
+class ParamCountRule(LintRule):
+    """统计参数个数的简单规则，用于测量引擎开销"""
+    name = "param-count"
+
+    def visit_filter(self, ctx, node, position, name, params):
+        ctx.state[self.name] = ctx.state.get(self.name, 0) + len(params)
+
+
+class TestLintEngineFusion(unittest.TestCase):
+    def test_fused_traversal(self):
+        """测试多条规则融合为一次遍历：每个节点只取一次滤镜数据，逐条规则运行则每条规则各取一次"""
+        chains = build_chain_dag(2000)
+        rules = [ParamCountRule() for _ in range(50)]
+        command = {"streams": [{"id": "0:v", "type": "video"}], "filter_chains": chains}
+
+        with mock.patch("parsers.lint_engine.chain_fields", wraps=chain_fields) as fields:
+            report = LintEngine(rules).run(command)
+            fused = fields.call_count
+            fields.reset_mock()
+            for rule in rules:
+                LintEngine([rule]).run(command)
+            separate = fields.call_count
+
+        self.assertEqual(report.diagnostics, [])
+        self.assertEqual(set(report.timings), {"param-count"})
+        self.assertEqual(fused, len(chains))
+        self.assertEqual(separate, len(rules) * len(chains))
+
+
+if __name__ == '__main__':
+    unittest.main()
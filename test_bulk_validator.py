@@ -0,0 +1,61 @@
+import unittest
+from core.bulk_validator import BulkRangeValidator
+from parsers.parser_models import FilterChain, FilterNode, ParsedCommand
+
+RANGES = {
+    "colorbalance": {"rs": (-1.0, 1.0), "gs": (-1.0, 1.0), "bs": (-1.0, 1.0)},
+    "scale": {"width": (1, 8192), "height": (1, 8192)},
+}
+
+
+def command(*filters):
+    return ParsedCommand(streams=[], filter_chains=[FilterChain(["0:v"], "out", list(filters))], outputs=[])
+
+
+class TestBulkRangeValidator(unittest.TestCase):
+    def setUp(self):
+        self.validator = BulkRangeValidator(RANGES)
+
+    def test_violations_map_back(self):
+        """测试越界参数映射回命令、链与滤镜位置"""
+        commands = [
+            command(FilterNode("scale", {"width": "1280", "height": "720"})),
+            command(FilterNode("null"), FilterNode("colorbalance", {"rs": "0.5", "bs": "1.5"})),
+            None,
+            command(FilterNode("scale", {"width": "iw/2", "height": "9000"})),
+        ]
+        errors = self.validator.validate(commands)
+        self.assertEqual(
+            [(e.details["command_index"], e.details["filter_index"], e.details["param"], e.details["value"])
+             for e in errors],
+            [(1, 1, "bs", "1.5"), (3, 0, "height", "9000")]
+        )
+        self.assertTrue(all(e.error_type == "INVALID_PARAM" for e in errors))
+        self.assertEqual(errors[0].suggestion, "取值范围: (-1, 1)")
+
+    def test_special_dimensions(self):
+        """测试尺寸参数的 0、-1 与 -n 是合法特殊值，其他参数的负数和非整数负尺寸仍判为越界"""
+        commands = [
+            command(FilterNode("scale", {"width": "0", "height": "-1"})),
+            command(FilterNode("scale", {"width": "-2", "height": "720"})),
+            command(FilterNode("scale", {"width": "-0.5", "height": "720"})),
+            command(FilterNode("colorbalance", {"rs": "-2"})),
+        ]
+        self.assertEqual(
+            [(e.details["command_index"], e.details["param"]) for e in self.validator.validate(commands)],
+            [(2, "width"), (3, "rs")]
+        )
+
+    def test_dict_chains_and_shared_values(self):
+        """测试字典形式的滤镜链，以及大量重复取值只解析一次"""
+        chains = [{"inputs": ["0:v"], "output": "out", "filters": [
+            {"name": "colorbalance", "params": {"rs": "0.1", "gs": "-2"}}]}]
+        self.assertEqual([e.details["param"] for e in self.validator.validate([chains])], ["gs"])
+
+        batch = [command(FilterNode("colorbalance", {"rs": str(i % 3 - 1), "gs": "0"})) for i in range(3000)]
+        self.assertEqual(self.validator.validate(batch), [])
+        self.assertEqual(self.validator.validate([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from core.capability_index import CapabilityIndex, parse_filters, parse_coders, parse_pix_fmts
+
+FAKE_OUTPUTS = {
+    "-filters": """Filters:
+  T.. = Timeline support
+  .S. = Slice threading
+  ..C = Command support
+  A = Audio input/output
+  V = Video input/output
+  N = Dynamic number and/or type of input/output
+  | = Source or sink filter
+ TSC acompressor       A->A       Audio compressor.
+ ..C scale             V->V       Scale the input video size and/or convert the image format.
+ ... scale_cuda        V->V       GPU accelerated video resizer
+ T.C overlay           VV->V      Overlay a video source on top of the input.
+ ... split             V->N       Pass on the input to N video outputs.
+""",
+    "-encoders": """Encoders:
+ V..... = Video
+ A..... = Audio
+ ------
+ V....D libx264              libx264 H.264 / AVC / MPEG-4 AVC (codec h264)
+ V....D h264_nvenc           NVIDIA NVENC H.264 encoder (codec h264)
+ A....D aac                  AAC (Advanced Audio Coding)
+""",
+    "-decoders": """Decoders:
+ V..... = Video
+ ------
+ VFS..D h264                 H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10
+""",
+    "-hwaccels": """Hardware acceleration methods:
+cuda
+vaapi
+qsv
+""",
+    "-pix_fmts": """Pixel formats:
+I.... = Supported Input  format for conversion
+FLAGS NAME            NB_COMPONENTS BITS_PER_PIXEL BIT_DEPTHS
+-----
+IO... yuv420p                3             12      8-8-8
+IO... nv12                   3             12      8-8-8
+..H.. cuda                   0              0      0
+""",
+}
+
+FAKE_FFMPEG = """#!{python}
+import sys
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+outputs = {outputs!r}
+print(outputs.get(sys.argv[-1], ""))
+"""
+
+
+@unittest.skipIf(os.name == "nt", "伪 ffmpeg 脚本依赖 shebang")
+class TestCapabilityIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.log = root / "calls.log"
+        self.binary = root / "ffmpeg"
+        self.binary.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(self.log), outputs=FAKE_OUTPUTS))
+        self.binary.chmod(self.binary.stat().st_mode | stat.S_IEXEC)
+        self.cache_dir = root / "cache"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _calls(self):
+        return self.log.read_text().splitlines() if self.log.exists() else []
+
+    def test_parse_outputs(self):
+        """测试解析各类 ffmpeg 列表输出"""
+        filters = parse_filters(FAKE_OUTPUTS["-filters"])
+        self.assertEqual(set(filters), {"acompressor", "scale", "scale_cuda", "overlay", "split"})
+        self.assertEqual(filters["overlay"], ("T.C", "VV->V"))
+        self.assertEqual(parse_coders(FAKE_OUTPUTS["-encoders"])["h264_nvenc"], "V....D")
+        self.assertEqual(parse_pix_fmts(FAKE_OUTPUTS["-pix_fmts"])["cuda"], ("..H..", 0, 0))
+
+    def test_probe_once_and_persist(self):
+        """测试每个可执行文件只探测一次，之后从磁盘索引加载"""
+        index = CapabilityIndex.load(str(self.binary), cache_dir=self.cache_dir)
+        self.assertEqual(len(self._calls()), 5)
+        self.assertTrue(index.has_filter("scale_cuda"))
+        self.assertFalse(index.has_filter("scale_qsv"))
+        self.assertTrue(index.has_encoder("h264_nvenc"))
+        self.assertTrue(index.has_decoder("h264"))
+        self.assertEqual(index.hwaccels, ("cuda", "vaapi", "qsv"))
+        self.assertTrue(index.has_pix_fmt("nv12"))
+        self.assertTrue(index.supports_timeline("overlay"))
+        self.assertFalse(index.supports_timeline("scale"))
+
+        reloaded = CapabilityIndex.load(str(self.binary), cache_dir=self.cache_dir)
+        self.assertEqual(len(self._calls()), 5, "命中磁盘索引时不应再启动 ffmpeg")
+        self.assertEqual(reloaded.to_data(), index.to_data())
+
+    def test_binary_change_invalidates(self):
+        """测试可执行文件变化（大小/修改时间）后重新探测"""
+        CapabilityIndex.load(str(self.binary), cache_dir=self.cache_dir)
+        with open(self.binary, "a") as f:
+            f.write("# upgraded\n")
+        CapabilityIndex.load(str(self.binary), cache_dir=self.cache_dir)
+        self.assertEqual(len(self._calls()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+from unittest import mock
+from core.error_types import FFmpegError
+from ui.comfyui.nodes import FFmpegProcessingNode
+
+
+class TestFFmpegProcessingNode(unittest.TestCase):
+    def test_cycle_rejected_before_processing(self):
+        """测试节点的增量验证拒绝循环依赖的滤镜图，修正后才交给命令处理器"""
+        node = FFmpegProcessingNode()
+        with mock.patch("ui.comfyui.nodes.FFmpegCommandProcessor") as processor:
+            with self.assertRaises(FFmpegError) as context:
+                node.process("in.mp4", "[a]null[b];[b]null[a]", False)
+            self.assertEqual(context.exception.message, "检测到流标签循环依赖")
+            processor.assert_not_called()
+
+            processor.return_value.process_command.return_value = {"status": "success", "output_path": "out.mp4"}
+            self.assertEqual(node.process("in.mp4", "[0:v]null[b];[b]null[a]", False), ("out.mp4", ""))
+            command = processor.return_value.process_command.call_args[0][0]
+            self.assertIn("[0:v]null[b];[b]null[a]", command)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+from core.command_cache import CommandCache, command_key, thaw
+from core.command_processor import FFmpegCommandProcessor
+from core.error_types import FFmpegError
+from hardware.probe import Adapter, DeviceStatus, HardwareSnapshot, StaticProbe
+
+
+class TestCommandCache(unittest.TestCase):
+    def test_normalized_key(self):
+        """测试空白归一化后的缓存键"""
+        a = command_key('ffmpeg  -i "in put.mp4"   -c:v libx264 out.mp4')
+        b = command_key('ffmpeg -i "in put.mp4" -c:v libx264\tout.mp4')
+        c = command_key('ffmpeg -i "in  put.mp4" -c:v libx264 out.mp4')
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c, "引号内的空白不应被归一化")
+        self.assertNotEqual(command_key("ffmpeg -i a.mp4 b.mp4", "cuda"), command_key("ffmpeg -i a.mp4 b.mp4"))
+
+    def test_hit_miss_counters(self):
+        """测试命中与未命中计数"""
+        cache = CommandCache()
+        self.assertIsNone(cache.get("k"))
+        cache.put("k", {"inputs": [{"path": "a.mp4"}]}, "ffmpeg -y -i a.mp4")
+        entry = cache.get("k")
+        self.assertEqual(entry.command, "ffmpeg -y -i a.mp4")
+        self.assertEqual(thaw(entry.parsed), {"inputs": [{"path": "a.mp4"}]})
+        with self.assertRaises(TypeError):
+            entry.parsed["inputs"] = []
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_lru_eviction_by_entries(self):
+        """测试按条目数淘汰最久未使用的结果"""
+        cache = CommandCache(max_entries=2)
+        cache.put("a", {}, "a")
+        cache.put("b", {}, "b")
+        cache.get("a")
+        cache.put("c", {}, "c")
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_eviction_by_memory(self):
+        """测试按内存占用淘汰"""
+        cache = CommandCache(max_entries=100, max_bytes=4096)
+        for i in range(50):
+            cache.put(str(i), {"filters": ["scale=iw/2:ih/2"] * 10}, "x" * 100)
+        self.assertLessEqual(cache.current_bytes, 4096)
+        self.assertGreater(cache.evictions, 0)
+        self.assertEqual(len(cache), cache.stats()["entries"])
+
+    def test_cached_error(self):
+        """测试缓存验证失败的结果"""
+        cache = CommandCache()
+        entry = cache.put("bad", None, error=FFmpegError("未定义的输入流: x", error_type="SEMANTIC_ERROR"))
+        self.assertIsNone(entry.command)
+        self.assertEqual(cache.get("bad").error.error_type, "SEMANTIC_ERROR")
+
+    def test_processor_cache(self):
+        """测试处理器经缓存复用结果：空白不同的命令命中，验证错误同样缓存，加速器不同或清空后重新处理"""
+        cache = CommandCache()
+        processor = FFmpegCommandProcessor(enable_hw_accel=False, cache=cache)
+        command = 'ffmpeg -ss 5 -i a.mp4 -filter_complex "[0:v]scale=640:360[v]" -map "[v]" -c:v h264_vaapi out.mp4'
+        expected = ("ffmpeg -y -ss 5 -i a.mp4 -filter_complex \"[0:v]scale=640:360[v]\" "
+                    "-map '[v]' -c:v h264_vaapi out.mp4")
+        self.assertEqual(processor.prepare_command(command), expected)
+        self.assertEqual(processor.prepare_command(command.replace(" -map ", "   -map\t")), expected)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        bad = 'ffmpeg -i a.mp4 -filter_complex "[x]scale=640:360[v]" -map "[v]" out.mp4'
+        for _ in range(2):
+            self.assertEqual(processor.process_command(bad)["code"], "SEMANTIC_ERROR")
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+        snapshot = HardwareSnapshot(None, ("vaapi",), {
+            "vaapi": DeviceStatus("vaapi", True, (Adapter("vaapi", 0, node="/dev/dri/renderD128"),))
+        })
+        accelerated = FFmpegCommandProcessor(cache=cache, probe=StaticProbe(snapshot))
+        self.assertIn("scale_vaapi", accelerated.prepare_command(command))
+        self.assertEqual(cache.misses, 3)
+
+        cache.clear()
+        self.assertEqual(processor.prepare_command(command), expected)
+        self.assertEqual((cache.hits, cache.misses), (2, 4))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import io
+import os
+import sys
+import stat
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+from pathlib import Path
+from core.cost_model import BenchmarkSample, CostModel, CostTable, benchmark_filters, explain
+from parsers.propagation import StreamInfo
+
+COMMAND = (
+    'ffmpeg -y -hwaccel cuda -threads 16 -i a.mp4 -i b.mp4 -filter_complex '
+    '"[1:v]scale=iw/2:ih/2,format=rgba,colorchannelmixer=aa=0.5,gblur=sigma=2[v2];'
+    '[0:v]scale=960:540[base];[base][v2]overlay[outv];[0:a]volume=0.5[aout]" '
+    '-map [outv] -map [aout] -c:v h264_nvenc -c:a aac out.mp4'
+)
+
+INPUTS = {
+    "0:v": StreamInfo("video", 1920, 1080, "yuv420p", 25.0),
+    "1:v": StreamInfo("video", 3840, 2160, "yuv420p", 25.0),
+}
+
+FAKE_FFMPEG = """#!{python}
+import sys
+graph = sys.argv[sys.argv.index("-vf") + 1]
+utime = {{"null": 0.5, "gblur=sigma=2": 1.5, "format=rgba": 0.7}}.get(graph, 0.6)
+sys.stderr.write("bench: utime=%.3fs stime=0.000s rtime=1.000s\\n" % utime)
+"""
+
+
+class TestCostModel(unittest.TestCase):
+    def test_hot_nodes_and_anti_patterns(self):
+        """测试按传递后的几何估算成本、热点排序与反模式提示"""
+        report = explain(COMMAND, INPUTS, table=CostTable())
+        self.assertEqual(report.assumed, ["0:a"])
+        hot = report.hot_nodes(2)
+        self.assertEqual([(n.chain_index, n.name) for n in hot], [(0, "gblur"), (0, "scale")])
+        gblur = hot[0]
+        self.assertEqual((gblur.input.width, gblur.input.pix_fmt), (1920, "rgba"))
+        self.assertEqual(gblur.units_per_second, 1920 * 1080 * 25)
+        self.assertEqual(gblur.conversions, 2)
+        self.assertEqual(report.nodes[1].conversions, 1)  # format=rgba 本身
+        self.assertEqual(report.conversions, 3)
+
+        rules = [w.details["rule"] for w in report.warnings]
+        self.assertEqual(rules, ["rgb-before-heavy", "threads-gpu-encoder"])
+        self.assertEqual(report.warnings[0].details["format_filter_index"], 1)
+        self.assertIn("rgb-before-heavy", report.format_text())
+
+    def test_no_warnings_for_yuv_graph(self):
+        """测试 YUV 滤镜图与 CPU 编码器不产生提示"""
+        report = explain('ffmpeg -threads 16 -i a.mp4 -filter_complex "[0:v]gblur=sigma=2,format=rgba[v]" '
+                         '-map [v] -c:v libx264 out.mp4', table=CostTable())
+        self.assertEqual(report.warnings, [])
+        self.assertGreater(report.total_cpu_seconds, 0)
+
+    def test_calibration_roundtrip(self):
+        """测试基准测试结果覆盖默认单价并持久化"""
+        table = CostTable().calibrate([
+            BenchmarkSample("gblur", 1e9, 2.0), BenchmarkSample("gblur", 1e9, 3.0), BenchmarkSample("gblur", 1e9, 10.0),
+            BenchmarkSample("format", 1e9, 0.5), BenchmarkSample("nothing", 0, 1.0),
+        ])
+        self.assertEqual(table.get("gblur").ns_per_unit, 3.0)
+        self.assertEqual(table.get("gblur").families, ("yuv", "gray"))
+        self.assertEqual(table.conversion_ns, 0.5)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = table.save(Path(tmp) / "costs.json")
+            loaded = CostTable.load(path)
+            self.assertEqual(loaded.get("gblur"), table.get("gblur"))
+            self.assertEqual(loaded.conversion_ns, 0.5)
+            self.assertEqual(CostTable.load(Path(tmp) / "missing.json").get("gblur").ns_per_unit, 6.0)
+        model = CostModel(table)
+        cost = model.node_cost(0, 0, "gblur", [INPUTS["0:v"]], [INPUTS["0:v"]])
+        self.assertAlmostEqual(cost.cpu_seconds, 3.0 * 1920 * 1080 * 25 / 1e9)
+
+    @unittest.skipIf(os.name == "nt", "伪 ffmpeg 脚本依赖 shebang")
+    def test_benchmark_filters(self):
+        """测试基准测试扣除 null 基线后得到净耗时"""
+        with tempfile.TemporaryDirectory() as tmp:
+            ffmpeg = Path(tmp) / "ffmpeg"
+            ffmpeg.write_text(FAKE_FFMPEG.format(python=sys.executable))
+            ffmpeg.chmod(ffmpeg.stat().st_mode | stat.S_IEXEC)
+            samples = benchmark_filters(["gblur"], str(ffmpeg), width=100, height=100, frames=10)
+        self.assertEqual([s.filter for s in samples], ["gblur", "format"])
+        self.assertAlmostEqual(samples[0].seconds, 1.0)
+        self.assertAlmostEqual(samples[1].seconds, 0.2)
+        self.assertEqual(samples[0].units, 100 * 100 * 10)
+
+
+    def test_loader_explain(self):
+        """测试 loader 的 explain 子命令：解析命令行参数后直接调用处理函数（不加载插件）"""
+        import loader
+        argv = ["loader.py", "explain",
+                "ffmpeg -i in.mp4 -filter_complex [0:v]format=rgba,gblur=sigma=2[v] -map [v] out.mp4"]
+        with mock.patch.object(sys, "argv", argv):
+            args = loader.parse_args()
+        with redirect_stdout(io.StringIO()) as output:
+            loader.execute_explain(args)
+        self.assertIn("热点滤镜", output.getvalue())
+        self.assertIn("rgb-before-heavy", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+from core.capability_index import CapabilityIndex
+from core.placement import DEVICE_PROFILES
+from hardware.equivalence import CATALOG, DEVICES, EquivalenceCatalog
+from hardware.nvidia import CUDAAccelerator
+from hardware.vaapi import VAAPIAccelerator
+from hardware.acceleration import AccelerationManager
+from parsers.filter_scanner import FilterScanner
+from parsers.graph_writer import format_filter
+
+
+def node(text):
+    return FilterScanner().parse(text).filter_chains[0].filters[0]
+
+
+def lower(catalog, text, device, pix_fmt=None):
+    translated = catalog.translate(node(text), device, pix_fmt)
+    return format_filter(translated) if translated is not None else None
+
+
+def fake_index(*filters):
+    data = {"filters": {name: ("V->V", "") for name in filters}, "encoders": {}, "decoders": {},
+            "hwaccels": (), "pix_fmts": {}}
+    return CapabilityIndex(data, ("ffmpeg", 0, 0))
+
+
+class TestEquivalenceCatalog(unittest.TestCase):
+    def test_parameter_and_value_translation(self):
+        """测试参数名、取值与固定参数的转换，无法表达的参数不转换"""
+        catalog = EquivalenceCatalog()
+        cases = [
+            ("scale=1280:720:flags=lanczos", "cuda", "scale_cuda=w=1280:h=720:interp_algo=lanczos"),
+            ("scale=w=1280:h=-2", "qsv", "scale_qsv=w=1280:h=-2"),
+            ("format=yuv420p", "cuda", "scale_cuda=format=yuv420p"),
+            ("crop=640:360:10:20", "qsv", "vpp_qsv=cw=640:ch=360:cx=10:cy=20"),
+            ("transpose=1", "qsv", "vpp_qsv=transpose=clock"),
+            ("hflip", "vaapi", "transpose_vaapi=dir=hflip"),
+            ("yadif=send_field", "vaapi", "deinterlace_vaapi=rate=field"),
+            ("yadif", "qsv", "deinterlace_qsv"),
+            ("pad=1920:1080:-1:-1:black", "vaapi", "pad_vaapi=width=1920:height=1080:x=-1:y=-1:color=black"),
+        ]
+        for text, device, expected in cases:
+            self.assertEqual(lower(catalog, text, device), expected, text)
+        for text, device in [("scale=1280:720:eval=frame", "cuda"), ("format=yuv410p", "cuda"),
+                             ("yadif=1", "qsv"), ("scale=1280:720:flags=spline", "vaapi"), ("eq=contrast=2", "cuda")]:
+            self.assertIsNone(lower(catalog, text, device), text)
+        # 设备滤镜不接受的帧格式
+        self.assertIsNone(lower(catalog, "overlay=10:10", "cuda", "yuv444p"))
+        self.assertEqual(lower(catalog, "overlay=10:10", "cuda", "nv12"), "overlay_cuda=x=10:y=10")
+
+    def test_checked_against_capability_index(self):
+        """测试只使用 ffmpeg 编译进来的设备滤镜，按优先顺序回退到其他实现"""
+        catalog = EquivalenceCatalog(index=fake_index("scale_npp", "overlay_cuda"))
+        self.assertEqual(lower(catalog, "scale=1280:720:flags=bicubic", "cuda"),
+                         "scale_npp=w=1280:h=720:interp_algo=cubic")
+        # scale_npp 不接受 RGB 帧
+        self.assertIsNone(lower(catalog, "scale=1280:720", "cuda", "bgra"))
+        self.assertIsNone(lower(catalog, "yadif", "cuda"))
+        self.assertEqual(catalog.coverage("cuda"), {"scale": ["scale_npp"], "overlay": ["overlay_cuda"]})
+        self.assertIn("yadif_cuda", {entry.name for entry in catalog.missing("cuda")})
+        self.assertFalse(any(entry.device != "cuda" for entry in catalog.missing("cuda")))
+
+    def test_catalog_consistency(self):
+        """测试目录中的设备都有放置配置，设备滤镜名称带设备后缀"""
+        self.assertEqual(set(DEVICES), set(DEVICE_PROFILES))
+        suffixes = {"cuda": ("_cuda", "_npp"), "qsv": ("_qsv",), "vaapi": ("_vaapi",)}
+        for entry in CATALOG:
+            self.assertIn(entry.device, DEVICES)
+            self.assertTrue(entry.name.endswith(suffixes[entry.device]), entry.name)
+            self.assertTrue(set(entry.values) <= set(entry.params), entry.name)
+
+    def test_accelerators_share_catalog(self):
+        """测试加速器通过目录转换字符串与字典形式的滤镜，没有等价实现时原样返回"""
+        cuda = CUDAAccelerator()
+        self.assertEqual(cuda.optimize_filter("scale=1280:720"), "scale_cuda=w=1280:h=720")
+        self.assertEqual(cuda.optimize_filter({"name": "format", "params": {"pix_fmt": "nv12"}}),
+                         {"name": "scale_cuda", "params": {"format": "nv12"}})
+        self.assertEqual(cuda.optimize_filter("qsv_scale=width=1280:height=720"), "qsv_scale=width=1280:height=720")
+        self.assertEqual(VAAPIAccelerator().optimize_filter("transpose=clock"), "transpose_vaapi=dir=clock")
+        # PRIORITY 中的每个设备都有加速器
+        self.assertEqual(set(AccelerationManager.PRIORITY), set(DEVICES))
+
+
+if __name__ == '__main__':
+    unittest.main()
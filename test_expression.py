@@ -0,0 +1,72 @@
+import unittest
+import numpy as np
+from core.error_types import FFmpegError
+from parsers.expression import compile_expression
+from parsers.lint_engine import LintEngine
+from parsers.lint_rules import ExpressionRangeRule, is_valid_dimension
+
+
+class EqRangeRule(ExpressionRangeRule):
+    duration = 10.0
+
+    @classmethod
+    def ranges(cls):
+        return {"eq": {"brightness": (-1.0, 1.0)}}
+
+
+class TestExpression(unittest.TestCase):
+    def test_constant_folding(self):
+        """测试常量折叠与恒等化简"""
+        self.assertEqual(compile_expression("0.0*PI/180").value, 0.0)
+        self.assertEqual(compile_expression("iw*1.0").simplified(), "iw")
+        self.assertEqual(compile_expression("(ih+0)/1").simplified(), "ih")
+        self.assertEqual(compile_expression("1K+2^10").value, 2024.0)
+        self.assertEqual(compile_expression("-2^2").value, -4.0)
+        self.assertEqual(compile_expression("a-(b-c)").simplified(), "a-(b-c)")
+        self.assertEqual(compile_expression("if(gt(3,2),iw,ih)").simplified(), "iw")
+        self.assertIs(compile_expression("iw/2"), compile_expression("iw/2"), "编译结果应被缓存")
+
+    def test_evaluate(self):
+        """测试标量与向量化求值"""
+        expression = compile_expression("if(between(t,1,2),sin(PI*t/2),0)")
+        self.assertEqual(expression.variables, frozenset({"t"}))
+        self.assertAlmostEqual(expression.evaluate(t=1), 1.0)
+        values = expression.evaluate(t=np.array([0.0, 1.0, 2.0, 3.0]))
+        np.testing.assert_allclose(values, [0.0, 1.0, 0.0, 0.0], atol=1e-12)
+        self.assertEqual(compile_expression("round(-2.5)+mod(-1,3)").value, -1.0)
+        samples = compile_expression("0.5*sin(2*PI*t)").sample(2.0, frame_rate=10)
+        self.assertEqual(samples.shape, (20,))
+        self.assertLessEqual(samples.max(), 0.5)
+
+        with self.assertRaises(FFmpegError):
+            compile_expression("st(0,t);ld(0)").evaluate(t=1)
+        with self.assertRaises(FFmpegError):
+            compile_expression("iw/2").evaluate()
+
+    def test_errors(self):
+        """测试语法错误与未知变量"""
+        for text in ("iw/", "(iw", "iw)", "foo(1)", "max(1)", ""):
+            with self.assertRaises(FFmpegError) as context:
+                compile_expression(text)
+            self.assertEqual(context.exception.error_type, "PARSER_ERROR")
+        with self.assertRaises(FFmpegError) as context:
+            compile_expression("iw*k", {"iw", "ih"})
+        self.assertEqual(context.exception.error_type, "INVALID_PARAM")
+        self.assertTrue(is_valid_dimension("trunc(iw/2)*2"))
+        self.assertFalse(is_valid_dimension("iw*k"))
+
+    def test_time_varying_range_rule(self):
+        """测试随时间变化的参数按整段时长检查范围"""
+        chains = [{"inputs": ["0:v"], "output": "out", "filters": [
+            {"name": "eq", "params": {"brightness": "0.5*sin(t)"}},
+            {"name": "eq", "params": {"brightness": "t/5"}},
+            {"name": "eq", "params": {"brightness": "t/"}},
+        ]}]
+        report = LintEngine([EqRangeRule()]).run({"streams": [{"id": "0:v"}], "filter_chains": chains})
+        self.assertEqual([e.details["filter_index"] for e in report.diagnostics], [1, 2])
+        self.assertIn("[0, 1.992]", report.diagnostics[0].message)
+        self.assertEqual(report.diagnostics[1].error_type, "PARSER_ERROR")
+
+
+if __name__ == '__main__':
+    unittest.main()
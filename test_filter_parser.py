@@ -0,0 +1,227 @@
+import io
+import mmap
+import pickle
+import tempfile
+import unittest
+from core.command_processor import _FLAG_OPTIONS
+from core.cost_model import parse_command_text
+from core.error_types import FFmpegError
+from parsers.filter_parser import FilterParser
+from parsers.grammar_parser import GrammarParser
+from parsers.graph_writer import format_command, format_graph
+from parsers.incremental_parser import IncrementalParser
+from parsers.stream_parser import StreamingFilterParser, StreamValidator
+from parsers.parser_models import ParsedCommand
+from parsers.token_stream import tokenize, TOKEN_NAMES
+
+
+class TestFilterParser(unittest.TestCase):
+    def test_filter_parser_chains(self):
+        """测试滤镜链按 ';' 与 ',' 切分"""
+        parsed = FilterParser().parse(
+            "[1:v]scale=iw/2:ih/2,colorbalance=rs=0:gs=0.1,format=rgba[v2]; "
+            "[0:v][v2]hstack[outv];[0:a]asplit=2[a1][a2];"
+        )
+        self.assertEqual(len(parsed.filter_chains), 3)
+
+        first = parsed.filter_chains[0]
+        self.assertEqual(first.inputs, ("1:v",))
+        self.assertEqual(first.output, "v2")
+        self.assertEqual(first.to_dict()["filters"], [
+            {"name": "scale", "params": {"width": "iw/2", "height": "ih/2"}},
+            {"name": "colorbalance", "params": {"rs": "0", "gs": "0.1"}},
+            {"name": "format", "params": {"pix_fmt": "rgba"}}
+        ])
+        self.assertEqual(parsed.filter_chains[1].inputs, ("0:v", "v2"))
+        self.assertEqual(parsed.filter_chains[2].outputs, ("a1", "a2"))
+
+    def test_filter_parser_quoted_params(self):
+        """测试带引号和转义的参数"""
+        parsed = FilterParser().parse("[0:v]drawtext=text='a:b,c':x=10[out]")
+        self.assertEqual(parsed.filter_chains[0].filters[0]["params"], {"text": "a:b,c", "x": "10"})
+
+    def test_filter_parser_unclosed_label(self):
+        """测试未闭合的流标签"""
+        with self.assertRaises(FFmpegError):
+            FilterParser().parse("[0:vscale=1280:720[out]")
+        with self.assertRaises(FFmpegError):
+            FilterParser().parse("[0:v]scale=1280:720[out")
+
+    def test_lalr_mode_matches_scanner(self):
+        """测试 LALR 语法解析模式与手写扫描器结果一致"""
+        graph = "[0:v]scale=iw/2:ih/2,format=yuv420p[a];[a][1:v]overlay=x=10:y=20[out]"
+        self.assertEqual(FilterParser(mode="lalr").parse(graph), FilterParser().parse(graph))
+        with self.assertRaises(FFmpegError):
+            FilterParser(mode="lalr").parse("[0:v]scale=1280:720[out")
+        # 三种模式都不允许名称与 '=' 之间有空白
+        for mode in ("scanner", "tokens", "lalr"):
+            with self.assertRaises(FFmpegError, msg=mode):
+                FilterParser(mode=mode).parse("[0:v]scale = 640:360[v]")
+
+    def test_mid_chain_labels(self):
+        """测试链中间的标签记录在所属滤镜上，三种模式一致，写回时留在原位"""
+        graph = "[0:v]scale=width=640:height=360,[1:v]overlay=x=10:y=10[o];[0:a]asplit[a1],volume=volume=2[a2]"
+        parsed = FilterParser().parse(graph)
+        for mode in ("tokens", "lalr"):
+            self.assertEqual(FilterParser(mode=mode).parse(graph), parsed, mode)
+        video, audio = parsed.filter_chains
+        self.assertEqual((video.inputs, video.outputs), (("0:v", "1:v"), ("o",)))
+        self.assertEqual([(f.inputs, f.outputs) for f in video.filters], [((), ()), (("1:v",), ())])
+        self.assertEqual((audio.outputs, audio.filters[0].outputs), (("a1", "a2"), ("a1",)))
+        self.assertEqual(format_graph(parsed.filter_chains), graph)
+
+    def test_lalr_command_options(self):
+        """测试命令语法：带引号的标签、不带值的开关与输入选项"""
+        parser = GrammarParser()
+        parsed = parser.parse_command(
+            'ffmpeg -hide_banner -ss 5 -i a.mp4 -filter_complex "[0:v]scale=640:360[v]" '
+            '-map "[v]" -map 0:a -an -shortest -c:v libx264 out.mp4'
+        )
+        self.assertEqual(parsed.global_options, {"hide_banner": True})
+        self.assertEqual(parsed.inputs, [{"path": "a.mp4", "options": {"-ss": "5"}}])
+        self.assertEqual(parsed.outputs, [{
+            "file": "out.mp4", "maps": ["v", "0:a"],
+            "options": {"-an": True, "-shortest": True, "-c:v": "libx264"}
+        }])
+        self.assertEqual(parser.parse_command(format_command(parsed)), parsed)
+        # 处理器的开关选项在语法中同样不带值
+        for flag in _FLAG_OPTIONS:
+            command = parser.parse_command(f"ffmpeg -i a.mp4 {flag} out.mp4")
+            self.assertEqual([output["file"] for output in command.outputs], ["out.mp4"], flag)
+        with self.assertRaises(FFmpegError):
+            parser.parse_command("ffmpeg -i a.mp4 out.mp4 -c:v libx264")
+
+    def test_lalr_dash_values(self):
+        """测试选项值可以以 - 开头：负数、否定的 -map、标准输入与标准输出"""
+        parser = GrammarParser()
+        parsed = parser.parse_command("ffmpeg -i in.mp4 -f null -")
+        self.assertEqual(parsed.outputs, [{"file": "-", "maps": [], "options": {"-f": "null"}}])
+        parsed = parser.parse_command("ffmpeg -itsoffset -1 -i in.mp4 -c copy out.mp4")
+        self.assertEqual(parsed.inputs, [{"path": "in.mp4", "options": {"-itsoffset": "-1"}}])
+        parsed = parser.parse_command("ffmpeg -i - -map 0 -map -0:a -map_metadata -1 out.mp4")
+        self.assertEqual(parsed.inputs[0]["path"], "-")
+        self.assertEqual(parsed.outputs[0]["maps"], ["0", "-0:a"])
+        self.assertEqual(parsed.outputs[0]["options"], {"-map_metadata": "-1"})
+        for command in ("ffmpeg -i in.mp4 -f null -", "ffmpeg -itsoffset -1 -i in.mp4 -c copy out.mp4",
+                        "ffmpeg -i in.mp4 -map_metadata -1 out.mp4"):
+            self.assertEqual(format_command(parse_command_text(command)), command)
+        self.assertEqual(format_command(parser.parse_command("ffmpeg -i a.mp4 -map -0:a out.mp4")),
+                         "ffmpeg -i a.mp4 -map -0:a out.mp4")
+        # 选项名不会被当作上一个选项的值
+        for command in ("ffmpeg -i a.mp4 -unknown -i b.mp4 out.mp4", "ffmpeg -i a.mp4 -1"):
+            with self.assertRaises(FFmpegError, msg=command):
+                parser.parse_command(command)
+
+    def test_incremental_reparse(self):
+        """测试增量解析只重新处理改动的滤镜链及其下游"""
+        chains = [
+            "[0:v]scale=iw/2:ih/2[a]",
+            "[a]eq=contrast=1.1[b]",
+            "[b][1:v]overlay[out]",
+            "[1:a]volume=1.0[aout]"
+        ]
+        parser = IncrementalParser()
+        first = parser.update(";".join(chains))
+        self.assertEqual(parser.stats, {"reused": 0, "reparsed": 4, "revalidated": 4})
+
+        chains[1] = "[a]eq=contrast=1.2[b]"
+        second = parser.update(";".join(chains))
+        self.assertEqual(parser.stats["reparsed"], 5)
+        # 改动链 + 下游 overlay 链
+        self.assertEqual(parser.stats["revalidated"], 6)
+        self.assertIs(second.filter_chains[0], first.filter_chains[0])
+        self.assertIs(second.filter_chains[3], first.filter_chains[3])
+        self.assertEqual(second, FilterParser().parse(";".join(chains)))
+
+        chains[0] = "[0:v]scale=iw/2:ih/2[x]"
+        parser.update(";".join(chains))
+        self.assertEqual([e.message for e in parser.errors], ["未定义的输入流: a"])
+
+    def test_incremental_cycle(self):
+        """测试增量解析在形成环时报告环上的每条链，断开后不再报告"""
+        chains = ["[0:v]null[a]", "[a]null[b]", "[b]null[c]"]
+        parser = IncrementalParser()
+        parser.update(";".join(chains))
+        self.assertEqual(parser.errors, [])
+        parser.update(";".join(chains + ["[c]null[a]"]))
+        self.assertEqual([e.message for e in parser.errors],
+                         ["重复的输出标签: a"] + ["检测到流标签循环依赖"] * 2 + ["重复的输出标签: a", "检测到流标签循环依赖"])
+        parser.update(";".join(chains))
+        self.assertEqual(parser.errors, [])
+        parser.update("[a]null[b];[b]null[a]")
+        self.assertEqual([e.message for e in parser.errors], ["检测到流标签循环依赖"] * 2)
+        parser.update("[x]null[x]")
+        self.assertEqual([e.message for e in parser.errors], ["检测到流标签循环依赖"])
+
+    def test_streaming_parser_chunk_boundaries(self):
+        """测试流式解析在任意分块位置下与整体解析一致"""
+        graph = (
+            "[0:v]scale=iw/2:ih/2[a];[a]drawtext=text='x;y':fontsize=12[b];"
+            "[b][1:v]overlay=10:10[out];[1:a]volume=0.5[aout]"
+        )
+        expected = FilterParser().parse(graph).filter_chains
+        for chunk_size in (1, 3, 16, 4096):
+            chains = list(StreamingFilterParser(chunk_size).iter_chains(io.StringIO(graph)))
+            self.assertEqual(chains, expected, f"分块大小 {chunk_size}")
+
+    def test_stream_validator(self):
+        """测试流式验证（允许先使用后定义）"""
+        parser = StreamingFilterParser(8)
+        validator = StreamValidator()
+        graph = "[b]null[out];[0:v]scale=iw/2:ih/2[b]"
+        chains = list(validator.validate(parser.iter_chains(io.StringIO(graph))))
+        self.assertEqual(len(chains), 2)
+        self.assertEqual(validator.finish(), ["out"])
+
+        with self.assertRaises(FFmpegError):
+            list(StreamValidator().validate(parser.iter_chains(io.StringIO("[x]null[out]"))))
+        with self.assertRaises(FFmpegError):
+            list(StreamValidator().validate(parser.iter_chains(io.StringIO("[0:v]null[a];[1:v]null[a]"))))
+
+    def test_compact_models(self):
+        """测试紧凑模型：不可变、参数名共享、字典往返兼容"""
+        parsed = FilterParser().parse("[0:v]scale=640:360[a];[1:v]scale=1280:720,format=yuv420p[b]")
+        first, second = parsed.filter_chains
+        self.assertIs(first.filters[0].param_keys, second.filters[0].param_keys)
+        self.assertFalse(hasattr(first.filters[0], "__dict__"))
+        self.assertEqual(second.filters[0].get("width"), "1280")
+        with self.assertRaises(AttributeError):
+            first.output = "c"
+
+        data = parsed.to_dict()
+        self.assertEqual(data["filter_chains"][0], {
+            "inputs": ["0:v"], "output": "a",
+            "filters": [{"name": "scale", "params": {"width": "640", "height": "360"}}],
+            "outputs": ["a"]
+        })
+        self.assertEqual(ParsedCommand.from_dict(data), parsed)
+        self.assertEqual(pickle.loads(pickle.dumps(parsed)), parsed)
+
+    def test_token_stream_offsets(self):
+        """测试偏移量 token 流：str/bytes/mmap 结果一致，错误带行列号"""
+        graph = "[0:v]scale=iw/2:ih/2[a];\n[a][1:v]overlay=x=10:y=20[out]"
+        expected = FilterParser().parse(graph)
+        parser = FilterParser(mode="tokens")
+        self.assertEqual(parser.parse(graph), expected)
+        self.assertEqual(parser.parse(graph.encode()), expected)
+
+        with tempfile.TemporaryFile() as f:
+            f.write(graph.encode())
+            f.flush()
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                self.assertEqual(parser.parse(view), expected)
+                view.release()
+
+        stream = tokenize(graph.encode())
+        self.assertEqual(TOKEN_NAMES[stream.kinds[1]], "NAME")
+        self.assertEqual(stream.text(2), "iw/2:ih/2")
+        self.assertEqual([f.name for f in stream.filters()], ["scale", "overlay"])
+
+        with self.assertRaises(FFmpegError) as ctx:
+            parser.parse(b"[0:v]scale=1:1[a];\n[a]overlay[out")
+        self.assertEqual((ctx.exception.details["line"], ctx.exception.details["column"]), (2, 11))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from core.filter_schema import (
+    FilterSchema, SchemaIndex, parse_filter_help, write_schema_index,
+    generate_schema_index, load_schema_index
+)
+
+SCALE_HELP = """Filter scale
+  Scale the input video size and/or convert the image format.
+    Inputs:
+       #0: default (video)
+    Outputs:
+       #0: default (video)
+scale AVOptions:
+  w                 <string>     ..FV.....T. Output video width
+  width             <string>     ..FV.....T. Output video width
+  h                 <string>     ..FV.....T. Output video height
+  height            <string>     ..FV.....T. Output video height
+  flags             <string>     ..FV....... Flags to pass to libswscale (default "")
+  interl            <boolean>    ..FV....... set interlacing (default false)
+  in_range          <int>        ..FV....... set input color range (from 0 to 2) (default auto)
+     auto            0            ..FV.......
+     jpeg            2            ..FV.......
+     mpeg            1            ..FV.......
+  force_divisible_by <int>        ..FV....... enforce that the output resolution is divisible by a defined integer (from 1 to 256) (default 1)
+  eval              <int>        ..FV....... specify when to evaluate expressions (from 0 to 1) (default init)
+     init            0            ..FV....... eval expressions once during initialization
+     frame           1            ..FV....... eval expressions during initialization and per-frame
+
+"""
+
+EQ_HELP = """Filter eq
+  Adjust brightness, contrast, gamma, and saturation.
+eq AVOptions:
+  contrast          <string>     ..FV.....T. set the contrast adjustment, negative values give a negative image (default "1.0")
+  brightness        <string>     ..FV.....T. set the brightness adjustment (default "0.0")
+  gamma_weight      <double>     ..FV......T set the gamma weight (from 0 to 1) (default 1)
+
+This filter has support for timeline through the 'enable' option.
+"""
+
+FAKE_OUTPUTS = {
+    "-filters": " ..C scale             V->V       Scale the input video size.\n"
+                " T.C eq                V->V       Adjust brightness.\n",
+    "filter=scale": SCALE_HELP,
+    "filter=eq": EQ_HELP,
+}
+
+FAKE_FFMPEG = """#!{python}
+import sys
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+outputs = {outputs!r}
+print(outputs.get(sys.argv[-1], ""))
+"""
+
+
+class TestFilterSchema(unittest.TestCase):
+    def test_parse_help(self):
+        """测试解析选项类型、范围、默认值、别名与常量"""
+        schema = parse_filter_help(SCALE_HELP)
+        self.assertEqual(schema.name, "scale")
+        self.assertFalse(schema.timeline)
+        self.assertEqual([o.name for o in schema.options],
+                         ["w", "h", "flags", "interl", "in_range", "force_divisible_by", "eval"])
+        self.assertIs(schema.option("width"), schema.option("w"))
+        self.assertEqual(schema.option("width").aliases, ("width",))
+        divisible = schema.option("force_divisible_by")
+        self.assertEqual((divisible.type, divisible.minimum, divisible.maximum, divisible.default),
+                         ("int", 1, 256, "1"))
+        self.assertEqual(schema.option("eval").constants, ("init", "frame"))
+        self.assertEqual(schema.option("flags").default, "")
+        self.assertTrue(parse_filter_help(EQ_HELP).timeline)
+
+    def test_validate_params(self):
+        """测试按选项描述验证参数，数字键按位置对应选项"""
+        schema = parse_filter_help(SCALE_HELP)
+        self.assertEqual(schema.validate_params({"0": "1280", "1": "-1", "eval": "frame", "interl": "1"}), [])
+        errors = schema.validate_params({"force_divisible_by": "512", "eval": "never", "colour": "red"})
+        self.assertEqual([e.details["param"] for e in errors], ["force_divisible_by", "eval", "colour"])
+        self.assertTrue(all(e.error_type == "INVALID_PARAM" for e in errors))
+        self.assertEqual(parse_filter_help(EQ_HELP).validate_params({"enable": "between(t,1,2)"}), [])
+
+    def test_index_lazy_lookup(self):
+        """测试二进制索引按名称二分查找并逐个解码"""
+        schemas = [parse_filter_help(SCALE_HELP), parse_filter_help(EQ_HELP)]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "filters.schema"
+            write_schema_index(path, schemas)
+            index = SchemaIndex(path)
+            self.assertEqual(len(index), 2)
+            self.assertEqual(index.names(), ["eq", "scale"])
+            self.assertEqual(index._decoded, {})
+            self.assertEqual(index.get("scale"), schemas[0])
+            self.assertEqual(list(index._decoded), ["scale"])
+            self.assertIsNone(index.get("missing"))
+            self.assertNotIn("missing", index)
+            self.assertIsInstance(index.get("eq"), FilterSchema)
+            index.close()
+
+    @unittest.skipIf(os.name == "nt", "伪 ffmpeg 脚本依赖 shebang")
+    def test_generate_from_binary(self):
+        """测试从 ffmpeg 生成索引，之后按可执行文件指纹直接加载"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            log = root / "calls.log"
+            binary = root / "ffmpeg"
+            binary.write_text(FAKE_FFMPEG.format(python=sys.executable, log=str(log), outputs=FAKE_OUTPUTS))
+            binary.chmod(binary.stat().st_mode | stat.S_IEXEC)
+            os.environ["FFMPEG_ANALYZER_CACHE_DIR"] = str(root / "cache")
+            try:
+                self.assertIsNone(load_schema_index(str(binary), root / "schemas"))
+                generate_schema_index(str(binary), root / "schemas", workers=2)
+                calls = log.read_text().splitlines()
+                self.assertIn("-hide_banner -h filter=eq", calls)
+                index = load_schema_index(str(binary), root / "schemas")
+                self.assertEqual(index.names(), ["eq", "scale"])
+                self.assertTrue(index.get("eq").timeline)
+                self.assertEqual(len(log.read_text().splitlines()), len(calls))
+                index.close()
+            finally:
+                del os.environ["FFMPEG_ANALYZER_CACHE_DIR"]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,319 @@
+import io
+import sys
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from unittest import mock
+from core.command_processor import FFmpegCommandProcessor
+from core.cost_model import CostModel, CostTable
+from core.graph_optimizer import GraphOptimizer, optimize_graph
+from parsers.grammar_parser import GrammarParser
+from parsers.graph_writer import format_command, format_graph
+from parsers.propagation import StreamInfo
+
+# main.py 中的示例命令
+SAMPLE = (
+    'ffmpeg -y -hwaccel cuda -threads 16 -i 2.mp4 -i b.mp4 -filter_complex '
+    '"[1:v]scale=iw*1.0:ih*1.0,rotate=0.0*PI/180,colorbalance=rs=0:gs=0:bs=0,gblur=sigma=0.0,'
+    'eq=brightness=0.0:contrast=1.0,format=rgba,colorchannelmixer=aa=1.0[v2];'
+    '[0:v]scale=iw/2:ih/2[base1];[v2]scale=iw/2:ih/2[base2];[base1][base2]hstack[outv];'
+    '[1:a]volume=1.0[a1];[0:a][a1]amix=inputs=2[aout]" '
+    '-map [outv] -map [aout] -c:v libx264 -preset medium -crf 18 -c:a aac -b:a 192k out.mp4'
+)
+
+YUV_1080P = StreamInfo("video", 1920, 1080, "yuv420p", 25.0)
+
+
+def graph_of(result):
+    return format_graph(result.command.filter_chains)
+
+
+class TestGraphOptimizer(unittest.TestCase):
+    def test_sample_identities_removed(self):
+        """测试 main.py 示例中的恒等滤镜被删除，命令保持等价且成本下降"""
+        parsed = GrammarParser().parse_command(SAMPLE)
+        result = optimize_graph(parsed)
+        self.assertEqual(
+            [f.split("=")[0] for f in result.removed],
+            ["scale", "rotate", "colorbalance", "gblur", "eq", "colorchannelmixer", "volume"]
+        )
+        self.assertEqual(
+            graph_of(result),
+            "[1:v]scale=width=iw/2:height=ih/2,format=rgba[base2];[0:v]scale=width=iw/2:height=ih/2[base1];"
+            "[base1][base2]hstack[outv];[0:a][1:a]amix=inputs=2[aout]"
+        )
+        self.assertEqual(result.command.outputs, parsed.outputs)
+        self.assertEqual(result.command.global_options, parsed.global_options)
+
+        model = CostModel(CostTable())
+        self.assertLess(model.explain(result.command).total_cpu_seconds,
+                        model.explain(parsed).total_cpu_seconds / 2)
+        # 输出的命令可以重新解析，再次优化没有改动
+        reparsed = GrammarParser().parse_command(format_command(result.command))
+        self.assertEqual(reparsed.filter_chains, result.command.filter_chains)
+        self.assertFalse(optimize_graph(reparsed).changed)
+
+    def test_mid_chain_labels_kept(self):
+        """测试链中间有标签的滤镜链不被改写，写回时标签留在所属滤镜前"""
+        command = ('ffmpeg -i a.mp4 -i b.mp4 -filter_complex '
+                   '"[0:v]scale=iw:ih,scale=640:360,[1:v]overlay=10:10[o]" -map [o] out.mp4')
+        result = optimize_graph(command)
+        self.assertFalse(result.changed)
+        self.assertEqual(graph_of(result),
+                         "[0:v]scale=width=iw:height=ih,scale=width=640:height=360,[1:v]overlay=x=10:y=10[o]")
+        self.assertEqual(GrammarParser().parse_command(format_command(result.command)).filter_chains,
+                         result.command.filter_chains)
+
+    def test_scale_and_format_fusion(self):
+        """测试相邻 scale 合并、无损的中间格式转换被删除"""
+        result = optimize_graph(
+            'ffmpeg -i a.mp4 -filter_complex "[0:v]scale=iw/2:ih/2:flags=lanczos,scale=iw/2:-2,'
+            'scale=iw/2:ih/2,scale=iw/3:ih/3,format=rgba,format=yuv420p,format=gray,format=rgba[v]" -map [v] out.mp4'
+        )
+        self.assertEqual(
+            graph_of(result),
+            "[0:v]scale=width=iw/2:height=ih/2:flags=lanczos,scale=width=iw/2:height=-2,"
+            "scale=width=iw/6:height=ih/6,format=gray,format=rgba[v]"
+        )
+        # 先转 rgba、yuv420p 再转 gray 与直接转 gray 相同；gray 丢失色度，不能省略
+        self.assertEqual(result.removed, ["format=rgba", "format=yuv420p"])
+        self.assertEqual(len(result.by_pass("fuse-scale")), 1)
+
+    def test_scale_fusion_rounding(self):
+        """测试 scale 合并折叠常量，只在逐级截断为整数的结果不变时合并"""
+        cases = {
+            "scale=1280:720,scale=iw/3:ih/2": "scale=width=426:height=360",
+            "scale=1280.7:720,scale=iw*2:ih": "scale=width=2560:height=720",
+            "scale=640:360,scale=ih*16/9:ih": "scale=width=640:height=360",
+            "scale=iw*2:ih*2,scale=iw*3/4:ih/3": "scale=width=iw*3/2:height=ih*2/3",
+            "scale=iw*0.5:ih/2,scale=iw/2:ih/3": "scale=width=iw/4:height=ih/6",
+            # iw/2 可能不是整数：floor(floor(iw/2)*2) 与 iw 不同
+            "scale=iw/2:ih/2,scale=iw*2:ih*2": None,
+            "scale=iw/2:ih/2,scale=ih*16/9:ih": None,
+        }
+        for graph, expected in cases.items():
+            result = optimize_graph(f"[0:v]{graph}[v]", select=["fuse-scale"])
+            self.assertEqual(result.changed, expected is not None, graph)
+            if expected:
+                self.assertEqual(graph_of(result), f"[0:v]{expected}[v]")
+
+    def test_geometry_aware_identities(self):
+        """测试结合输入属性判断恒等：与输入同尺寸的 scale、与输入同格式的 format"""
+        command = GrammarParser().parse_command(
+            'ffmpeg -i a.mp4 -filter_complex "[0:v]scale=1920:1080,format=yuv420p[v];[v]split[x][y]" '
+            '-map [x] -map [y] out.mp4'
+        )
+        self.assertEqual(graph_of(optimize_graph(command)),
+                         "[0:v]scale=width=1920:height=1080,format=yuv420p,split[x][y]")
+        result = GraphOptimizer().optimize(command, {"0:v": YUV_1080P})
+        self.assertEqual(graph_of(result), "[0:v]split[x][y]")
+
+    def test_unspliceable_chain_keeps_null(self):
+        """测试无法删除的空链保留为 null，选择优化遍与再次运行不再改动"""
+        command = GrammarParser().parse_command(
+            'ffmpeg -i a.mp4 -filter_complex "[0:v]rotate=0[a];[a][0:v]hstack[v]" -map [v] out.mp4'
+        )
+        result = optimize_graph(command, select=["identity"])
+        self.assertEqual(graph_of(result), "[0:v][0:v]hstack[v]")
+
+        only_filter = GrammarParser().parse_command(
+            'ffmpeg -i a.mp4 -filter_complex "[in]eq=contrast=1[v]" -map [v] out.mp4'
+        )
+        result = optimize_graph(only_filter)
+        self.assertEqual(graph_of(result), "[in]null[v]")
+        self.assertFalse(optimize_graph(result.command).changed)
+
+    def test_loader_optimize(self):
+        """测试 loader 的 optimize 子命令：解析命令行参数后直接调用处理函数（不加载插件）"""
+        import loader
+        command = ('ffmpeg -hide_banner -ss 5 -i in.mp4 -filter_complex "[0:v]rotate=0,eq=contrast=1,hflip[v]" '
+                   '-map "[v]" -an out.mp4')
+        for extra, expected in ((["--pass", "identity"], "[0:v]hflip[v]"), ([], "[0:v]hflip[v]")):
+            with mock.patch.object(sys, "argv", ["loader.py", "optimize", *extra, command]):
+                args = loader.parse_args()
+            with redirect_stdout(io.StringIO()) as output, redirect_stderr(io.StringIO()):
+                loader.execute_optimize(args)
+            self.assertIn(f'ffmpeg -hide_banner -ss 5 -i in.mp4 -filter_complex "{expected}" -map \'[v]\' -an out.mp4',
+                          output.getvalue().splitlines())
+
+
+
+class TestReorderPass(unittest.TestCase):
+    OPTIONS = {"reorder": {"table": CostTable()}}
+
+    def optimize(self, graph, tolerance=None, inputs=None):
+        options = {"reorder": dict(self.OPTIONS["reorder"])}
+        if tolerance is not None:
+            options["reorder"]["tolerance"] = tolerance
+        command = f'ffmpeg -i a.mp4 -filter_complex "{graph}" -map [v] out.mp4'
+        return optimize_graph(command, inputs, options=options)
+
+    def test_downscale_moves_before_per_pixel_filters(self):
+        """测试缩小移到调色与模糊之前，gblur 的 sigma 按比例缩小，成本下降"""
+        graph = "[0:v]colorbalance=rs=0.1,gblur=sigma=2,eq=contrast=1.2,format=rgba[v2];[v2]scale=iw/2:ih/2[v]"
+        result = self.optimize(graph)
+        self.assertEqual(graph_of(result),
+                         "[0:v]scale=width=iw/2:height=ih/2,colorbalance=rs=0.1,gblur=sigma=1,"
+                         "eq=contrast=1.2,format=rgba[v]")
+        self.assertEqual(len(result.by_pass("reorder")), 4)
+        model = CostModel(CostTable())
+        before = GrammarParser().parse_command(f'ffmpeg -i a.mp4 -filter_complex "{graph}" -map [v] out.mp4')
+        self.assertLess(model.explain(result.command).total_cpu_seconds,
+                        model.explain(before).total_cpu_seconds / 2)
+        self.assertFalse(optimize_graph(result.command, options=self.OPTIONS).changed)
+
+    def test_tolerance_blocks_lossy_swaps(self):
+        """测试超过画质容差的滤镜（降噪、模糊）挡住缩放"""
+        result = self.optimize("[0:v]eq=contrast=1.2,hqdn3d,scale=iw/2:ih/2[v]")
+        self.assertEqual(graph_of(result), "[0:v]eq=contrast=1.2,hqdn3d,scale=width=iw/2:height=ih/2[v]")
+        result = self.optimize("[0:v]eq=contrast=1.2,hqdn3d,scale=iw/2:ih/2[v]", tolerance=0.5)
+        self.assertEqual(graph_of(result), "[0:v]scale=width=iw/2:height=ih/2,eq=contrast=1.2,hqdn3d[v]")
+        result = self.optimize("[0:v]eq=contrast=1.2,gblur=sigma=2,scale=iw/2:ih/2[v]", tolerance=0)
+        self.assertEqual(graph_of(result), "[0:v]eq=contrast=1.2,gblur=sigma=2,scale=width=iw/2:height=ih/2[v]")
+
+    def test_upscale_and_position_dependent_filters_stay(self):
+        """测试放大不前移、裁剪不越过旋转、非等比缩放不越过模糊"""
+        result = self.optimize("[0:v]eq=contrast=1.2,scale=iw*2:ih*2[v]")
+        self.assertFalse(result.changed)
+        result = self.optimize("[0:v]rotate=0.3,eq=contrast=1.2,crop=640:360[v]")
+        self.assertEqual(graph_of(result), "[0:v]rotate=angle=0.3,crop=w=640:h=360,eq=contrast=1.2[v]")
+        result = self.optimize("[0:v]gblur=sigma=2,scale=iw/2:ih/4[v]")
+        self.assertFalse(result.changed)
+        # 固定输出尺寸在输入尺寸已知时可以算出比例
+        result = self.optimize("[0:v]gblur=sigma=3,scale=640:360[v]", inputs={"0:v": YUV_1080P})
+        self.assertEqual(graph_of(result), "[0:v]scale=width=640:height=360,gblur=sigma=1[v]")
+
+    def test_size_dependent_parameters(self):
+        """测试位置参数写法的 boxblur 半径按比例缩小，引用画面尺寸或带未识别参数的滤镜不交换"""
+        result = self.optimize("[0:v]boxblur=10:1,scale=iw/2:ih/2[v]", tolerance=0.1)
+        self.assertEqual(graph_of(result),
+                         "[0:v]scale=width=iw/2:height=ih/2,boxblur=luma_radius=5:luma_power=1[v]")
+        result = self.optimize("[0:v]boxblur=lr=8:cr=4:ar=2,scale=iw/2:ih/2[v]")
+        self.assertEqual(graph_of(result), "[0:v]scale=width=iw/2:height=ih/2,boxblur=lr=4:cr=2:ar=1[v]")
+        for graph in ("[0:v]boxblur=luma_radius=2:unknown=1,scale=iw/2:ih/2[v]",
+                      "[0:v]gblur=2:6,scale=iw/2:ih/2[v]",
+                      "[0:v]lut=y=val*w/1920,scale=iw/2:ih/2[v]",
+                      "[0:v]lutrgb=r='if(gt(X\\,w/2)\\,val\\,0)',crop=640:360[v]",
+                      "[0:v]rotate=PI*iw/1920,scale=iw/2:ih/2[v]"):
+            self.assertFalse(self.optimize(graph).by_pass("reorder"), graph)
+        result = self.optimize("[0:v]lut=y=negval,scale=iw/2:ih/2[v]")
+        self.assertEqual(graph_of(result), "[0:v]scale=width=iw/2:height=ih/2,lut=y=negval[v]")
+
+
+
+class TestCommonSubgraphPass(unittest.TestCase):
+    def test_shared_prefix_uses_split(self):
+        """测试对同一输入的相同处理只计算一次，经 split/asplit 分发，成本下降"""
+        parsed = GrammarParser().parse_command(
+            'ffmpeg -i a.mp4 -filter_complex "[0:v]scale=1280:720,eq=contrast=1.2[main];'
+            '[0:v]scale=1280:720,scale=320:180[prev];[0:v]scale=1280:720[copy];'
+            '[0:a]volume=2[a1];[0:a]volume=2[a2]" '
+            '-map [main] -map [a1] main.mp4 -map [prev] -map [a2] prev.mp4 -map [copy] copy.mp4'
+        )
+        result = optimize_graph(parsed)
+        self.assertEqual(
+            graph_of(result),
+            "[0:v]scale=width=1280:height=720,split=outputs=3[t0][t1][copy];[t0]eq=contrast=1.2[main];"
+            "[t1]scale=width=320:height=180[prev];[0:a]volume=volume=2,asplit[a1][a2]"
+        )
+        self.assertEqual([change.action for change in result.by_pass("cse")], ["share", "share"])
+        self.assertEqual(result.command.outputs, parsed.outputs)
+        model = CostModel(CostTable())
+        self.assertLess(model.explain(result.command).total_cpu_seconds,
+                        model.explain(parsed).total_cpu_seconds * 0.7)
+        reparsed = GrammarParser().parse_command(format_command(result.command))
+        self.assertEqual(reparsed.filter_chains, result.command.filter_chains)
+        self.assertFalse(optimize_graph(reparsed).changed)
+
+    def test_unshareable_chains_kept(self):
+        """测试参数不同、随机滤镜、无输入标签、链中间有标签与多输出链尾不合并"""
+        for graph in (
+            "[0:v]scale=1280:720[a];[0:v]scale=1280:722[b]",
+            "[0:v]random,hflip[a];[0:v]random,hflip[b]",
+            "hflip[a];hflip[b]",
+            "[0:v]scale=640:360,[1:v]overlay[a];[0:v]scale=640:360,[1:v]hstack[b]",
+            "[0:v]split[x],hflip[a];[0:v]split[y],hflip[b]",
+            "[0:v]hflip,split[a][b];[0:v]hflip,split[c][d]",
+        ):
+            result = optimize_graph(f'ffmpeg -i a.mp4 -filter_complex "{graph}" out.mp4', select=["cse"])
+            if graph.endswith("[c][d]"):
+                # 只共用 hflip，两个 split 保留
+                self.assertEqual(graph_of(result), "[0:v]hflip,split[t0][t1];[t0]split[a][b];[t1]split[c][d]")
+            else:
+                self.assertFalse(result.changed, graph)
+
+
+
+DEAD_BRANCHES = (
+    'ffmpeg -i a.mp4 -i unused.mp4 -i c.mp4 -filter_complex '
+    '"[0:v]split=3[a][b][c];[a]scale=640:360[small];[b]hflip[dead];[dead]eq=gamma=2[dead2];'
+    '[2:a]volume=2[aud];[1:v]hflip[x]" -map [small] -map [c] -map [aud] -map_metadata 2 out.mp4'
+)
+
+
+class TestDeadBranchPass(unittest.TestCase):
+    def test_unmapped_chains_and_inputs_removed(self):
+        """测试删除 -map 不可达的滤镜链、split 多余输出与未使用的输入，之后的输入重新编号"""
+        result = optimize_graph(DEAD_BRANCHES, select=["dead-branches"])
+        self.assertEqual(
+            format_command(result.command),
+            'ffmpeg -i a.mp4 -i c.mp4 -filter_complex "[0:v]split[a][c];[a]scale=width=640:height=360[small];'
+            '[1:a]volume=volume=2[aud]" -map \'[small]\' -map \'[c]\' -map \'[aud]\' -map_metadata 1 out.mp4'
+        )
+        self.assertEqual([f.split("=")[0] for f in result.removed], ["hflip", "eq", "hflip", "split"])
+        self.assertEqual(len(result.by_pass("dead-branches")), 5)
+        self.assertFalse(optimize_graph(result.command).changed)
+
+    def test_automatic_stream_selection_kept(self):
+        """测试没有 -map 或有输出文件未指定 -map 时保留输入"""
+        command = 'ffmpeg -i a.mp4 -i b.mp4 -filter_complex "[0:v]hflip[x];[0:v]vflip[y]" out.mp4'
+        self.assertFalse(optimize_graph(command, select=["dead-branches"]).changed)
+        command = 'ffmpeg -i a.mp4 -i b.mp4 -filter_complex "[0:v]hflip[x];[0:v]vflip[y]" -map [x] a.mp4 b.mp4'
+        result = optimize_graph(command, select=["dead-branches"])
+        self.assertEqual(graph_of(result), "[0:v]hflip[x]")
+        self.assertEqual(len(result.command.inputs), 2)
+
+    def test_negative_input_index_options(self):
+        """测试 -map_metadata -1、-map_chapters -1 表示不复制，不算引用输入，删除输入后保持不变"""
+        command = ('ffmpeg -i unused.mp4 -i a.mp4 -filter_complex "[1:v]hflip[v]" -map [v] '
+                   '-map_metadata -1 -map_chapters -1 out.mp4')
+        expected = ('ffmpeg -i a.mp4 -filter_complex "[0:v]hflip[v]" -map \'[v]\' '
+                    '-map_metadata -1 -map_chapters -1 out.mp4')
+        self.assertEqual(format_command(optimize_graph(command, select=["dead-branches"]).command), expected)
+        processor = FFmpegCommandProcessor(enable_hw_accel=False)
+        self.assertEqual(
+            processor.prepare_command(command),
+            'ffmpeg -y -i a.mp4 -filter_complex "[0:v]hflip[v]" -map \'[v]\' -map_metadata -1 -map_chapters -1 out.mp4'
+        )
+
+    def test_processor_mid_chain_labels(self):
+        """测试处理器按链中间的标签判断滤镜链与输入是否被使用，删除输入后改写这些标签"""
+        processor = FFmpegCommandProcessor(enable_hw_accel=False)
+        self.assertEqual(
+            processor.prepare_command(
+                'ffmpeg -i a.mp4 -i unused.mp4 -i b.mp4 -filter_complex '
+                '"[2:v]hflip[x];[0:v]scale=640:360,[x]overlay,[2:v]overlay[o]" -map [o] out.mp4'
+            ),
+            'ffmpeg -y -i a.mp4 -i b.mp4 -filter_complex '
+            '"[1:v]hflip[x];[0:v]scale=640:360,[x]overlay,[1:v]overlay[o]" -map \'[o]\' out.mp4'
+        )
+
+    def test_processor_keeps_stdout_output(self):
+        """测试输出到标准输出（-）的命令保留输出目标"""
+        processor = FFmpegCommandProcessor(enable_hw_accel=False)
+        self.assertEqual(
+            processor.prepare_command('ffmpeg -i a.mp4 -i b.mp4 -filter_complex "[0:v]hflip[v]" -map [v] -f null -'),
+            "ffmpeg -y -i a.mp4 -filter_complex \"[0:v]hflip[v]\" -map '[v]' -f null -"
+        )
+
+    def test_processor_prunes_before_generating(self):
+        """测试命令处理器按 -map 删除不可达的滤镜链与输入"""
+        processor = FFmpegCommandProcessor(enable_hw_accel=False)
+        self.assertEqual(
+            processor.prepare_command(DEAD_BRANCHES.replace(" out.mp4", " -c:v libx264 out.mp4")),
+            'ffmpeg -y -i a.mp4 -i c.mp4 -filter_complex "[0:v]split=2[a][c];[a]scale=640:360[small];'
+            '[1:a]volume=2[aud]" -map \'[small]\' -map \'[c]\' -map \'[aud]\' -c:v libx264 -map_metadata 1 out.mp4'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
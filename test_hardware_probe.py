@@ -0,0 +1,101 @@
+import tempfile
+import threading
+import unittest
+from hardware.acceleration import AccelerationManager
+from hardware.probe import Adapter, DeviceStatus, HardwareProbe, HardwareSnapshot, StaticProbe
+
+HWACCELS = "Hardware acceleration methods:\ncuda\nvaapi\n"
+NVIDIA_SMI = "0, NVIDIA GeForce RTX 3090, 24576\n1, NVIDIA GeForce RTX 3060, 12288\n"
+NODES = {"/dev/nvidia[0-9]*": ["/dev/nvidia1", "/dev/nvidia0"], "/dev/dri/renderD*": ["/dev/dri/renderD128"]}
+
+
+class FakeRunner:
+    """按参数返回预设结果并记录调用"""
+
+    def __init__(self, init_results=None):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.init_results = init_results or {}
+
+    def __call__(self, args, timeout):
+        with self.lock:
+            self.calls.append(list(args))
+        if args[0] == "nvidia-smi":
+            return 0, NVIDIA_SMI
+        if "-hwaccels" in args:
+            return 0, HWACCELS
+        spec = args[args.index("-init_hw_device") + 1]
+        return self.init_results.get(spec.split("=")[0], (0, ""))
+
+
+class TestHardwareProbe(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_probe_devices(self):
+        """测试设备节点、-hwaccels 与 -init_hw_device 共同决定可用性，并列出显卡"""
+        runner = FakeRunner({"vaapi": (1, "Failed to initialise VAAPI connection\n")})
+        snapshot = HardwareProbe(runner=runner, find_nodes=lambda pattern: NODES.get(pattern, [])).probe("ffmpeg")
+        self.assertEqual(snapshot.hwaccels, ("cuda", "vaapi"))
+        self.assertEqual(snapshot.available_devices, ["cuda"])
+        self.assertEqual([(a.index, a.name, a.memory_mb) for a in snapshot.adapters("cuda")],
+                         [(0, "NVIDIA GeForce RTX 3090", 24576), (1, "NVIDIA GeForce RTX 3060", 12288)])
+        self.assertEqual(snapshot.devices["qsv"].reason, "FFmpeg 不支持 -hwaccel qsv")
+        self.assertIn("Failed to initialise VAAPI connection", snapshot.devices["vaapi"].reason)
+        self.assertIn(["ffmpeg", "-hide_banner", "-v", "error", "-init_hw_device", "vaapi=va:/dev/dri/renderD128",
+                       "-f", "lavfi", "-i", "nullsrc=s=64x64:d=0.04", "-f", "null", "-"], runner.calls)
+
+        # 没有设备节点时不启动任何 ffmpeg 进程
+        runner = FakeRunner()
+        snapshot = HardwareProbe(runner=runner, find_nodes=lambda pattern: []).probe("ffmpeg")
+        self.assertEqual(snapshot.available_devices, [])
+        self.assertEqual(runner.calls, [["ffmpeg", "-hide_banner", "-hwaccels"]])
+        self.assertTrue(snapshot.devices["cuda"].reason.startswith("未找到设备节点"))
+
+    def test_timeout_reported(self):
+        """测试试运行超时时设备不可用并说明原因"""
+        runner = FakeRunner({"cuda": (None, "超时（5 秒）")})
+        snapshot = HardwareProbe(runner=runner, find_nodes=lambda pattern: NODES.get(pattern, [])).probe("ffmpeg")
+        self.assertFalse(snapshot.is_available("cuda"))
+        self.assertIn("超时", snapshot.devices["cuda"].reason)
+
+    def test_snapshot_cached_with_ttl(self):
+        """测试快照在有效期内从内存与磁盘读取，过期后重新探测"""
+        runner = FakeRunner()
+
+        def probe(ttl=3600.0):
+            return HardwareProbe("missing-ffmpeg-binary", ttl=ttl, cache_dir=self.tmp.name, runner=runner,
+                                 find_nodes=lambda pattern: NODES.get(pattern, []))
+
+        first = probe()
+        snapshot = first.snapshot()
+        # 没有 ffmpeg 时只查询显卡清单
+        self.assertEqual(len(runner.calls), 1)
+        self.assertEqual(snapshot.devices["cuda"].reason, "未找到 FFmpeg 可执行文件")
+        self.assertIs(first.snapshot(), snapshot)
+        cached = probe().snapshot()
+        self.assertEqual(len(runner.calls), 1)
+        self.assertEqual(cached.to_data(), snapshot.to_data())
+        probe(ttl=-1).snapshot()
+        self.assertEqual(len(runner.calls), 2)
+        first.snapshot(refresh=True)
+        self.assertEqual(len(runner.calls), 3)
+
+    def test_manager_on_cpu_only_host(self):
+        """测试没有硬件时加速管理器正常构造并回退到软件处理"""
+        manager = AccelerationManager(StaticProbe())
+        self.assertIsNone(manager.active_accelerator)
+        self.assertEqual(manager.get_current_accelerator(), "software")
+
+        snapshot = HardwareSnapshot(None, ("vaapi",), {
+            "vaapi": DeviceStatus("vaapi", True, (Adapter("vaapi", 0, node="/dev/dri/renderD128"),))
+        })
+        manager = AccelerationManager(StaticProbe(snapshot))
+        self.assertEqual(manager.get_current_accelerator(), "vaapi")
+        self.assertEqual(manager.accelerators["vaapi"].get_device_info(),
+                         {"name": "", "node": "/dev/dri/renderD128"})
+
+
+if __name__ == '__main__':
+    unittest.main()
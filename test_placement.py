@@ -0,0 +1,87 @@
+import unittest
+from core.cost_model import CostModel, CostTable
+from core.graph_optimizer import optimize_graph
+from core.placement import GPU, PlacementPlanner
+from hardware.acceleration import AccelerationManager
+from hardware.equivalence import EquivalenceCatalog
+from hardware.probe import Adapter, DeviceStatus, HardwareSnapshot, StaticProbe
+from parsers.grammar_parser import GrammarParser
+from parsers.graph_writer import format_graph
+from parsers.propagation import StreamInfo
+
+
+def graph_of(result):
+    return format_graph(result.command.filter_chains)
+
+
+def place(command, device="cuda", inputs=None):
+    return optimize_graph(command, inputs, select=["placement"],
+                          options={"placement": {"device": device, "table": CostTable(), "catalog": EquivalenceCatalog()}})
+
+
+class TestPlacementPlanner(unittest.TestCase):
+    def test_transfers_dominate_keeps_cpu(self):
+        """测试轻量滤镜的上传/下载成本高于收益时整条链留在 CPU"""
+        command = 'ffmpeg -i a.mp4 -filter_complex "[0:v]scale=iw/2:ih/2,hflip[v]" -map [v] -c:v libx264 out.mp4'
+        result = place(command, inputs={"0:v": StreamInfo("video", 640, 360, "yuv420p", 25.0)})
+        self.assertFalse(result.changed)
+        # 1080p 的缩放计算量足以抵消传输
+        self.assertTrue(place(command).changed)
+
+    def test_transfers_only_at_segment_boundaries(self):
+        """测试连续的设备滤镜只上传一次；GPU 编码器不需要下载，CPU 编码器在链尾下载一次"""
+        graph = "[0:v]scale=3840:2160,yadif,scale=1280:720[v]"
+        result = place(f'ffmpeg -i a.mp4 -filter_complex "{graph}" -map [v] -c:v h264_nvenc out.mp4')
+        self.assertEqual(graph_of(result),
+                         "[0:v]hwupload_cuda,scale_cuda=w=3840:h=2160,yadif_cuda,scale_cuda=w=1280:h=720[v]")
+        result = place(f'ffmpeg -i a.mp4 -filter_complex "{graph}" -map [v] -c:v libx264 out.mp4')
+        self.assertEqual(graph_of(result),
+                         "[0:v]hwupload_cuda,scale_cuda=w=3840:h=2160,yadif_cuda,scale_cuda=w=1280:h=720,"
+                         "hwdownload,format=yuv420p[v]")
+        # 已指定设备的链保持不变
+        self.assertFalse(place(result.command).changed)
+
+        planner = PlacementPlanner("cuda", CostModel(CostTable()))
+        chains = GrammarParser().parse_command(
+            f'ffmpeg -i a.mp4 -filter_complex "{graph}" -map [v] out.mp4').filter_chains
+        placement = planner.plan(chains, [{"maps": ["v"]}]).placements[0]
+        self.assertEqual(placement.locations, (GPU, GPU, GPU))
+        self.assertEqual((placement.uploads, placement.downloads), (1, 1))
+        self.assertLess(placement.planned_seconds, placement.cpu_seconds / 4)
+
+    def test_multi_input_and_device_setup(self):
+        """测试多输入滤镜的 CPU 输入单独上传，VAAPI 自动初始化设备，CPU 分支只下载一次"""
+        result = place(
+            'ffmpeg -i a.mp4 -i logo.png -filter_complex "[0:v]scale=3840:2160,split[x][y];[x][1:v]overlay=10:10[v];'
+            '[y]eq=contrast=1.2[w]" -map [v] -c:v h264_vaapi main.mp4 -map [w] -c:v libx264 preview.mp4',
+            device="vaapi"
+        )
+        self.assertEqual(
+            graph_of(result),
+            "[0:v]format=nv12,hwupload,scale_vaapi=w=3840:h=2160,split[x][y];[1:v]format=nv12,hwupload[t0];"
+            "[x][t0]overlay_vaapi=x=10:y=10[v];[y]hwdownload,format=nv12,eq=contrast=1.2[w]"
+        )
+        self.assertEqual(result.command.global_options["init_hw_device"], "vaapi=va")
+        self.assertEqual(graph_of(place(result.command, device="vaapi")), graph_of(result))
+
+    def test_acceleration_manager_uses_planner(self):
+        """测试加速管理器通过放置规划替换滤镜并设置编码器"""
+        snapshot = HardwareSnapshot(None, ("cuda",), {
+            "cuda": DeviceStatus("cuda", True, (Adapter("cuda", 0, "NVIDIA GeForce RTX 3090", "/dev/nvidia0"),))
+        })
+        manager = AccelerationManager(StaticProbe(snapshot))
+        self.assertEqual(manager.active_accelerator, "cuda")
+        parsed = GrammarParser().parse_command(
+            'ffmpeg -i a.mp4 -filter_complex "[0:v]scale=3840:2160,scale=1280:720[v]" -map [v] out.mp4'
+        ).to_dict()
+        parsed["outputs"][0]["video_codec"] = "libx264"
+        optimized = manager.optimize_command(parsed, table=CostTable(), catalog=EquivalenceCatalog())
+        self.assertEqual(optimized["outputs"][0]["video_codec"], "h264_nvenc")
+        self.assertEqual(
+            [f["name"] for f in optimized["filter_chains"][0]["filters"]],
+            ["hwupload_cuda", "scale_cuda", "scale_cuda"]
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import stat
+import tempfile
+import unittest
+from pathlib import Path
+from parsers.filter_parser import FilterParser
+from parsers.propagation import StreamInfo, PropertyPropagator, propagate, probe_inputs
+
+SAMPLE_GRAPH = (
+    "[1:v]scale=iw*1.0:ih*1.0,rotate=0.0*PI/180,format=rgba[v2];"
+    "[0:v]scale=iw/2:ih/2[base1];[v2]scale=iw/2:-2[base2];[base1][base2]vstack[outv];"
+    "[0:a][1:a]amix=inputs=2[aout];[outv]split=2[x][y];[x]fps=ntsc,setpts=0.5*PTS[fast];[y]crop=iw/2[half]"
+)
+
+INPUTS = {
+    "0:v": StreamInfo("video", 1280, 720, "yuv420p", 25.0),
+    "1:v": StreamInfo("video", 1920, 1080, "yuv420p", 30.0),
+    "0:a": StreamInfo("audio", sample_rate=48000, channels=2),
+    "1:a": StreamInfo("audio", sample_rate=44100, channels=6),
+}
+
+PROBE_OUTPUT = {"streams": [
+    {"codec_type": "video", "width": 3840, "height": 2160, "pix_fmt": "yuv420p10le", "avg_frame_rate": "60000/1001"},
+    {"codec_type": "audio", "sample_rate": "48000", "channels": 2},
+]}
+
+FAKE_FFPROBE = """#!{python}
+import sys
+with open({log!r}, "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+print({output!r})
+"""
+
+
+class TestPropagation(unittest.TestCase):
+    def setUp(self):
+        self.parsed = FilterParser().parse(SAMPLE_GRAPH)
+
+    def test_geometry_and_formats(self):
+        """测试宽高、像素格式、帧率与声道沿滤镜图传递"""
+        labels = propagate(self.parsed.filter_chains, INPUTS).labels
+        self.assertEqual((labels["v2"].width, labels["v2"].height, labels["v2"].pix_fmt), (1920, 1080, "rgba"))
+        self.assertEqual((labels["base1"].width, labels["base1"].height), (640, 360))
+        self.assertEqual((labels["base2"].width, labels["base2"].height), (960, 540))
+        self.assertEqual((labels["outv"].width, labels["outv"].height), (640, 900))
+        self.assertEqual((labels["aout"].sample_rate, labels["aout"].channels), (48000, 6))
+        self.assertEqual(labels["x"], labels["y"])
+        self.assertAlmostEqual(labels["fast"].frame_rate, 60000 / 1001)
+        self.assertEqual(labels["half"].width, 320)
+
+    def test_edges_and_unknown_inputs(self):
+        """测试按边给出属性，未声明的输入保持未知"""
+        result = propagate(self.parsed.filter_chains, {"0:v": INPUTS["0:v"]})
+        self.assertEqual(len(result.edges), result.graph.edge_count)
+        self.assertIsNone(result.labels["v2"].width)
+        self.assertEqual(result.labels["v2"].pix_fmt, "rgba")
+        inputs, outputs = result.filter_io(0, 0)
+        self.assertEqual(inputs[0].kind, "video")
+
+    def test_cache_by_inputs(self):
+        """测试相同滤镜图与输入属性复用结果"""
+        propagator = PropertyPropagator()
+        first = propagator.propagate(self.parsed, INPUTS)
+        self.assertIs(propagator.propagate(self.parsed, dict(INPUTS)), first)
+        changed = dict(INPUTS, **{"0:v": StreamInfo("video", 640, 360, "yuv420p", 25.0)})
+        self.assertIsNot(propagator.propagate(self.parsed, changed), first)
+
+    @unittest.skipIf(os.name == "nt", "伪 ffprobe 脚本依赖 shebang")
+    def test_probe_cached_by_fingerprint(self):
+        """测试输入文件按指纹只探测一次"""
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            log = root / "calls.log"
+            ffprobe = root / "ffprobe"
+            ffprobe.write_text(FAKE_FFPROBE.format(python=sys.executable, log=str(log), output=json.dumps(PROBE_OUTPUT)))
+            ffprobe.chmod(ffprobe.stat().st_mode | stat.S_IEXEC)
+            media = root / "in.mp4"
+            media.write_bytes(b"\0" * 16)
+
+            labels = probe_inputs([str(media)], str(ffprobe))
+            self.assertEqual(labels["0:v"], labels["0:v:0"])
+            self.assertEqual((labels["0:v"].width, labels["0:v"].pix_fmt), (3840, "yuv420p10le"))
+            self.assertEqual(labels["0:a"].sample_rate, 48000)
+            probe_inputs([str(media), str(media)], str(ffprobe))
+            self.assertEqual(len(log.read_text().splitlines()), 1)
+
+            media.write_bytes(b"\0" * 32)
+            probe_inputs([str(media)], str(ffprobe))
+            self.assertEqual(len(log.read_text().splitlines()), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
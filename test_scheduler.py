@@ -0,0 +1,111 @@
+import threading
+import unittest
+from core.error_types import FFmpegError
+from hardware.probe import Adapter, DeviceStatus, HardwareSnapshot
+from hardware.scheduler import DeviceScheduler, Job, NVENC_CONSUMER_SESSIONS, rewrite_device
+from parsers.grammar_parser import GrammarParser
+from parsers.graph_writer import format_command
+from parsers.propagation import StreamInfo
+
+
+def inventory(*adapters):
+    devices = {}
+    for adapter in adapters:
+        status = devices.get(adapter.device)
+        devices[adapter.device] = DeviceStatus(adapter.device, True, (status.adapters if status else ()) + (adapter,))
+    return HardwareSnapshot(None, tuple(devices), devices)
+
+
+GEFORCE = (Adapter("cuda", 0, "NVIDIA GeForce RTX 3090", "/dev/nvidia0", 24576),
+           Adapter("cuda", 1, "NVIDIA GeForce RTX 3060", "/dev/nvidia1", 12288))
+
+
+def rewrite(command, adapter):
+    return format_command(rewrite_device(GrammarParser().parse_command(command), adapter))
+
+
+class TestDeviceScheduler(unittest.TestCase):
+    def test_least_loaded_with_session_limits(self):
+        """测试任务分配到负载最低的显卡，消费级 NVENC 的会话数不超过上限"""
+        scheduler = DeviceScheduler(inventory(*GEFORCE))
+        assignments = [scheduler.assign(Job(f"j{i}", "cuda", vram_mb=500)) for i in range(2 * NVENC_CONSUMER_SESSIONS)]
+        self.assertEqual([a.adapter.index for a in assignments[:4]], [0, 1, 0, 1])
+        self.assertEqual([load.sessions for load in scheduler.loads("cuda")], [NVENC_CONSUMER_SESSIONS] * 2)
+        self.assertIsNone(scheduler.assign(Job("extra", "cuda", vram_mb=500)))
+        scheduler.release(assignments[3])
+        self.assertEqual(scheduler.assign(Job("extra", "cuda", vram_mb=500)).adapter.index, 1)
+
+        # 只编码不占会话的任务按显存预算分配
+        scheduler = DeviceScheduler(inventory(*GEFORCE))
+        indexes = [scheduler.assign(Job(f"d{i}", "cuda", sessions=0, vram_mb=5000)).adapter.index for i in range(6)]
+        self.assertEqual(sorted(indexes), [0, 0, 0, 0, 1, 1])
+        self.assertIsNone(scheduler.assign(Job("d6", "cuda", sessions=0, vram_mb=5000)))
+
+    def test_professional_cards_and_capacity_errors(self):
+        """测试专业卡不限会话数，超出设备容量或没有设备时报错"""
+        scheduler = DeviceScheduler(inventory(Adapter("cuda", 0, "NVIDIA RTX A6000", memory_mb=49140)))
+        for i in range(NVENC_CONSUMER_SESSIONS + 4):
+            self.assertIsNotNone(scheduler.assign(Job(f"j{i}", "cuda", vram_mb=100)))
+        with self.assertRaises(FFmpegError):
+            scheduler.assign(Job("huge", "cuda", vram_mb=60000))
+        with self.assertRaises(FFmpegError):
+            scheduler.assign(Job("q", "qsv"))
+        limited = DeviceScheduler(inventory(*GEFORCE), session_limits={"cuda": 1})
+        limited.assign(Job("a", "cuda"))
+        limited.assign(Job("b", "cuda"))
+        self.assertIsNone(limited.assign(Job("c", "cuda")))
+
+    def test_acquire_waits_for_release(self):
+        """测试设备已满时 acquire 等待释放，超时报错"""
+        scheduler = DeviceScheduler(inventory(GEFORCE[0]), session_limits={"cuda": 1})
+        first = scheduler.acquire(Job("a", "cuda"))
+        with self.assertRaises(FFmpegError):
+            scheduler.acquire(Job("b", "cuda"), timeout=0.01)
+        timer = threading.Timer(0.05, scheduler.release, (first,))
+        timer.start()
+        self.assertEqual(scheduler.acquire(Job("b", "cuda"), timeout=5).job.job_id, "b")
+        timer.join()
+
+    def test_rewrite_device_options(self):
+        """测试按分配的设备改写 -hwaccel_device、-init_hw_device 与 NVENC 的 -gpu"""
+        gpu1, render = GEFORCE[1], "/dev/dri/renderD129"
+        self.assertEqual(rewrite("ffmpeg -hwaccel cuda -i a.mp4 -c:v h264_nvenc out.mp4", gpu1),
+                         "ffmpeg -hwaccel cuda -hwaccel_device 1 -i a.mp4 -c:v h264_nvenc out.mp4")
+        self.assertEqual(rewrite("ffmpeg -init_hw_device cuda=cu:0 -i a.mp4 -c:v h264_nvenc out.mp4", gpu1),
+                         "ffmpeg -init_hw_device cuda=cu:1 -i a.mp4 -c:v h264_nvenc out.mp4")
+        self.assertEqual(rewrite("ffmpeg -i a.mp4 -c:v h264_nvenc out.mp4", gpu1),
+                         "ffmpeg -i a.mp4 -c:v h264_nvenc -gpu 1 out.mp4")
+        self.assertEqual(
+            rewrite("ffmpeg -hwaccel vaapi -init_hw_device vaapi=va -i a.mp4 -c:v h264_vaapi out.mp4",
+                    Adapter("vaapi", 1, node=render)),
+            f"ffmpeg -hwaccel vaapi -hwaccel_device va -init_hw_device vaapi=va:{render} -i a.mp4 -c:v h264_vaapi out.mp4"
+        )
+        self.assertEqual(
+            rewrite("ffmpeg -hwaccel qsv -i a.mp4 -c:v h264_qsv out.mp4", Adapter("qsv", 1, node=render)),
+            f"ffmpeg -hwaccel qsv -hwaccel_device qs -init_hw_device qsv=qs:hw,child_device={render} "
+            "-i a.mp4 -c:v h264_qsv out.mp4"
+        )
+        # 不使用该设备的命令不变
+        command = "ffmpeg -hwaccel vaapi -i a.mp4 -c:v libx264 out.mp4"
+        self.assertEqual(rewrite(command, gpu1), command)
+
+    def test_session_from_command(self):
+        """测试按命令估算会话数与显存，退出时释放设备"""
+        command = GrammarParser().parse_command(
+            'ffmpeg -hwaccel cuda -i a.mp4 -map 0:v -c:v h264_nvenc a.mp4 -map 0:v -c:v hevc_nvenc b.mp4 '
+            '-map 0:v -c:v libx264 c.mp4'
+        )
+        job = Job.from_command(command, "cuda", {"0:v": StreamInfo("video", 3840, 2160, "yuv420p", 25.0)})
+        self.assertEqual(job.sessions, 2)
+        self.assertGreater(job.vram_mb, Job.from_command(command, "cuda").vram_mb)
+        scheduler = DeviceScheduler(inventory(*GEFORCE))
+        scheduler.assign(Job("busy", "cuda", sessions=4))
+        with scheduler.session(command, "cuda") as (rewritten, assignment):
+            self.assertEqual(assignment.adapter.index, 1)
+            self.assertEqual(rewritten.global_options["hwaccel_device"], "1")
+            self.assertEqual(scheduler.loads("cuda")[1].sessions, 2)
+        self.assertEqual(scheduler.loads("cuda")[1].sessions, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
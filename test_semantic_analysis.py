@@ -7,6 +7,8 @@ from unittest.mock import patch
 from loader import init_plugins
 from parsers.semantic_analyzer import SemanticAnalyzer
 from parsers.parser_models import ParsedCommand
+from parsers.validation_session import ValidationSession
+from parsers.lint_engine import LintEngine, LintRule
 from core.error_types import FFmpegError
 
 class TestSemanticAnalyzer(unittest.TestCase):
@@ -41,6 +43,102 @@ class TestSemanticAnalyzer(unittest.TestCase):
             self.analyzer.validate(invalid_command)
         self.assertIn("未定义的输入流", str(context.exception))
 
+    def test_graph_ir_validation(self):
+        """测试滤镜图 IR：先使用后定义、重复输出、环与未消费输出"""
+        chain = lambda inputs, output: {"inputs": inputs, "output": output, "filters": []}
+        streams = [{"id": "0:v", "type": "video"}]
+
+        forward = ParsedCommand(streams=streams, filter_chains=[chain(["a"], "out"), chain(["0:v"], "a")], outputs=[])
+        self.assertTrue(self.analyzer.validate(forward))
+        self.assertEqual(list(self.analyzer.graph.order), [1, 0])
+        self.assertEqual(self.analyzer.graph.unconsumed_outputs(), ["out"])
+
+        duplicate = ParsedCommand(streams=streams, filter_chains=[chain(["0:v"], "a"), chain(["0:v"], "a")], outputs=[])
+        with self.assertRaises(FFmpegError) as context:
+            self.analyzer.validate(duplicate)
+        self.assertIn("重复的输出标签", str(context.exception))
+
+        cycle = ParsedCommand(streams=streams, filter_chains=[chain(["b"], "a"), chain(["a"], "b")], outputs=[])
+        with self.assertRaises(FFmpegError) as context:
+            self.analyzer.validate(cycle)
+        self.assertIn("循环依赖", str(context.exception))
+
+    def test_incremental_session(self):
+        """测试增量验证会话只重新验证受影响的链"""
+        session = ValidationSession({"0:v"})
+        chain = lambda inputs, output: {"inputs": inputs, "output": output, "filters": []}
+        head = session.add_chain(chain(["0:v"], "a"))
+        middle = session.add_chain(chain(["a"], "b"))
+        session.add_chain(chain(["b"], "out"))
+        others = [session.add_chain(chain(["0:v"], f"x{i}")) for i in range(50)]
+        self.assertEqual(session.diagnostics(), [])
+
+        session.stats["revalidated"] = 0
+        errors = session.replace_chain(middle, chain(["missing"], "b"))
+        self.assertEqual([e.message for e in errors], ["未定义的输入流: missing"])
+        self.assertLessEqual(session.stats["revalidated"], 3, "不相关的分支不应被重新验证")
+
+        self.assertEqual(session.replace_chain(middle, chain(["a"], "b")), [])
+        errors = session.replace_chain(head, chain(["out"], "a"))
+        self.assertTrue(all("循环依赖" in e.message for e in errors))
+        self.assertEqual(session.replace_chain(head, chain(["0:v"], "a")), [])
+        session.remove_chain(others[0])
+        self.assertEqual(session.unconsumed_outputs(), sorted(["out"] + [f"x{i}" for i in range(1, 50)]))
+
+    def test_lint_engine(self):
+        """测试检查规则融合为一次遍历、按名称选择并分别计时"""
+        class CountingRule(LintRule):
+            name = "counting"
+            visits = 0
+
+            def visit_filter(self, ctx, node, position, name, params):
+                CountingRule.visits += 1
+                if params.get("sigma") == "0.0":
+                    self.report(ctx, "gblur 无效果", chain_index=node)
+
+        command = ParsedCommand(
+            streams=[{"id": "0:v", "type": "video"}],
+            filter_chains=[
+                {"inputs": ["0:v"], "output": "a", "filters": [
+                    {"name": "scale", "params": {"width": "iw*k", "height": "720"}},
+                    {"name": "gblur", "params": {"sigma": "0.0"}}]},
+                {"inputs": ["a", "missing"], "output": "out", "filters": []}
+            ],
+            outputs=[]
+        )
+        report = self.analyzer.lint(command)
+        self.assertEqual([e.message for e in report.by_rule("graph-structure")], ["未定义的输入流: missing"])
+        self.assertEqual([e.details["param"] for e in report.by_rule("invalid-dimension")], ["width"])
+        self.assertEqual(len(report.by_rule("unknown-filter")), 1)
+        self.assertEqual(report.by_rule("unconsumed-output"), [], "默认关闭的规则不应运行")
+
+        report = self.analyzer.lint(command, select=["unconsumed-output", "unknown-filter"], ignore=["unknown-filter"])
+        self.assertEqual(list(report.timings), ["unconsumed-output"])
+        self.assertEqual([e.details["label"] for e in report.diagnostics], ["out"])
+        with self.assertRaises(FFmpegError):
+            self.analyzer.lint(command, select=["no-such-rule"])
+
+        report = LintEngine([CountingRule(), CountingRule()]).run(command)
+        self.assertEqual(CountingRule.visits, 4)
+        self.assertEqual(len(report.diagnostics), 2)
+        self.assertGreater(report.timings["counting"], 0)
+
+    def test_validate_runs_lint_rules(self):
+        """测试 validate 通过检查引擎报告尺寸与随时间变化的表达式越界"""
+        command = lambda *filters: ParsedCommand(
+            streams=[{"id": "0:v", "type": "video"}],
+            filter_chains=[{"inputs": ["0:v"], "output": "out", "filters": list(filters)}],
+            outputs=[]
+        )
+        with self.assertRaises(FFmpegError) as context:
+            self.analyzer.validate(command({"name": "scale", "params": {"width": "iw*k", "height": "720"}}))
+        self.assertEqual(context.exception.details["rule"], "invalid-dimension")
+
+        with self.assertRaises(FFmpegError) as context:
+            self.analyzer.validate(command({"name": "colorbalance", "params": {"rs": "2*sin(t)"}}))
+        self.assertEqual(context.exception.details["rule"], "expression-range")
+        self.assertEqual(context.exception.error_type, "INVALID_PARAM")
+
 if __name__ == "__main__":
     # 设置环境变量
     os.environ['DEBUG_MODE'] = 'True'
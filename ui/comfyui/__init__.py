@@ -1,4 +1,4 @@
 from .nodes import FFmpegAdvancedProcessing  # 从nodes模块导入FFmpegAdvancedProcessing类
-from .widgets import GPUOptionsWidget, WidgetConfig, FFmpegWidget, NumberWidget, SelectWidget, TextWidget
+from .widgets import WidgetConfig, FFmpegWidget, NumberWidget, SelectWidget, TextWidget
 
-__all__ = ['FFmpegAdvancedProcessing', 'GPUOptionsWidget', 'WidgetConfig', 'FFmpegWidget', 'NumberWidget', 'SelectWidget', 'TextWidget']  # 定义模块导出内容
+__all__ = ['FFmpegAdvancedProcessing', 'WidgetConfig', 'FFmpegWidget', 'NumberWidget', 'SelectWidget', 'TextWidget']  # 定义模块导出内容
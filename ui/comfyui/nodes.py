@@ -4,8 +4,13 @@ import shlex
 from typing import Dict, Any, List
 from core.command_builder import CommandBuilder
 from parsers.semantic_analyzer import SemanticAnalyzer
+from parsers.incremental_parser import IncrementalParser
 
 class FFmpegProcessingNode:
+    def __init__(self):
+        # 节点实例在多次运行间保留，只重新解析/验证改动的滤镜链
+        self.filter_parser = IncrementalParser(SemanticAnalyzer().ffmpeg_query)
+
     @classmethod
     def INPUT_TYPES(cls):
         return {
@@ -24,6 +29,11 @@ class FFmpegProcessingNode:
     CATEGORY = "FFmpeg/Processing"
 
     def process(self, input_video: str, filter_chain: str, enable_gpu: bool, audio_input: str = ""):
+        # 增量验证滤镜链
+        self.filter_parser.update(filter_chain)
+        if self.filter_parser.errors:
+            raise self.filter_parser.errors[0]
+
         # 构建基础命令
         cmd = ["ffmpeg -y"]
         if input_video:
@@ -35,7 +45,7 @@ class FFmpegProcessingNode:
         
         # 处理输出
         processor = FFmpegCommandProcessor(enable_hw_accel=enable_gpu)
-        result = processor.process(" ".join(cmd))
+        result = processor.process_command(" ".join(cmd), validated=True)
         
         if result["status"] != "success":
             raise Exception(f"FFmpeg处理失败: {result.get('message', '未知错误')}")